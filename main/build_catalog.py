@@ -0,0 +1,104 @@
+import argparse
+import os
+import sys
+
+# Find the pipeline modules next to this folder
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "year_3"))
+
+import imaging_catalog
+import imaging_registry
+
+
+def main():
+    """
+    Main function to parse command-line arguments and catalog the final files of a pipeline run.
+    """
+    # 1. --- Argument Parsing ---
+    parser = argparse.ArgumentParser(
+        description="A script to record the final files of an existing pipeline run (paths, participant, UIDs, references, checksums, metadata) in the SQLite release catalog."
+    )
+
+    parser.add_argument(
+        "-i", "--input-folder",
+        dest="input_folder",
+        required=True,
+        help="Path to the final structure folder, e.g. output/step4_final_structure.",
+        metavar="PATH"
+    )
+
+    parser.add_argument(
+        "-c", "--catalog",
+        dest="catalog",
+        required=True,
+        help="Path to the SQLite catalog, created if it does not exist.",
+        metavar="PATH"
+    )
+
+    parser.add_argument(
+        "-m", "--metadata-folder",
+        dest="metadata_folder",
+        help="Path to the metadata records of the run, e.g. output/metadata (recommended: "
+        "the checksums and references are taken from them).",
+        metavar="PATH"
+    )
+
+    parser.add_argument(
+        "--device",
+        dest="device",
+        choices=list(imaging_registry.device_domains),
+        help="Device of the run.",
+    )
+
+    parser.add_argument(
+        "--run-log",
+        dest="run_log",
+        help="Path to the run log of the run (logs/run_log.jsonl), recorded as step history.",
+        metavar="FILE"
+    )
+
+    parser.add_argument(
+        "-j", "--jobs",
+        dest="jobs",
+        type=int,
+        default=-1,
+        help="Number of headers read in parallel (-1 uses every CPU).",
+        metavar="N"
+    )
+
+    args = parser.parse_args()
+
+    print("--- Starting Release Cataloging ---")
+    print(f"Input Folder: {args.input_folder}")
+    print(f"Catalog: {args.catalog}")
+    print("-----------------------------------------")
+
+    # 2. --- Cataloging ---
+    result = imaging_catalog.catalog_folder(
+        args.catalog,
+        args.input_folder,
+        metadata_folder=args.metadata_folder,
+        device=args.device,
+        run_log_path=args.run_log,
+        n_jobs=args.jobs,
+    )
+
+    for path, error in result["Failed"]:
+        print(f"Error reading {path}: {error}")
+    print(f"Cataloged {result['Files']} files and {result['Steps']} run log records.")
+
+    # 3. --- Summary ---
+    with imaging_catalog.Catalog(args.catalog) as catalog:
+        rows = catalog.query(
+            "SELECT device, protocol, COUNT(*) AS files, COUNT(DISTINCT participant) AS participants "
+            "FROM files GROUP BY device, protocol ORDER BY device, protocol"
+        )
+    width = max([len("Protocol")] + [len(row["protocol"] or "") for row in rows]) + 2
+    print(f"\n{'Device':<12}{'Protocol':<{width}}{'Files':>8}{'Participants':>14}")
+    for row in rows:
+        print(f"{row['device'] or '':<12}{row['protocol'] or '':<{width}}{row['files']:>8}{row['participants']:>14}")
+
+
+if __name__ == "__main__":
+    # This block ensures that the main() function is called only when
+    # the script is executed directly from the terminal.
+    main()
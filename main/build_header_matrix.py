@@ -0,0 +1,131 @@
+import argparse
+import os
+import sys
+
+# Find the pipeline modules next to this folder
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "year_3"))
+
+import pandas as pd
+
+import imaging_header_matrix
+import imaging_registry
+import organize_utils
+
+imaging_registry.register_dicom_dictionary()
+
+
+def main():
+    """
+    Main function to parse command-line arguments, build the header matrix of a file set
+    and answer QA queries from it.
+    """
+    # 1. --- Argument Parsing ---
+    parser = argparse.ArgumentParser(
+        description="A script to read the headers of a DICOM file set once into a files x tags matrix, "
+        "and query it (missing tags, values per folder or per tag) without reading the files again."
+    )
+
+    parser.add_argument(
+        "-i", "--input-folder",
+        dest="input_folder",
+        required=True,
+        help="Path to the folder containing the DICOM files.",
+        metavar="PATH"
+    )
+
+    parser.add_argument(
+        "-o", "--matrix",
+        dest="matrix",
+        required=True,
+        help=f"Path to the header matrix (header_matrix{imaging_header_matrix.matrix_extension}), "
+        "updated if it exists. .parquet needs pyarrow (pip install -e .[columnar]), other "
+        "extensions are pandas pickles.",
+        metavar="PATH"
+    )
+
+    parser.add_argument(
+        "--nested",
+        dest="nested",
+        nargs="+",
+        help="Nested attributes extracted into their own column, as paths of keywords or tags "
+        "separated by '>' (default: " + ", ".join(imaging_header_matrix.nested_tags) + ").",
+        metavar="PATH"
+    )
+
+    parser.add_argument(
+        "--missing",
+        dest="missing",
+        nargs="+",
+        default=[],
+        help="List the files missing these tags (keywords or hexadecimal tags).",
+        metavar="TAG"
+    )
+
+    parser.add_argument(
+        "--values",
+        dest="values",
+        nargs="+",
+        default=[],
+        help="Count the values these tags take.",
+        metavar="TAG"
+    )
+
+    parser.add_argument(
+        "--by",
+        dest="by",
+        help="Count the --values per value of this column (folder, or a tag such as SOPClassUID).",
+        metavar="COLUMN"
+    )
+
+    parser.add_argument(
+        "-j", "--jobs",
+        dest="jobs",
+        type=int,
+        default=-1,
+        help="Number of headers read in parallel (-1 uses every CPU).",
+        metavar="N"
+    )
+
+    args = parser.parse_args()
+
+    print("--- Starting Header Matrix ---")
+    print(f"Input Folder: {args.input_folder}")
+    print(f"Matrix: {args.matrix}")
+    print("-----------------------------------------")
+
+    # 2. --- Matrix ---
+    # Only the DICOM files: a release also holds its manifest.tsv files
+    files = organize_utils.get_dcm_files(args.input_folder)
+    matrix = imaging_header_matrix.build_matrix(
+        files, args.matrix, root=args.input_folder, nested=args.nested, n_jobs=args.jobs
+    )
+
+    errors = matrix.frame[matrix.frame["error"].notna()]
+    for _, row in errors.iterrows():
+        print(f"Error reading {row['filepath']}: {row['error']}")
+    print(f"{len(matrix.frame)} files, {len(matrix.tag_columns)} top-level tags, {len(errors)} unreadable.")
+
+    # 3. --- Structure checks, from the matrix ---
+    print(f"{len(organize_utils.group_by_signature(files, matrix=matrix))} structure group(s).")
+    organize_utils.same_number_tags(files, matrix=matrix)
+    organize_utils.check_unique_sopclassuids(
+        [file for file in files if matrix.row(file)["error"] is None], matrix=matrix
+    )
+
+    # 4. --- Queries ---
+    for tag in args.missing:
+        missing = matrix.missing(tag)
+        print(f"\n{len(missing)} file(s) missing {tag}:")
+        for file in missing:
+            print("  ", file)
+
+    with pd.option_context("display.max_rows", None, "display.max_colwidth", 80, "display.width", 200):
+        for tag in args.values:
+            print(f"\nValues of {tag}" + (f" by {args.by}:" if args.by else ":"))
+            print(matrix.values(tag, by=args.by).to_string(index=False))
+
+
+if __name__ == "__main__":
+    # This block ensures that the main() function is called only when
+    # the script is executed directly from the terminal.
+    main()
@@ -0,0 +1,122 @@
+import argparse
+import json
+import os
+import sys
+
+# Find the pipeline modules next to this folder
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "year_3"))
+
+import release_diff
+
+
+def main():
+    """
+    Main function to parse command-line arguments and compare two releases.
+    """
+    # 1. --- Argument Parsing ---
+    parser = argparse.ArgumentParser(
+        description="A script to list the files added, removed, moved and changed between two releases."
+    )
+
+    parser.add_argument(
+        "--old",
+        dest="old_folder",
+        required=True,
+        help="Path to the root of the previous release.",
+        metavar="PATH"
+    )
+
+    parser.add_argument(
+        "--new",
+        dest="new_folder",
+        required=True,
+        help="Path to the root of the new release.",
+        metavar="PATH"
+    )
+
+    parser.add_argument(
+        "--old-index",
+        dest="old_index",
+        help="Index of the previous release, reused for unchanged files and updated (JSON Lines).",
+        metavar="FILE"
+    )
+
+    parser.add_argument(
+        "--new-index",
+        dest="new_index",
+        help="Index of the new release, reused for unchanged files and updated (JSON Lines).",
+        metavar="FILE"
+    )
+
+    parser.add_argument(
+        "--old-metadata",
+        dest="old_metadata",
+        help="Metadata folder of the previous release; its pixel data checksums spare reading the pixel data.",
+        metavar="PATH"
+    )
+
+    parser.add_argument(
+        "--new-metadata",
+        dest="new_metadata",
+        help="Metadata folder of the new release; its pixel data checksums spare reading the pixel data.",
+        metavar="PATH"
+    )
+
+    parser.add_argument(
+        "-o", "--output",
+        dest="output",
+        default="release_diff.json",
+        help="Path to the JSON report (default: release_diff.json).",
+        metavar="FILE"
+    )
+
+    parser.add_argument(
+        "--explain-limit",
+        dest="explain_limit",
+        type=int,
+        default=100,
+        help="Number of changed files opened to explain what changed (default: 100).",
+        metavar="N"
+    )
+
+    parser.add_argument(
+        "-j", "--jobs",
+        dest="jobs",
+        type=int,
+        default=-1,
+        help="Number of files indexed in parallel (-1 uses every CPU).",
+        metavar="N"
+    )
+
+    args = parser.parse_args()
+
+    print("--- Starting Release Comparison ---")
+    print(f"Previous Release: {args.old_folder}")
+    print(f"New Release: {args.new_folder}")
+    print("-----------------------------------------")
+
+    # 2. --- Comparison ---
+    result = release_diff.release_diff(
+        args.old_folder,
+        args.new_folder,
+        old_index_path=args.old_index,
+        new_index_path=args.new_index,
+        old_metadata=args.old_metadata,
+        new_metadata=args.new_metadata,
+        explain_limit=args.explain_limit,
+        n_jobs=args.jobs,
+    )
+
+    with open(args.output, "w") as file:
+        json.dump(result, file, indent=2)
+
+    for key in ["Added", "Removed", "Moved", "Changed"]:
+        print(f"{key:<12}{len(result[key]):>8}")
+    print(f"{'Unchanged':<12}{result['Unchanged']:>8}")
+    print(f"Report: {args.output}")
+
+
+if __name__ == "__main__":
+    # This block ensures that the main() function is called only when
+    # the script is executed directly from the terminal.
+    main()
@@ -1,55 +1,25 @@
-import sys
-
-sys.path.append("/Users/nayoonkim/pipeline_imaging/aireadi_retinal_imaging/year_3")
 import argparse
 import os
+import sys
+
+# Find the pipeline modules next to this folder
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "year_3"))
 
 import compliance_report
 import compliance_rules
+import imaging_header_matrix
+import imaging_registry
 import imaging_utils
 import nested_structure_excel
 import pydicom
 
 print(pydicom.__version__)
 
-from pydicom.datadict import DicomDictionary, keyword_dict
 from pydicom.dataset import Dataset
 
-# Define items as (VR, VM, description, is_retired flag, keyword)
-#   Leave is_retired flag blank.
-new_dict_items = {
-    0x00221627: (
-        "SQ",
-        "1",
-        "En Face Volume Descriptor Sequence",
-        "",
-        "EnFaceVolumeDescriptorSequence",
-    ),
-    0x00221629: (
-        "CS",
-        "1",
-        "En Face Volume Descriptor Scope",
-        "",
-        "EnFaceVolumeDescriptorScope",
-    ),
-    0x0008114C: (
-        "SQ",
-        "1",
-        "Referenced Segmentation Sequence",
-        "",
-        "ReferencedSegmentationSequence",
-    ),
-    0x00660005: ("FL", "1", "Surface Offset", "", "SurfaceOffset"),
-}
-
-# Update the dictionary itself
-DicomDictionary.update(new_dict_items)
-
-# Update the reverse mapping from name to tag
-new_names_dict = dict([(val[4], tag) for tag, val in new_dict_items.items()])
-keyword_dict.update(new_names_dict)
-
-def sort_them_by_sop_class(input_folder, device_protocol, output_folder):
+imaging_registry.register_dicom_dictionary()
+
+def sort_them_by_sop_class(input_folder, device_protocol, output_folder, matrix_path=None):
     # Initialize lists to store files based on SOP Class
     sop_class_1 = []
     sop_class_2 = []
@@ -68,9 +38,21 @@ def sort_them_by_sop_class(input_folder, device_protocol, output_folder):
     input_list = imaging_utils.get_filtered_file_names(input_folder)
     input_list = sorted(input_list, key=imaging_utils.extract_numeric_part)
 
+    # With a header matrix, the headers are read once (or not at all for unchanged
+    # files) and every report below is written from it
+    matrix = None
+    if matrix_path:
+        matrix = imaging_header_matrix.build_matrix(input_list, matrix_path, root=input_folder)
+        sop_classes = {
+            file: summary["SOPClassUID"] for file, summary in matrix.summaries(input_list).items()
+        }
+
     for file in input_list:
-        dicom = pydicom.dcmread(file)
-        sop_class = dicom.SOPClassUID
+        if matrix is not None:
+            sop_class = sop_classes[file]
+        else:
+            dicom = pydicom.dcmread(file)
+            sop_class = dicom.SOPClassUID
 
         # Sort files based on SOP class
         if sop_class == "1.2.840.10008.5.1.4.1.1.77.1.5.1":
@@ -97,6 +79,7 @@ def sort_them_by_sop_class(input_folder, device_protocol, output_folder):
             compliance_rules.cfp_ir_rule,
             sorted(sop_class_1),
             f"{output_folder}/{device}/{device_protocol}_eval_op.xlsx",
+            matrix=matrix,
         )
 
         nested_structure_excel.multi_create_excelsheet_nested_structure(
@@ -119,6 +102,7 @@ def sort_them_by_sop_class(input_folder, device_protocol, output_folder):
                 "0022001A",
             ],
             f"{output_folder}/{device}/{device_protocol}_eval_op_nested.xlsx",
+            matrix=matrix,
         )
 
     if sop_class_2:
@@ -127,6 +111,7 @@ def sort_them_by_sop_class(input_folder, device_protocol, output_folder):
             compliance_rules.oct_b_rule,
             sorted(sop_class_2),
             f"{output_folder}/{device}/{device_protocol}_eval_oct.xlsx",
+            matrix=matrix,
         )
         nested_structure_excel.multi_create_excelsheet_nested_structure(
             sorted(sop_class_2),
@@ -148,6 +133,7 @@ def sort_them_by_sop_class(input_folder, device_protocol, output_folder):
                 "00082218",
             ],
             f"{output_folder}/{device}/{device_protocol}_eval_oct_nested.xlsx",
+            matrix=matrix,
         )
 
     if sop_class_3:
@@ -156,6 +142,7 @@ def sort_them_by_sop_class(input_folder, device_protocol, output_folder):
             compliance_rules.volume_analysis_rule,
             sorted(sop_class_3),
             f"{output_folder}/{device}/{device_protocol}_eval_volume_analysis.xlsx",
+            matrix=matrix,
         )
 
         # # oct volume
@@ -175,6 +162,7 @@ def sort_them_by_sop_class(input_folder, device_protocol, output_folder):
                 "00221640",
             ],
             f"{output_folder}/{device}/{device_protocol}_eval_volume_analysis_nested.xlsx",
+            matrix=matrix,
         )
 
     # segmentation
@@ -183,6 +171,7 @@ def sort_them_by_sop_class(input_folder, device_protocol, output_folder):
             compliance_rules.heightmap_rule,
             sorted(sop_class_4),
             f"{output_folder}/{device}/{device_protocol}_eval_heightmap_segmentation.xlsx",
+            matrix=matrix,
         )
 
         nested_structure_excel.multi_create_excelsheet_nested_structure(
@@ -201,6 +190,7 @@ def sort_them_by_sop_class(input_folder, device_protocol, output_folder):
                 "00081115",
             ],
             f"{output_folder}/{device}/{device_protocol}_eval_heightmap_segmentation_nested.xlsx",
+            matrix=matrix,
         )
 
     # Enface
@@ -209,6 +199,7 @@ def sort_them_by_sop_class(input_folder, device_protocol, output_folder):
             compliance_rules.octa_enface_rule,
             sorted(sop_class_5),
             f"{output_folder}/{device}/{device_protocol}_eval_en_face.xlsx",
+            matrix=matrix,
         )
 
         # compliance_report.create_report(
@@ -244,6 +235,7 @@ def sort_them_by_sop_class(input_folder, device_protocol, output_folder):
                 "00221632",
             ],
             f"{output_folder}/{device}/{device_protocol}_eval_enface_nested.xlsx",
+            matrix=matrix,
         )
 
     if sop_class_6:
@@ -251,6 +243,7 @@ def sort_them_by_sop_class(input_folder, device_protocol, output_folder):
             compliance_rules.cfp_ir_16_rule,
             sorted(sop_class_6),
             f"{output_folder}/{device}/{device_protocol}_op_16.xlsx",
+            matrix=matrix,
         )
 
         # 2d
@@ -274,6 +267,7 @@ def sort_them_by_sop_class(input_folder, device_protocol, output_folder):
                 "0022001A",
             ],
             f"{output_folder}/{device}/{device_protocol}_op_16_nested.xlsx",
+            matrix=matrix,
         )
     return (
         sop_class_1,
@@ -286,7 +280,11 @@ def sort_them_by_sop_class(input_folder, device_protocol, output_folder):
 
 
 
-if __name__ == "__main__":
+def main():
+    """
+    Main function to parse command-line arguments, sort the DICOM files by SOP Class UID
+    and write the compliance reports.
+    """
     # 1. Create an ArgumentParser object
     parser = argparse.ArgumentParser(
         description="Sort DICOM files by SOP Class UID and generate compliance reports."
@@ -308,6 +306,13 @@ if __name__ == "__main__":
         type=str,
         help="Path to the folder where the output reports will be saved.",
     )
+    parser.add_argument(
+        "--matrix",
+        dest="matrix",
+        help="Header matrix of the input files (see the header-matrix command), built or updated "
+        f"first; the reports are then written from it. E.g. header_matrix{imaging_header_matrix.matrix_extension}.",
+        metavar="PATH",
+    )
 
     # 3. Parse the command-line arguments
     args = parser.parse_args()
@@ -319,6 +324,7 @@ if __name__ == "__main__":
         input_folder=args.input_folder,
         device_protocol=args.device_name,
         output_folder=args.output_folder,
+        matrix_path=args.matrix,
     )
 
     print("\n--- Analysis Complete ---")
@@ -330,3 +336,9 @@ if __name__ == "__main__":
     print(f"Found {len(sop6)} files for Ophthalmic Photography 16 Bit Image (SOP Class 6)")
     print(f"\nAll reports have been saved in the '{args.output_folder}' directory.")
     print("-----------------------------------------")
+
+
+if __name__ == "__main__":
+    # This block ensures that the main() function is called only when
+    # the script is executed directly from the terminal.
+    main()
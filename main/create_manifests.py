@@ -0,0 +1,76 @@
+import argparse
+import os
+import sys
+
+# Find the pipeline modules next to this folder
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "year_3"))
+
+import catalog_manifests
+import manifest_creation
+
+
+def main():
+    """
+    Main function to parse command-line arguments and write the manifests of a release.
+    """
+    # 1. --- Argument Parsing ---
+    parser = argparse.ArgumentParser(
+        description="A script to write the manifest.tsv of each top folder of a release (retinal photography, OCT, OCTA, FLIO)."
+    )
+
+    parser.add_argument(
+        "-i", "--imaging-folder",
+        dest="imaging_folder",
+        required=True,
+        help="Path to the final structure folder of the release.",
+        metavar="PATH"
+    )
+
+    parser.add_argument(
+        "-c", "--catalog",
+        dest="catalog",
+        help="Build the manifests with SQL joins over this release catalog (see the catalog command). "
+        "Without it, the metadata records in <imaging folder>_metadata are read.",
+        metavar="PATH"
+    )
+
+    parser.add_argument(
+        "--folders",
+        dest="folders",
+        nargs="+",
+        choices=list(catalog_manifests.manifest_builders),
+        help="Top folders to write the manifest of (default: all of them).",
+    )
+
+    args = parser.parse_args()
+
+    print("--- Starting Manifest Creation ---")
+    print(f"Imaging Folder: {args.imaging_folder}")
+    print(f"Source: {args.catalog or args.imaging_folder + '_metadata'}")
+    print("-----------------------------------------")
+
+    # 2. --- Manifests ---
+    if args.catalog:
+        written = catalog_manifests.make_manifests(args.catalog, args.imaging_folder, args.folders)
+        for folder, (path, rows) in written.items():
+            print(f"{folder:<22}{rows:>8} rows  {path}")
+        return
+
+    # Without a catalog, the metadata records are parsed again for each manifest
+    folders = args.folders or list(catalog_manifests.manifest_builders)
+    metadata_folder = f"{args.imaging_folder}_metadata"
+    op = f"{args.imaging_folder}/retinal_photography/manifest.tsv"
+    if "retinal_photography" in folders:
+        op, _ = manifest_creation.make_retinal_photography_manifest(args.imaging_folder)
+    if "retinal_oct" in folders and os.path.isdir(f"{metadata_folder}/retinal_oct"):
+        manifest_creation.make_retinal_oct_manifest(op, args.imaging_folder)
+    if "retinal_octa" in folders and os.path.isdir(f"{metadata_folder}/retinal_octa"):
+        manifest_creation.octa_manifest(args.imaging_folder)
+    if "retinal_flio" in folders and os.path.isdir(f"{metadata_folder}/retinal_flio"):
+        manifest_creation.make_flio_manifest(args.imaging_folder)
+
+
+if __name__ == "__main__":
+    # This block ensures that the main() function is called only when
+    # the script is executed directly from the terminal.
+    main()
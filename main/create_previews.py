@@ -0,0 +1,94 @@
+import argparse
+import os
+import sys
+
+# Find the pipeline modules next to this folder
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "year_3"))
+
+import imaging_previews
+
+
+def main():
+    """
+    Main function to parse command-line arguments and render the QC previews of a folder.
+    """
+    # 1. --- Argument Parsing ---
+    parser = argparse.ArgumentParser(
+        description="A script to render JPEG previews (thumbnails, B-scan contact sheets, FLIO intensity images) of every DICOM file of a folder."
+    )
+
+    parser.add_argument(
+        "-i", "--input-folder",
+        dest="input_folder",
+        required=True,
+        help="Path to the folder of DICOM files, e.g. output/step4_final_structure.",
+        metavar="PATH"
+    )
+
+    parser.add_argument(
+        "-o", "--output-folder",
+        dest="output_folder",
+        required=True,
+        help="Path to the folder receiving the previews and their index.",
+        metavar="PATH"
+    )
+
+    parser.add_argument(
+        "--size",
+        dest="size",
+        type=int,
+        default=imaging_previews.preview_max_size,
+        help=f"Longest side of a single-image preview in pixels (default: {imaging_previews.preview_max_size}).",
+        metavar="PIXELS"
+    )
+
+    parser.add_argument(
+        "--frames",
+        dest="frames",
+        type=int,
+        default=imaging_previews.contact_sheet_frames,
+        help=f"B-scans shown on the contact sheet of a volume (default: {imaging_previews.contact_sheet_frames}).",
+        metavar="N"
+    )
+
+    parser.add_argument(
+        "--force",
+        dest="force",
+        action="store_true",
+        help="Render every file again, even if its content already has a preview.",
+    )
+
+    parser.add_argument(
+        "-j", "--jobs",
+        dest="jobs",
+        type=int,
+        default=-1,
+        help="Number of files rendered in parallel (-1 uses every CPU).",
+        metavar="N"
+    )
+
+    args = parser.parse_args()
+
+    print("--- Starting Preview Rendering ---")
+    print(f"Input Folder: {args.input_folder}")
+    print(f"Output Folder: {args.output_folder}")
+    print("-----------------------------------------")
+
+    # 2. --- Rendering ---
+    counts = imaging_previews.make_previews(
+        args.input_folder,
+        args.output_folder,
+        max_size=args.size,
+        sheet_frames=args.frames,
+        force=args.force,
+        n_jobs=args.jobs,
+    )
+
+    for status, count in counts.items():
+        print(f"{status:<12}{count:>8}")
+
+
+if __name__ == "__main__":
+    # This block ensures that the main() function is called only when
+    # the script is executed directly from the terminal.
+    main()
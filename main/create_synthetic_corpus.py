@@ -0,0 +1,109 @@
+import argparse
+import math
+import os
+import sys
+import time
+
+# Find the pipeline modules next to this folder
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "year_3"))
+
+import synthetic_corpus
+
+
+def main():
+    """
+    Main function to parse command-line arguments and write a synthetic imaging corpus.
+    """
+    # 1. --- Argument Parsing ---
+    parser = argparse.ArgumentParser(
+        description="A script to write a synthetic corpus with the input layout of every process_*.py script."
+    )
+
+    parser.add_argument(
+        "-o", "--output-folder",
+        dest="output_folder",
+        required=True,
+        help="Path to the folder where the corpus is written (one subfolder per device).",
+        metavar="PATH"
+    )
+
+    size_group = parser.add_mutually_exclusive_group()
+    size_group.add_argument(
+        "-n", "--participants",
+        dest="participants",
+        type=int,
+        default=10,
+        help="Number of synthetic participants (both eyes are generated).",
+    )
+    size_group.add_argument(
+        "--files",
+        dest="files",
+        type=int,
+        help="Approximate number of files to write (e.g. 100000); sets the number of participants.",
+    )
+
+    parser.add_argument(
+        "--devices",
+        dest="devices",
+        nargs="+",
+        default=synthetic_corpus.synthetic_devices,
+        choices=synthetic_corpus.synthetic_devices,
+        help="Devices to generate (default: all).",
+    )
+
+    parser.add_argument(
+        "--no-pixels",
+        dest="pixels",
+        action="store_false",
+        help="Write headers only, without pixel data.",
+    )
+
+    parser.add_argument(
+        "--seed",
+        dest="seed",
+        type=int,
+        default=0,
+        help="Seed of the UIDs and acquisition dates; the same seed writes the same corpus.",
+    )
+
+    parser.add_argument(
+        "-j", "--jobs",
+        dest="n_jobs",
+        type=int,
+        default=-1,
+        help="Number of parallel jobs (-1 uses all cores).",
+    )
+
+    args = parser.parse_args()
+
+    participants = args.participants
+    if args.files:
+        participants = math.ceil(
+            args.files / synthetic_corpus.files_per_participant(args.devices)
+        )
+
+    # 2. --- Corpus Generation ---
+    print(f"Writing {participants} synthetic participants to {args.output_folder}...")
+    start = time.time()
+    result = synthetic_corpus.generate_corpus(
+        args.output_folder,
+        participants=participants,
+        devices=args.devices,
+        seed=args.seed,
+        pixels=args.pixels,
+        n_jobs=args.n_jobs,
+    )
+    elapsed = time.time() - start
+
+    for device, count in result["Devices"].items():
+        print(f"  {device}: {count} files -> {os.path.join(args.output_folder, device)}")
+    print(
+        f"Total: {result['Files']} files, {result['Bytes'] / 1024 ** 3:.2f} GB "
+        f"(apparent size) in {elapsed:.1f} s"
+    )
+
+
+if __name__ == "__main__":
+    # This block ensures that the main() function is called only when
+    # the script is executed directly from the terminal.
+    main()
@@ -0,0 +1,113 @@
+import argparse
+import os
+import sys
+
+# Find the pipeline modules next to this folder
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "year_3"))
+
+import imaging_ingest
+import imaging_registry
+
+
+def main():
+    """
+    Main function to parse command-line arguments and run every device pipeline on a mixed input tree.
+    """
+    # 1. --- Argument Parsing ---
+    parser = argparse.ArgumentParser(
+        description="A script to route a mixed input tree to the pipeline of each device and run them concurrently."
+    )
+
+    parser.add_argument(
+        "-i", "--input-folder",
+        dest="input_folder",
+        required=True,
+        help="Path to the root input folder holding the exports of any device.",
+        metavar="PATH"
+    )
+
+    parser.add_argument(
+        "-o", "--output-folder",
+        dest="output_folder",
+        required=True,
+        help="Path to the root output folder; each device is processed into <PATH>/<device>.",
+        metavar="PATH"
+    )
+
+    parser.add_argument(
+        "--devices",
+        dest="devices",
+        nargs="+",
+        choices=list(imaging_registry.device_domains),
+        help="Devices to run (default: every device found in the input).",
+    )
+
+    parser.add_argument(
+        "-j", "--jobs",
+        dest="jobs",
+        type=int,
+        default=-1,
+        help="Number of device pipelines run at the same time (-1 runs all of them at once).",
+        metavar="N"
+    )
+
+    parser.add_argument(
+        "--flio-json-path",
+        dest="json_path",
+        default=imaging_ingest.flio_json_path,
+        help="Path to the JSON file with FLIO conversion settings (default: the one of the pipeline modules).",
+        metavar="FILE"
+    )
+
+    parser.add_argument(
+        "--dry-run",
+        dest="dry_run",
+        action="store_true",
+        help="Only print which device owns how much of the input.",
+    )
+
+    parser.add_argument(
+        "--trace-folder",
+        dest="trace_folder",
+        help="Record a trace of each device pipeline into <PATH>/<device>.",
+        metavar="PATH"
+    )
+
+    parser.add_argument(
+        "--catalog",
+        dest="catalog",
+        help="SQLite release catalog every device pipeline records its final files and run log into.",
+        metavar="PATH"
+    )
+
+    args = parser.parse_args()
+
+    print("--- Starting Multi-Device Ingestion ---")
+    print(f"Input Folder: {args.input_folder}")
+    print(f"Output Folder: {args.output_folder}")
+    print("-----------------------------------------")
+
+    # 2. --- Routing and Processing ---
+    result = imaging_ingest.ingest(
+        args.input_folder,
+        args.output_folder,
+        devices=args.devices,
+        n_jobs=args.jobs,
+        trace_folder=args.trace_folder,
+        json_path=args.json_path,
+        dry_run=args.dry_run,
+        catalog_path=args.catalog,
+    )
+
+    for run in result["Runs"]:
+        status = "SUCCESS" if run["Return code"] == 0 else f"FAILURE (exit {run['Return code']})"
+        print(f"{run['Device']:<12}{status:<20}{run['Seconds']:>8.1f} s  {run['Log']}")
+
+    if any(run["Return code"] != 0 for run in result["Runs"]):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    # This block ensures that the main() function is called only when
+    # the script is executed directly from the terminal.
+    main()
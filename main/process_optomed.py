@@ -1,51 +1,24 @@
 import argparse
-import csv
 import os
 import shutil
 import sys
-from datetime import datetime
 
 from tqdm import tqdm
 
-# This line is specific to your local machine's setup.
-# It tells Python where to find your custom modules.
-sys.path.append("/Users/nayoonkim/pipeline_imaging/aireadi_retinal_imaging/year_3")
+# Find the pipeline modules next to this folder
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "year_3"))
 
+import imaging_tracing
 import imaging_utils
+import imaging_writer
 # Now that the path is added, you can import your custom modules
 import pydicom
+from imaging_catalog import Catalog
 from imaging_optomed_retinal_photography_root import Optomed
+from imaging_prefetch import Prefetcher
+from imaging_run_log import RunLog
 
 
-def write_log(log_file_path, input_path, status, error_message=""):
-    """
-    Appends a log entry to a specified CSV file.
-    Creates the file and writes a header if it doesn't exist.
-
-    Args:
-        log_file_path (str): The full path to the log file.
-        input_path (str): The input file or folder being processed.
-        status (str): The result of the operation (e.g., "SUCCESS", "FAILURE").
-        error_message (str, optional): The error message if the status is "FAILURE".
-    """
-    # Check if the log file needs a header
-    file_exists = os.path.exists(log_file_path)
-
-    # 'a' mode is for appending, newline='' prevents extra blank rows
-    with open(log_file_path, 'a', newline='') as csvfile:
-        fieldnames = ['Timestamp', 'Input', 'Status', 'ErrorMessage']
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-
-        if not file_exists:
-            writer.writeheader()  # Write the header row
-
-        writer.writerow({
-            'Timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            'Input': input_path,
-            'Status': status,
-            'ErrorMessage': error_message
-        })
-
 def main():
     """
     Main function to parse command-line arguments and run the Optomed processing pipeline.
@@ -73,7 +46,43 @@ def main():
     )
 
 
+    parser.add_argument(
+        "--trace-folder",
+        dest="trace_folder",
+        help="Record a trace of every organize/convert/metadata call and converter function "
+        "into this folder (trace.json for chrome://tracing, trace.csv).",
+        metavar="PATH"
+    )
+
+    parser.add_argument(
+        "--prefetch-mb",
+        dest="prefetch_mb",
+        type=int,
+        default=512,
+        help="Megabytes of upcoming inputs read ahead in the background while the current one "
+        "is processed (0 disables read-ahead).",
+        metavar="MB"
+    )
+
+    parser.add_argument(
+        "--fsync",
+        dest="fsync",
+        choices=imaging_writer.fsync_policies,
+        default="batch",
+        help="When converted DICOMs are flushed to the disk: never, at the end of each step "
+        "(default) or after each file.",
+    )
+
+    parser.add_argument(
+        "--catalog",
+        dest="catalog",
+        help="Record every final file (paths, participant, UIDs, references, checksums, metadata) "
+        "and the run log in this SQLite release catalog.",
+        metavar="PATH"
+    )
+
     args = parser.parse_args()
+    prefetch_bytes = args.prefetch_mb * 1024 * 1024
 
     # Assign the parsed arguments to variables
     input_folder = args.input_folder
@@ -85,6 +94,12 @@ def main():
     print("-----------------------------------------")
 
     # 2. --- Setup ---
+    if args.trace_folder:
+        imaging_tracing.enable_tracing(args.trace_folder)
+
+    # Converted DICOMs are written in the background while the next input converts
+    imaging_writer.start_writer(fsync=args.fsync)
+
     # Initialize your custom class
     optomed_instance = Optomed()
 
@@ -111,28 +126,36 @@ def main():
 
     # 3. --- Processing Pipeline ---
 
+    run_log = RunLog(os.path.join(logs_folder, "run_log.jsonl"))
+    catalog = Catalog(args.catalog) if args.catalog else None
+    if catalog:
+        # The final structure was just reset
+        catalog.forget_release(step4_folder)
+
     # Step 1: Organize
     print("\nStep: Organizing files...")
-    step2_log_path = os.path.join(logs_folder, "step2_organized_log.csv")
     folders = imaging_utils.list_subfolders(input_folder)
     for folder in tqdm(folders, desc="Organizing Folders"):
 
         filtered_list = imaging_utils.get_filtered_file_names(folder)
 
-        for file in tqdm(filtered_list, desc="Organizing Files"):
+        for file in tqdm(Prefetcher(filtered_list, prefetch_bytes), desc="Organizing Files"):
 
             try:
-                organize_result = optomed_instance.organize(file, step2_folder)
- 
+                with run_log.item(
+                    "step2_organized", file, converter="Optomed.organize"
+                ) as item:
+                    organize_result = optomed_instance.organize(file, step2_folder)
+                    item["Protocol"] = organize_result.get("Rule", "")
 
             except Exception as e:
                 # If an error occurs, log it and continue to the next folder
                 print(f"\nERROR organizing {file}: {e}")
-                write_log(step2_log_path, file, "FAILURE", str(e))
+
+    run_log.print_summary("step2_organized")
 
     # Step 2: Convert to DICOM
     print("\nStep: Converting to DICOM format...")
-    step3_log_path = os.path.join(logs_folder, "step3_convert_log.csv")
     folders = imaging_utils.list_subfolders(step2_folder)
     protocols = ["optomed_mac_or_disk_centered_cfp"]
 
@@ -143,38 +166,56 @@ def main():
 
         files = imaging_utils.get_filtered_file_names(f"{step2_folder}/{protocol}")
 
-        for file in tqdm(files, desc="Converting"):
+        for file in tqdm(Prefetcher(files, prefetch_bytes), desc="Converting"):
             try:
-                convert_result = optomed_instance.convert(file, output)
-
+                with run_log.item(
+                    "step3_convert", file, protocol, converter="Optomed.convert"
+                ), imaging_writer.writing_for(file, protocol):
+                    convert_result = optomed_instance.convert(file, output)
             except Exception as e:
                  # If an error occurs, log it and continue to the next folder
                 print(f"\nERROR converting {file}: {e}")
-                write_log(step3_log_path, file, "FAILURE", str(e))
-                
+
+    imaging_writer.flush_writer(run_log, "step3_write")
+    run_log.print_summary("step3_convert")
+    run_log.print_summary("step3_write")
 
 
     # Step 3: Final Structure and Metadata Extraction
     print("\nStep: Arranging final structure and extracting metadata...")
-    step4_log_path = os.path.join(logs_folder, "step4_final_log.csv")
     folders = imaging_utils.list_subfolders(step3_folder)
 
     for folder in folders:
         filelist = imaging_utils.get_filtered_file_names(folder)
 
-        for file in tqdm(filelist):
+        for file in tqdm(Prefetcher(filelist, prefetch_bytes)):
             try:
-                full_file_path = imaging_utils.format_file(file, step4_folder)
-                if full_file_path:
-                    metadata_result = optomed_instance.metadata(
-                        full_file_path, metadata_folder
-                    )
+                with run_log.item(
+                    "step4_final",
+                    file,
+                    os.path.basename(folder),
+                    converter="Optomed.metadata",
+                ):
+                    full_file_path = imaging_utils.format_file(file, step4_folder)
+                    if full_file_path:
+                        metadata_result = optomed_instance.metadata(
+                            full_file_path, metadata_folder
+                        )
+                        if catalog:
+                            catalog.record_file(
+                                full_file_path,
+                                step4_folder,
+                                source_path=file,
+                                device="optomed",
+                                step="step4_final",
+                                metadata=metadata_result,
+                            )
 
-                    
             except Exception as e:
                 # If an error occurs, log it and continue to the next folder
                 print(f"\nERROR finalizing {file}: {e}")
-                write_log(step4_log_path, file, "FAILURE", str(e))
+
+    run_log.print_summary("step4_final")
 
 
     # filtered_list = imaging_utils.get_filtered_file_names(step3_folder)
@@ -210,6 +251,17 @@ def main():
     
     # print("\n--- Pipeline Finished ---")
 
+    if catalog:
+        catalog.record_steps(run_log.read(), "optomed")
+        catalog.close()
+
+    imaging_writer.stop_writer()
+
+    if args.trace_folder:
+        trace = imaging_tracing.export_trace(args.trace_folder)
+        print(f"\nTrace of {trace['Spans']} spans saved to {trace['Chrome trace']} and {trace['CSV']}")
+
+
 if __name__ == "__main__":
     # This block ensures that the main() function is called only when
     # the script is executed directly from the terminal.
@@ -1,84 +1,23 @@
 import argparse
-import csv
 import os
 import shutil
 import sys
-from datetime import datetime
 
 from tqdm import tqdm
 
-# This line is specific to your local machine's setup.
-# It tells Python where to find your custom modules.
-sys.path.append("/Users/nayoonkim/pipeline_imaging/aireadi_retinal_imaging/year_3")
+# Find the pipeline modules next to this folder
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "year_3"))
+import imaging_tracing
 import imaging_utils
+import imaging_writer
 # Now that the path is added, you can import your custom modules
 import pydicom
+from imaging_catalog import Catalog
 from imaging_maestro2_triton_root import Maestro2_Triton
-from pydicom.datadict import DicomDictionary, keyword_dict
+from imaging_prefetch import Prefetcher
+from imaging_run_log import RunLog, input_size
 from pydicom.dataset import Dataset
 
-# Define items as (VR, VM, description, is_retired flag, keyword)
-#   Leave is_retired flag blank.
-new_dict_items = {
-    0x00221627: (
-        "SQ",
-        "1",
-        "En Face Volume Descriptor Sequence",
-        "",
-        "EnFaceVolumeDescriptorSequence",
-    ),
-    0x00221629: (
-        "CS",
-        "1",
-        "En Face Volume Descriptor Scope",
-        "",
-        "EnFaceVolumeDescriptorScope",
-    ),
-    0x0008114C: (
-        "SQ",
-        "1",
-        "Referenced Segmentation Sequence",
-        "",
-        "ReferencedSegmentationSequence",
-    ),
-    0x00660005: ("FL", "1", "Surface Offset", "", "SurfaceOffset"),
-}
-
-# Update the dictionary itself
-DicomDictionary.update(new_dict_items)
-
-# Update the reverse mapping from name to tag
-new_names_dict = dict([(val[4], tag) for tag, val in new_dict_items.items()])
-keyword_dict.update(new_names_dict)
-
-def write_log(log_file_path, input_path, status, error_message=""):
-    """
-    Appends a log entry to a specified CSV file.
-    Creates the file and writes a header if it doesn't exist.
-
-    Args:
-        log_file_path (str): The full path to the log file.
-        input_path (str): The input file or folder being processed.
-        status (str): The result of the operation (e.g., "SUCCESS", "FAILURE").
-        error_message (str, optional): The error message if the status is "FAILURE".
-    """
-    # Check if the log file needs a header
-    file_exists = os.path.exists(log_file_path)
-
-    # 'a' mode is for appending, newline='' prevents extra blank rows
-    with open(log_file_path, 'a', newline='') as csvfile:
-        fieldnames = ['Timestamp', 'Input', 'Status', 'ErrorMessage']
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-
-        if not file_exists:
-            writer.writeheader()  # Write the header row
-
-        writer.writerow({
-            'Timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            'Input': input_path,
-            'Status': status,
-            'ErrorMessage': error_message
-        })
 
 def main():
     """
@@ -106,8 +45,52 @@ def main():
         metavar="PATH"
     )
 
+    parser.add_argument(
+        "-j", "--jobs",
+        dest="jobs",
+        type=int,
+        default=-1,
+        help="Number of folders organized in parallel (-1 uses all cores).",
+        metavar="N"
+    )
+
+    parser.add_argument(
+        "--trace-folder",
+        dest="trace_folder",
+        help="Record a trace of every organize/convert/metadata call and converter function "
+        "into this folder (trace.json for chrome://tracing, trace.csv).",
+        metavar="PATH"
+    )
+
+    parser.add_argument(
+        "--prefetch-mb",
+        dest="prefetch_mb",
+        type=int,
+        default=512,
+        help="Megabytes of upcoming inputs read ahead in the background while the current one "
+        "is processed (0 disables read-ahead).",
+        metavar="MB"
+    )
+
+    parser.add_argument(
+        "--fsync",
+        dest="fsync",
+        choices=imaging_writer.fsync_policies,
+        default="batch",
+        help="When converted DICOMs are flushed to the disk: never, at the end of each step "
+        "(default) or after each file.",
+    )
+
+    parser.add_argument(
+        "--catalog",
+        dest="catalog",
+        help="Record every final file (paths, participant, UIDs, references, checksums, metadata) "
+        "and the run log in this SQLite release catalog.",
+        metavar="PATH"
+    )
 
     args = parser.parse_args()
+    prefetch_bytes = args.prefetch_mb * 1024 * 1024
 
     # Assign the parsed arguments to variables
     input_folder = args.input_folder
@@ -119,6 +102,12 @@ def main():
     print("-----------------------------------------")
 
     # 2. --- Setup ---
+    if args.trace_folder:
+        imaging_tracing.enable_tracing(args.trace_folder)
+
+    # Converted DICOMs are written in the background while the next input converts
+    imaging_writer.start_writer(fsync=args.fsync)
+
     # Initialize your custom class
     maestro2_triton_instance = Maestro2_Triton()
 
@@ -145,9 +134,14 @@ def main():
 
     # 3. --- Processing Pipeline ---
 
+    run_log = RunLog(os.path.join(logs_folder, "run_log.jsonl"))
+    catalog = Catalog(args.catalog) if args.catalog else None
+    if catalog:
+        # The final structure was just reset
+        catalog.forget_release(step4_folder)
+
     # Step 1: Organize
     print("\nStep: Organizing files...")
-    step2_log_path = os.path.join(logs_folder, "step2_organized_log.csv")
     batch_folders = imaging_utils.list_subfolders(input_folder)
     
     print(batch_folders)
@@ -156,20 +150,57 @@ def main():
   
         subfolders = imaging_utils.list_subfolders(batch_folder)
 
-        for folder in tqdm(subfolders, desc="Organizing Folders"):
+        # Folders are independent acquisitions, so they are organized in parallel
+        organize_results = maestro2_triton_instance.organize_many(
+            subfolders, step2_folder, n_jobs=args.jobs, prefetch_bytes=prefetch_bytes
+        )
 
-            try:
-                organize_result = maestro2_triton_instance.organize(folder, step2_folder)
-                # write_log(step2_log_path, folder, "SUCCESS")
-
-            except Exception as e:
+        for organize_result in organize_results:
+            folder = organize_result["Input"]
+            if "Error" in organize_result:
                 # If an error occurs, log it and continue to the next folder
-                print(f"\nERROR organizing {folder}: {e}")
-                write_log(step2_log_path, folder, "FAILURE", str(e))
+                print(f"\nERROR organizing {folder}: {organize_result['Error']}")
+            run_log.record(
+                "step2_organized",
+                folder,
+                "FAILURE" if "Error" in organize_result else "SUCCESS",
+                protocol=organize_result.get("Rule", ""),
+                converter="Maestro2_Triton.organize",
+                seconds=organize_result["Seconds"],
+                size=input_size(folder),
+                error_message=organize_result.get("Error", ""),
+            )
+
+    # FDA zip archives are organized straight out of the archive, without extracting them first
+    def organize_zip_folder(folder, output):
+        with run_log.item(
+            "step2_organized", folder, converter="Maestro2_Triton.organize"
+        ) as item:
+            organize_result = maestro2_triton_instance.organize(folder, output)
+            item["Protocol"] = organize_result["Rule"]
+        return organize_result
+
+    zip_results = imaging_utils.unzip_fda_files(
+        imaging_utils.list_fda_zip_files(input_folder, ["maestro2", "triton"]),
+        step2_folder,
+        organize=organize_zip_folder,
+    )
+    for zip_result in zip_results:
+        if zip_result["Unzipping"] != "correct":
+            # Nothing of a corrupt zip was kept, even the acquisitions logged before the error
+            run_log.record(
+                "step2_organized",
+                zip_result["Input"],
+                "FAILURE",
+                converter="imaging_utils.unzip_fda_file",
+                seconds=zip_result.get("Seconds"),
+                error_message=zip_result["Unzipping"],
+            )
+
+    run_log.print_summary("step2_organized")
 
     # Step 2: Convert to DICOM
     print("\nStep: Converting to DICOM format...")
-    step3_log_path = os.path.join(logs_folder, "step3_convert_log.csv")
     folders = imaging_utils.list_subfolders(step2_folder)
     
     protocols = [
@@ -188,42 +219,71 @@ def main():
 
         folders = imaging_utils.list_subfolders(f"{step2_folder}/{protocol}")
 
-        for folder in tqdm(folders, desc="Converting"):
+        for folder in tqdm(Prefetcher(folders, prefetch_bytes), desc="Converting"):
     
             try:
-                convert_result = maestro2_triton_instance.convert(folder, output)
-                # write_log(step3_log_path, folder, "SUCCESS")
+                with run_log.item(
+                    "step3_convert",
+                    folder,
+                    protocol,
+                    converter="Maestro2_Triton.convert",
+                ), imaging_writer.writing_for(folder, protocol):
+                    convert_result = maestro2_triton_instance.convert(folder, output)
             except Exception as e:
                  # If an error occurs, log it and continue to the next folder
                 print(f"\nERROR converting {folder}: {e}")
-                write_log(step3_log_path, folder, "FAILURE", str(e))
-                
+
+    imaging_writer.flush_writer(run_log, "step3_write")
+    run_log.print_summary("step3_convert")
+    run_log.print_summary("step3_write")
 
 
     # Step 3: Final Structure and Metadata Extraction
     print("\nStep: Arranging final structure and extracting metadata...")
-    step4_log_path = os.path.join(logs_folder, "step4_final_log.csv")
     folders = imaging_utils.list_subfolders(step3_folder)
 
 
     for folder in folders:
         filelist = imaging_utils.get_filtered_file_names(folder)
 
-        for file in tqdm(filelist):
+        for file in tqdm(Prefetcher(filelist, prefetch_bytes)):
             try:
-                full_file_path = imaging_utils.format_file(file, step4_folder)
-                if full_file_path:
-                    metadata_result = maestro2_triton_instance.metadata(
-                        full_file_path, metadata_folder
-                    )
-                    # write_log(step4_log_path, file, "SUCCESS")
-                    
+                with run_log.item(
+                    "step4_final",
+                    file,
+                    os.path.basename(folder),
+                    converter="Maestro2_Triton.metadata",
+                ):
+                    full_file_path = imaging_utils.format_file(file, step4_folder)
+                    if full_file_path:
+                        metadata_result = maestro2_triton_instance.metadata(
+                            full_file_path, metadata_folder
+                        )
+                        if catalog:
+                            catalog.record_file(
+                                full_file_path,
+                                step4_folder,
+                                source_path=file,
+                                device="topcon",
+                                step="step4_final",
+                                metadata=metadata_result,
+                            )
+
             except Exception as e:
                 # If an error occurs, log it and continue to the next folder
                 print(f"\nERROR finalizing {file}: {e}")
-                write_log(step4_log_path, file, "FAILURE", str(e))
 
+    run_log.print_summary("step4_final")
+
+    if catalog:
+        catalog.record_steps(run_log.read(), "topcon")
+        catalog.close()
+
+    imaging_writer.stop_writer()
 
+    if args.trace_folder:
+        trace = imaging_tracing.export_trace(args.trace_folder)
+        print(f"\nTrace of {trace['Spans']} spans saved to {trace['Chrome trace']} and {trace['CSV']}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,188 @@
+import argparse
+import os
+import sys
+from datetime import datetime
+
+# Find the pipeline modules next to this folder
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "year_3"))
+
+import pipeline_benchmark
+import synthetic_corpus
+
+
+def main():
+    """
+    Main function to parse command-line arguments and run or compare the pipeline benchmarks.
+    """
+    # 1. --- Argument Parsing ---
+    parser = argparse.ArgumentParser(
+        description="A script to benchmark the imaging pipeline on a synthetic corpus and compare runs."
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser(
+        "run", help="Run the benchmarks and save the results as a JSON baseline."
+    )
+    run_parser.add_argument(
+        "-w", "--workdir",
+        dest="workdir",
+        required=True,
+        help="Working folder; the synthetic corpus is written to <workdir>/corpus if missing.",
+        metavar="PATH"
+    )
+    run_parser.add_argument(
+        "-o", "--output",
+        dest="output",
+        help="Path of the JSON baseline (default: <workdir>/benchmark_<timestamp>.json).",
+        metavar="PATH"
+    )
+    run_parser.add_argument(
+        "-n", "--participants",
+        dest="participants",
+        type=int,
+        default=2,
+        help="Number of synthetic participants of the corpus.",
+    )
+    run_parser.add_argument(
+        "--devices",
+        dest="devices",
+        nargs="+",
+        default=synthetic_corpus.synthetic_devices,
+        choices=synthetic_corpus.synthetic_devices,
+        help="Devices to benchmark (default: all).",
+    )
+    run_parser.add_argument(
+        "--only",
+        dest="only",
+        nargs="+",
+        help="Run only the matching benchmarks: a kind (micro, end_to_end), a step or "
+        "benchmark (convert, find_rule), a device (cirrus) or a full name (convert.cirrus).",
+    )
+    run_parser.add_argument(
+        "--repeat",
+        dest="repeat",
+        type=int,
+        default=1,
+        help="Number of runs of each benchmark; the fastest is kept.",
+    )
+    run_parser.add_argument(
+        "--no-check",
+        dest="check",
+        action="store_false",
+        help="Do not check first that the corpus goes through every driver without failures.",
+    )
+    run_parser.add_argument(
+        "--baseline",
+        dest="baseline",
+        help="Baseline to compare the new results with.",
+        metavar="PATH"
+    )
+    run_parser.add_argument(
+        "--threshold",
+        dest="threshold",
+        type=float,
+        default=pipeline_benchmark.benchmark_threshold,
+        help="Relative change reported as a regression (default: %(default)s).",
+    )
+
+    check_parser = subparsers.add_parser(
+        "check", help="Check that the synthetic corpus goes through every driver without failures."
+    )
+    check_parser.add_argument(
+        "-w", "--workdir",
+        dest="workdir",
+        required=True,
+        help="Working folder; the synthetic corpus is written to <workdir>/corpus if missing.",
+        metavar="PATH"
+    )
+    check_parser.add_argument(
+        "-n", "--participants",
+        dest="participants",
+        type=int,
+        default=2,
+        help="Number of synthetic participants of the corpus.",
+    )
+    check_parser.add_argument(
+        "--devices",
+        dest="devices",
+        nargs="+",
+        default=synthetic_corpus.synthetic_devices,
+        choices=synthetic_corpus.synthetic_devices,
+        help="Devices to check (default: all).",
+    )
+
+    compare_parser = subparsers.add_parser(
+        "compare", help="Compare two JSON baselines and report the regressions."
+    )
+    compare_parser.add_argument("baseline", help="The reference baseline.")
+    compare_parser.add_argument("current", help="The baseline to check.")
+    compare_parser.add_argument(
+        "--threshold",
+        dest="threshold",
+        type=float,
+        default=pipeline_benchmark.benchmark_threshold,
+        help="Relative change reported as a regression (default: %(default)s).",
+    )
+
+    args = parser.parse_args()
+
+    # 2. --- Driver Check ---
+    if args.command in ["run", "check"]:
+        corpus = os.path.join(args.workdir, "corpus")
+        print(f"Preparing the synthetic corpus in {corpus}...")
+        corpus_info = pipeline_benchmark.prepare_corpus(
+            corpus, args.participants, args.devices
+        )
+
+    if args.command == "check" or (args.command == "run" and args.check):
+        print("Running the corpus through every driver...")
+        problems = pipeline_benchmark.check_drivers(corpus, args.workdir, args.devices)
+        for device, found in problems.items():
+            print(f"{device}: {'OK' if not found else f'{len(found)} problem(s)'}")
+            for problem in found:
+                print("  ", problem)
+        if any(problems.values()):
+            print("The corpus does not go through every driver; the benchmarks would time an error path.")
+            sys.exit(1)
+        if args.command == "check":
+            return
+
+    # 3. --- Benchmark Run ---
+    if args.command == "run":
+
+        names = pipeline_benchmark.select_benchmarks(
+            pipeline_benchmark.benchmark_names(args.devices), args.only
+        )
+        results = pipeline_benchmark.run_benchmarks(
+            corpus, args.workdir, names, args.devices, repeat=args.repeat
+        )
+        failed = [result["Name"] for result in results if result["Failures"] or "Error" in result]
+        if failed:
+            print(f"WARNING: {len(failed)} benchmark(s) had failed items or errors: {', '.join(failed)}")
+
+        current = pipeline_benchmark.create_baseline(results, corpus_info)
+        output = args.output or os.path.join(
+            args.workdir, f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        )
+        pipeline_benchmark.save_baseline(output, current)
+        print(f"Results saved to {output}")
+
+        if not args.baseline:
+            return
+        baseline = pipeline_benchmark.load_baseline(args.baseline)
+
+    # 4. --- Comparison ---
+    else:
+        baseline = pipeline_benchmark.load_baseline(args.baseline)
+        current = pipeline_benchmark.load_baseline(args.current)
+
+    regressions = pipeline_benchmark.compare_baselines(baseline, current, args.threshold)
+    pipeline_benchmark.print_comparison(baseline, current, regressions, args.threshold)
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    # This block ensures that the main() function is called only when
+    # the script is executed directly from the terminal.
+    main()
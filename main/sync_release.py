@@ -0,0 +1,125 @@
+import argparse
+import os
+import sys
+
+# Find the pipeline modules next to this folder
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "year_3"))
+
+import release_sync
+
+
+def main():
+    """
+    Main function to parse command-line arguments and assemble a release folder incrementally.
+    """
+    # 1. --- Argument Parsing ---
+    parser = argparse.ArgumentParser(
+        description="A script to pool the past-year and newly processed files of a device into its release folder, transferring only what changed."
+    )
+
+    parser.add_argument(
+        "-s", "--sources",
+        dest="sources",
+        nargs="+",
+        required=True,
+        help="Source folders in priority order, e.g. past_year and output/step4_final_structure.",
+        metavar="PATH"
+    )
+
+    parser.add_argument(
+        "-o", "--output-folder",
+        dest="output_folder",
+        required=True,
+        help="Path to the release folder to assemble.",
+        metavar="PATH"
+    )
+
+    parser.add_argument(
+        "-p", "--participants",
+        dest="patientid_csv",
+        required=True,
+        help="CSV file whose \"Participant ID\" column lists the participants to include.",
+        metavar="FILE"
+    )
+
+    parser.add_argument(
+        "-r", "--remove-list",
+        dest="remove_txt",
+        required=True,
+        help="Text file listing the base filenames to exclude, one per line.",
+        metavar="FILE"
+    )
+
+    parser.add_argument(
+        "--previous-release",
+        dest="previous_release",
+        help="Previous release folder; unchanged files are hard-linked from it.",
+        metavar="PATH"
+    )
+
+    parser.add_argument(
+        "--keep-stale",
+        dest="delete",
+        action="store_false",
+        help="Keep the release files that are no longer selected.",
+    )
+
+    parser.add_argument(
+        "--no-link",
+        dest="link",
+        action="store_false",
+        help="Copy unchanged files instead of hard-linking them.",
+    )
+
+    parser.add_argument(
+        "--dry-run",
+        dest="dry_run",
+        action="store_true",
+        help="Only log the transfers.",
+    )
+
+    parser.add_argument(
+        "--log",
+        dest="log_path",
+        help="Transfer log (default: <output folder>_sync_log.jsonl).",
+        metavar="FILE"
+    )
+
+    parser.add_argument(
+        "-j", "--jobs",
+        dest="jobs",
+        type=int,
+        default=release_sync.sync_threads,
+        help=f"Number of files transferred at the same time (default: {release_sync.sync_threads}).",
+        metavar="N"
+    )
+
+    args = parser.parse_args()
+
+    print("--- Starting Release Assembly ---")
+    print(f"Sources: {', '.join(args.sources)}")
+    print(f"Release Folder: {args.output_folder}")
+    print("-----------------------------------------")
+
+    # 2. --- Synchronization ---
+    counts = release_sync.sync_release(
+        args.patientid_csv,
+        args.sources,
+        args.output_folder,
+        args.remove_txt,
+        previous_release=args.previous_release,
+        delete=args.delete,
+        link=args.link,
+        dry_run=args.dry_run,
+        log_path=args.log_path,
+        n_threads=args.jobs,
+    )
+
+    for action, count in counts.items():
+        print(f"{action:<12}{count:>8}")
+
+
+if __name__ == "__main__":
+    # This block ensures that the main() function is called only when
+    # the script is executed directly from the terminal.
+    main()
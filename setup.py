@@ -0,0 +1,16 @@
+import glob
+import os
+
+from setuptools import setup
+
+# The pipeline modules import each other as top-level modules, so every module of
+# year_3 is installed as one
+setup(
+    py_modules=[
+        os.path.splitext(os.path.basename(path))[0]
+        for path in sorted(glob.glob("year_3/*.py"))
+        if not path.endswith("__init__.py")
+    ],
+    # Read by imaging_ingest when the modules are installed
+    data_files=[("share/aireadi-imaging", ["year_3/flio_uid_data.json"])],
+)
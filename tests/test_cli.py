@@ -0,0 +1,85 @@
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+year_3_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "year_3")
+sys.path.append(year_3_folder)
+
+import imaging_registry
+import pipeline_benchmark
+
+cli_path = os.path.join(year_3_folder, "imaging_cli.py")
+
+
+def run_cli(*arguments):
+    """
+    Run imaging_cli.py in a fresh interpreter and return the completed process.
+    """
+    return subprocess.run(
+        [sys.executable, cli_path, *arguments], capture_output=True, text=True
+    )
+
+
+def test_help_within_budget():
+    """
+    `aireadi-imaging --help` starts within pipeline_benchmark.cli_help_budget.
+    """
+    # The first start also compiles and caches the modules
+    run_cli("--help")
+
+    start = time.perf_counter()
+    completed = run_cli("--help")
+    seconds = time.perf_counter() - start
+
+    assert completed.returncode == 0
+    assert "process" in completed.stdout
+    assert seconds < pipeline_benchmark.cli_help_budget
+
+
+def test_help_imports_no_device_module():
+    """
+    The help only loads imaging_cli and the registry, not the device modules.
+    """
+    completed = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, contextlib, io\n"
+            f"sys.path.insert(0, {year_3_folder!r})\n"
+            "import imaging_cli\n"
+            "with contextlib.suppress(SystemExit), contextlib.redirect_stdout(io.StringIO()):\n"
+            "    imaging_cli.main(['--help'])\n"
+            "print(' '.join(sorted(sys.modules)))",
+        ],
+        capture_output=True,
+        text=True,
+    )
+
+    assert completed.returncode == 0
+    modules = completed.stdout.split()
+    for module in ["pydicom", "numpy", "pandas", "imaging_cirrus_root"]:
+        assert module not in modules
+
+
+def test_driver_folder_of_checkout():
+    """
+    In a checkout the driver scripts are found in main/.
+    """
+    folder = imaging_registry.get_driver_folder()
+
+    for _, _, driver in imaging_registry.device_domains.values():
+        assert os.path.exists(os.path.join(folder, f"{driver}.py"))
+
+
+def test_missing_drivers_fail_clearly(monkeypatch):
+    """
+    Without the driver scripts, commands stop with an error naming the fix.
+    """
+    monkeypatch.setattr(imaging_registry, "driver_folder", "/nonexistent/main")
+    monkeypatch.setattr(imaging_registry, "driver_package", "nonexistent_drivers")
+
+    with pytest.raises(FileNotFoundError, match="pip install"):
+        imaging_registry.get_driver_folder()
@@ -0,0 +1,41 @@
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "year_3"))
+
+import imaging_tracing
+import imaging_utils
+import synthetic_corpus
+from imaging_maestro2_triton_root import Maestro2_Triton
+
+
+def test_topcon_organize_traced_in_workers(tmp_path, monkeypatch):
+    """
+    A traced parallel Topcon organize records one Maestro2_Triton.organize span per
+    folder, from the worker processes.
+    """
+    corpus = tmp_path / "corpus"
+    synthetic_corpus.generate_corpus(
+        str(corpus), participants=1, devices=["topcon"], pixels=False, n_jobs=1
+    )
+    folders = [
+        folder
+        for batch in imaging_utils.list_subfolders(str(corpus / "topcon"))
+        for folder in imaging_utils.list_subfolders(batch)
+    ]
+
+    trace_folder = tmp_path / "trace"
+    trace_folder.mkdir()
+    monkeypatch.setenv(imaging_tracing.trace_env_var, str(trace_folder))
+
+    results = Maestro2_Triton().organize_many(folders, str(tmp_path / "organized"), n_jobs=2)
+    imaging_tracing.flush_spans()
+
+    assert not [result for result in results if "Error" in result]
+    spans = imaging_tracing.load_spans(str(trace_folder))
+    organize_spans = [span for span in spans if span["Name"] == "Maestro2_Triton.organize"]
+    assert sorted(span["Input"] for span in organize_spans) == sorted(folders)
+    assert all(span["Process"] != os.getpid() for span in organize_spans)
+    assert [span["Name"] for span in spans if span["Process"] == os.getpid()] == [
+        "Maestro2_Triton.organize_many"
+    ]
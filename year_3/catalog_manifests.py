@@ -0,0 +1,471 @@
+import os
+
+import pandas as pd
+
+import imaging_catalog
+
+# Checksums recorded by imaging_writer in the metadata records (as in manifest_creation)
+checksum_columns = ["file_blake2b", "pixel_data_blake2b"]
+
+# Columns of each manifest, as written by manifest_creation
+retinal_photography_columns = [
+    "person_id",
+    "manufacturer",
+    "manufacturers_model_name",
+    "laterality",
+    "anatomic_region",
+    "imaging",
+    "height",
+    "width",
+    "color_channel_dimension",
+    "sop_instance_uid",
+    "filepath",
+    "file_blake2b",
+    "pixel_data_blake2b",
+]
+
+retinal_oct_columns = [
+    "person_id",
+    "manufacturer",
+    "manufacturers_model_name",
+    "anatomic_region",
+    "imaging",
+    "laterality",
+    "height",
+    "width",
+    "number_of_frames",
+    "pixel_spacing",
+    "slice_thickness",
+    "sop_instance_uid",
+    "filepath",
+    "file_blake2b",
+    "pixel_data_blake2b",
+    "reference_instance_uid",
+    "reference_filepath",
+]
+
+flio_columns = [
+    "person_id",
+    "manufacturer",
+    "manufacturers_model_name",
+    "laterality",
+    "wavelength",
+    "height",
+    "width",
+    "number_of_frames",
+    "sop_instance_uid",
+    "filepath",
+    "file_blake2b",
+    "pixel_data_blake2b",
+]
+
+enface_numbers = [1, 2, 3, 4]
+
+retinal_octa_columns = (
+    [
+        "person_id",
+        "manufacturer",
+        "manufacturers_model_name",
+        "anatomic_region",
+        "imaging",
+        "laterality",
+        "flow_cube_height",
+        "flow_cube_width",
+        "flow_cube_number_of_frames",
+        "associated_segmentation_type",
+        "associated_segmentation_number_of_frames",
+    ]
+    + [
+        f"associated_enface_{number}_{field}"
+        for number in enface_numbers
+        for field in ["ophthalmic_image_type", "segmentation_surface_1", "segmentation_surface_2"]
+    ]
+    + [
+        "flow_cube_sop_instance_uid",
+        "flow_cube_file_path",
+        "flow_cube_file_blake2b",
+        "flow_cube_pixel_data_blake2b",
+        "associated_retinal_photography_sop_instance_uid",
+        "associated_retinal_photography_file_path",
+        "associated_structural_oct_sop_instance_uid",
+        "associated_structural_oct_file_path",
+        "associated_segmentation_sop_instance_uid",
+        "associated_segmentation_file_path",
+        "variant_segmentation_sop_instance_uid",
+        "variant_segmentation_file_path",
+        "associated_enface_1_sop_instance_uid",
+        "associated_enface_1_file_path",
+    ]
+    + [
+        column
+        for number in enface_numbers[1:]
+        for column in [
+            f"associated_enface_{number}_sop_instance_uid",
+            f"associated_enface_{number}_file_path",
+            f"associated_enface_{number}_projection_removed_sop_instance_uid",
+            f"associated_enface_{number}_projection_removed_filepath",
+        ]
+    ]
+)
+
+# SQL literal of the values missing from a manifest
+not_reported = "'Not reported'"
+
+
+def meta(alias, key):
+    """
+    SQL expression of a field of the metadata record of a joined file.
+    """
+    return f"json_extract({alias}.metadata, '$.{key}')"
+
+
+def capitalized(expression):
+    """
+    SQL equivalent of str.capitalize.
+    """
+    return f"upper(substr({expression}, 1, 1)) || lower(substr({expression}, 2))"
+
+
+def reported(expression):
+    """
+    SQL expression replacing a missing or empty value by "Not reported".
+    """
+    return f"COALESCE(NULLIF({expression}, ''), {not_reported})"
+
+
+def checksum(alias, column):
+    """
+    SQL expression of a checksum column, "Not reported" for records written before
+    checksums were recorded (see manifest_creation.add_checksum_columns).
+    """
+    return f"CASE WHEN json_type({alias}.metadata, '$.{column}') IS NULL THEN {not_reported} ELSE {meta(alias, column)} END"
+
+
+def in_folder(alias, folder, indexed=True):
+    """
+    SQL condition keeping the files of a top folder of the release; a range on the
+    (release_folder, filepath) index rather than a LIKE. When not indexed, the unary +
+    keeps SQLite from using that index for the condition.
+    """
+    column = f"{alias}.filepath" if indexed else f"+{alias}.filepath"
+    return f"{column} >= '/{folder}/' AND {column} < '/{folder}0'"
+
+
+def join_file(alias, folder, uid_expression, name_pattern=None):
+    """
+    SQL LEFT JOIN of the file of the release with a SOP Instance UID.
+
+    The release and folder conditions are kept off the indexes, so each joined file is
+    one lookup in the SOP Instance UID index rather than a scan of its folder.
+
+    Args:
+        alias (str): The alias of the joined file.
+        folder (str): The top folder holding it, e.g. "retinal_oct".
+        uid_expression (str): SQL expression of its SOP Instance UID.
+        name_pattern (str, optional): LIKE pattern its path must match, e.g. "%flow_cube%".
+    """
+    join = (
+        f"LEFT JOIN files {alias} ON +{alias}.release_folder = seed.release_folder "
+        f"AND {alias}.sop_instance_uid = {uid_expression} AND {in_folder(alias, folder, indexed=False)} "
+        f"AND {alias}.metadata IS NOT NULL"
+    )
+    if name_pattern:
+        join += f" AND {alias}.filepath LIKE '{name_pattern}'"
+    return join
+
+
+def select_manifest(catalog, imaging_folder, folder, expressions, joins=(), order=("person_id", "filepath")):
+    """
+    Run the query of one manifest: one row per file of a top folder of the release.
+
+    Args:
+        catalog (imaging_catalog.Catalog): The catalog.
+        imaging_folder (str): The final structure folder.
+        folder (str): The top folder of the files, e.g. "retinal_photography".
+        expressions (dict): Manifest column -> SQL expression on the file ("seed") and the joins.
+        joins (list): SQL joins of related files.
+        order (tuple): Manifest columns the rows are sorted by.
+
+    Returns:
+        pandas.DataFrame: The manifest.
+    """
+    sql = (
+        f"SELECT {', '.join(f'{expression} AS {column}' for column, expression in expressions.items())} "
+        f"FROM files seed {' '.join(joins)} "
+        f"WHERE seed.release_folder = ? AND {in_folder('seed', folder)} AND seed.metadata IS NOT NULL "
+        f"ORDER BY {', '.join(order)}"
+    )
+    rows = catalog.query(sql, (os.path.abspath(imaging_folder),))
+    return pd.DataFrame(rows, columns=list(expressions))
+
+
+def retinal_photography_manifest(catalog, imaging_folder):
+    """
+    Build the retinal photography manifest of a release from the catalog.
+
+    Returns:
+        pandas.DataFrame: The columns of manifest_creation.make_retinal_photography_manifest.
+    """
+    expressions = {column: meta("seed", column) for column in retinal_photography_columns}
+    for column in checksum_columns:
+        expressions[column] = checksum("seed", column)
+    return select_manifest(catalog, imaging_folder, "retinal_photography", expressions)
+
+
+def retinal_oct_manifest(catalog, imaging_folder):
+    """
+    Build the retinal OCT manifest of a release from the catalog, with the path of the
+    reference photograph of each volume joined on its SOP Instance UID.
+
+    Returns:
+        pandas.DataFrame: The columns of manifest_creation.make_retinal_oct_manifest.
+    """
+    reference_uid = meta("seed", "reference_retinal_photography_image_instance_uid")
+    expressions = {column: meta("seed", column) for column in retinal_oct_columns}
+    for column in checksum_columns:
+        expressions[column] = checksum("seed", column)
+    expressions["reference_instance_uid"] = reference_uid
+    expressions["reference_filepath"] = meta("op", "filepath")
+    joins = [join_file("op", "retinal_photography", reference_uid)]
+    return select_manifest(catalog, imaging_folder, "retinal_oct", expressions, joins)
+
+
+def flio_manifest(catalog, imaging_folder):
+    """
+    Build the FLIO manifest of a release from the catalog.
+
+    Returns:
+        pandas.DataFrame: The columns of manifest_creation.make_flio_manifest.
+    """
+    expressions = {column: meta("seed", column) for column in flio_columns}
+    for column in checksum_columns:
+        expressions[column] = checksum("seed", column)
+    return select_manifest(catalog, imaging_folder, "retinal_flio", expressions)
+
+
+def enface_expressions(number, alias, surfaces=True):
+    """
+    Manifest columns of the enface number of an OCTA acquisition, joined as alias
+    ("Not reported" if there is no such enface).
+    """
+    image_type = f"COALESCE({meta(alias, 'ophthalmic_image_type')}, {meta(alias, 'Ophthalmic_image_type')})"
+    if surfaces:
+        surface_1 = meta(alias, "en_face_retinal_segmentation_surface_1")
+        surface_2 = reported(meta(alias, "en_face_retinal_segmentation_surface_2"))
+    else:
+        surface_1 = surface_2 = not_reported
+    missing = f"{alias}.output_path IS NULL"
+    return {
+        f"associated_enface_{number}_file_path": f"COALESCE({meta(alias, 'filepath')}, {not_reported})",
+        f"associated_enface_{number}_sop_instance_uid": f"COALESCE({meta(alias, 'sop_instance_uid')}, {not_reported})",
+        f"associated_enface_{number}_ophthalmic_image_type": f"CASE WHEN {missing} THEN {not_reported} ELSE {capitalized(image_type)} END",
+        f"associated_enface_{number}_segmentation_surface_1": f"CASE WHEN {missing} THEN {not_reported} ELSE {capitalized(surface_1)} END",
+        f"associated_enface_{number}_segmentation_surface_2": f"CASE WHEN {missing} THEN {not_reported} ELSE {capitalized(surface_2)} END",
+    }
+
+
+def projection_removed_expressions(number, alias=None):
+    """
+    Manifest columns of the projection-removed enface number, joined as alias
+    ("Not reported" if alias is None or there is no such enface).
+    """
+    if alias is None:
+        filepath = uid = not_reported
+    else:
+        filepath = f"COALESCE({meta(alias, 'filepath')}, {not_reported})"
+        uid = f"COALESCE({meta(alias, 'sop_instance_uid')}, {not_reported})"
+    return {
+        f"associated_enface_{number}_projection_removed_filepath": filepath,
+        f"associated_enface_{number}_projection_removed_sop_instance_uid": uid,
+    }
+
+
+def acquisition_expressions(op_uid, oct_uid, vol_uid, seg_uid, anatomic_region):
+    """
+    Manifest columns shared by Cirrus and Topcon OCTA acquisitions: the flow cube ("vol"),
+    the segmentation ("seg"), the photograph ("op") and the structural OCT ("oct").
+    """
+    return {
+        "person_id": meta("vol", "person_id"),
+        "manufacturer": capitalized(meta("vol", "manufacturer")),
+        "manufacturers_model_name": capitalized(meta("vol", "manufacturers_model_name")),
+        "anatomic_region": anatomic_region,
+        "imaging": f"upper({meta('vol', 'modality')})",
+        "laterality": capitalized(meta("vol", "laterality")),
+        "flow_cube_height": meta("vol", "height"),
+        "flow_cube_width": meta("vol", "width"),
+        "flow_cube_number_of_frames": meta("vol", "number_of_frames"),
+        "associated_segmentation_type": "'Heightmap'",
+        "associated_segmentation_number_of_frames": meta("seg", "number_of_frames"),
+        "flow_cube_sop_instance_uid": vol_uid,
+        "flow_cube_file_path": meta("vol", "filepath"),
+        "flow_cube_file_blake2b": reported(meta("vol", "file_blake2b")),
+        "flow_cube_pixel_data_blake2b": reported(meta("vol", "pixel_data_blake2b")),
+        "associated_retinal_photography_sop_instance_uid": op_uid,
+        "associated_structural_oct_sop_instance_uid": oct_uid,
+        "associated_structural_oct_file_path": meta("oct", "filepath"),
+        "associated_segmentation_sop_instance_uid": seg_uid,
+        "associated_segmentation_file_path": meta("seg", "filepath"),
+        "variant_segmentation_sop_instance_uid": not_reported,
+        "variant_segmentation_file_path": not_reported,
+    }
+
+
+def cirrus_octa_query():
+    """
+    SQL of the Cirrus rows of the OCTA manifest (see manifest_creation.process_cirrus_file).
+
+    Each acquisition starts from its first enface, whose metadata names the flow cube,
+    segmentation, photograph and structural OCT. The other enfaces share its UID but for
+    the last digit: 2 and 3 (projection removed), 6 and 7, 4 and 5.
+    """
+    op_uid = meta("seed", "op_reference_instance_uid")
+    oct_uid = meta("seed", "oct_reference_instance_uid")
+    vol_uid = meta("seed", "vol_reference_instance_uid")
+    seg_uid = meta("seed", "seg_reference_instance_uid")
+
+    def sibling(digit):
+        return f"substr(seed.sop_instance_uid, 1, length(seed.sop_instance_uid) - 1) || '{digit}'"
+
+    joins = [
+        join_file("op", "retinal_photography", op_uid),
+        join_file("oct", "retinal_oct", oct_uid),
+        join_file("seg", "retinal_octa", seg_uid, "%segmentation%"),
+        join_file("vol", "retinal_octa", vol_uid, "%flow_cube%"),
+    ]
+    expressions = acquisition_expressions(
+        op_uid, oct_uid, vol_uid, seg_uid, meta("oct", "anatomic_region")
+    )
+    expressions["associated_retinal_photography_file_path"] = meta("op", "filepath")
+    expressions.update(enface_expressions(1, "seed", surfaces=False))
+    for number, digit, projection_digit in [(2, 2, 3), (3, 6, 7), (4, 4, 5)]:
+        joins.append(
+            join_file(f"enface_{number}", "retinal_octa", sibling(digit), "%enface%")
+            + f" AND enface_{number}.filepath NOT LIKE '%projection_removed%'"
+        )
+        joins.append(
+            join_file(
+                f"projection_{number}", "retinal_octa", sibling(projection_digit), "%enface_projection_removed%"
+            )
+        )
+        expressions.update(enface_expressions(number, f"enface_{number}", surfaces=False))
+        expressions.update(projection_removed_expressions(number, f"projection_{number}"))
+
+    return (
+        f"SELECT {', '.join(f'{expressions[column]} AS {column}' for column in retinal_octa_columns)} "
+        f"FROM files seed {' '.join(joins)} "
+        f"WHERE seed.release_folder = :release AND {in_folder('seed', 'retinal_octa')} "
+        f"AND seed.metadata IS NOT NULL AND seed.filepath LIKE '%cirrus%enface%1.dcm'"
+    )
+
+
+def topcon_octa_query():
+    """
+    SQL of the Topcon rows of the OCTA manifest (see manifest_creation.process_topcon_file).
+
+    Each acquisition starts from its segmentation (UID <prefix>.7.3); the photograph,
+    structural OCT and flow cube are <prefix>.2.1, <prefix>.1.1 and <prefix>.3.1, and
+    the enfaces 1 to 4 are <prefix>.6.3, .6.4, .6.5 and .6.80.
+    """
+    # The UID of the segmentation without its last two components, dot included
+    prefix = "rtrim(rtrim(rtrim(seed.sop_instance_uid, '0123456789'), '.'), '0123456789')"
+    op_uid = f"{prefix} || '2.1'"
+    oct_uid = f"{prefix} || '1.1'"
+    vol_uid = f"{prefix} || '3.1'"
+
+    joins = [
+        join_file("op", "retinal_photography", op_uid),
+        join_file("oct", "retinal_oct", oct_uid),
+        join_file("vol", "retinal_octa", vol_uid, "%flow_cube%"),
+    ]
+    expressions = acquisition_expressions(
+        op_uid, oct_uid, vol_uid, "seed.sop_instance_uid", capitalized(meta("oct", "anatomic_region"))
+    )
+    # The segmentation is the starting file
+    expressions["associated_segmentation_number_of_frames"] = meta("seed", "number_of_frames")
+    expressions["associated_segmentation_file_path"] = meta("seed", "filepath")
+    expressions["associated_retinal_photography_file_path"] = f"COALESCE({meta('op', 'filepath')}, 'Not Provided')"
+    for number, suffix in [(1, "6.3"), (2, "6.4"), (3, "6.5"), (4, "6.80")]:
+        joins.append(join_file(f"enface_{number}", "retinal_octa", f"{prefix} || '{suffix}'", "%enface%"))
+        expressions.update(enface_expressions(number, f"enface_{number}"))
+        if number > 1:
+            expressions.update(projection_removed_expressions(number))
+
+    return (
+        f"SELECT {', '.join(f'{expressions[column]} AS {column}' for column in retinal_octa_columns)} "
+        f"FROM files seed {' '.join(joins)} "
+        f"WHERE seed.release_folder = :release AND {in_folder('seed', 'retinal_octa')} "
+        f"AND seed.metadata IS NOT NULL AND (seed.filepath LIKE '%maestro2%' OR seed.filepath LIKE '%triton%') "
+        f"AND seed.filepath LIKE '%segmentation%7.3.dcm'"
+    )
+
+
+def retinal_octa_manifest(catalog, imaging_folder):
+    """
+    Build the retinal OCTA manifest of a release from the catalog.
+
+    One row per Cirrus or Topcon acquisition, with its flow cube, segmentation, enfaces,
+    photograph and structural OCT associated by SQL joins on their SOP Instance UIDs
+    (the catalog index) instead of regular expressions over the metadata file names.
+    Duplicate rows are dropped and the rows are sorted by participant and flow cube.
+
+    Returns:
+        pandas.DataFrame: The columns of manifest_creation.octa_manifest.
+    """
+    sql = (
+        f"{cirrus_octa_query()} UNION {topcon_octa_query()} "
+        "ORDER BY person_id, flow_cube_file_path, associated_segmentation_file_path, "
+        "associated_enface_1_file_path"
+    )
+    rows = catalog.query(sql, {"release": os.path.abspath(imaging_folder)})
+    for row in rows:
+        if row["associated_retinal_photography_file_path"] == "Not Provided":
+            print(f"{row['associated_retinal_photography_sop_instance_uid']} unavailable")
+    return pd.DataFrame(rows, columns=retinal_octa_columns)
+
+
+# Top folder of the release -> function building its manifest
+manifest_builders = {
+    "retinal_photography": retinal_photography_manifest,
+    "retinal_oct": retinal_oct_manifest,
+    "retinal_octa": retinal_octa_manifest,
+    "retinal_flio": flio_manifest,
+}
+
+
+def make_manifests(catalog_path, imaging_folder, folders=None):
+    """
+    Write the manifests of a release from the catalog, without reading its metadata files.
+
+    The release must have been cataloged with its metadata records (see
+    imaging_catalog.catalog_folder, or the --catalog option of the drivers). Each
+    manifest is written to <imaging_folder>/<top folder>/manifest.tsv when it has rows; a
+    warning is printed for a folder with files whose manifest has none.
+
+    Args:
+        catalog_path (str): The SQLite catalog.
+        imaging_folder (str): The final structure folder of the release.
+        folders (list, optional): Top folders to write (default: every key of manifest_builders).
+
+    Returns:
+        dict: Top folder -> (manifest path, number of rows), for the manifests written.
+    """
+    written = {}
+    with imaging_catalog.Catalog(catalog_path) as catalog:
+        for folder in folders or manifest_builders:
+            manifest = manifest_builders[folder](catalog, imaging_folder)
+            if manifest.empty:
+                # A folder with files but no rows means no acquisition was matched
+                files = catalog.query(
+                    f"SELECT COUNT(*) AS files FROM files seed "
+                    f"WHERE seed.release_folder = :release AND {in_folder('seed', folder)}",
+                    {"release": os.path.abspath(imaging_folder)},
+                )[0]["files"]
+                if files:
+                    print(f"WARNING: {folder} has {files} files but its manifest has no rows; it was not written.")
+                continue
+            path = os.path.join(imaging_folder, folder, "manifest.tsv")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            manifest.to_csv(path, sep="\t", index=False)
+            written[folder] = (path, len(manifest))
+    return written
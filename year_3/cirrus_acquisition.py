@@ -0,0 +1,123 @@
+import imaging_utils
+import imaging_zip_input
+import numpy as np
+
+
+class CirrusAcquisition:
+    """
+    One Cirrus acquisition (the files of one organized folder) shared by all converters.
+
+    Headers are read once, without pixel data, and cached together with their JSON
+    representation, so the references each converter needs (Struc, LSO, Flow, Seg)
+    are parsed only once per acquisition. Pixel data is only read by dataset(), for
+    the file a converter is actually converting.
+
+    Attributes:
+        files (list): The paths to the files of the acquisition.
+        struc (str): The structural OCT (*Struc.*) file.
+        ir (str): The LSO (infrared retinal photography) file.
+        flow (str): The flow volume file.
+        seg (str): The segmentation file.
+
+    Missing roles hold the "String not found in any file." message, as returned by
+    imaging_utils.find_string_in_files.
+    """
+
+    def __init__(self, folder=None, files=None):
+        """
+        Initializes the acquisition from a folder or from an explicit list of files.
+
+        Args:
+            folder (str, optional): The organized acquisition folder.
+            files (list, optional): The paths to the files of the acquisition.
+        """
+        self.files = (
+            files if files is not None else imaging_utils.get_filtered_file_names(folder)
+        )
+        self.struc = imaging_utils.find_string_in_files(self.files, "Struc.")
+        self.ir = imaging_utils.find_string_in_files(self.files, "LSO")
+        self.flow = imaging_utils.find_string_in_files(self.files, "Flow")
+        self.seg = imaging_utils.find_string_in_files(self.files, "Seg")
+
+        self._headers = {}
+        self._json_dicts = {}
+        self._reference_coordinates = {}
+
+    def header(self, file):
+        """
+        Return the header of a file, read once without pixel data.
+
+        The returned dataset is shared and must not be modified.
+
+        Args:
+            file (str): The path to the DICOM file.
+
+        Returns:
+            pydicom.Dataset: The DICOM header.
+        """
+        if file not in self._headers:
+            if not imaging_zip_input.exists(file):
+                raise FileNotFoundError(f"File {file} not found.")
+            self._headers[file] = imaging_zip_input.dcmread(
+                file, stop_before_pixels=True
+            )
+        return self._headers[file]
+
+    def json_dict(self, file):
+        """
+        Return the JSON representation of a file header, computed once.
+
+        The returned dictionary is shared and must not be modified.
+
+        Args:
+            file (str): The path to the DICOM file.
+
+        Returns:
+            dict: The output of pydicom.Dataset.to_json_dict() for the header.
+        """
+        if file not in self._json_dicts:
+            self._json_dicts[file] = self.header(file).to_json_dict()
+        return self._json_dicts[file]
+
+    def dataset(self, file):
+        """
+        Read a file with its pixel data. The dataset is not cached and may be modified.
+
+        Args:
+            file (str): The path to the DICOM file.
+
+        Returns:
+            pydicom.Dataset: The full DICOM dataset.
+        """
+        return imaging_zip_input.dcmread(file)
+
+    def reference_coordinates(self, oct_file=None):
+        """
+        Return the bounding box of the B-scan reference coordinates of the OCT, computed once.
+
+        Args:
+            oct_file (str, optional): The OCT file. Defaults to the structural OCT of the acquisition.
+
+        Returns:
+            list: [x_min, y_max, x_max, y_min], see
+            cirrus_enface_converter_functional_groups.get_reference_coordinates.
+        """
+        oct_file = oct_file or self.struc
+        if oct_file not in self._reference_coordinates:
+            header = self.header(oct_file)
+            coordinates = np.array(
+                [
+                    frame["00220031"].value[0]["00220032"].value
+                    for frame in header["52009230"].value
+                ],
+                dtype=np.float64,
+            )
+            x = coordinates[:, [0, 2]]
+            y = coordinates[:, [1, 3]]
+            self._reference_coordinates[oct_file] = [
+                float(x.min()),
+                float(y.max()),
+                float(x.max()),
+                float(y.min()),
+            ]
+        return self._reference_coordinates[oct_file]
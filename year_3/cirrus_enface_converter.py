@@ -1,7 +1,9 @@
 import os
 
 import imaging_classifying_rules
+import imaging_writer
 import pydicom
+from cirrus_acquisition import CirrusAcquisition
 from cirrus_enface_converter_functional_groups import (
     derivation_algorithm_sequence, enface_volume_descriptor_sequence,
     ophthalmic_frame_location_sequence, ophthalmic_image_type_code_sequence,
@@ -336,13 +338,15 @@ class DicomEntry:
         return len(self.value) == 0
 
 
-def extract_dicom_dict(file, tags):
+def extract_dicom_dict(file, tags, acquisition=None):
     """
     Extracts DICOM metadata and specified tags from a DICOM file.
 
     Args:
         file (str): The path to the DICOM file.
         tags (list): A list of tags to extract from the DICOM file.
+        acquisition (CirrusAcquisition, optional): When given, the cached header of a
+            referenced file is used as is (no pixel data, no orientation overrides).
 
     Returns:
         tuple: A tuple containing the extracted metadata dictionary, transfer syntax information,
@@ -351,16 +355,21 @@ def extract_dicom_dict(file, tags):
     Raises:
         FileNotFoundError: If the specified file does not exist.
     """
-    if not os.path.exists(file):
-        raise FileNotFoundError(f"File {file} not found.")
-
     output = dict()
     output["filepath"] = file
 
-    dataset = pydicom.dcmread(file)
-    dataset.PatientOrientation = ["L", "F"]
-    dataset.ImageOrientationPatient = ""
-    dataset.PixelSpacing = [0.005859375, 0.005859375]
+    if acquisition is not None:
+        dataset = acquisition.header(file)
+        info = acquisition.json_dict(file)
+    else:
+        if not os.path.exists(file):
+            raise FileNotFoundError(f"File {file} not found.")
+
+        dataset = pydicom.dcmread(file)
+        dataset.PatientOrientation = ["L", "F"]
+        dataset.ImageOrientationPatient = ""
+        dataset.PixelSpacing = [0.005859375, 0.005859375]
+        info = dataset.to_json_dict()
 
     header_elements = {
         "00020000": {
@@ -386,14 +395,12 @@ def extract_dicom_dict(file, tags):
 
     json_dict = {}
     json_dict.update(header_elements)
-    info = dataset.to_json_dict()
+    json_dict.update(info)
 
     patient_name = dataset.PatientName
-    info["00100010"]["Value"] = [patient_name]
+    json_dict["00100010"] = dict(info["00100010"], Value=[patient_name])
     physician_name = dataset.ReferringPhysicianName
-    info["00080090"]["Value"] = [physician_name]
-
-    json_dict.update(info)
+    json_dict["00080090"] = dict(info["00080090"], Value=[physician_name])
 
     dicom = json_dict
 
@@ -411,7 +418,16 @@ def extract_dicom_dict(file, tags):
 
 
 def write_dicom(
-    protocol, dicom_dict_list, seg, vol, opt, op, opt_file, op_file, file_path
+    protocol,
+    dicom_dict_list,
+    seg,
+    vol,
+    opt,
+    op,
+    opt_file,
+    op_file,
+    file_path,
+    acquisition=None,
 ):
     """
     Writes a DICOM file based on a specified protocol and input data.
@@ -429,6 +445,7 @@ def write_dicom(
         opt (dict): Dictionary containing optical data.
         op (dict): Dictionary containing operational data.
         file_path (str): The path where the output DICOM file will be saved.
+        acquisition (CirrusAcquisition, optional): The acquisition the referenced files belong to.
     """
     headertags = protocol.header_tags()
     tags = protocol.tags()
@@ -545,18 +562,21 @@ def write_dicom(
 
             setattr(dataset, element_name, value)
 
-        source_image_sequence(dataset, dicom_dict_list)
-        ophthalmic_image_type_code_sequence(dataset, dicom_dict_list)
-        referenced_series_sequence(dataset, dicom_dict_list, seg, vol, opt, op)
-        derivation_algorithm_sequence(dataset, dicom_dict_list)
-        enface_volume_descriptor_sequence(dataset, dicom_dict_list)
-        ophthalmic_frame_location_sequence(dataset, dicom_dict_list, opt_file, op_file)
+    # The functional groups do not depend on the sequence being written, so they are built once
+    source_image_sequence(dataset, dicom_dict_list)
+    ophthalmic_image_type_code_sequence(dataset, dicom_dict_list)
+    referenced_series_sequence(dataset, dicom_dict_list, seg, vol, opt, op)
+    derivation_algorithm_sequence(dataset, dicom_dict_list)
+    enface_volume_descriptor_sequence(dataset, dicom_dict_list)
+    ophthalmic_frame_location_sequence(
+        dataset, dicom_dict_list, opt_file, op_file, acquisition
+    )
 
-    dataset.save_as(file_path, write_like_original=False)
+    imaging_writer.write_dataset(dataset, file_path, write_like_original=False)
 
 
 def convert_dicom(
-    inputenface, inputseg, inputvol, inputopt, inputop, output
+    inputenface, inputseg, inputvol, inputopt, inputop, output, acquisition=None
 ):  # inputseg, inputoct, inputop,
     """
     Convert DICOM data using a specific conversion rule.
@@ -571,7 +591,14 @@ def convert_dicom(
         inputopt (str): Path to the input optical DICOM file.
         inputop (str): Path to the input operational DICOM file.
         output (str): Path to the output DICOM file directory.
+        acquisition (CirrusAcquisition, optional): The acquisition of the input files. Its
+            cached headers are used for the referenced files.
     """
+    if acquisition is None:
+        acquisition = CirrusAcquisition(
+            files=[inputenface, inputseg, inputvol, inputopt, inputop]
+        )
+
     conversion_rule = enface
     tags = (
         conversion_rule.header_tags()
@@ -590,10 +617,18 @@ def convert_dicom(
         ]
     )
     enf = extract_dicom_dict(inputenface, tags)
-    seg = extract_dicom_dict(inputseg, ["0020000D", "0020000E", "00080016", "00080018"])
-    vol = extract_dicom_dict(inputvol, ["0020000D", "0020000E", "00080016", "00080018"])
-    opt = extract_dicom_dict(inputopt, ["0020000D", "0020000E", "00080016", "00080018"])
-    op = extract_dicom_dict(inputop, ["0020000D", "0020000E", "00080016", "00080018"])
+    seg = extract_dicom_dict(
+        inputseg, ["0020000D", "0020000E", "00080016", "00080018"], acquisition
+    )
+    vol = extract_dicom_dict(
+        inputvol, ["0020000D", "0020000E", "00080016", "00080018"], acquisition
+    )
+    opt = extract_dicom_dict(
+        inputopt, ["0020000D", "0020000E", "00080016", "00080018"], acquisition
+    )
+    op = extract_dicom_dict(
+        inputop, ["0020000D", "0020000E", "00080016", "00080018"], acquisition
+    )
 
     filename = inputenface.split("/")[-1]
 
@@ -607,4 +642,5 @@ def convert_dicom(
         inputopt,
         inputop,
         f"{output}/converted_{filename}",
+        acquisition,
     )
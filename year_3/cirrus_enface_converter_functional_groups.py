@@ -1,4 +1,9 @@
+import imaging_registry
 import pydicom
+from cirrus_acquisition import CirrusAcquisition
+
+# Private attributes such as EnFaceVolumeDescriptorSequence
+imaging_registry.register_dicom_dictionary()
 
 
 def source_image_sequence(dataset, x):
@@ -279,16 +284,18 @@ def ophthalmic_image_type_code_sequence(dataset, x):
     dataset.OphthalmicImageTypeCodeSequence = ophthalmic_image_type_code_seq
 
 
-def get_reference_coordinates(oct_file):
+def get_reference_coordinates(oct_file, acquisition=None):
     """
     Extract reference coordinates from an OCT (Optical Coherence Tomography) DICOM file.
 
-    This function reads a DICOM file, extracts 3D coordinates from the 'Ophthalmic Volumetric Properties'
+    This function reads the header of a DICOM file, extracts 3D coordinates from the 'Ophthalmic Volumetric Properties'
     (tag '52009230') element, and calculates the minimum and maximum values for each coordinate component (x, y).
     These min/max values are used to determine the bounding box of the coordinates in a 2D plane.
 
     Args:
         oct_file (str): The path to the OCT DICOM file.
+        acquisition (CirrusAcquisition, optional): The acquisition holding the already parsed
+            OCT header; the bounding box is then computed only once per acquisition.
 
     Returns:
         list: A list of 4 values representing the bounding box coordinates:
@@ -304,57 +311,12 @@ def get_reference_coordinates(oct_file):
         FileNotFoundError: If the specified DICOM file does not exist.
         KeyError: If the required DICOM tags are missing or improperly formatted.
     """
-
-    list_coordinates = []
-    a = pydicom.dcmread(oct_file)
-
-    for i in range(len(a["52009230"].value)):
-        x = a["52009230"].value[i]["00220031"].value[0]["00220032"].value
-        list_coordinates.append(x)
-
-    min_max_per_component = []
-    num_components = len(list_coordinates[0])
-
-    for n in range(num_components):
-        # Extract the nth component from each sublist
-        nth_components = [coords[n] for coords in list_coordinates]
-
-        # Get the min and max of the nth components
-        min_value = min(nth_components)
-        max_value = max(nth_components)
-
-        # Store the min and max for the nth component
-        min_max_per_component.append((min_value, max_value))
-
-    x_min = min(
-        min_max_per_component[0][0],
-        min_max_per_component[0][1],
-        min_max_per_component[2][0],
-        min_max_per_component[2][1],
-    )
-    y_max = max(
-        min_max_per_component[1][0],
-        min_max_per_component[1][1],
-        min_max_per_component[3][0],
-        min_max_per_component[3][1],
-    )
-    x_max = max(
-        min_max_per_component[0][0],
-        min_max_per_component[0][1],
-        min_max_per_component[2][0],
-        min_max_per_component[2][1],
-    )
-    y_min = min(
-        min_max_per_component[1][0],
-        min_max_per_component[1][1],
-        min_max_per_component[3][0],
-        min_max_per_component[3][1],
-    )
-    final_coordinates = [x_min, y_max, x_max, y_min]
-    return final_coordinates
+    if acquisition is None:
+        acquisition = CirrusAcquisition(files=[oct_file])
+    return acquisition.reference_coordinates(oct_file)
 
 
-def ophthalmic_frame_location_sequence(dataset, x, opt, op):
+def ophthalmic_frame_location_sequence(dataset, x, opt, op, acquisition=None):
     """
     Add an Ophthalmic Frame Location Sequence to a DICOM dataset.
 
@@ -366,24 +328,27 @@ def ophthalmic_frame_location_sequence(dataset, x, opt, op):
         dataset (pydicom.Dataset): The target DICOM dataset to which the Ophthalmic Frame Location Sequence
                                    will be added.
         x (dict): A dictionary of additional parameters (currently unused, but reserved for future customization).
-        opt (str): The file path to the OCT DICOM file from which to extract reference coordinates
-                   and SOP (Service Object Pair) UIDs.
+        opt (str): The file path to the OCT DICOM file from which to extract reference coordinates.
+        op (str): The file path to the retinal photography (LSO) DICOM file whose SOP
+                  (Service Object Pair) UIDs are referenced.
+        acquisition (CirrusAcquisition, optional): The acquisition holding the already parsed headers.
 
     Returns:
         None: The function modifies the input dataset in place, adding the Ophthalmic Frame Location Sequence.
 
     The Ophthalmic Frame Location Sequence contains:
-        - ReferencedSOPClassUID: SOP Class UID of the OCT DICOM file.
-        - ReferencedSOPInstanceUID: SOP Instance UID of the OCT DICOM file.
+        - ReferencedSOPClassUID: SOP Class UID of the retinal photography DICOM file.
+        - ReferencedSOPInstanceUID: SOP Instance UID of the retinal photography DICOM file.
         - ReferenceCoordinates: Extracted reference coordinates [x_min, y_max, x_max, y_min].
 
     Raises:
         FileNotFoundError: If the OCT DICOM file path is invalid.
         KeyError: If the required DICOM tags are missing or improperly formatted in the input file.
     """
-    coordinates = get_reference_coordinates(opt)
-    a = pydicom.dcmread(opt)
-    b = pydicom.dcmread(op)
+    if acquisition is None:
+        acquisition = CirrusAcquisition(files=[opt, op])
+    coordinates = get_reference_coordinates(opt, acquisition)
+    b = acquisition.header(op)
     ophthalmic_image_type_code_seq = pydicom.Sequence()
     ophthalmic_image_type_code_item = pydicom.Dataset()
 
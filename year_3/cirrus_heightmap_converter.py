@@ -1,7 +1,7 @@
-import os
-
+import imaging_writer
 import numpy as np
 import pydicom
+from cirrus_acquisition import CirrusAcquisition
 from cirrus_heightmap_converter_functional_groups import (
     dimension_index_sequence, dimension_organization_sequence,
     per_frame_functional_groups_sequence, referenced_series_sequence,
@@ -33,15 +33,17 @@ class ZeissSegmentationConverter:
                                            file into a heightmap and returns the result.
     """
 
-    def __init__(self, segmentation_file):
+    def __init__(self, segmentation_file, pixel_array=None):
         """
         Initializes the ZeissSegmentationConverter with the provided segmentation DICOM file.
 
         Args:
             segmentation_file (str): Path to the Zeiss OCT segmentation DICOM file.
+            pixel_array (numpy.ndarray, optional): The already decoded segmentation pixels.
+                When given, the segmentation file is not read again.
         """
         self.segmentation_file = segmentation_file
-        self.pixel_array = None
+        self.pixel_array = pixel_array
         self.change_indices_dict = {}
         self.final_array = None
 
@@ -52,6 +54,8 @@ class ZeissSegmentationConverter:
         Returns:
             None
         """
+        if self.pixel_array is not None:
+            return
         a = pydicom.dcmread(self.segmentation_file)
         self.pixel_array = a.pixel_array
 
@@ -149,20 +153,23 @@ def get_heightmap_float_pixel_data(seg_file):
     return floatpixeldata
 
 
-def get_heightmap_array(seg_file):
+def get_heightmap_array(seg_file, pixel_array=None):
     """
-    Convert the segmentation data from a Zeiss OCT DICOM file to a heightmap and return the pixel data in byte format.
+    Convert the segmentation data from a Zeiss OCT DICOM file to a heightmap and return the heightmap array.
 
     This function uses the ZeissSegmentationConverter class to process the segmentation file
-    and extract heightmap data, then converts this data to byte format for further use.
+    and extract heightmap data.
 
     Args:
         seg_file (str): Path to the Zeiss OCT segmentation DICOM file.
+        pixel_array (numpy.ndarray, optional): The already decoded segmentation pixels.
 
     Returns:
-        bytes: The heightmap pixel data in byte format.
+        numpy.ndarray: The heightmap array with shape (2, num_slices, num_columns).
     """
-    converter = ZeissSegmentationConverter(segmentation_file=seg_file)
+    converter = ZeissSegmentationConverter(
+        segmentation_file=seg_file, pixel_array=pixel_array
+    )
     pixel_array = converter.zeiss_segmentation_to_heightmap()
     return pixel_array
 
@@ -690,31 +697,30 @@ class DicomEntry:
         return len(self.value) == 0
 
 
-def extract_dicom_dict(file, tags):
+def extract_dicom_dict(file, tags, acquisition=None):
     """
     Extract DICOM information from a file and create a structured dictionary.
 
-    This function reads a DICOM file, extracts relevant header and data information,
+    This function reads a DICOM header, extracts relevant header and data information,
     and creates a structured dictionary containing header elements, metadata,
     and processed DICOM tag information.
 
     Args:
         file (str): Path to the DICOM file.
         tags (list): List of DICOM tags to be processed.
+        acquisition (CirrusAcquisition, optional): The acquisition holding the already parsed header.
 
     Returns:
         tuple: A tuple containing the structured dictionary, transfer syntax information,
                and pixel data of the DICOM file.
     """
-    if not os.path.exists(file):
-        raise FileNotFoundError(f"File {file} not found.")
+    if acquisition is None:
+        acquisition = CirrusAcquisition(files=[file])
 
     output = dict()
     output["filepath"] = file
 
-    dataset = pydicom.dcmread(file)
-
-    dataset.ImageType = ["DERIVED", "PRIMARY"]
+    dataset = acquisition.header(file)
 
     header_elements = {
         "00020000": {
@@ -740,14 +746,15 @@ def extract_dicom_dict(file, tags):
 
     json_dict = {}
     json_dict.update(header_elements)
-    info = dataset.to_json_dict()
+    info = acquisition.json_dict(file)
+    json_dict.update(info)
 
+    # The cached header is shared, so the overrides are applied to the copy only
+    json_dict["00080008"] = {"vr": "CS", "Value": ["DERIVED", "PRIMARY"]}
     patient_name = dataset.PatientName
-    info["00100010"]["Value"] = [patient_name]
+    json_dict["00100010"] = dict(info["00100010"], Value=[patient_name])
     physician_name = dataset.ReferringPhysicianName
-    info["00080090"]["Value"] = [physician_name]
-
-    json_dict.update(info)
+    json_dict["00080090"] = dict(info["00080090"], Value=[physician_name])
 
     dicom = json_dict
 
@@ -760,7 +767,16 @@ def extract_dicom_dict(file, tags):
     return output, transfersyntax, pixeldata
 
 
-def write_dicom(protocol, seg_dic, oct_dic, op_dic, seg_file, oct_file, file_path):
+def write_dicom(
+    protocol,
+    seg_dic,
+    oct_dic,
+    op_dic,
+    seg_file,
+    oct_file,
+    file_path,
+    acquisition=None,
+):
     """
     Extract DICOM information from a file and create a structured dictionary.
 
@@ -822,7 +838,10 @@ def write_dicom(protocol, seg_dic, oct_dic, op_dic, seg_file, oct_file, file_pat
         )
         setattr(dataset, element_name, value)
 
-    pixel_array = get_heightmap_array(seg_file)
+    seg_pixels = (
+        acquisition.dataset(seg_file).pixel_array if acquisition is not None else None
+    )
+    pixel_array = get_heightmap_array(seg_file, seg_pixels)
     dataset.Rows = pixel_array.shape[1]
     dataset.Columns = pixel_array.shape[2]
     dataset.NumberOfFrames = pixel_array.shape[0]
@@ -833,18 +852,16 @@ def write_dicom(protocol, seg_dic, oct_dic, op_dic, seg_file, oct_file, file_pat
     dataset.is_little_endian = seg_dic[1][0]
     dataset.is_implicit_VR = seg_dic[1][1]
 
-    dataset.FloatPixelData = get_heightmap_float_pixel_data(seg_file)
-
     shared_functional_group_sequence(dataset, seg_dic, oct_dic, op_dic)
     per_frame_functional_groups_sequence(dataset)
     dimension_index_sequence(dataset, seg_dic, oct_dic)
     dimension_organization_sequence(dataset, seg_dic, oct_dic)
     segment_sequence(dataset, seg_dic, oct_dic)
     referenced_series_sequence(dataset, seg_dic, oct_dic, op_dic)
-    dataset.save_as(file_path, write_like_original=False)
+    imaging_writer.write_dataset(dataset, file_path, write_like_original=False)
 
 
-def convert_dicom(inputseg, inputoct, inputop, output):
+def convert_dicom(inputseg, inputoct, inputop, output, acquisition=None):
     """
     Convert DICOM data using a specific conversion rule.
 
@@ -856,7 +873,12 @@ def convert_dicom(inputseg, inputoct, inputop, output):
         inputoct (str): Path to the input OCT DICOM file.
         inputop (str): Path to the input OP DICOM file.
         output (str): Path to the output DICOM file.
+        acquisition (CirrusAcquisition, optional): The acquisition of the input files. Its
+            cached headers are used, so every input header is parsed once.
     """
+    if acquisition is None:
+        acquisition = CirrusAcquisition(files=[inputseg, inputoct, inputop])
+
     conversion_rule = heightmap
     tags = (
         conversion_rule.header_tags()
@@ -872,14 +894,21 @@ def convert_dicom(inputseg, inputoct, inputop, output):
         + list(conversion_rule1.sequence_tags().keys())
         + ["52009230", "52009229", "00620002", "00081115", "00209221", "00209222"]
     )
-    x = extract_dicom_dict(inputseg, tags)
+    x = extract_dicom_dict(inputseg, tags, acquisition)
 
-    y = extract_dicom_dict(inputoct, tags1)
+    y = extract_dicom_dict(inputoct, tags1, acquisition)
 
-    z = extract_dicom_dict(inputop, ["0020000E", "00080016", "00080018"])
+    z = extract_dicom_dict(inputop, ["0020000E", "00080016", "00080018"], acquisition)
 
     filename = inputseg.split("/")[-1]
 
     write_dicom(
-        conversion_rule, x, y, z, inputseg, inputoct, f"{output}/converted_{filename}"
+        conversion_rule,
+        x,
+        y,
+        z,
+        inputseg,
+        inputoct,
+        f"{output}/converted_{filename}",
+        acquisition,
     )
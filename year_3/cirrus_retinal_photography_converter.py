@@ -1,5 +1,6 @@
 import os
 
+import imaging_writer
 import pydicom
 
 KEEP = 0
@@ -314,7 +315,7 @@ class DicomEntry:
         return len(self.value) == 0
 
 
-def extract_dicom_dict(file, tags):
+def extract_dicom_dict(file, tags, dataset=None):
     """
     Extract DICOM metadata and information from a DICOM file.
 
@@ -325,6 +326,7 @@ def extract_dicom_dict(file, tags):
     Args:
         file (str): The path to the DICOM file.
         tags (list): List of DICOM tags to process.
+        dataset (pydicom.Dataset, optional): The already loaded dataset of the file.
 
     Returns:
         tuple: A tuple containing:
@@ -335,13 +337,13 @@ def extract_dicom_dict(file, tags):
     Raises:
         FileNotFoundError: If the specified DICOM file does not exist.
     """
-    if not os.path.exists(file):
-        raise FileNotFoundError(f"File {file} not found.")
-
     output = dict()
     output["filepath"] = file
 
-    dataset = pydicom.dcmread(file)
+    if dataset is None:
+        if not os.path.exists(file):
+            raise FileNotFoundError(f"File {file} not found.")
+        dataset = pydicom.dcmread(file)
 
     dataset.ImageType = ["ORIGINAL", "PRIMARY", "", "INFRARED"]
 
@@ -507,10 +509,10 @@ def write_dicom(protocol, dicom_dict_list, file_path):
             value = pydicom.Sequence()
             element_name = pydicom.datadict.keyword_for_tag(key)
             setattr(dataset, element_name, value)
-    dataset.save_as(file_path, write_like_original=False)
+    imaging_writer.write_dataset(dataset, file_path, write_like_original=False)
 
 
-def convert_dicom(input, output):
+def convert_dicom(input, output, acquisition=None):
     """
     Convert DICOM data from an input file to an output file using a conversion rule.
 
@@ -521,14 +523,17 @@ def convert_dicom(input, output):
     Args:
         input (str): The path to the input DICOM file.
         output (str): The path to the output DICOM file to be created.
+        acquisition (CirrusAcquisition, optional): The acquisition the input file belongs to.
     """
+    dataset = acquisition.dataset(input) if acquisition is not None else None
+
     conversion_rule = cirrus
     tags = (
         conversion_rule.header_tags()
         + conversion_rule.tags()
         + list(conversion_rule.sequence_tags().keys())
     )
-    x = extract_dicom_dict(input, tags)
+    x = extract_dicom_dict(input, tags, dataset)
 
     filename = input.split("/")[-1]
 
@@ -2,6 +2,7 @@ import os
 import shutil
 
 import imaging_utils
+import imaging_writer
 import pydicom
 
 device_folder_mapping = {
@@ -113,7 +114,7 @@ def format_cirrus_file(file, output):
         os.makedirs(full_dir_path, exist_ok=True)
         filename = os.path.basename(file)
         full_file_path = os.path.join(full_dir_path, filename)
-        shutil.copy(file, full_file_path)
+        imaging_writer.copy_file(file, full_file_path)
     else:
         # try:
         #     # Check if dataset has pixel data
@@ -134,7 +135,7 @@ def format_cirrus_file(file, output):
             os.makedirs(full_dir_path, exist_ok=True)
             filename = os.path.basename(file)
             full_file_path = os.path.join(full_dir_path, filename)
-            dataset.save_as(full_file_path)
+            imaging_writer.save_dataset(dataset, full_file_path)
 
         else:
             uid = dataset.SOPInstanceUID
@@ -193,6 +194,6 @@ def format_cirrus_file(file, output):
 
             full_file_path = os.path.join(full_dir_path, filename)
 
-            dataset.save_as(full_file_path)
+            imaging_writer.save_dataset(dataset, full_file_path)
 
             return full_file_path
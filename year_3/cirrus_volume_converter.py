@@ -1,5 +1,6 @@
 import os
 
+import imaging_writer
 import pydicom
 
 KEEP = 0
@@ -277,7 +278,7 @@ class DicomEntry:
         return len(self.value) == 0
 
 
-def extract_dicom_dict(file, tags):
+def extract_dicom_dict(file, tags, dataset=None):
     """
     Extract DICOM information from a file and create a structured dictionary.
 
@@ -288,18 +289,19 @@ def extract_dicom_dict(file, tags):
     Args:
         file (str): Path to the DICOM file.
         tags (list): List of DICOM tags to be processed.
+        dataset (pydicom.Dataset, optional): The already loaded dataset of the file.
 
     Returns:
         tuple: A tuple containing the structured dictionary, transfer syntax information,
                and pixel data of the DICOM file.
     """
-    if not os.path.exists(file):
-        raise FileNotFoundError(f"File {file} not found.")
-
     output = dict()
     output["filepath"] = file
 
-    dataset = pydicom.dcmread(file)
+    if dataset is None:
+        if not os.path.exists(file):
+            raise FileNotFoundError(f"File {file} not found.")
+        dataset = pydicom.dcmread(file)
 
     header_elements = {
         "00020000": {
@@ -353,12 +355,14 @@ def write_dicom(inputfile, protocol, dicom_dict_list, file_path):
     and dictionary.
 
     Args:
+        inputfile (str or pydicom.Dataset): The input DICOM file, or its already loaded dataset.
         protocol (ConversionRule): The conversion protocol specifying the structure of the DICOM data.
         dicom_dict_list (tuple): A tuple containing the structured DICOM dictionary,
                                 transfer syntax information, and pixel data.
         file_path (str): Path to the output DICOM file.
     """
-    inputfile = pydicom.dcmread(inputfile)
+    if not isinstance(inputfile, pydicom.Dataset):
+        inputfile = pydicom.dcmread(inputfile)
     headertags = protocol.header_tags()
     tags = protocol.tags()
     sequencetags = protocol.sequence_tags()
@@ -487,10 +491,10 @@ def write_dicom(inputfile, protocol, dicom_dict_list, file_path):
 
             setattr(dataset, element_name, value)
 
-    dataset.save_as(file_path, write_like_original=False)
+    imaging_writer.write_dataset(dataset, file_path, write_like_original=False)
 
 
-def convert_dicom(input, output):
+def convert_dicom(input, output, acquisition=None):
     """
     Convert DICOM data using a specific conversion rule.
 
@@ -500,15 +504,23 @@ def convert_dicom(input, output):
     Args:
         input (str): Path to the input DICOM file.
         output (str): Path to the output DICOM file.
+        acquisition (CirrusAcquisition, optional): The acquisition the input file belongs to.
+
+    The input file is read once and shared by the extraction and the writing steps.
     """
+    if acquisition is not None:
+        dataset = acquisition.dataset(input)
+    else:
+        dataset = pydicom.dcmread(input)
+
     conversion_rule = octa_volume
     tags = (
         conversion_rule.header_tags()
         + conversion_rule.tags()
         + list(conversion_rule.sequence_tags().keys())
     )
-    x = extract_dicom_dict(input, tags)
+    x = extract_dicom_dict(input, tags, dataset)
 
     filename = input.split("/")[-1]
 
-    write_dicom(input, conversion_rule, x, f"{output}/converted_{filename}")
+    write_dicom(dataset, conversion_rule, x, f"{output}/converted_{filename}")
@@ -24,11 +24,19 @@ class DicomEntry:
         return len(self.value) == 0
 
 
-def extract_dicom_dict(file, tags):
+def read_json_dict(file, matrix=None):
+    # The header matrix (imaging_header_matrix) holds the same DICOM JSON, without reading the file
+    if matrix is not None:
+        return matrix.json_dict(file)
+
     if not os.path.exists(file):
         raise FileNotFoundError(f"File {file} not found.")
 
-    dicom = pydicom.dcmread(file).to_json_dict()
+    return pydicom.dcmread(file).to_json_dict()
+
+
+def extract_dicom_dict(file, tags, matrix=None):
+    dicom = read_json_dict(file, matrix)
     output = dict()
     output["filepath"] = file
 
@@ -47,11 +55,8 @@ def extract_dicom_dict(file, tags):
     return output
 
 
-def extract_dicom_dict_extra(file, tags):
-    if not os.path.exists(file):
-        raise FileNotFoundError(f"File {file} not found.")
-
-    dicom = pydicom.dcmread(file).to_json_dict()
+def extract_dicom_dict_extra(file, tags, matrix=None):
+    dicom = read_json_dict(file, matrix)
     alltags = list(dicom.keys())
 
     output_extra = dict()
@@ -136,7 +141,7 @@ def evaluate_compliance(rules, dicom_dict):
     return result
 
 
-def export_to_excel(rules, dicom_dict_list, action_list, output_file_path, file_paths):
+def export_to_excel(rules, dicom_dict_list, action_list, output_file_path, file_paths, matrix=None):
     tags = rules.tags()
     workbook = xlsxwriter.Workbook(output_file_path)
     worksheet = workbook.add_worksheet("compliance_report")
@@ -230,7 +235,7 @@ def export_to_excel(rules, dicom_dict_list, action_list, output_file_path, file_
         end_col = start_col + len(headers) - 1
         worksheet_next.merge_range(1, start_col, 1, end_col, file_path, merge_format)
 
-        dicom_entries = extract_dicom_dict_extra(file_path, tags)
+        dicom_entries = extract_dicom_dict_extra(file_path, tags, matrix)
 
         for row, entry in enumerate(dicom_entries.values(), start=3):
             col = start_col
@@ -248,9 +253,9 @@ def export_to_excel(rules, dicom_dict_list, action_list, output_file_path, file_
     workbook.close()
 
 
-def create_report(rules, input_files, output_file):
-    dicom_dict_list = [extract_dicom_dict(file, rules.tags()) for file in input_files]
+def create_report(rules, input_files, output_file, matrix=None):
+    dicom_dict_list = [extract_dicom_dict(file, rules.tags(), matrix) for file in input_files]
     action_list = [
         evaluate_compliance(rules, dicom_dict) for dicom_dict in dicom_dict_list
     ]
-    export_to_excel(rules, dicom_dict_list, action_list, output_file, input_files)
+    export_to_excel(rules, dicom_dict_list, action_list, output_file, input_files, matrix)
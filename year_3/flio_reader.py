@@ -1,6 +1,5 @@
 import struct
 import numpy as np
-import matplotlib.pyplot as plt
 
 
 class Module:
@@ -563,6 +562,9 @@ def image_summary_view(file_path):
     Returns:
         None
     """
+    # matplotlib is only needed to display images, so it is not imported with the module
+    import matplotlib.pyplot as plt
+
     with open(file_path, "rb") as file:
         module_data_flio_header = get_module_data(flioheader, file)
         img_size = 256
@@ -612,6 +614,9 @@ def image_slice_view(file_path, block_number, slice_number):
     Returns:
         None
     """
+    # matplotlib is only needed to display images, so it is not imported with the module
+    import matplotlib.pyplot as plt
+
     with open(file_path, "rb") as file:
         module_data_flio_header = get_module_data(flioheader, file)
 
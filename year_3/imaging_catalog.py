@@ -0,0 +1,505 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from importlib import metadata as package_metadata
+
+import pydicom
+from joblib import Parallel, delayed
+
+import imaging_writer
+import organize_utils
+
+# Rows written to the catalog in one transaction
+catalog_batch_size = 200
+
+# Seconds a writer waits for another process (e.g. a concurrent device driver) to commit
+catalog_timeout = 60
+
+# Columns of the files table, in order
+file_columns = [
+    "output_path",
+    "filepath",
+    "release_folder",
+    "source_path",
+    "participant",
+    "device",
+    "protocol",
+    "sop_class_uid",
+    "sop_instance_uid",
+    "size",
+    "file_blake2b",
+    "pixel_data_blake2b",
+    "step",
+    "status",
+    "pipeline_version",
+    "updated",
+    "metadata",
+]
+
+# Top folders of a release, used to find the release root of a file
+release_top_folders = ["retinal_photography", "retinal_oct", "retinal_octa", "retinal_flio"]
+
+catalog_schema = """
+CREATE TABLE IF NOT EXISTS files (
+    output_path TEXT PRIMARY KEY,
+    filepath TEXT,
+    release_folder TEXT,
+    source_path TEXT,
+    participant TEXT,
+    device TEXT,
+    protocol TEXT,
+    sop_class_uid TEXT,
+    sop_instance_uid TEXT,
+    size INTEGER,
+    file_blake2b TEXT,
+    pixel_data_blake2b TEXT,
+    step TEXT,
+    status TEXT,
+    pipeline_version TEXT,
+    updated TEXT,
+    metadata TEXT
+);
+CREATE INDEX IF NOT EXISTS files_sop_instance_uid ON files (sop_instance_uid);
+CREATE INDEX IF NOT EXISTS files_participant ON files (participant);
+CREATE INDEX IF NOT EXISTS files_protocol ON files (protocol);
+CREATE INDEX IF NOT EXISTS files_release_folder ON files (release_folder, filepath);
+CREATE INDEX IF NOT EXISTS files_file_blake2b ON files (file_blake2b);
+
+CREATE TABLE IF NOT EXISTS file_references (
+    output_path TEXT NOT NULL,
+    sop_instance_uid TEXT,
+    referenced_uid TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    PRIMARY KEY (output_path, referenced_uid, kind)
+);
+CREATE INDEX IF NOT EXISTS file_references_referenced_uid ON file_references (referenced_uid);
+
+CREATE TABLE IF NOT EXISTS steps (
+    timestamp TEXT,
+    step TEXT,
+    input_path TEXT,
+    protocol TEXT,
+    converter TEXT,
+    status TEXT,
+    seconds REAL,
+    bytes INTEGER,
+    error_message TEXT,
+    device TEXT,
+    pipeline_version TEXT,
+    UNIQUE (timestamp, step, input_path, converter)
+);
+CREATE INDEX IF NOT EXISTS steps_input_path ON steps (input_path);
+CREATE INDEX IF NOT EXISTS steps_protocol ON steps (protocol);
+"""
+
+
+def pipeline_version():
+    """
+    Return the version of the installed aireadi-imaging package, or "unknown" when the
+    pipeline runs from a checkout.
+    """
+    try:
+        return package_metadata.version("aireadi-imaging")
+    except package_metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def release_path(output_path):
+    """
+    Split a file of a final structure folder into its release root and its path in the
+    release ("/retinal_oct/..."), as in the metadata records.
+
+    Returns:
+        tuple: (release root, path in the release), or (None, None) if the file is not
+        under one of release_top_folders.
+    """
+    parts = os.path.abspath(output_path).split(os.sep)
+    for index, part in enumerate(parts):
+        if part in release_top_folders:
+            return os.sep.join(parts[:index]) or os.sep, "/" + "/".join(parts[index:])
+    return None, None
+
+
+def referenced_uids(dataset, sequence=None):
+    """
+    List the SOP Instance UIDs a dataset references, at any depth.
+
+    Args:
+        dataset (pydicom.Dataset): The dataset (usually read without pixel data).
+        sequence (str): The top-level sequence being walked (used by the recursion).
+
+    Returns:
+        list: (referenced UID, keyword of the top-level sequence holding the reference).
+    """
+    references = []
+    for element in dataset:
+        if element.VR == "SQ":
+            for item in element.value:
+                references += referenced_uids(item, sequence or element.keyword)
+        elif element.keyword == "ReferencedSOPInstanceUID" and element.value:
+            references.append((str(element.value), sequence or element.keyword))
+    return references
+
+
+def file_row(
+    output_path,
+    release_folder=None,
+    source_path=None,
+    device=None,
+    protocol=None,
+    step=None,
+    status="SUCCESS",
+    metadata=None,
+):
+    """
+    Build the catalog row of a processed file and the references it makes.
+
+    The header is read without the pixel data. The checksums come from the metadata
+    record when it has them, otherwise from imaging_writer.file_checksums (free for files
+    written by this process).
+
+    Args:
+        output_path (str): The processed file.
+        release_folder (str, optional): The final structure folder holding the file
+            (default: the parent of its retinal_* top folder).
+        source_path (str, optional): The input the file was written from.
+        device (str, optional): The device, e.g. "cirrus".
+        protocol (str, optional): The protocol (default: from the metadata or the header).
+        step (str, optional): The step that wrote the file, e.g. "step4_final".
+        status (str): The status of that step.
+        metadata (dict, optional): The metadata record of the file.
+
+    Returns:
+        tuple: (row dictionary with the keys of file_columns, list of references as
+        (referenced UID, kind)).
+    """
+    metadata = metadata or {}
+    output_path = os.path.abspath(output_path)
+    dataset = pydicom.dcmread(output_path, stop_before_pixels=True)
+
+    if metadata.get("file_blake2b"):
+        checksums = metadata
+    else:
+        checksums = imaging_writer.file_checksums(output_path)
+
+    if release_folder:
+        release_folder = os.path.abspath(release_folder)
+        filepath = "/" + os.path.relpath(output_path, release_folder).replace(os.sep, "/")
+    else:
+        release_folder, filepath = release_path(output_path)
+
+    # Metadata records name their references "<kind>_reference_instance_uid"
+    references = set(referenced_uids(dataset))
+    for key, value in metadata.items():
+        if key.endswith("_instance_uid") and key != "sop_instance_uid" and value:
+            references.add((str(value), key[: -len("_instance_uid")]))
+
+    row = {
+        "output_path": output_path,
+        "filepath": filepath,
+        "release_folder": release_folder,
+        "source_path": os.path.abspath(source_path) if source_path else None,
+        "participant": str(metadata.get("person_id") or dataset.get("PatientID", "")) or None,
+        "device": device,
+        "protocol": protocol or metadata.get("protocol") or dataset.get("ProtocolName"),
+        "sop_class_uid": str(dataset.get("SOPClassUID", "")) or None,
+        "sop_instance_uid": str(dataset.get("SOPInstanceUID", "")) or None,
+        "size": os.path.getsize(output_path),
+        "file_blake2b": checksums.get("file_blake2b"),
+        "pixel_data_blake2b": checksums.get("pixel_data_blake2b"),
+        "step": step,
+        "status": status,
+        "pipeline_version": pipeline_version(),
+        "updated": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "metadata": json.dumps(metadata, default=str) if metadata else None,
+    }
+    return row, sorted(references)
+
+
+class Catalog:
+    """
+    Persistent SQLite catalog of the files processed by the pipeline.
+
+    Every processed file is a row of the files table (source and output path,
+    participant, device, protocol, SOP class and instance UIDs, size, checksums, step
+    status, pipeline version and metadata record); the UIDs it references are rows of
+    file_references, and the run log records of the steps are rows of steps. Rows are
+    written in batches; the database is in WAL mode, so several drivers can write to the
+    same catalog while it is being queried.
+
+    Example:
+        with Catalog("catalog.sqlite") as catalog:
+            catalog.record_file(path, source_path=file, device="eidon", step="step4_final")
+            rows = catalog.files(participant="1001", protocol="eidon_mosaic_cfp")
+
+    Args:
+        path (str): The SQLite database, created if it does not exist.
+        batch_size (int): The number of files buffered before they are written.
+    """
+
+    def __init__(self, path, batch_size=catalog_batch_size):
+        self.path = path
+        self.batch_size = batch_size
+        self.pending = []
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.connection = sqlite3.connect(path, timeout=catalog_timeout, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(catalog_schema)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def add(self, row, references=()):
+        """
+        Buffer a row built by file_row (replacing the file if it is already cataloged).
+        """
+        with self.lock:
+            self.pending.append((row, list(references)))
+            full = len(self.pending) >= self.batch_size
+        if full:
+            self.flush()
+
+    def record_file(self, output_path, release_folder=None, **kwargs):
+        """
+        Catalog a processed file; the arguments are those of file_row.
+        """
+        self.add(*file_row(output_path, release_folder, **kwargs))
+
+    def flush(self):
+        """
+        Write the buffered files in one transaction.
+        """
+        with self.lock:
+            pending = self.pending
+            self.pending = []
+            if not pending:
+                return
+            with self.connection:
+                self.connection.executemany(
+                    "DELETE FROM file_references WHERE output_path = ?",
+                    [(row["output_path"],) for row, _ in pending],
+                )
+                self.connection.executemany(
+                    f"INSERT OR REPLACE INTO files ({', '.join(file_columns)}) "
+                    f"VALUES ({', '.join('?' for _ in file_columns)})",
+                    [tuple(row[column] for column in file_columns) for row, _ in pending],
+                )
+                self.connection.executemany(
+                    "INSERT OR IGNORE INTO file_references VALUES (?, ?, ?, ?)",
+                    [
+                        (row["output_path"], row["sop_instance_uid"], uid, kind)
+                        for row, references in pending
+                        for uid, kind in references
+                    ],
+                )
+
+    def record_steps(self, records, device=None):
+        """
+        Catalog run log records (see imaging_run_log.RunLog); records already in the
+        catalog are skipped.
+
+        Args:
+            records (list): The records, e.g. RunLog.read().
+            device (str, optional): The device of the run.
+        """
+        version = pipeline_version()
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO steps VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        record["Timestamp"],
+                        record["Step"],
+                        record["Input"],
+                        record["Protocol"],
+                        record["Converter"],
+                        record["Status"],
+                        record["Seconds"],
+                        record["Bytes"],
+                        record["ErrorMessage"],
+                        device,
+                        version,
+                    )
+                    for record in records
+                ],
+            )
+
+    def forget_release(self, release_folder):
+        """
+        Remove the files of a final structure folder, e.g. before a driver rebuilds it.
+        """
+        self.flush()
+        release_folder = os.path.abspath(release_folder)
+        with self.lock, self.connection:
+            self.connection.execute(
+                "DELETE FROM file_references WHERE output_path IN "
+                "(SELECT output_path FROM files WHERE release_folder = ?)",
+                (release_folder,),
+            )
+            self.connection.execute("DELETE FROM files WHERE release_folder = ?", (release_folder,))
+
+    def query(self, sql, parameters=()):
+        """
+        Run a read query on the catalog.
+
+        Returns:
+            list: One dictionary per result row.
+        """
+        self.flush()
+        with self.lock:
+            return [dict(row) for row in self.connection.execute(sql, parameters)]
+
+    def files(self, **filters):
+        """
+        Return the cataloged files matching every filter, e.g. files(participant="1001").
+
+        Args:
+            **filters: Column of the files table -> value (a list matches any of its values).
+
+        Returns:
+            list: The matching rows, sorted by output path.
+        """
+        conditions = []
+        parameters = []
+        for column, value in filters.items():
+            if column not in file_columns:
+                raise ValueError(f"Unknown catalog column: {column}")
+            if isinstance(value, (list, tuple, set)):
+                conditions.append(f"{column} IN ({', '.join('?' for _ in value)})")
+                parameters += list(value)
+            elif value is None:
+                conditions.append(f"{column} IS NULL")
+            else:
+                conditions.append(f"{column} = ?")
+                parameters.append(value)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        return self.query(f"SELECT * FROM files{where} ORDER BY output_path", parameters)
+
+    def find_uid(self, sop_instance_uid):
+        """
+        Return the files with a SOP Instance UID (one per release that contains it).
+        """
+        return self.files(sop_instance_uid=sop_instance_uid)
+
+    def referencing(self, sop_instance_uid):
+        """
+        Return the files referencing a SOP Instance UID, with the kind of reference.
+        """
+        return self.query(
+            "SELECT files.*, file_references.kind AS reference_kind FROM file_references "
+            "JOIN files ON files.output_path = file_references.output_path "
+            "WHERE file_references.referenced_uid = ? ORDER BY files.output_path",
+            (sop_instance_uid,),
+        )
+
+    def step_history(self, input_path):
+        """
+        Return the run log records of an input, oldest first.
+        """
+        return self.query(
+            "SELECT * FROM steps WHERE input_path = ? ORDER BY timestamp", (input_path,)
+        )
+
+    def close(self):
+        """
+        Write the buffered files and close the database.
+        """
+        self.flush()
+        self.connection.close()
+
+
+def try_file_row(output_path, release_folder, device, metadata):
+    """
+    Build the catalog row of a file of a final structure folder (see file_row).
+
+    Returns:
+        tuple: (row, references), or (output_path, error message) if the file cannot be read.
+    """
+    try:
+        return file_row(
+            output_path, release_folder, device=device, step="step4_final", metadata=metadata
+        )
+    except Exception as e:
+        return output_path, str(e)
+
+
+def load_metadata_records(metadata_folder):
+    """
+    Map the files of a release to their metadata records.
+
+    Returns:
+        dict: Path in the release ("/retinal_oct/...") -> metadata record.
+    """
+    records = {}
+    for json_file in organize_utils.get_json_files(metadata_folder):
+        with open(json_file, "r") as file:
+            for record in json.load(file).values():
+                if record.get("filepath"):
+                    records[record["filepath"]] = record
+    return records
+
+
+def catalog_folder(
+    catalog_path,
+    release_folder,
+    metadata_folder=None,
+    device=None,
+    run_log_path=None,
+    n_jobs=-1,
+):
+    """
+    Catalog the files of an existing final structure folder.
+
+    The headers are read in parallel; the rows are written by this process. Files of the
+    folder cataloged before are replaced, and files no longer in the folder are removed.
+
+    Args:
+        catalog_path (str): The SQLite catalog.
+        release_folder (str): The final structure folder (e.g. output/step4_final_structure).
+        metadata_folder (str, optional): The metadata records of the folder.
+        device (str, optional): The device of the files.
+        run_log_path (str, optional): The run log of the driver run, imported into steps.
+        n_jobs (int): Number of files read in parallel.
+
+    Returns:
+        dict: "Files" (number cataloged), "Failed" (list of (path, error)) and "Steps"
+        (number of run log records read).
+    """
+    records = load_metadata_records(metadata_folder) if metadata_folder else {}
+    files = organize_utils.get_dcm_files(release_folder)
+
+    results = Parallel(n_jobs=n_jobs, batch_size=32)(
+        delayed(try_file_row)(
+            file,
+            release_folder,
+            device,
+            records.get("/" + os.path.relpath(file, release_folder).replace(os.sep, "/")),
+        )
+        for file in files
+    )
+
+    result = {"Files": 0, "Failed": [], "Steps": 0}
+    with Catalog(catalog_path) as catalog:
+        catalog.forget_release(release_folder)
+        for row, references in results:
+            if isinstance(references, str):
+                result["Failed"].append((row, references))
+                continue
+            catalog.add(row, references)
+            result["Files"] += 1
+
+        if run_log_path and os.path.exists(run_log_path):
+            with open(run_log_path, "r") as file:
+                steps = [json.loads(line) for line in file if line.strip()]
+            catalog.record_steps(steps, device)
+            result["Steps"] = len(steps)
+
+    return result
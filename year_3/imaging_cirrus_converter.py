@@ -6,6 +6,7 @@ import cirrus_oct_converter
 import cirrus_heightmap_converter
 import cirrus_volume_converter
 import imaging_utils
+from cirrus_acquisition import CirrusAcquisition
 
 
 def convert_dicom(folder, output):
@@ -31,18 +32,23 @@ def convert_dicom(folder, output):
 
     x = imaging_utils.get_filtered_file_names(folder)
 
+    # Every header of the acquisition is parsed once and shared by all converters
+    acquisition = CirrusAcquisition(folder, files=x)
+
     if len(x) == 11:
 
-        struc = imaging_utils.find_string_in_files(x, "Struc.")
-        ir = imaging_utils.find_string_in_files(x, "LSO")
-        flow = imaging_utils.find_string_in_files(x, "Flow")
-        seg = imaging_utils.find_string_in_files(x, "Seg")
+        struc = acquisition.struc
+        ir = acquisition.ir
+        flow = acquisition.flow
+        seg = acquisition.seg
 
         conversion_num = 0
         for file in x:
             if "Struc." in file:
                 try:
-                    cirrus_oct_converter.convert_dicom(file, output)
+                    cirrus_oct_converter.convert_dicom(
+                        file, output, acquisition
+                    )
 
                 except Exception as e:
                     print(f"An error occurred: {e}")
@@ -51,21 +57,27 @@ def convert_dicom(folder, output):
 
             elif "LSO" in file:
                 try:
-                    cirrus_retinal_photography_converter.convert_dicom(file, output)
+                    cirrus_retinal_photography_converter.convert_dicom(
+                        file, output, acquisition
+                    )
                 except Exception as e:
                     print(f"An error occurred: {e}")
                 conversion_num += 1
 
             elif "Flow" in file:
                 try:
-                    cirrus_volume_converter.convert_dicom(file, output)
+                    cirrus_volume_converter.convert_dicom(
+                        file, output, acquisition
+                    )
                 except Exception as e:
                     print(f"An error occurred: {e}")
                 conversion_num += 1
 
             elif "Seg" in file:
                 try:
-                    cirrus_heightmap_converter.convert_dicom(file, struc, ir, output)
+                    cirrus_heightmap_converter.convert_dicom(
+                        file, struc, ir, output, acquisition
+                    )
 
                 except Exception as e:
                     print(f"An error occurred: {e}")
@@ -80,6 +92,7 @@ def convert_dicom(folder, output):
                         struc,
                         ir,
                         output,
+                        acquisition,
                     )
                 except Exception as e:
                     print(f"An error occurred: {e}")
@@ -88,7 +101,7 @@ def convert_dicom(folder, output):
             else:
                 print("No converter found for the file: ", file)
 
-        file_num = len(imaging_utils.get_filtered_file_names(folder))
+        file_num = len(x)
         boolean = file_num == conversion_num
 
         dic = {
@@ -99,21 +112,25 @@ def convert_dicom(folder, output):
 
     if len(x) == 2:
 
-        struc = imaging_utils.find_string_in_files(x, "Struc.")
-        ir = imaging_utils.find_string_in_files(x, "LSO")
+        struc = acquisition.struc
+        ir = acquisition.ir
 
         conversion_num = 0
         for file in x:
             if "Struc." in file:
                 try:
-                    cirrus_oct_converter.convert_dicom(file, output)
+                    cirrus_oct_converter.convert_dicom(
+                        file, output, acquisition
+                    )
                 except Exception as e:
                     print(f"An error occurred: {e}")
                 conversion_num += 1
 
             elif "LSO" in file:
                 try:
-                    cirrus_retinal_photography_converter.convert_dicom(file, output)
+                    cirrus_retinal_photography_converter.convert_dicom(
+                        file, output, acquisition
+                    )
                 except Exception as e:
                     print(f"An error occurred: {e}")
                 conversion_num += 1
@@ -121,7 +138,7 @@ def convert_dicom(folder, output):
             else:
                 print("No converter found for the file: ", file)
 
-        file_num = len(imaging_utils.get_filtered_file_names(folder))
+        file_num = len(x)
         boolean = file_num == conversion_num
 
         dic = {
@@ -4,6 +4,7 @@ import json
 import os
 
 import imaging_utils
+import imaging_writer
 import pydicom
 
 oct_mapping = {
@@ -158,6 +159,8 @@ def meta_data_save(filename, output_folder):
     """
     if filename is not None:
         dataset = pydicom.dcmread(filename)
+        # Recorded by imaging_writer when this process wrote the file, else computed
+        checksums = imaging_writer.file_checksums(filename, dataset)
 
 
         if dataset.SOPClassUID == "1.2.840.10008.5.1.4.1.1.77.1.5.1":
@@ -209,6 +212,8 @@ def meta_data_save(filename, output_folder):
                 "protocol": rule,
                 "content_time": dataset.ContentDate + dataset.ContentTime,
                 "sop_class_uid": dataset.SOPClassUID,
+                "file_blake2b": checksums["file_blake2b"],
+                "pixel_data_blake2b": checksums["pixel_data_blake2b"],
             }
 
             filename = file.split("/")[-1].replace(".", "_")
@@ -290,6 +295,8 @@ def meta_data_save(filename, output_folder):
                 "protocol": dataset.ProtocolName,
                 "content_time": dataset.ContentDate + dataset.ContentTime,
                 "sop_class_uid": dataset.SOPClassUID,
+                "file_blake2b": checksums["file_blake2b"],
+                "pixel_data_blake2b": checksums["pixel_data_blake2b"],
             }
 
             filename = file.split("/")[-1].replace(".", "_")
@@ -370,6 +377,8 @@ def meta_data_save(filename, output_folder):
                 "sop_instance_uid": sop_instance_uid,
                 "content_time": dataset.ContentDate + dataset.ContentTime,
                 "sop_class_uid": dataset.SOPClassUID,
+                "file_blake2b": checksums["file_blake2b"],
+                "pixel_data_blake2b": checksums["pixel_data_blake2b"],
             }
             filename = file.split("/")[-1].replace(".", "_")
 
@@ -452,6 +461,8 @@ def meta_data_save(filename, output_folder):
                 "segmentation_type": "Heightmap",
                 "content_time": dataset.ContentDate + dataset.ContentTime,
                 "sop_class_uid": dataset.SOPClassUID,
+                "file_blake2b": checksums["file_blake2b"],
+                "pixel_data_blake2b": checksums["pixel_data_blake2b"],
             }
 
             filename = file.split("/")[-1].replace(".", "_")
@@ -620,6 +631,8 @@ def meta_data_save(filename, output_folder):
                 "op_reference_instance_uid": op_reference_instance_uid,
                 "vol_reference_instance_uid": vol_reference_instance_uid,
                 "seg_reference_instance_uid": seg_reference_instance_uid,
+                "file_blake2b": checksums["file_blake2b"],
+                "pixel_data_blake2b": checksums["pixel_data_blake2b"],
             }
 
             filename = file.split("/")[-1].replace(".", "_")
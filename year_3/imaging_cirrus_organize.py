@@ -1,339 +1,341 @@
 import os
 import shutil
 
-import imaging_classifying_rules
 import imaging_utils
+import imaging_zip_input
 import pydicom
 
 
-def filter_cirrus_files(folder, output):
+def read_cirrus_headers(folder):
     """
-    Filter and process Cirrus files based on classification rules.
+    Read the DICOM header of every filtered file in a Cirrus folder exactly once.
 
-    This function performs the following steps:
-    1. Checks critical information from files in the given folder.
-    2. Determines the expected status of the files (e.g., "Unknown" or "Expected").
-    3. Applies classification rules to the DICOM files.
-    4. Processes and copies the files to the appropriate output directory based on the classification rule.
+    Pixel data is never loaded. Files that are not valid DICOM are mapped to None
+    so callers can tell them apart without reading them again.
 
     Args:
-        folder (str): The path to the folder containing DICOM files to be processed.
-        output (str): The directory where the processed files will be stored.
+        folder (str): The path to the folder containing the Cirrus acquisition.
 
     Returns:
-        dict: A dictionary containing information about the processed files, including the protocol used
-        and the folder name. The dictionary has the following keys:
-            - "Protocol" (str): The protocol applied to the files.
-            - "Foldername" (str): The name of the folder processed.
+        dict: A dictionary mapping each filtered file path to its header dataset
+        (pydicom.Dataset) or None if the file is not a DICOM file.
     """
-    # imaging_utils.delete_csv_files(folder)
-    filtered_list = imaging_utils.get_filtered_file_names(folder)
+    headers = {}
+    for file_path in imaging_utils.get_filtered_file_names(folder):
+        try:
+            headers[file_path] = imaging_zip_input.dcmread(
+                file_path, stop_before_pixels=True
+            )
+        except pydicom.errors.InvalidDicomError:
+            headers[file_path] = None
+    return headers
+
+
+def cirrus_protocol_name(dataset):
+    """
+    Build the Cirrus protocol folder name from the ProtocolName of a DICOM header.
+
+    Args:
+        dataset (pydicom.Dataset): The DICOM header.
 
-    all_dicom = all(
-        imaging_classifying_rules.is_dicom_file(file) for file in filtered_list
+    Returns:
+        str: The protocol name, e.g. "cirrus_mac_angiography".
+    """
+    return (
+        "cirrus"
+        + "_"
+        + str(dataset.ProtocolName)
+        .lower()[:-7]
+        .replace("-", "_")
+        .replace(" ", "_")
+        .removesuffix("_")
     )
 
-    if filtered_list:
-        if all_dicom:
-
-            check = imaging_utils.check_critical_info_from_files_in_folder(folder)
-
-            if check == "pass":
-
-                expected_status = imaging_utils.cirrus_check_files_expected(folder)
-
-                if expected_status == "Unknown":
-
-                    protocol = "unknown_protocol"
-                    for root, dirs, files in os.walk(folder):
-                        for file in files:
-                            if file[0].isalpha():
-                                file_path = os.path.join(root, file)
-                                original_folder_basename = os.path.basename(
-                                    os.path.dirname(file_path)
-                                )
-                                if file_path.lower().endswith(".csv"):
-                                    # skip CSVs
-                                    continue
-                                else:
-                                    try:
-                                        # read only metadata, skip pixel data for speed
-                                        data = pydicom.dcmread(file_path, stop_before_pixels=True)
-                                    except Exception as e:
-                                        print(f"Skipping non-DICOM or unreadable file: {file_path} ({e})")
-                                        continue
-
-
-                                    laterality = data.ImageLaterality
-                                    patientid = data.PatientID
-
-                                    outputfolder = f"{output}/{protocol}/{protocol}_{patientid}_{laterality}_{file}"
-                                    os.makedirs(
-                                        f"{output}/{protocol}/{protocol}_{patientid}_{laterality}_{original_folder_basename}",
-                                        exist_ok=True,
-                                    )
-                                    shutil.copytree(
-                                        folder,
-                                        f"{output}/{protocol}/{protocol}_{patientid}_{laterality}_{original_folder_basename}",
-                                        dirs_exist_ok=True,
-                                    )
-
-                elif expected_status == "Expected":
-
-                    for root, dirs, files in os.walk(folder):
-                        first_file = files[0]
-                        if "350x350" in first_file:
-                            angio_files = [f for f in files if "Angio" in f]
-                            if angio_files:
-                                for root, dirs, files in os.walk(folder):
-                                    for file in files:
-                                        if file[0].isalpha():
-                                            file_path = os.path.join(root, file)
-                                            original_folder_basename = os.path.basename(
-                                                os.path.dirname(file_path)
-                                            )
-
-                                            if file_path.lower().endswith(".csv"):
-                                                # skip CSVs
-                                                continue
-                                            else:
-                                                try:
-                                                    # read only metadata, skip pixel data for speed
-                                                    data = pydicom.dcmread(file_path, stop_before_pixels=True)
-                                                except Exception as e:
-                                                    print(f"Skipping non-DICOM or unreadable file: {file_path} ({e})")
-                                        
-                                            laterality = data.ImageLaterality
-                                            patientid = data.PatientID
-                                            protocol = (
-                                                "cirrus"
-                                                + "_"
-                                                + str(data.ProtocolName)
-                                                .lower()[:-7]
-                                                .replace("-", "_")
-                                                .replace(" ", "_")
-                                                .removesuffix("_")
-                                            )
-
-                                            # Define the output folder
-                                            outputfolder = f"{output}/{protocol}/{protocol}_{patientid}_{laterality}_{original_folder_basename}"
-
-                                            # Ensure the output folder exists
-                                            os.makedirs(outputfolder, exist_ok=True)
-
-                                            # Create the destination path with just the filename, not the full path again
-                                            new_filename = f"{protocol}_{patientid}_{laterality}_{file}"
-                                            if (
-                                                "StructuralEnface" in new_filename
-                                                or (
-                                                    "512x128" in new_filename
-                                                    and "Seg.dcm" in new_filename
-                                                )
-                                                or (
-                                                    "200x200" in new_filename
-                                                    and "Seg.dcm" in new_filename
-                                                )
-                                            ):
-                                                continue  # Skip this file and move to the next one
-
-                                            destination = os.path.join(
-                                                outputfolder, new_filename
-                                            )
-
-                                            # Copy the file
-                                            shutil.copy2(file_path, destination)
-
-                            else:
-                                for root, dirs, files in os.walk(folder):
-                                    for file in files:
-                                        if file[0].isalpha():
-                                            file_path = os.path.join(root, file)
-                                            original_folder_basename = os.path.basename(
-                                                os.path.dirname(file_path)
-                                            )
-
-                                            if file_path.lower().endswith(".csv"):
-                                            # skip CSVs
-                                                continue
-                                            else:
-                                                try:
-                                                    # read only metadata, skip pixel data for speed
-                                                    data = pydicom.dcmread(file_path, stop_before_pixels=True)
-                                                except Exception as e:
-                                                    print(f"Skipping non-DICOM or unreadable file: {file_path} ({e})")
-                                   
-                                            laterality = data.ImageLaterality
-                                            patientid = data.PatientID
-                                            protocol = "wrong_angio_protocol"
-
-                                            # Define the output folder
-                                            outputfolder = f"{output}/{protocol}/{protocol}_{patientid}_{laterality}_{original_folder_basename}"
-
-                                            # Ensure the output folder exists
-                                            os.makedirs(outputfolder, exist_ok=True)
-
-                                            # Create the destination path with just the filename, not the full path again
-                                            new_filename = f"{protocol}_{patientid}_{laterality}_{file}"
-                                            if (
-                                                "StructuralEnface" in new_filename
-                                                or (
-                                                    "512x128" in new_filename
-                                                    and "Seg.dcm" in new_filename
-                                                )
-                                                or (
-                                                    "200x200" in new_filename
-                                                    and "Seg.dcm" in new_filename
-                                                )
-                                            ):
-                                                continue
-                                            destination = os.path.join(
-                                                outputfolder, new_filename
-                                            )
-
-                                            # Copy the file
-                                            shutil.copy2(file_path, destination)
-                        else:
-                            for root, dirs, files in os.walk(folder):
-                                for file in files:
-                                    if file[0].isalpha():
-                                        file_path = os.path.join(root, file)
-                                        original_folder_basename = os.path.basename(
-                                            os.path.dirname(file_path)
-                                        )
-
-                                        if file_path.lower().endswith(".csv"):
-                                            # skip CSVs
-                                            continue
-                                        else:
-                                            try:
-                                                # read only metadata, skip pixel data for speed
-                                                data = pydicom.dcmread(file_path, stop_before_pixels=True)
-                                            except Exception as e:
-                                                print(f"Skipping non-DICOM or unreadable file: {file_path} ({e})")
-                                                
-                                        laterality = data.ImageLaterality
-                                        patientid = data.PatientID
-                                        protocol = (
-                                            "cirrus"
-                                            + "_"
-                                            + str(data.ProtocolName)
-                                            .lower()[:-7]
-                                            .replace("-", "_")
-                                            .replace(" ", "_")
-                                            .removesuffix("_")
-                                        )
-
-                                        # Define the output folder
-                                        outputfolder = f"{output}/{protocol}/{protocol}_{patientid}_{laterality}_{original_folder_basename}"
-
-                                        # Ensure the output folder exists
-                                        os.makedirs(outputfolder, exist_ok=True)
-
-                                        # Create the destination path with just the filename, not the full path again
-                                        new_filename = f"{protocol}_{patientid}_{laterality}_{file}"
-                                        if (
-                                            "StructuralEnface" in new_filename
-                                            or (
-                                                "512x128" in new_filename
-                                                and "Seg.dcm" in new_filename
-                                            )
-                                            or (
-                                                "200x200" in new_filename
-                                                and "Seg.dcm" in new_filename
-                                            )
-                                        ):
-                                            continue
-                                        destination = os.path.join(
-                                            outputfolder, new_filename
-                                        )
-
-                                        # Copy the file
-                                        shutil.copy2(file_path, destination)
-
-            else:
-
-                protocol = f"{check}"
-
-                outputfolder = f"{output}/{protocol}"
-
-                if file_path.lower().endswith(".csv"):
-                    # skip CSVs
-                    pass
-                else:
-                    try:
-                        # read only metadata, skip pixel data for speed
-                        a = pydicom.dcmread(filtered_list[0])
-                    except Exception as e:
-                        print(f"Skipping non-DICOM or unreadable file: {filtered_list[0]} ({e})")
-                        
-                patientid = a.PatientID if hasattr(a, "PatientID") else "N/A"
-                laterality = (
-                    a.ImageLaterality if hasattr(a, "ImageLaterality") else "N/A"
-                )
 
-                # Ensure the output folder exists
-                os.makedirs(outputfolder, exist_ok=True)
+def is_skipped_cirrus_file(filename):
+    """
+    Check whether an organized Cirrus file should be left out of the output.
 
-                # Construct the source folder path
-                source_folder = f"{outputfolder}/{protocol}_{folder.split('/')[-1]}"
-                os.makedirs(source_folder, exist_ok=True)
+    StructuralEnface files and the 512x128 / 200x200 segmentation files are not
+    used by the conversion step.
 
-                # Copy the entire folder to the output directory
-                shutil.copytree(source_folder, outputfolder, dirs_exist_ok=True)
+    Args:
+        filename (str): The destination file name.
 
-            dic = {
-                "Rule": protocol,
-                "Patient ID": patientid,
-                "Laterality": laterality,
-                "Input": folder,
-                "Output": outputfolder,
-            }
+    Returns:
+        bool: True if the file should be skipped, False otherwise.
+    """
+    return (
+        "StructuralEnface" in filename
+        or ("512x128" in filename and "Seg.dcm" in filename)
+        or ("200x200" in filename and "Seg.dcm" in filename)
+    )
 
-        else:
 
-            protocol = "invalid_dicom"
+def _placeholder_plan(folder, output, protocol, patientid="N/A", laterality="N/A"):
+    """
+    Build the plan for a folder that is only recorded under a status folder.
 
-            outputfolder = f"{output}/{protocol}"
+    Args:
+        folder (str): The input folder.
+        output (str): The output directory.
+        protocol (str): The status used as protocol (e.g. "no_files").
+        patientid (str): The patient ID, if known.
+        laterality (str): The laterality, if known.
 
-            # Ensure the output folder exists
-            os.makedirs(outputfolder, exist_ok=True)
+    Returns:
+        dict: The organize plan.
+    """
+    outputfolder = f"{output}/{protocol}"
+    return {
+        "Rule": protocol,
+        "Patient ID": patientid,
+        "Laterality": laterality,
+        "Input": folder,
+        "Output": outputfolder,
+        "Folders": [
+            outputfolder,
+            f"{outputfolder}/{protocol}_{folder.split('/')[-1]}",
+        ],
+        "Copies": [],
+        "Skipped": [],
+    }
+
+
+def plan_cirrus_folder(folder, output):
+    """
+    Compute where every file of a Cirrus folder goes without touching the output.
 
-            # Construct the source folder path
-            source_folder = f"{outputfolder}/{protocol}_{folder.split('/')[-1]}"
-            os.makedirs(source_folder, exist_ok=True)
+    Each header is read once and reused for the DICOM check, the critical
+    information check and the destination naming (protocol, patient, laterality).
+    The folder may also be a folder inside a zip archive; nothing is extracted
+    until the plan is executed, and then only the planned files.
 
-            # Copy the entire folder to the output directory
-            shutil.copytree(source_folder, outputfolder, dirs_exist_ok=True)
+    Args:
+        folder (str): The path to the folder containing DICOM files to be processed.
+        output (str): The directory where the processed files will be stored.
 
-            dic = {
-                "Rule": protocol,
-                "Patient ID": "N/A",
-                "Laterality": "N/A",
-                "Input": folder,
-                "Output": outputfolder,
-            }
+    Returns:
+        dict: The organize plan with the keys "Rule", "Patient ID", "Laterality",
+        "Input", "Output", "Folders" (folders to create), "Copies" (list of
+        (source, destination, size in bytes) tuples) and "Skipped" (source files
+        left out by the skip rules).
+    """
+    if imaging_zip_input.is_zip_path(folder):
+        folder = imaging_zip_input.join_zip_path(
+            *imaging_zip_input.split_zip_path(folder)
+        )
+
+    headers = read_cirrus_headers(folder)
+
+    if not headers:
+        return _placeholder_plan(folder, output, "no_files")
+
+    if any(dataset is None for dataset in headers.values()):
+        return _placeholder_plan(folder, output, "invalid_dicom")
+
+    first_dataset = next(iter(headers.values()))
+    check = imaging_utils.check_critical_info_from_dataset(first_dataset)
+
+    if check != "pass":
+        return _placeholder_plan(
+            folder,
+            output,
+            check,
+            first_dataset.PatientID if hasattr(first_dataset, "PatientID") else "N/A",
+            (
+                first_dataset.ImageLaterality
+                if hasattr(first_dataset, "ImageLaterality")
+                else "N/A"
+            ),
+        )
+
+    plan = {
+        "Rule": None,
+        "Patient ID": None,
+        "Laterality": None,
+        "Input": folder,
+        "Output": None,
+        "Folders": [],
+        "Copies": [],
+        "Skipped": [],
+    }
+
+    # Only files starting with a letter name the acquisition
+    named = [
+        (file_path, dataset)
+        for file_path, dataset in headers.items()
+        if os.path.basename(file_path)[0].isalpha()
+    ]
+
+    expected_status = imaging_utils.cirrus_check_files_expected(folder)
+
+    if expected_status == "Unknown":
+        protocol = "unknown_protocol"
+        destinations = []
+        for file_path, dataset in named:
+            original_folder_basename = os.path.basename(os.path.dirname(file_path))
+            outputfolder = f"{output}/{protocol}/{protocol}_{dataset.PatientID}_{dataset.ImageLaterality}_{original_folder_basename}"
+            if outputfolder not in destinations:
+                destinations.append(outputfolder)
+            plan.update(
+                {
+                    "Rule": protocol,
+                    "Patient ID": dataset.PatientID,
+                    "Laterality": dataset.ImageLaterality,
+                    "Output": outputfolder,
+                }
+            )
+
+        # The whole folder is copied once per destination, not once per file
+        for outputfolder in destinations:
+            plan["Folders"].append(outputfolder)
+            for root, dirs, files in imaging_zip_input.walk(folder):
+                relative_root = os.path.relpath(root, folder)
+                for file in files:
+                    source = os.path.join(root, file)
+                    destination = os.path.normpath(
+                        os.path.join(outputfolder, relative_root, file)
+                    )
+                    plan["Copies"].append(
+                        (source, destination, imaging_zip_input.getsize(source))
+                    )
+
+    elif expected_status == "Expected":
+        top_files = next(imaging_zip_input.walk(folder))[2]
+        first_file = top_files[0] if top_files else ""
+        wrong_angio = "350x350" in first_file and not any(
+            "Angio" in f for f in top_files
+        )
+
+        for file_path, dataset in named:
+            file = os.path.basename(file_path)
+            original_folder_basename = os.path.basename(os.path.dirname(file_path))
+            protocol = (
+                "wrong_angio_protocol" if wrong_angio else cirrus_protocol_name(dataset)
+            )
+            laterality = dataset.ImageLaterality
+            patientid = dataset.PatientID
+
+            outputfolder = f"{output}/{protocol}/{protocol}_{patientid}_{laterality}_{original_folder_basename}"
+            if outputfolder not in plan["Folders"]:
+                plan["Folders"].append(outputfolder)
+
+            plan.update(
+                {
+                    "Rule": protocol,
+                    "Patient ID": patientid,
+                    "Laterality": laterality,
+                    "Output": outputfolder,
+                }
+            )
+
+            new_filename = f"{protocol}_{patientid}_{laterality}_{file}"
+            if is_skipped_cirrus_file(new_filename):
+                plan["Skipped"].append(file_path)
+                continue
+
+            plan["Copies"].append(
+                (
+                    file_path,
+                    os.path.join(outputfolder, new_filename),
+                    imaging_zip_input.getsize(file_path),
+                )
+            )
 
-    else:
+    return plan
 
-        protocol = "no_files"
-        outputfolder = f"{output}/{protocol}"
 
-        # Ensure the output folder exists
-        os.makedirs(outputfolder, exist_ok=True)
+def print_cirrus_plan(plan):
+    """
+    Print an organize plan and its byte totals without executing it.
+
+    Args:
+        plan (dict): The plan returned by plan_cirrus_folder.
+    """
+    total_bytes = sum(size for _, _, size in plan["Copies"])
+    print(f"Input: {plan['Input']}")
+    print(
+        f"Rule: {plan['Rule']} | Patient ID: {plan['Patient ID']} | Laterality: {plan['Laterality']}"
+    )
+    for folder in plan["Folders"]:
+        print(f"  mkdir {folder}")
+    for source, destination, size in plan["Copies"]:
+        print(f"  {source} -> {destination} ({size} bytes)")
+    for source in plan["Skipped"]:
+        print(f"  skip {source}")
+    print(
+        f"Total: {len(plan['Copies'])} files, {total_bytes} bytes "
+        f"({total_bytes / 1024 ** 2:.2f} MB), {len(plan['Skipped'])} skipped"
+    )
+
+
+def execute_cirrus_plan(plan, link=False):
+    """
+    Create the planned folders and copy (or hard link) every planned file once.
+
+    Args:
+        plan (dict): The plan returned by plan_cirrus_folder.
+        link (bool): If True, hard link files instead of copying them. Falls back
+            to copying when linking is not possible (e.g. across file systems or
+            for files read from a zip archive).
+
+    Returns:
+        int: The number of bytes copied or linked.
+    """
+    for folder in plan["Folders"]:
+        os.makedirs(folder, exist_ok=True)
+
+    total_bytes = 0
+    for source, destination, size in plan["Copies"]:
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        if link and not imaging_zip_input.is_zip_path(source):
+            try:
+                if os.path.exists(destination):
+                    os.remove(destination)
+                os.link(source, destination)
+            except OSError:
+                shutil.copy2(source, destination)
+        else:
+            imaging_zip_input.copy_file(source, destination)
+        total_bytes += size
+
+    return total_bytes
+
+
+def filter_cirrus_files(folder, output, dry_run=False, link=False):
+    """
+    Filter and process Cirrus files based on classification rules.
+
+    This function performs the following steps:
+    1. Reads every file header once and checks that all files are DICOM.
+    2. Checks critical information from the first file in the given folder.
+    3. Determines the expected status of the files (e.g., "Unknown" or "Expected").
+    4. Plans the destination of every file and then copies each of them exactly once.
 
-        # Construct the source folder path
-        source_folder = f"{outputfolder}/{protocol}_{folder.split('/')[-1]}"
-        os.makedirs(source_folder, exist_ok=True)
+    Args:
+        folder (str): The path to the folder containing DICOM files to be processed.
+        output (str): The directory where the processed files will be stored.
+        dry_run (bool): If True, only print the plan and its byte totals.
+        link (bool): If True, hard link files instead of copying them.
 
-        # Copy the entire folder to the output directory
-        shutil.copytree(source_folder, outputfolder, dirs_exist_ok=True)
+    Returns:
+        dict: A dictionary containing information about the processed files, with the keys
+        "Rule", "Patient ID", "Laterality", "Input" and "Output".
+    """
+    plan = plan_cirrus_folder(folder, output)
 
-        dic = {
-            "Rule": protocol,
-            "Patient ID": "N/A",
-            "Laterality": "N/A",
-            "Input": folder,
-            "Output": outputfolder,
-        }
+    if dry_run:
+        print_cirrus_plan(plan)
+    else:
+        execute_cirrus_plan(plan, link=link)
+
+    dic = {
+        "Rule": plan["Rule"],
+        "Patient ID": plan["Patient ID"],
+        "Laterality": plan["Laterality"],
+        "Input": folder,
+        "Output": plan["Output"],
+    }
 
     return dic
@@ -26,18 +26,22 @@ class Cirrus(DataDomain):
         super().__init__()
         self.ver = "1.0"
 
-    def organize(self, dicom_file, output_folder):
+    def organize(self, dicom_file, output_folder, dry_run=False, link=False):
         """
         Organizes a DICOM file by its protocol in the specified output folder.
 
         Args:
             dicom_file (str): Full path to the *.dicom file.
             output_folder (str): Full path to the output folder.
+            dry_run (bool): If True, only print the organize plan and byte totals.
+            link (bool): If True, hard link files instead of copying them.
 
         Returns:
             dict: A dictionary containing metadata and organization details.
         """
-        organize_dict = cirrus_organize.filter_cirrus_files(dicom_file, output_folder)
+        organize_dict = cirrus_organize.filter_cirrus_files(
+            dicom_file, output_folder, dry_run=dry_run, link=link
+        )
         return organize_dict
 
     def convert(self, input_folder, output_folder):
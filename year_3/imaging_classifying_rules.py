@@ -1,5 +1,6 @@
 import os
 
+import imaging_zip_input
 import pydicom
 
 
@@ -458,30 +459,33 @@ class DicomSummary:
 
 
 # Function to extract information from a DICOM file and create a DicomEntry object
-def extract_dicom_entry(file):
+def extract_dicom_entry(file, dataset=None):
     """
     Extract detailed information from a DICOM file and create a DicomEntry object.
 
+    Only the header is needed, so the file is read once without its pixel data.
+
     Args:
         file (str): The path to the DICOM file.
+        dataset (pydicom.Dataset, optional): The already loaded dataset of the file,
+            to avoid reading it again.
 
     Returns:
         DicomEntry: An object containing detailed information about the DICOM file.
     """
-    if not os.path.exists(file):
+    if not imaging_zip_input.exists(file):
         raise FileNotFoundError(f"File {file} not found.")
 
-    dicom = pydicom.dcmread(file).to_json_dict()
-    ds = pydicom.dcmread(file)
+    if dataset is None:
+        dataset = imaging_zip_input.dcmread(file, stop_before_pixels=True)
+    dicom = dataset.to_json_dict()
 
     filename = os.path.basename(file)
     bottom_file_name = os.path.basename(file)
     directory_one_level_up = os.path.dirname(file)
     second_to_bottom_file_name = os.path.basename(directory_one_level_up)
 
-    filesize = os.path.getsize(file) / (1000 * 1000)
-    folder_path = os.path.dirname(file)
-    folder_files = os.listdir(folder_path)
+    filesize = imaging_zip_input.getsize(file) / (1000 * 1000)
     error = "no"
 
     if "0020000E" in dicom:
@@ -708,7 +712,7 @@ def get_summary(file):
     return obj_dict
 
 
-def find_rule(file):
+def find_rule(file, dataset=None):
     """
     Find and apply classification rules to a DICOM file.
 
@@ -717,12 +721,13 @@ def find_rule(file):
 
     Args:
         file (str): The path to the file.
+        dataset (pydicom.Dataset, optional): The already loaded dataset of the file.
 
     Returns:
         str: The name of the classification rule that applies, or "no_rules_apply" if none apply.
     """
     if file.endswith(".dcm") or file[-8:].isdigit():
-        dicomentry = extract_dicom_entry(file)
+        dicomentry = extract_dicom_entry(file, dataset)
         matching_rules = [rule for rule in rules if rule.apply(dicomentry)]
         if matching_rules:
             for rule in matching_rules:
@@ -745,7 +750,7 @@ def is_dicom_file(file_path):
         str: The name of the classification rule that applies, or "no_rules_apply" if none apply.
     """
     try:
-        pydicom.dcmread(file_path)
+        imaging_zip_input.dcmread(file_path, stop_before_pixels=True)
         return True
     except pydicom.errors.InvalidDicomError:
         return False
@@ -0,0 +1,95 @@
+import argparse
+import importlib
+import sys
+
+import imaging_registry
+
+# Command -> (driver script, help). Drivers are imported only when their command runs,
+# so `aireadi-imaging --help` loads nothing but this module and the registry.
+cli_commands = {
+    "process": (None, "Run the pipeline of one device: process <device> -i INPUT -o OUTPUT ..."),
+    "ingest": ("ingest_devices", "Route a mixed input tree to every device pipeline and run them together."),
+    "compliance-report": ("create_compliance_report", "Write the compliance reports of converted DICOMs."),
+    "synthetic-corpus": ("create_synthetic_corpus", "Write a synthetic corpus for every device protocol."),
+    "benchmark": ("run_benchmarks", "Run or compare the pipeline benchmarks."),
+    "release-diff": ("compare_releases", "Compare two releases: added, removed, moved and changed files."),
+    "release-sync": ("sync_release", "Assemble a release folder, transferring only new or changed files."),
+    "previews": ("create_previews", "Render QC previews (thumbnails, B-scan contact sheets, FLIO intensity)."),
+    "catalog": ("build_catalog", "Record the final files of a run in the SQLite release catalog."),
+    "manifests": ("create_manifests", "Write the manifests of a release, from the catalog or the metadata records."),
+    "header-matrix": ("build_header_matrix", "Read the headers of a file set once into a files x tags matrix and query it."),
+    "devices": (None, "List the registered devices."),
+}
+
+
+def run_driver(module_name, prog, arguments):
+    """
+    Run the main() of a driver script with the given command-line arguments.
+
+    Args:
+        module_name (str): The driver module, e.g. "process_cirrus".
+        prog (str): The program name shown in the driver usage.
+        arguments (list): The command-line arguments of the driver.
+
+    Raises:
+        FileNotFoundError: If the driver scripts are not installed.
+    """
+    driver_folder = imaging_registry.get_driver_folder()
+    if driver_folder not in sys.path:
+        sys.path.append(driver_folder)
+    module = importlib.import_module(module_name)
+    sys.argv = [prog, *arguments]
+    module.main()
+
+
+def main(argv=None):
+    """
+    Entry point of the aireadi-imaging command.
+
+    Args:
+        argv (list, optional): The command-line arguments (default: sys.argv[1:]).
+    """
+    parser = argparse.ArgumentParser(
+        prog="aireadi-imaging",
+        description="AI-READI retinal imaging pipeline.",
+        epilog="commands:\n"
+        + "\n".join(f"  {name:<20}{help}" for name, (_, help) in cli_commands.items())
+        + "\n\nRun `aireadi-imaging <command> --help` for the options of a command.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("command", choices=cli_commands, metavar="command")
+    parser.add_argument("arguments", nargs=argparse.REMAINDER, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.command != "devices":
+        try:
+            imaging_registry.get_driver_folder()
+        except FileNotFoundError as e:
+            parser.exit(1, f"aireadi-imaging: error: {e}\n")
+
+    if args.command == "devices":
+        for device, (module_name, class_name, _) in imaging_registry.device_domains.items():
+            print(f"{device:<12}{module_name}.{class_name}")
+        return
+
+    if args.command == "process":
+        if not args.arguments or args.arguments[0] not in imaging_registry.device_domains:
+            parser.error(
+                "process expects a device: "
+                + ", ".join(imaging_registry.device_domains)
+            )
+        device = args.arguments[0]
+        run_driver(
+            imaging_registry.device_domains[device][2],
+            f"aireadi-imaging process {device}",
+            args.arguments[1:],
+        )
+        return
+
+    run_driver(
+        cli_commands[args.command][0], f"aireadi-imaging {args.command}", args.arguments
+    )
+
+
+if __name__ == "__main__":
+    main()
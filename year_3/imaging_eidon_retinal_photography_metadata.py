@@ -2,6 +2,7 @@ import json
 import os
 
 import imaging_utils
+import imaging_writer
 import pydicom
 
 oct_mapping = {
@@ -131,6 +132,8 @@ def meta_data_save(filename, output_folder):
     """
 
     dataset = pydicom.dcmread(filename)
+    # Recorded by imaging_writer when this process wrote the file, else computed
+    checksums = imaging_writer.file_checksums(filename, dataset)
 
     if dataset.SOPClassUID == "1.2.840.10008.5.1.4.1.1.77.1.5.1":
 
@@ -181,6 +184,8 @@ def meta_data_save(filename, output_folder):
             "protocol": rule,
             "content_time": dataset.ContentDate + dataset.ContentTime,
             "sop_class_uid": dataset.SOPClassUID,
+            "file_blake2b": checksums["file_blake2b"],
+            "pixel_data_blake2b": checksums["pixel_data_blake2b"],
         }
 
         filename = file.split("/")[-1].replace(".", "_")
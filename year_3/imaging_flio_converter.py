@@ -1,9 +1,12 @@
+import copy
+import io
 import json
 import os
 import re
 
 import flio_reader
 import imaging_utils
+import imaging_writer
 import numpy as np
 import pydicom
 from bs4 import BeautifulSoup
@@ -364,10 +367,10 @@ def short_add_html_sdt_info(dataset, sdt, dicom_info, output):
         dataset (Dataset): The DICOM dataset to modify.
         sdt (str): The path to the SDT file.
         dicom_info (dict): Dictionary containing extracted DICOM metadata.
-        output (str): Path to save the modified DICOM dataset.
+        output (str): Path to save the modified DICOM dataset, or None to only build it.
 
     Returns:
-        str: The output path where the DICOM dataset is saved.
+        str: The output path where the DICOM dataset is saved (the dataset if output is None).
     """
     dicom = dataset
 
@@ -462,8 +465,11 @@ def short_add_html_sdt_info(dataset, sdt, dicom_info, output):
     dicom.DeviceSerialNumber = r["flio_measurement_description_block_0"]["mod_ser_no"]
     dicom.StudyDescription = "Short Wavelength 498nm - 560nm"
 
+    if output is None:
+        return dicom
+
     os.makedirs(os.path.dirname(output), exist_ok=True)
-    return dicom.save_as(output, write_like_original=False)
+    return imaging_writer.write_dataset(dicom, output, write_like_original=False)
 
 
 def long_add_html_sdt_info(dataset, sdt, dicom_info, output):
@@ -474,10 +480,10 @@ def long_add_html_sdt_info(dataset, sdt, dicom_info, output):
         dataset (Dataset): The DICOM dataset to modify.
         sdt (str): The path to the SDT file.
         dicom_info (dict): Dictionary containing extracted DICOM metadata.
-        output (str): Path to save the modified DICOM dataset.
+        output (str): Path to save the modified DICOM dataset, or None to only build it.
 
     Returns:
-        str: The output path where the DICOM dataset is saved.
+        str: The output path where the DICOM dataset is saved (the dataset if output is None).
     """
     dicom = dataset
 
@@ -573,18 +579,72 @@ def long_add_html_sdt_info(dataset, sdt, dicom_info, output):
     dicom.DeviceSerialNumber = r["flio_measurement_description_block_0"]["mod_ser_no"]
     dicom.StudyDescription = "Long Wavelength 560nm - 720nm"
 
+    if output is None:
+        return dicom
+
     os.makedirs(os.path.dirname(output), exist_ok=True)
 
-    return dicom.save_as(output, write_like_original=False)
+    return imaging_writer.write_dataset(dicom, output, write_like_original=False)
 
 
-def make_flio_dicom(folder_path, output, json_path):
+def make_flio_datasets(inputsdt, inputhtml, json_path):
     """
-    Create FLIO DICOM files from SDT and HTML files.
+    Build the short and long wavelength datasets of an acquisition, with their UIDs.
 
     Args:
         inputsdt (str): Path to the SDT file.
         inputhtml (str): Path to the HTML file.
+        json_path (str): Path to the JSON file containing UID information.
+
+    Returns:
+        tuple: The information of the HTML file, and a dictionary mapping "short" and
+        "long" to the dataset (pixel data only, see make_min_info_dicom_from_sdt) and
+        the file name of the wavelength.
+    """
+    a, b = make_min_info_dicom_from_sdt(inputsdt)
+    dicom_info = extract_dicom_info_from_html(inputhtml)
+
+    with open(json_path, "r") as file:
+        data = json.load(file)
+
+    patientid = dicom_info["PatientID"][-4:]
+    content_time = str(dicom_info["ContentTime"])[0:5]
+    laterality = dicom_info["Laterality"]
+
+    uid_short = data[patientid][laterality]["short_uid"]
+    uid_short = uid_short[:-5] + content_time
+
+    uid_long = data[patientid][laterality]["long_uid"]
+    uid_long = uid_long[:-5] + content_time
+
+    a.file_meta.MediaStorageSOPInstanceUID = uid_short
+
+    a.SOPInstanceUID = uid_short
+    a.StudyInstanceUID = uid_short
+    a.SeriesInstanceUID = uid_short
+    a.SynchronizationFrameOfReferenceUID = uid_short
+
+    b.file_meta.MediaStorageSOPInstanceUID = uid_long
+
+    b.SOPInstanceUID = uid_long
+    b.StudyInstanceUID = uid_long
+    b.SeriesInstanceUID = uid_long
+    b.SynchronizationFrameOfReferenceUID = uid_long
+
+    laterality = laterality.lower()
+
+    return dicom_info, {
+        "short": (a, f"{patientid}_flio_short_wavelength_{laterality}_{uid_short}.dcm"),
+        "long": (b, f"{patientid}_flio_long_wavelength_{laterality}_{uid_long}.dcm"),
+    }
+
+
+def make_flio_dicom(folder_path, output, json_path):
+    """
+    Create FLIO DICOM files from SDT and HTML files.
+
+    Args:
+        folder_path (str): Path to the folder containing the SDT and HTML files.
         output (str): Directory path to save the output DICOM files.
         json_path (str): Path to the JSON file containing UID information.
 
@@ -603,44 +663,13 @@ def make_flio_dicom(folder_path, output, json_path):
             }
 
         else:
-            a, b = make_min_info_dicom_from_sdt(inputsdt)
-            dicom_info = extract_dicom_info_from_html(inputhtml)
-
-            with open(json_path, "r") as file:
-                data = json.load(file)
-
-            patientid = dicom_info["PatientID"][-4:]
-            content_time = str(dicom_info["ContentTime"])[0:5]
-            laterality = dicom_info["Laterality"]
-
-            uid_short = data[patientid][laterality]["short_uid"]
-            uid_short = uid_short[:-5] + content_time
-
-            uid_long = data[patientid][laterality]["long_uid"]
-            uid_long = uid_long[:-5] + content_time
-
-            a.file_meta.MediaStorageSOPInstanceUID = uid_short
-
-            a.SOPInstanceUID = uid_short
-            a.StudyInstanceUID = uid_short
-            a.SeriesInstanceUID = uid_short
-            a.SynchronizationFrameOfReferenceUID = uid_short
-
-            b.file_meta.MediaStorageSOPInstanceUID = uid_long
-
-            b.SOPInstanceUID = uid_long
-            b.StudyInstanceUID = uid_long
-            b.SeriesInstanceUID = uid_long
-            b.SynchronizationFrameOfReferenceUID = uid_long
-
-            patientid = dicom_info["PatientID"][-4:]
-            laterality = dicom_info["Laterality"].lower()
+            dicom_info, datasets = make_flio_datasets(inputsdt, inputhtml, json_path)
+            a, short_name = datasets["short"]
+            b, long_name = datasets["long"]
 
             # Define output file paths
-            short_output_path = f"{output}/{patientid}_flio_short_wavelength_{laterality}_{uid_short}.dcm"
-            long_output_path = (
-                f"{output}/{patientid}_flio_long_wavelength_{laterality}_{uid_long}.dcm"
-            )
+            short_output_path = f"{output}/{short_name}"
+            long_output_path = f"{output}/{long_name}"
 
             # Process short wavelength
             try:
@@ -1076,11 +1105,24 @@ def extract_dicom_dict(file, tags):
     if not os.path.exists(file):
         raise FileNotFoundError(f"File {file} not found.")
 
-    output = dict()
-    output["filepath"] = file
+    return extract_dataset_dict(pydicom.dcmread(file), tags, "short" in file)
+
+
+def extract_dataset_dict(dataset, tags, short):
+    """
+    Extract the DICOM metadata of a FLIO dataset (see extract_dicom_dict).
 
-    dataset = pydicom.dcmread(file)
+    The pixel data is left out of the JSON representation of the dataset and returned
+    as it is, so it is never encoded or copied.
 
+    Args:
+        dataset (pydicom.Dataset): The dataset written by convert1, read back or in memory.
+        tags (list): List of DICOM tags to process.
+        short (bool): Whether the dataset is the short wavelength one.
+
+    Returns:
+        tuple: As extract_dicom_dict.
+    """
     dataset.PatientOrientation = ["L", "F"]
     dataset.StudyDate = dataset.ContentDate
     dataset.StudyTime = dataset.ContentTime
@@ -1088,7 +1130,7 @@ def extract_dicom_dict(file, tags):
     dataset.ImageType = ["ORIGINAL", "PRIMARY"]
     dataset.AcquisitionDateTime = str(dataset.ContentDate) + str(dataset.ContentTime)
 
-    if "short" in file:
+    if short:
         dataset.ImagePathFilterPassBand = [498, 560]
 
     else:
@@ -1123,7 +1165,9 @@ def extract_dicom_dict(file, tags):
     }
     json_dict = {}
     json_dict.update(header_elements)
-    info = dataset.to_json_dict()
+    info = Dataset(
+        {element.tag: element for element in dataset if element.tag != 0x7FE00010}
+    ).to_json_dict()
 
     json_dict.update(info)
 
@@ -1189,6 +1233,8 @@ def write_dicom(protocol, dicom_dict_list, file_path, input):
         protocol (ConversionRule): The ConversionRule instance containing processing instructions.
         dicom_dict_list (list): List containing DICOM dictionaries and related information.
         file_path (str): The path to the new DICOM file to be created.
+        input (str or pydicom.Dataset): The source DICOM file, or the source dataset
+            itself when it was built in memory, the private FLIO tags are copied from it.
 
     """
     headertags = protocol.header_tags()
@@ -1296,7 +1342,11 @@ def write_dicom(protocol, dicom_dict_list, file_path, input):
         illumination_type_code_sequence(dataset, dicom_dict_list)
 
     ##########
-    source_ds = pydicom.dcmread(input)
+    if isinstance(input, Dataset):
+        source_ds = input
+    else:
+        # Only the private tags are copied, the pixel data is already in dicom_dict_list
+        source_ds = pydicom.dcmread(input, stop_before_pixels=True)
     extracted_tags = []
     for tag in tags_to_extract:
         if tag in source_ds:
@@ -1307,7 +1357,7 @@ def write_dicom(protocol, dicom_dict_list, file_path, input):
     for tag, VR, value in extracted_tags:
         add_tag(dataset, tag, VR, value)
 
-    dataset.save_as(file_path,  write_like_original=False)
+    imaging_writer.write_dataset(dataset, file_path, write_like_original=False)
 
 
 def convert_dicom(input, output):
@@ -1353,3 +1403,107 @@ def convert_dicom(input, output):
         }
 
         return dic
+
+
+def read_back_header(dataset):
+    """
+    Return a dataset as it reads back from the file make_flio_dicom writes, without
+    writing its pixel data.
+
+    Only the header is written to memory and read again, so its values are the ones
+    convert_dicom sees in the intermediate file (text values lose their trailing padding,
+    the file meta information is completed). The pixel data element is moved over as it is.
+
+    Args:
+        dataset (pydicom.Dataset): A wavelength dataset built in memory.
+
+    Returns:
+        pydicom.Dataset: A new dataset with the read-back header and the same pixel data.
+    """
+    header = Dataset(
+        {element.tag: element for element in dataset if element.tag != 0x7FE00010}
+    )
+    header.file_meta = copy.deepcopy(dataset.file_meta)
+
+    buffer = io.BytesIO()
+    pydicom.dcmwrite(buffer, header, write_like_original=False)
+    buffer.seek(0)
+
+    read_back = pydicom.dcmread(buffer)
+    read_back.add(dataset[0x7FE00010])
+    return read_back
+
+
+def make_compliant_flio_dicom(folder_path, output, json_path, debug_folder=None):
+    """
+    Create the compliant FLIO DICOM files of an acquisition in one stage.
+
+    This fuses make_flio_dicom and convert_dicom: the wavelength datasets are built in
+    memory from the SDT file, the HTML file and the UID map, and converted with the
+    flio rule without being written and read back. The pixel data is taken out of the
+    SDT once and written once, to the compliant file. The output files are the ones
+    convert_dicom writes from the files of make_flio_dicom.
+
+    Args:
+        folder_path (str): Path to the folder containing the SDT and HTML files.
+        output (str): Directory path to save the compliant DICOM files.
+        json_path (str): Path to the JSON file containing UID information.
+        debug_folder (str, optional): Also write the intermediate DICOM files of
+            make_flio_dicom there, for debugging.
+
+    Returns:
+        dict: The status of the short and long wavelength conversions, as make_flio_dicom,
+        with the name of the compliant file of each wavelength.
+    """
+    inputsdt, inputhtml = find_html_sdt_files(folder_path)
+
+    if inputsdt == "" or inputhtml == "":
+        return {
+            "Input SDT": "no sdt ot html file found",
+            "Input HTML": "no sdt ot html file found",
+            "Short wavelength conversion": "failed",
+            "Long wavelength conversion": "failed",
+        }
+
+    try:
+        dicom_info, datasets = make_flio_datasets(inputsdt, inputhtml, json_path)
+    except Exception as e:
+        return {
+            "Input SDT": "not enough information from sdt or html to make dicom",
+            "Input HTML": "not enough information from sdt or html to make dicom",
+            "Short wavelength conversion": "failed",
+            "Long wavelength conversion": "failed",
+        }
+
+    conversion_rule = flio
+    tags = (
+        conversion_rule.header_tags()
+        + conversion_rule.tags()
+        + list(conversion_rule.sequence_tags().keys())
+    )
+    add_html_sdt_info = {"short": short_add_html_sdt_info, "long": long_add_html_sdt_info}
+
+    dic = {
+        "Input SDT": inputsdt.split("/")[-2:],
+        "Input HTML": inputhtml.split("/")[-2:],
+    }
+    for wavelength, (dataset, filename) in datasets.items():
+        try:
+            dataset = add_html_sdt_info[wavelength](dataset, inputsdt, dicom_info, None)
+            read_back = read_back_header(dataset)
+
+            if debug_folder:
+                os.makedirs(debug_folder, exist_ok=True)
+                imaging_writer.write_dataset(
+                    dataset, f"{debug_folder}/{filename}", write_like_original=False
+                )
+
+            x = extract_dataset_dict(read_back, tags, wavelength == "short")
+            write_dicom(conversion_rule, x, f"{output}/converted_{filename}", read_back)
+            status = "complete", f"converted_{filename}"
+        except Exception as e:
+            status = f"error: {e}"
+
+        dic[f"{wavelength.capitalize()} wavelength conversion"] = status
+
+    return dic
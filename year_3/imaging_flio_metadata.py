@@ -2,6 +2,7 @@ import json
 import os
 
 import imaging_utils
+import imaging_writer
 import pydicom
 
 
@@ -20,6 +21,8 @@ def meta_data_save(filename, output_folder):
     """
 
     dataset = pydicom.dcmread(filename)
+    # Recorded by imaging_writer when this process wrote the file, else computed
+    checksums = imaging_writer.file_checksums(filename, dataset)
 
     start_index = filename.find("/retinal_flio")
     file = filename[start_index:]
@@ -63,6 +66,8 @@ def meta_data_save(filename, output_folder):
         "number_of_frames": number_of_frames,
         "filepath": file,
         "sop_instance_uid": sop_instance_uid,
+        "file_blake2b": checksums["file_blake2b"],
+        "pixel_data_blake2b": checksums["pixel_data_blake2b"],
     }
 
     filename = file.split("/")[-1].replace(".", "_")
@@ -31,6 +31,26 @@ class Flio(DataDomain):
         organize_dict = flio_organize.filter_flio_files_process(folder, output_folder)
         return organize_dict
 
+    def convert(self, input_folder, output, jsonpath, debug_folder=None):
+        """
+        Converts the SDT and HTML files of an acquisition to NEMA-compliant DICOM files in one
+        stage (convert1 and convert2 fused, without the intermediate files).
+
+        Args:
+            input_folder (str): Full path to the folder containing the SDT and HTML files.
+            output (str): Path to the final location for the converted DICOM files.
+            jsonpath (str): Path to the JSON file containing conversion configurations.
+            debug_folder (str, optional): Also write the intermediate files of convert1 there.
+
+        Returns:
+            dict: Information on conversion issues and output files.
+        """
+        conv_dict = flio_conv.make_compliant_flio_dicom(
+            input_folder, output, jsonpath, debug_folder
+        )
+
+        return conv_dict
+
     def convert1(self, input_folder, output, jsonpath):
         """
         Converts FLIO .dcm files to NEMA-compliant DICOM files.
@@ -0,0 +1,309 @@
+import io
+import os
+import struct
+
+import numpy as np
+import pydicom
+from PIL import Image
+from pydicom.tag import Tag
+
+# Pixel data elements and the NumPy type of their values (None: from BitsAllocated)
+pixel_data_tags = {
+    Tag(0x7FE0, 0x0010): None,  # PixelData
+    Tag(0x7FE0, 0x0008): np.float32,  # FloatPixelData
+    Tag(0x7FE0, 0x0009): np.float64,  # DoubleFloatPixelData
+}
+
+# NumPy types of native pixel data by BitsAllocated and PixelRepresentation
+native_dtypes = {
+    (8, 0): np.uint8,
+    (8, 1): np.int8,
+    (16, 0): np.uint16,
+    (16, 1): np.int16,
+    (32, 0): np.uint32,
+    (32, 1): np.int32,
+}
+
+# Explicit VRs whose length is stored on 4 bytes after 2 reserved bytes
+long_length_vrs = {b"OB", b"OD", b"OF", b"OL", b"OV", b"OW", b"UN"}
+
+# Compressed transfer syntaxes whose frames PIL decodes directly
+pil_transfer_syntaxes = [
+    "1.2.840.10008.1.2.4.50",  # JPEG Baseline
+    "1.2.840.10008.1.2.4.51",  # JPEG Extended
+    "1.2.840.10008.1.2.4.90",  # JPEG 2000 Lossless
+    "1.2.840.10008.1.2.4.91",  # JPEG 2000
+]
+
+# Item and sequence delimiter tags of encapsulated pixel data
+item_tag = 0xFFFEE000
+sequence_delimiter_tag = 0xFFFEE0DD
+
+
+class FrameReader:
+    """
+    Random-access reader of the frames of a DICOM file.
+
+    The header is read once without the pixel data, and the pixel data element is
+    located right after it. Native pixel data is memory-mapped: frames are NumPy views
+    computed from Rows, Columns, BitsAllocated and SamplesPerPixel, so reading one
+    B-scan of a volume only reads that B-scan from the disk. For encapsulated pixel
+    data, the fragments of each frame are located from the Basic (or Extended) Offset
+    Table, and only the requested frames are read and decoded.
+
+    Memory-mapped frames hold the stored values (e.g. YBR_FULL is not converted to RGB);
+    decoded frames are converted as pydicom does.
+
+    Example:
+        with FrameReader(path) as reader:
+            bscan = reader.frame(len(reader) // 2)
+
+    Attributes:
+        header (pydicom.Dataset): The dataset without its pixel data.
+        has_pixel_data (bool): Whether the file has pixel data.
+        encapsulated (bool): Whether the pixel data is compressed.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): The DICOM file.
+        """
+        self.path = path
+        self.array = None
+        self.fragments = None
+        self.frame_fragments = None
+
+        with open(path, "rb") as file:
+            self.header = pydicom.dcmread(file, stop_before_pixels=True)
+            # pydicom stops at the start of the pixel data element
+            self.pixel_tag, self.data_offset, length = self.read_element_header(file)
+            if self.pixel_tag is not None and length == 0xFFFFFFFF:
+                self.read_fragments(file)
+
+        self.has_pixel_data = self.pixel_tag is not None
+        self.encapsulated = self.fragments is not None
+        self.n_frames = int(self.header.get("NumberOfFrames", 1) or 1)
+
+        # Native data is memory-mapped unless its layout is not one value per sample
+        # (1-bit data, subsampled YBR_FULL_422); pydicom decodes those frames instead
+        if (
+            self.has_pixel_data
+            and not self.encapsulated
+            and (
+                self.pixel_tag != Tag(0x7FE0, 0x0010)
+                or (self.header.BitsAllocated, self.header.get("PixelRepresentation", 0)) in native_dtypes
+            )
+            and self.header.get("PhotometricInterpretation") != "YBR_FULL_422"
+        ):
+            self.array = np.memmap(
+                path, dtype=self.dtype, mode="r", offset=self.data_offset, shape=self.shape
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return self.n_frames
+
+    @property
+    def transfer_syntax(self):
+        return self.header.file_meta.TransferSyntaxUID
+
+    @property
+    def samples(self):
+        return int(self.header.get("SamplesPerPixel", 1))
+
+    @property
+    def planar(self):
+        return self.samples > 1 and self.header.get("PlanarConfiguration", 0) == 1
+
+    @property
+    def dtype(self):
+        """
+        The NumPy type of native pixel values, in the byte order of the file.
+        """
+        dtype = pixel_data_tags[self.pixel_tag]
+        if dtype is None:
+            key = (self.header.BitsAllocated, self.header.get("PixelRepresentation", 0))
+            if key not in native_dtypes:
+                raise ValueError(f"Unsupported BitsAllocated: {self.header.BitsAllocated}")
+            dtype = native_dtypes[key]
+        dtype = np.dtype(dtype)
+        return dtype if self.transfer_syntax.is_little_endian else dtype.newbyteorder(">")
+
+    @property
+    def shape(self):
+        """
+        The shape of the memory-mapped pixel data: (frames, rows, columns, samples), or
+        (frames, samples, rows, columns) for planar color data.
+        """
+        if self.planar:
+            return (self.n_frames, self.samples, self.header.Rows, self.header.Columns)
+        return (self.n_frames, self.header.Rows, self.header.Columns, self.samples)
+
+    def read_element_header(self, file):
+        """
+        Read the tag and length of the pixel data element at the current position.
+
+        Returns:
+            tuple: (tag, offset of the value, length), with None as tag if the element
+            is not pixel data (or the file ends).
+        """
+        little = self.transfer_syntax.is_little_endian
+        endian = "<" if little else ">"
+        data = file.read(8)
+        if len(data) < 8:
+            return None, None, None
+        group, element = struct.unpack(f"{endian}HH", data[:4])
+        tag = Tag(group, element)
+        if tag not in pixel_data_tags:
+            return None, None, None
+
+        if self.transfer_syntax.is_implicit_VR:
+            (length,) = struct.unpack(f"{endian}L", data[4:8])
+        elif data[4:6] in long_length_vrs:
+            (length,) = struct.unpack(f"{endian}L", file.read(4))
+        else:
+            (length,) = struct.unpack(f"{endian}H", data[6:8])
+        return tag, file.tell(), length
+
+    def read_fragments(self, file):
+        """
+        Locate the fragments of encapsulated pixel data (without reading them) and
+        assign them to frames.
+        """
+        offset_table = b""
+        self.fragments = []
+        first_fragment = None
+        while True:
+            data = file.read(8)
+            if len(data) < 8:
+                break
+            group, element, length = struct.unpack("<HHL", data)
+            tag = (group << 16) | element
+            if tag == sequence_delimiter_tag:
+                break
+            if tag != item_tag:
+                raise ValueError(f"Unexpected tag {tag:08X} in encapsulated pixel data")
+            if first_fragment is None:
+                # The first item is the Basic Offset Table
+                offset_table = file.read(length)
+                first_fragment = file.tell()
+                continue
+            self.fragments.append((file.tell() - 8 - first_fragment, file.tell(), length))
+            file.seek(length, os.SEEK_CUR)
+
+        n_frames = int(self.header.get("NumberOfFrames", 1) or 1)
+        if "ExtendedOffsetTable" in self.header:
+            offsets = list(np.frombuffer(self.header.ExtendedOffsetTable, dtype="<u8"))
+        elif offset_table:
+            offsets = list(np.frombuffer(offset_table, dtype="<u4"))
+        elif n_frames == 1:
+            offsets = [0]
+        elif len(self.fragments) == n_frames:
+            offsets = [position for position, _, _ in self.fragments]
+        else:
+            # Several fragments per frame and no offset table: decoded by pydicom
+            return
+
+        self.frame_fragments = [[] for _ in offsets]
+        starts = {int(offset): index for index, offset in enumerate(offsets)}
+        frame = -1
+        for position, value_offset, length in self.fragments:
+            frame = starts.get(position, frame)
+            self.frame_fragments[frame].append((value_offset, length))
+
+    def frame_bytes(self, index):
+        """
+        Return the stored bytes of one frame (the compressed codestream if encapsulated).
+        """
+        if not self.encapsulated:
+            return self.frame(index).tobytes()
+        if self.frame_fragments is None:
+            raise ValueError("The frames cannot be located without an offset table")
+        with open(self.path, "rb") as file:
+            chunks = []
+            for value_offset, length in self.frame_fragments[index]:
+                file.seek(value_offset)
+                chunks.append(file.read(length))
+        return b"".join(chunks)
+
+    def frames(self, start=0, stop=None, step=1):
+        """
+        Return a range of frames.
+
+        Native pixel data gives a memory-mapped view (nothing is read until it is used);
+        encapsulated pixel data is decoded frame by frame.
+
+        Returns:
+            numpy.ndarray: (frames, rows, columns[, samples]) array.
+        """
+        if not self.has_pixel_data:
+            raise ValueError(f"No pixel data in {self.path}")
+        indices = range(*slice(start, stop, step).indices(self.n_frames))
+        if self.array is None:
+            return np.stack([self.frame(index) for index in indices])
+
+        array = self.array[start:stop:step]
+        if self.planar:
+            array = array.transpose(0, 2, 3, 1)
+        return array[..., 0] if self.samples == 1 else array
+
+    def frame(self, index):
+        """
+        Return one frame as a (rows, columns[, samples]) array.
+        """
+        if self.array is not None:
+            return self.frames(index, index + 1)[0]
+        if self.encapsulated and self.frame_fragments is not None and self.transfer_syntax in pil_transfer_syntaxes:
+            return np.asarray(Image.open(io.BytesIO(self.frame_bytes(index))))
+        return pydicom.pixels.pixel_array(self.path, index=index)
+
+    def read(self, indices, step=1):
+        """
+        Read selected frames keeping every step-th row and column, copying only the kept
+        pixels of native pixel data.
+
+        Returns:
+            numpy.ndarray: (frames, rows, columns[, samples]) array.
+        """
+        if self.array is None:
+            return np.stack([self.frame(index)[::step, ::step] for index in indices])
+        if self.planar:
+            array = self.array[list(indices), :, ::step, ::step].transpose(0, 2, 3, 1)
+        else:
+            array = self.array[list(indices), ::step, ::step]
+        return array[..., 0] if self.samples == 1 else array
+
+    def close(self):
+        """
+        Drop the memory map; it is unmapped once the views handed out are gone too.
+        """
+        self.array = None
+
+
+def differing_frames(file1, file2):
+    """
+    Compare the frames of two DICOM files one at a time.
+
+    Returns:
+        list: Indices of the frames that differ, or None if the files cannot be compared
+        frame by frame (only one has pixel data, or the frame counts or shapes differ).
+    """
+    with FrameReader(file1) as reader1, FrameReader(file2) as reader2:
+        if not reader1.has_pixel_data and not reader2.has_pixel_data:
+            return []
+        if reader1.has_pixel_data != reader2.has_pixel_data or len(reader1) != len(reader2):
+            return None
+        differing = []
+        for index in range(len(reader1)):
+            frame1, frame2 = reader1.frame(index), reader2.frame(index)
+            if frame1.shape != frame2.shape:
+                return None
+            if not np.array_equal(frame1, frame2):
+                differing.append(index)
+        return differing
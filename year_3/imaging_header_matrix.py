@@ -0,0 +1,367 @@
+import json
+import os
+import re
+import struct
+
+import pandas as pd
+import pydicom
+from joblib import Parallel, delayed
+from pydicom.datadict import dictionary_VR, tag_for_keyword
+
+import imaging_writer
+import organize_utils
+
+try:
+    import pyarrow
+except ImportError:  # the matrix is saved as a pandas pickle instead of Parquet
+    pyarrow = None
+
+# File extension of a saved matrix: Parquet when pyarrow is installed (pip install -e .[columnar])
+matrix_extension = ".parquet" if pyarrow else ".pkl"
+
+# Columns of the matrix that are not DICOM tags
+file_columns = ["filepath", "folder", "size", "mtime", "tag_count", "signature", "error"]
+
+# Nested attributes extracted into their own column by default, as paths of keywords
+nested_tags = [
+    "SharedFunctionalGroupsSequence>PixelMeasuresSequence>PixelSpacing",
+    "SharedFunctionalGroupsSequence>PixelMeasuresSequence>SliceThickness",
+    "AnatomicRegionSequence>CodeMeaning",
+    "AcquisitionDeviceTypeCodeSequence>CodeMeaning",
+    "SourceImageSequence>ReferencedSOPInstanceUID",
+]
+
+# Elements the header read stops at (pydicom stop_before_pixels)
+pixel_tags = [0x7FE00008, 0x7FE00009, 0x7FE00010]
+
+# Shown by HeaderMatrix.values for files without the tag
+missing_value = "(missing)"
+
+
+def tag_column(name):
+    """
+    Return the matrix column of a tag, given as a keyword ("PatientID"), hexadecimal
+    ("00100020") or "(0010,0020)".
+
+    Nested attributes are paths of tags separated by ">"
+    ("AnatomicRegionSequence>CodeMeaning" -> "00082218>00080104").
+
+    Raises:
+        KeyError: If a keyword is not in the DICOM dictionary.
+    """
+    if ">" in name:
+        return ">".join(tag_column(part.strip()) for part in name.split(">"))
+    hexadecimal = re.sub(r"[(),\s]", "", name)
+    if re.fullmatch(r"[0-9A-Fa-f]{8}", hexadecimal):
+        return hexadecimal.upper()
+    tag = tag_for_keyword(name)
+    if tag is None:
+        raise KeyError(f"Unknown DICOM keyword: {name}")
+    return f"{tag:08X}"
+
+
+def nested_values(json_dict, path):
+    """
+    Collect the values of a nested attribute over every item of the sequences on its path.
+
+    Args:
+        json_dict (dict): The DICOM JSON of a dataset (Dataset.to_json_dict).
+        path (list): Hexadecimal tags, from the top-level sequence to the attribute.
+
+    Returns:
+        list: The "Value" list of each occurrence of the attribute, or None if it has none.
+    """
+    items = [json_dict]
+    for tag in path[:-1]:
+        items = [
+            item
+            for node in items
+            for item in node.get(tag, {}).get("Value", [])
+            if isinstance(item, dict)
+        ]
+    found = [item[path[-1]] for item in items if path[-1] in item]
+    return [element.get("Value", []) for element in found] if found else None
+
+
+def display_value(element):
+    """
+    Render a stored element the way the compliance report shows it: the values joined by
+    ", ", or the number of items of a sequence. None if the element is missing.
+    """
+    if element is None:
+        return None
+    if isinstance(element, str):
+        element = json.loads(element)
+    if isinstance(element, list):  # nested attribute: the values of each occurrence
+        return ", ".join(map(str, element))
+    if element.get("vr") == "SQ":
+        return f"{len(element.get('Value', []))} item(s)"
+    return ", ".join(map(str, element.get("Value", [])))
+
+
+def header_row(file_path, root=None, nested=None):
+    """
+    Read the header of one DICOM file into a row of the header matrix.
+
+    Every top-level element is stored as its DICOM JSON (sequences in full), keyed by
+    its hexadecimal tag. Binary values are not kept (see Dataset.to_json_dict
+    bulk data), and the pixel data element is recorded without being read.
+
+    Args:
+        file_path (str): The DICOM file.
+        root (str, optional): Root of the file set; "folder" is relative to it.
+        nested (list, optional): Nested attribute columns to extract (see tag_column).
+
+    Returns:
+        dict: The row, with "error" set and no tag columns if the file cannot be read.
+    """
+    stat = os.stat(file_path)
+    folder = os.path.dirname(os.path.relpath(file_path, root) if root else file_path)
+    row = {
+        "filepath": os.path.abspath(file_path),
+        "folder": folder,
+        "size": stat.st_size,
+        "mtime": stat.st_mtime_ns,
+        "tag_count": None,
+        "signature": None,
+        "error": None,
+    }
+    try:
+        with open(file_path, "rb") as file:
+            dataset = pydicom.dcmread(file, stop_before_pixels=True)
+            # pydicom rewinds to the start of the pixel data element when it stops
+            implicit_vr, little_endian = dataset.original_encoding
+            start = file.read(6)
+        json_dict = dataset.to_json_dict(
+            bulk_data_threshold=0,
+            bulk_data_element_handler=lambda element: "",
+        )
+    except Exception as e:
+        row["error"] = str(e)
+        return row
+
+    row["tag_count"] = len(dataset.keys())
+    row["signature"] = organize_utils._schema_signature(dataset)
+    for tag, element in json_dict.items():
+        row[tag] = json.dumps(element)
+
+    if len(start) >= 4:
+        group, element = struct.unpack("<HH" if little_endian is not False else ">HH", start[:4])
+        tag = group << 16 | element
+        if tag in pixel_tags:
+            vr = start[4:6].decode("ascii", "replace") if not implicit_vr and len(start) == 6 else dictionary_VR(tag)
+            row[f"{tag:08X}"] = json.dumps({"vr": vr})
+
+    for path in nested or []:
+        values = nested_values(json_dict, path.split(">"))
+        row[path] = json.dumps(values) if values is not None else None
+    return row
+
+
+def check_matrix_path(path):
+    """
+    Check that a matrix can be saved at a path: a .parquet matrix needs pyarrow.
+
+    Raises:
+        ImportError: If the path is a .parquet file and pyarrow is not installed.
+    """
+    if path.endswith(".parquet") and pyarrow is None:
+        raise ImportError("Saving a .parquet header matrix needs pyarrow: pip install -e .[columnar]")
+
+
+class HeaderMatrix:
+    """
+    Files x tags matrix of DICOM headers, answering the QA questions without reading the files.
+
+    One row per file (see header_row): the file columns (see file_columns), one column
+    per top-level tag holding the DICOM JSON of the element (None where the file does
+    not have it) and one column per extracted nested attribute.
+
+    Attributes:
+        frame (pandas.DataFrame): The matrix.
+    """
+
+    def __init__(self, frame):
+        self.frame = frame.reset_index(drop=True)
+        self._rows = self.frame.set_index("filepath", drop=False)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a matrix saved by save (.parquet or .pkl).
+        """
+        if path.endswith(".parquet"):
+            frame = pd.read_parquet(path)
+        else:
+            frame = pd.read_pickle(path)
+        return cls(frame.astype(object).where(frame.notna(), None))
+
+    def save(self, path):
+        """
+        Save the matrix as Parquet (.parquet, needs pyarrow) or as a pandas pickle (other extensions).
+        """
+        check_matrix_path(path)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        frame = self.frame.astype({"size": "int64", "mtime": "int64", "tag_count": "Int64"})
+        if path.endswith(".parquet"):
+            imaging_writer.atomic_write(path, lambda file: frame.to_parquet(file, index=False))
+        else:
+            imaging_writer.atomic_write(path, lambda file: frame.to_pickle(file))
+
+    @property
+    def files(self):
+        """The files of the matrix (absolute paths)."""
+        return list(self.frame["filepath"])
+
+    @property
+    def tag_columns(self):
+        """The top-level tag columns."""
+        return [column for column in self.frame.columns if column not in file_columns and ">" not in column]
+
+    def column(self, name):
+        """
+        Return the column of a file column, tag or nested attribute (see tag_column),
+        with None everywhere if no file has it.
+        """
+        if name in self.frame.columns:
+            return self.frame[name]
+        column = tag_column(name)
+        if column in self.frame.columns:
+            return self.frame[column]
+        return pd.Series([None] * len(self.frame), index=self.frame.index, dtype=object)
+
+    def row(self, file):
+        """
+        Return the row of a file.
+
+        Raises:
+            KeyError: If the file is not in the matrix.
+        """
+        path = os.path.abspath(file)
+        if path not in self._rows.index:
+            raise KeyError(f"{file} is not in the header matrix")
+        return self._rows.loc[path]
+
+    def json_dict(self, file, tags=None):
+        """
+        Return the DICOM JSON of a file (as Dataset.to_json_dict), limited to the given
+        hexadecimal tags if any.
+        """
+        row = self.row(file)
+        columns = self.tag_columns if tags is None else [tag for tag in tags if tag in self.frame.columns]
+        return {tag: json.loads(row[tag]) for tag in columns if isinstance(row[tag], str)}
+
+    def missing(self, name):
+        """Return the files (read without error) that do not have a tag."""
+        column = self.column(name)
+        return list(self.frame["filepath"][column.isna() & self.frame["error"].isna()])
+
+    def empty(self, name):
+        """Return the files that have a tag without a value."""
+        column = self.column(name)
+        return list(
+            self.frame["filepath"][column.map(lambda element: isinstance(element, str) and not display_value(element))]
+        )
+
+    def values(self, name, by=None):
+        """
+        Count the values a tag takes (as the compliance report shows them), over all files
+        or per value of another column, e.g. by="folder" or by="SOPClassUID".
+
+        Returns:
+            pandas.DataFrame: The value (and group) of each combination with its number of files.
+        """
+        frame = pd.DataFrame({name: self.column(name).map(display_value).fillna(missing_value)})
+        if by is not None:
+            frame.insert(0, by, self.column(by).map(display_value if by not in file_columns else str))
+        return frame.value_counts(sort=False).rename("files").reset_index()
+
+    def table(self, names):
+        """
+        Return the displayed values of some tags, one row per file, e.g. for notebook checks.
+        """
+        return pd.DataFrame(
+            {"filepath": self.frame["filepath"]}
+            | {name: self.column(name).map(display_value) for name in names}
+        )
+
+    def summaries(self, files=None):
+        """
+        Return the header summary of files, as organize_utils.header_summaries does from the files.
+
+        Returns:
+            dict: File -> "Signature", "Tag count", "SOPClassUID" (and "Error").
+        """
+        summaries = {}
+        for file in self.files if files is None else files:
+            try:
+                row = self.row(file)
+            except KeyError as e:
+                summaries[file] = {"Signature": None, "Tag count": None, "SOPClassUID": None, "Error": str(e.args[0])}
+                continue
+            if row["error"] is not None:
+                summaries[file] = {"Signature": None, "Tag count": None, "SOPClassUID": None, "Error": row["error"]}
+                continue
+            sop_class = row.get("00080016")
+            sop_class = json.loads(sop_class).get("Value", [None])[0] if isinstance(sop_class, str) else None
+            summaries[file] = {
+                "Signature": row["signature"],
+                "Tag count": int(row["tag_count"]),
+                "SOPClassUID": sop_class,
+            }
+        return summaries
+
+
+def build_matrix(files, matrix_path=None, root=None, nested=None, n_jobs=-1):
+    """
+    Build the header matrix of a file set in one parallel pass, reusing a saved matrix
+    for unchanged files.
+
+    Rows of the saved matrix are reused when the size and modification time of the file
+    have not changed (and it has the requested nested columns), so updating the matrix
+    only reads new or modified files.
+
+    Args:
+        files (list): The DICOM files.
+        matrix_path (str, optional): Saved matrix, loaded first and updated afterwards.
+        root (str, optional): Root of the file set (see header_row).
+        nested (list, optional): Nested attributes to extract (default: nested_tags).
+        n_jobs (int): Number of headers read in parallel.
+
+    Returns:
+        HeaderMatrix: The matrix of the files.
+    """
+    if matrix_path:
+        # Fail before the headers are read, not when the matrix is saved
+        check_matrix_path(matrix_path)
+    nested = [tag_column(name) for name in (nested_tags if nested is None else nested)]
+
+    saved = {}
+    if matrix_path and os.path.exists(matrix_path):
+        saved_frame = HeaderMatrix.load(matrix_path).frame
+        if all(path in saved_frame.columns for path in nested):
+            saved = {row["filepath"]: row for row in saved_frame.to_dict("records")}
+
+    rows = []
+    pending = []
+    for file in files:
+        row = saved.get(os.path.abspath(file))
+        stat = os.stat(file)
+        if row and row["size"] == stat.st_size and row["mtime"] == stat.st_mtime_ns:
+            rows.append({column: value for column, value in row.items() if value is not None})
+        else:
+            pending.append(file)
+
+    rows += Parallel(n_jobs=n_jobs, batch_size=64)(
+        delayed(header_row)(file, root, nested) for file in pending
+    )
+
+    frame = pd.DataFrame(rows, columns=file_columns) if not rows else pd.DataFrame(rows)
+    tags = sorted(column for column in frame.columns if column not in file_columns and ">" not in column)
+    frame = frame.reindex(columns=file_columns + tags + nested)
+    frame = frame.astype(object).where(frame.notna(), None).sort_values("filepath")
+    matrix = HeaderMatrix(frame)
+
+    if matrix_path:
+        matrix.save(matrix_path)
+    return matrix
@@ -0,0 +1,343 @@
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+import pydicom
+from joblib import Parallel, delayed
+
+import imaging_registry
+
+# Lower-case keyword of the DICOM Manufacturer / ManufacturerModelName -> device,
+# checked in this order
+dicom_device_keywords = [
+    ("zeiss", "cirrus"),
+    ("cirrus", "cirrus"),
+    ("topcon", "topcon"),
+    ("maestro", "topcon"),
+    ("triton", "topcon"),
+    ("heidelberg", "spectralis"),
+    ("spectralis", "spectralis"),
+    ("centervue", "eidon"),
+    ("eidon", "eidon"),
+    ("optomed", "optomed"),
+    ("aurora", "optomed"),
+]
+
+# Lower-case keyword of an FDA zip name -> device, as in imaging_utils.zip_device_mapping
+zip_device_keywords = {"maestro2": "topcon", "triton": "topcon", "cirrus": "cirrus"}
+
+# Files that make a folder a FLIO acquisition (see imaging_flio_organize)
+flio_files = ["Measurement.sdt", "measurement_info.html"]
+
+# Side files that never identify a device; folders holding only these are ignored
+ignored_suffixes = (".csv", ".json", ".txt", ".xml", ".pdf")
+
+# FLIO conversion settings shipped with the pipeline modules, or installed under
+# <prefix>/share/aireadi-imaging by pip (see setup.py)
+flio_json_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "flio_uid_data.json")
+if not os.path.exists(flio_json_path):
+    flio_json_path = os.path.join(sys.prefix, "share", "aireadi-imaging", "flio_uid_data.json")
+
+# Folder levels of an acquisition kept below its batch folder when it is staged:
+# FLIO drivers expect <batch>/<patient>/<eye>, the others <batch>/<acquisition>
+staged_folder_levels = {"flio": 2}
+
+
+def sniff_dicom_device(file_path):
+    """
+    Return the device of a DICOM file from its Manufacturer and model name.
+
+    Only the two attributes are parsed, so the pixel data is never read.
+
+    Args:
+        file_path (str): The path of the file.
+
+    Returns:
+        str: A key of imaging_registry.device_domains, or None if the file is not a
+        DICOM file of a known device.
+    """
+    try:
+        dataset = pydicom.dcmread(
+            file_path,
+            stop_before_pixels=True,
+            specific_tags=["Manufacturer", "ManufacturerModelName"],
+        )
+    except Exception:
+        return None
+
+    description = (
+        f"{dataset.get('Manufacturer', '')} {dataset.get('ManufacturerModelName', '')}".lower()
+    )
+    for keyword, device in dicom_device_keywords:
+        if keyword in description:
+            return device
+    return None
+
+
+def sniff_folder_device(folder, files):
+    """
+    Return the device owning the files of one folder.
+
+    A folder holds a single acquisition, so the first file that identifies a device
+    decides for the whole folder.
+
+    Args:
+        folder (str): The folder.
+        files (list): The names of the files of the folder.
+
+    Returns:
+        str: The device, or None if no file of the folder identifies one.
+    """
+    if all(name in files for name in flio_files):
+        return "flio"
+
+    for name in sorted(files):
+        if name.lower().endswith(".html"):
+            continue
+        device = sniff_dicom_device(os.path.join(folder, name))
+        if device:
+            return device
+    return None
+
+
+def sniff_zip_device(zip_path):
+    """
+    Return the device of an FDA zip archive from its name.
+
+    Args:
+        zip_path (str): The path of the zip archive.
+
+    Returns:
+        str: The device, or None if the name has no "fda" or does not match a device.
+    """
+    name = os.path.basename(zip_path).lower()
+    if "fda" not in name:
+        return None
+    for keyword, device in zip_device_keywords.items():
+        if keyword in name:
+            return device
+    return None
+
+
+def scan_input(input_folder):
+    """
+    Walk a mixed input tree once and route every acquisition folder and zip archive
+    to the device that owns it.
+
+    A folder whose files identify a device is an acquisition, along with all of its
+    subfolders, which are not routed on their own.
+
+    Args:
+        input_folder (str): The root of the mixed input tree.
+
+    Returns:
+        dict: "Routes" maps each device to a list of (path, is_zip) entries,
+        "Unrouted" lists the folders and archives no device claimed, and "Bytes"
+        maps each device to the size of its inputs.
+    """
+    routes = {device: [] for device in imaging_registry.device_domains}
+    sizes = {device: 0 for device in imaging_registry.device_domains}
+    unrouted = []
+
+    for root, dirs, files in os.walk(input_folder):
+        dirs.sort()
+        zips = [name for name in files if name.lower().endswith(".zip")]
+        for name in zips:
+            zip_path = os.path.join(root, name)
+            device = sniff_zip_device(zip_path)
+            if device:
+                routes[device].append((zip_path, True))
+                sizes[device] += os.path.getsize(zip_path)
+            else:
+                unrouted.append(zip_path)
+
+        files = [
+            name
+            for name in files
+            if name not in zips
+            and not name.startswith(".")
+            and not name.lower().endswith(ignored_suffixes)
+        ]
+        if not files:
+            continue
+
+        device = sniff_folder_device(root, files)
+        if device:
+            # The subfolders belong to the acquisition (e.g. the Topcon "Trees" folder)
+            dirs[:] = []
+            routes[device].append((root, False))
+            sizes[device] += sum(
+                os.path.getsize(os.path.join(folder, name))
+                for folder, _, names in os.walk(root)
+                for name in names
+            )
+        else:
+            unrouted.append(root)
+
+    return {
+        "Routes": {device: entries for device, entries in routes.items() if entries},
+        "Unrouted": unrouted,
+        "Bytes": {device: size for device, size in sizes.items() if size},
+    }
+
+
+def stage_device_input(device, entries, input_folder, staging_folder):
+    """
+    Lay out the routed inputs of a device the way its driver expects them, as
+    symbolic links to the original files (nothing is copied).
+
+    Acquisition folders are staged as <batch>/<acquisition>, where the batch is the
+    path of the parent folder relative to the input root, with their whole subtree
+    mirrored; zip archives are linked directly under the staging folder.
+
+    Args:
+        device (str): The device.
+        entries (list): The (path, is_zip) entries routed to the device.
+        input_folder (str): The root of the mixed input tree.
+        staging_folder (str): The input folder given to the device driver.
+    """
+    levels = staged_folder_levels.get(device, 1)
+    os.makedirs(staging_folder, exist_ok=True)
+
+    for path, is_zip in entries:
+        if is_zip:
+            os.symlink(os.path.abspath(path), os.path.join(staging_folder, os.path.basename(path)))
+            continue
+
+        parts = os.path.relpath(path, input_folder).split(os.sep)
+        if parts == ["."]:
+            parts = [os.path.basename(os.path.abspath(input_folder))]
+        batch = "__".join(parts[:-levels]) or "input"
+        destination = os.path.join(staging_folder, batch, *parts[-levels:])
+
+        # Folders are created, not linked, as the drivers do not follow folder links
+        for root, _, files in os.walk(path):
+            target = os.path.normpath(os.path.join(destination, os.path.relpath(root, path)))
+            os.makedirs(target, exist_ok=True)
+            for name in files:
+                os.symlink(os.path.abspath(os.path.join(root, name)), os.path.join(target, name))
+
+
+def run_device(
+    device,
+    staging_folder,
+    output_folder,
+    trace_folder=None,
+    json_path=flio_json_path,
+    catalog_path=None,
+):
+    """
+    Run the driver of a device in its own process, with its output saved to a log.
+
+    Args:
+        device (str): The device.
+        staging_folder (str): The staged input folder of the device.
+        output_folder (str): The output folder of the device.
+        trace_folder (str, optional): The trace folder of the device.
+        json_path (str): The FLIO conversion settings (FLIO only).
+        catalog_path (str, optional): The SQLite release catalog the driver records into.
+
+    Returns:
+        dict: The device, return code, duration and log of the run.
+    """
+    driver = imaging_registry.device_domains[device][2]
+    command = [
+        sys.executable,
+        os.path.join(imaging_registry.get_driver_folder(), f"{driver}.py"),
+        "-i", staging_folder,
+        "-o", output_folder,
+    ]
+    if device == "flio":
+        command += ["-j", json_path]
+    if trace_folder:
+        command += ["--trace-folder", trace_folder]
+    if catalog_path:
+        command += ["--catalog", catalog_path]
+
+    os.makedirs(output_folder, exist_ok=True)
+    log_path = os.path.join(output_folder, "ingest_driver.log")
+    start = time.perf_counter()
+    with open(log_path, "w") as log:
+        completed = subprocess.run(command, stdout=log, stderr=subprocess.STDOUT)
+
+    return {
+        "Device": device,
+        "Return code": completed.returncode,
+        "Seconds": time.perf_counter() - start,
+        "Log": log_path,
+    }
+
+
+def ingest(
+    input_folder,
+    output_folder,
+    devices=None,
+    n_jobs=-1,
+    trace_folder=None,
+    json_path=flio_json_path,
+    dry_run=False,
+    catalog_path=None,
+):
+    """
+    Route a mixed input tree to the devices found in it and run their pipelines
+    concurrently.
+
+    The scan only reads enough of each folder to route it; each driver then lists and
+    reads its staged inputs itself, as when it is run on its own.
+
+    Each device gets <output_folder>/<device> with the usual step folders, metadata
+    and logs. Devices with the most input bytes are started first so the longest
+    pipeline does not start last.
+
+    Args:
+        input_folder (str): The root of the mixed input tree.
+        output_folder (str): The root output folder.
+        devices (list, optional): Devices to run (default: every device found).
+        n_jobs (int): Number of devices run at the same time (-1 runs all at once).
+        trace_folder (str, optional): Trace every device into <trace_folder>/<device>.
+        json_path (str): The FLIO conversion settings.
+        dry_run (bool): Only print the routing of the input tree.
+        catalog_path (str, optional): SQLite release catalog shared by the devices (see
+            imaging_catalog; the drivers write to it concurrently).
+
+    Returns:
+        dict: "Scan" is the result of scan_input and "Runs" the result of run_device
+        for each device.
+    """
+    scan = scan_input(input_folder)
+    routes = {
+        device: entries
+        for device, entries in scan["Routes"].items()
+        if devices is None or device in devices
+    }
+
+    for device, entries in routes.items():
+        print(f"{device:<12}{len(entries):>6} inputs  {scan['Bytes'][device] / 1e6:>10.1f} MB")
+    if scan["Unrouted"]:
+        print(f"{'unrouted':<12}{len(scan['Unrouted']):>6} inputs, e.g. {scan['Unrouted'][0]}")
+
+    if dry_run or not routes:
+        return {"Scan": scan, "Runs": []}
+
+    staging_root = os.path.join(output_folder, "ingest_staging")
+    if os.path.exists(staging_root):
+        shutil.rmtree(staging_root)
+    for device, entries in routes.items():
+        stage_device_input(device, entries, input_folder, os.path.join(staging_root, device))
+
+    order = sorted(routes, key=lambda device: scan["Bytes"][device], reverse=True)
+    runs = Parallel(n_jobs=n_jobs if n_jobs > 0 else len(order), prefer="threads")(
+        delayed(run_device)(
+            device,
+            os.path.join(staging_root, device),
+            os.path.join(output_folder, device),
+            os.path.join(trace_folder, device) if trace_folder else None,
+            json_path,
+            catalog_path,
+        )
+        for device in order
+    )
+
+    return {"Scan": scan, "Runs": runs}
@@ -6,6 +6,29 @@ import maestro2_triton_heightmap_converter
 import maestro2_triton_oct_converter
 import maestro2_triton_retinal_photography_converter
 import maestro2_triton_volume_converter
+from pydicom.tag import Tag
+
+# Tags read from the referenced files: the four UIDs used by the enface references and the
+# Shared Functional Groups Sequence holding the OCT pixel spacing used by the heightmap
+reference_tags = maestro2_triton_enface_converter.reference_tags + [Tag(0x5200, 0x9229)]
+
+
+def get_reference_header(path, references):
+    """
+    Return the projected header of a referenced file, reading it once per acquisition folder.
+
+    Args:
+        path (str): The path to the referenced DICOM file.
+        references (dict): The cache of the acquisition folder, mapping paths to headers.
+
+    Returns:
+        pydicom.Dataset: The header with only the reference tags (no pixel data).
+    """
+    if path not in references:
+        references[path] = maestro2_triton_enface_converter.read_reference_header(
+            path, reference_tags
+        )
+    return references[path]
 
 
 def convert_dicom(folder, output):
@@ -32,6 +55,9 @@ def convert_dicom(folder, output):
     x = imaging_utils.get_filtered_file_names(folder)
     uids_sorted = sorted(x, key=imaging_utils.extract_numeric_part)
 
+    # Referenced headers are read once per folder and shared by the enface and heightmap conversions
+    references = {}
+
     conversion_num = 0
     for i in uids_sorted:
         if i.endswith("1.1.dcm"):
@@ -48,7 +74,7 @@ def convert_dicom(folder, output):
 
         if i.endswith("7.3.dcm"):
             maestro2_triton_heightmap_converter.convert_dicom(
-                i, output, uids_sorted[0]
+                i, output, get_reference_header(uids_sorted[0], references)
             )
             conversion_num += 1
 
@@ -61,14 +87,14 @@ def convert_dicom(folder, output):
             maestro2_triton_enface_converter.convert_dicom(
                 i,
                 output,
-                uids_sorted[1],  # op
-                uids_sorted[0],  # opt
-                uids_sorted[2],  # vol
-                uids_sorted[-1],  # seg
+                get_reference_header(uids_sorted[1], references),  # op
+                get_reference_header(uids_sorted[0], references),  # opt
+                get_reference_header(uids_sorted[2], references),  # vol
+                get_reference_header(uids_sorted[-1], references),  # seg
             )
             conversion_num += 1
 
-    file_num = len(imaging_utils.get_filtered_file_names(folder))
+    file_num = len(x)
     boolean = file_num == conversion_num
 
     dic = {
@@ -3,120 +3,227 @@ import shutil
 
 import imaging_classifying_rules
 import imaging_utils
+import imaging_zip_input
 import pydicom
 
 
-def filter_maestro2_triton_files(folder, output):
+def is_topcon_oct_file(file):
     """
-    Filter and process Maestro2 or Triton files based on classification rules.
+    Check whether a file name is the OCT (*1.1.dcm) file that anchors a Topcon acquisition.
+
+    Args:
+        file (str): The file name.
+
+    Returns:
+        bool: True if the file anchors an acquisition, False otherwise.
+    """
+    return file.endswith("1.1.dcm") and file.startswith("2")
 
-    This function performs the following steps:
-    1. Checks critical information from files in the given folder.
-    2. Determines the expected status of the files (e.g., "Unknown" or "Expected").
-    3. Applies classification rules to the DICOM files.
-    4. Processes and copies the files to the appropriate output directory based on the classification rule.
+
+def read_header(file_path):
+    """
+    Read a DICOM header without its pixel data.
 
     Args:
-        folder (str): The path to the folder containing DICOM files to be processed.
-        output (str): The directory where the processed files will be stored.
+        file_path (str): The path to the file (or to a member of a zip archive).
 
     Returns:
-        dict: A dictionary containing information about the processed files, including the protocol used
-        and the folder name. The dictionary has the following keys:
-            - "Protocol" (str): The protocol applied to the files.
-            - "Foldername" (str): The name of the folder processed.
+        pydicom.Dataset: The header, or None if the file is not a DICOM file.
     """
-    filtered_list = imaging_utils.get_filtered_file_names(folder)
-    all_dicom = all(
-        imaging_classifying_rules.is_dicom_file(file) for file in filtered_list
-    )
-    if filtered_list:
+    try:
+        return imaging_zip_input.dcmread(file_path, stop_before_pixels=True)
+    except pydicom.errors.InvalidDicomError:
+        return None
 
-        if all_dicom:
 
-            check = imaging_utils.check_critical_info_from_files_in_folder(folder)
-
-            if check == "pass":
-
-                expected_status = imaging_utils.topcon_check_files_expected(folder)
-
-                if expected_status == "Unknown":
-                    for root, dirs, files in os.walk(folder):
-                        for file in files:
-                            if file.endswith("1.1.dcm") and file.startswith("2"):
-                                file_path = os.path.join(root, file)
-                                protocol = "unknown_protocol"
-                                a = pydicom.dcmread(file_path)
-                                patient_id = a.PatientID
-                                laterality = a.ImageLaterality
-                                outputtt = imaging_utils.topcon_process_folder(
-                                    folder, output, protocol
-                                )
-
-                elif expected_status == "Expected":
-
-                    for root, dirs, files in os.walk(folder):
-                        for file in files:
-                            if file.endswith("1.1.dcm") and file.startswith("2"):
-                                # print(f"{root}, {file}")
-                                file_path = os.path.join(root, file)
-                                # protocol = imaging_classifying_rules.find_rule(
-                                #     file_path
-                                # )
-                                protocol = imaging_utils.get_protocol_updated(file_path)
-                                a = pydicom.dcmread(file_path)
-                                patient_id = a.PatientID
-                                laterality = a.ImageLaterality
-                                outputtt = imaging_utils.topcon_process_folder(
-                                    folder, output, protocol
-                                )
-
-            else:
-                protocol = f"{check}"
-                for root, dirs, files in os.walk(folder):
-                    for file in files:
-                        if file.endswith("1.1.dcm") and file.startswith("2"):
-                            file_path = os.path.join(root, file)
-                            protocol = f"{check}"
-                            a = pydicom.dcmread(file_path)
-                            patient_id = a.PatientID
-                            laterality = a.ImageLaterality
-                            outputtt = imaging_utils.topcon_process_folder(
-                                folder, output, protocol
-                            )
-
-                imaging_utils.topcon_process_folder(folder, output, protocol)
-
-            dic = {
-                "Rule": protocol,
-                "Patient ID": patient_id,
-                "Laterality": laterality,
-                "Input": folder,
-                "Output": outputtt,
-            }
+def plan_topcon_acquisition(file_path, output, rule, dataset=None):
+    """
+    Plan the copy of one Topcon acquisition (the folder holding a *1.1.dcm file).
+
+    Mirrors imaging_utils.topcon_process_folder: when the acquisition folder holds
+    exactly three files only the 1.1 and 2.1 files are kept, otherwise every file
+    is copied. Files are renamed to "<folder>_<file>" and subfolders are copied as is.
 
-        else:
-            protocol = "invalid_dicom"
-            outputtt = imaging_utils.topcon_process_folder(folder, output, protocol)
-            dic = {
-                "Rule": protocol,
-                "Patient ID": "N/A",
-                "Laterality": "N/A",
-                "Input": folder,
-                "Output": outputtt,
-            }
-    else:
+    Args:
+        file_path (str): The path to the *1.1.dcm file of the acquisition.
+        output (str): The output directory.
+        rule (str): The classification rule of the acquisition.
+        dataset (pydicom.Dataset, optional): The already loaded header of the 1.1 file.
 
-        protocol = "no_files"
-        outputtt = f"{output}/{protocol}/{protocol}_{folder.split('/')[-1]}"
-        shutil.copytree(folder, outputtt, dirs_exist_ok=True)
+    Returns:
+        dict: The acquisition plan with the keys "Rule", "Patient ID", "Laterality",
+        "Output", "Copies" (list of (source, destination) file pairs) and "Trees"
+        (list of (source, destination) folder pairs).
+    """
+    info = imaging_classifying_rules.extract_dicom_entry(file_path, dataset)
+    folder = os.path.dirname(file_path)
+    original_folder_basename = os.path.basename(folder)
+    name = rule[:-4] if rule.endswith("_oct") else rule
+    outputfolder = f"{output}/{name}/{name}_{info.patientid}_{info.laterality}_{original_folder_basename}"
+
+    all_items = imaging_zip_input.listdir(folder)
+    all_files = [
+        f for f in all_items if imaging_zip_input.isfile(os.path.join(folder, f))
+    ]
+    keep_all = len(all_files) != 3
+
+    copies = []
+    trees = []
+    for item in all_items:
+        source_path = os.path.join(folder, item)
+        if imaging_zip_input.isdir(source_path):
+            trees.append((source_path, os.path.join(outputfolder, item)))
+        elif keep_all or item.endswith(("1.1.dcm", "2.1.dcm")):
+            copies.append(
+                (
+                    source_path,
+                    os.path.join(outputfolder, f"{original_folder_basename}_{item}"),
+                )
+            )
+
+    return {
+        "Rule": rule,
+        "Patient ID": info.patientid,
+        "Laterality": info.laterality,
+        "Output": outputfolder,
+        "Copies": copies,
+        "Trees": trees,
+    }
+
+
+def plan_maestro2_triton_folder(folder, output):
+    """
+    Plan the organization of a Maestro2 or Triton folder in a single scan.
+
+    Every filtered file header is read once (without pixel data). Acquisitions are
+    grouped by the folder holding their *1.1.dcm file, so each source is planned once.
+    The folder may also be a folder inside a zip archive; only the planned files are
+    extracted when the plan is executed.
+
+    Args:
+        folder (str): The path to the folder containing DICOM files to be processed.
+        output (str): The directory where the processed files will be stored.
+
+    Returns:
+        dict: The plan with the keys "Rule", "Patient ID", "Laterality", "Input",
+        "Output" and "Acquisitions" (list of acquisition plans).
+    """
+    filtered_list = imaging_utils.get_filtered_file_names(folder)
 
-        dic = {
-            "Rule": "no_files",
+    if not filtered_list:
+        protocol = "no_files"
+        outputfolder = f"{output}/{protocol}/{protocol}_{folder.split('/')[-1]}"
+        return {
+            "Rule": protocol,
             "Patient ID": "N/A",
             "Laterality": "N/A",
             "Input": folder,
-            "Output": outputtt,
+            "Output": outputfolder,
+            "Acquisitions": [
+                {"Output": outputfolder, "Copies": [], "Trees": [(folder, outputfolder)]}
+            ],
         }
 
+    # Keep only the headers that are used again: the first file and the 1.1 files
+    headers = {}
+    all_dicom = True
+    for index, file_path in enumerate(filtered_list):
+        dataset = read_header(file_path)
+        if dataset is None:
+            all_dicom = False
+        elif index == 0 or is_topcon_oct_file(os.path.basename(file_path)):
+            headers[file_path] = dataset
+
+    # One acquisition per folder holding a 1.1 file
+    acquisitions = {}
+    for file_path in sorted(filtered_list):
+        if is_topcon_oct_file(os.path.basename(file_path)):
+            acquisitions.setdefault(os.path.dirname(file_path), file_path)
+
+    if not all_dicom:
+        protocol = "invalid_dicom"
+    else:
+        check = imaging_utils.check_critical_info_from_dataset(
+            headers[filtered_list[0]]
+        )
+        if check != "pass":
+            protocol = f"{check}"
+        elif imaging_utils.topcon_check_files_expected(folder) == "Unknown":
+            protocol = "unknown_protocol"
+        else:
+            protocol = None
+
+    plan = {
+        "Rule": protocol,
+        "Patient ID": "N/A",
+        "Laterality": "N/A",
+        "Input": folder,
+        "Output": None,
+        "Acquisitions": [],
+    }
+
+    for file_path in acquisitions.values():
+        dataset = headers.get(file_path)
+        rule = protocol
+        if rule is None:
+            rule = imaging_utils.get_protocol_updated(file_path, dataset)
+        acquisition = plan_topcon_acquisition(file_path, output, rule, dataset)
+        plan["Acquisitions"].append(acquisition)
+        plan["Rule"] = rule
+        plan["Output"] = acquisition["Output"]
+        if all_dicom:
+            plan["Patient ID"] = dataset.get("PatientID", "N/A")
+            plan["Laterality"] = dataset.get("ImageLaterality", "N/A")
+
+    return plan
+
+
+def execute_maestro2_triton_plan(plan):
+    """
+    Copy every file and folder of an organize plan exactly once.
+
+    Args:
+        plan (dict): The plan returned by plan_maestro2_triton_folder.
+    """
+    for acquisition in plan["Acquisitions"]:
+        os.makedirs(acquisition["Output"], exist_ok=True)
+        for source_path, dest_path in acquisition["Trees"]:
+            if source_path != plan["Input"] and os.path.exists(dest_path):
+                shutil.rmtree(dest_path)
+            imaging_zip_input.copy_tree(source_path, dest_path)
+        for source_path, dest_path in acquisition["Copies"]:
+            imaging_zip_input.copy_file(source_path, dest_path)
+
+
+def filter_maestro2_triton_files(folder, output):
+    """
+    Filter and process Maestro2 or Triton files based on classification rules.
+
+    This function performs the following steps:
+    1. Reads every file header once and checks that all files are DICOM.
+    2. Checks critical information from the first file in the given folder.
+    3. Determines the expected status of the files (e.g., "Unknown" or "Expected").
+    4. Applies classification rules to each acquisition (*1.1.dcm file).
+    5. Copies each acquisition once to the appropriate output directory based on the classification rule.
+
+    Args:
+        folder (str): The path to the folder containing DICOM files to be processed.
+        output (str): The directory where the processed files will be stored.
+
+    Returns:
+        dict: A dictionary containing information about the processed files, with the keys
+        "Rule", "Patient ID", "Laterality", "Input" and "Output".
+    """
+    plan = plan_maestro2_triton_folder(folder, output)
+    execute_maestro2_triton_plan(plan)
+
+    dic = {
+        "Rule": plan["Rule"],
+        "Patient ID": plan["Patient ID"],
+        "Laterality": plan["Laterality"],
+        "Input": folder,
+        "Output": plan["Output"],
+    }
+
     return dic
+
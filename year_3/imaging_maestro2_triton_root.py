@@ -1,7 +1,11 @@
+import time
+
 import imaging_maestro2_triton_converter as maestro2_triton_conv
 import imaging_maestro2_triton_metadata as maestro2_triton_meta
 import imaging_maestro2_triton_organize as maestro2_triton_organize
+from imaging_prefetch import Prefetcher
 from imaging_standards import DataDomain
+from joblib import Parallel, delayed
 
 # import imaging.maestro2_triton_metadata as maestro2_triton_meta
 
@@ -41,6 +45,29 @@ class Maestro2_Triton(DataDomain):
         )
         return organize_dict
 
+    def organize_many(self, folders, output_folder, n_jobs=-1, prefetch_bytes=0):
+        """
+        Organizes several acquisition folders in parallel worker processes.
+
+        Each worker calls organize, so the folders are organized (and traced) exactly as
+        one by one.
+
+        Args:
+            folders (list): Full paths to the acquisition folders.
+            output_folder (str): Full path to the output folder.
+            n_jobs (int): The number of parallel jobs (-1 uses all cores).
+            prefetch_bytes (int): Bytes of upcoming folders read ahead (see imaging_prefetch).
+
+        Returns:
+            list: One organize dictionary per folder, in the input order, with the processing
+            time in "Seconds". Failed folders are reported as {"Input": folder, "Error": message}.
+        """
+        if prefetch_bytes:
+            folders = Prefetcher(folders, prefetch_bytes)
+        return Parallel(n_jobs=n_jobs)(
+            delayed(_organize_folder)(folder, output_folder) for folder in folders
+        )
+
     def convert(self, input_folder, output_folder):
         """
         Converts DICOM files to NEMA compliant *.dcm files.
@@ -70,3 +97,34 @@ class Maestro2_Triton(DataDomain):
         meta_dict = maestro2_triton_meta.meta_data_save(input_file, output_folder)
 
         return meta_dict
+
+
+# Domain instance of a worker process of organize_many, created on its first folder
+_worker_domain = None
+
+
+def _organize_folder(folder, output_folder):
+    """
+    Organize one folder in a worker process of organize_many, returning the error
+    instead of raising it.
+
+    Args:
+        folder (str): The acquisition folder.
+        output_folder (str): The output folder.
+
+    Returns:
+        dict: The organize dictionary, or {"Input": folder, "Error": message} on failure,
+        with the processing time in "Seconds".
+    """
+    global _worker_domain
+    if _worker_domain is None:
+        # Also installs the tracing of the worker when the trace folder is set
+        _worker_domain = Maestro2_Triton()
+
+    start = time.perf_counter()
+    try:
+        dic = _worker_domain.organize(folder, output_folder)
+    except Exception as e:
+        dic = {"Input": folder, "Error": str(e)}
+    dic["Seconds"] = time.perf_counter() - start
+    return dic
@@ -1,6 +1,7 @@
 import os
 
 import imaging_classifying_rules
+import imaging_writer
 import pydicom
 
 KEEP = 0
@@ -470,7 +471,7 @@ def write_dicom(protocol, dicom_dict_list, file_path):
             value = pydicom.Sequence()
             element_name = pydicom.datadict.keyword_for_tag(key)
             setattr(dataset, element_name, value)
-    dataset.save_as(file_path, write_like_original=False)
+    imaging_writer.write_dataset(dataset, file_path, write_like_original=False)
 
 
 def convert_dicom(input, output):
@@ -0,0 +1,124 @@
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from imaging_run_log import input_size
+
+# Bytes of upcoming inputs read ahead while the current one is processed
+prefetch_max_bytes = 512 * 1024 * 1024
+
+# Background threads reading ahead
+prefetch_threads = 2
+
+# Size of the reads that pull a file into the page cache
+prefetch_chunk_size = 8 * 1024 * 1024
+
+
+def warm_path(path):
+    """
+    Read a file, or every file of a folder, so the next open is served from the page cache.
+
+    Args:
+        path (str): The file or folder.
+
+    Returns:
+        int: The number of bytes read.
+    """
+    if os.path.isdir(path):
+        files = [os.path.join(root, file) for root, _, names in os.walk(path) for file in names]
+    else:
+        files = [path]
+
+    total = 0
+    for file in files:
+        try:
+            with open(file, "rb", buffering=0) as f:
+                while True:
+                    chunk = f.read(prefetch_chunk_size)
+                    if not chunk:
+                        break
+                    total += len(chunk)
+        except OSError:
+            # The converter reports unreadable inputs itself
+            pass
+    return total
+
+
+class Prefetcher:
+    """
+    Iterate over input paths while background threads read the next ones ahead.
+
+    The inputs are yielded in order. Read-ahead stops once the inputs read but not
+    yet consumed reach max_bytes, so a run of large inputs (FLIO measurements,
+    Cirrus flow cubes) only keeps max_bytes in the page cache ahead of the converter.
+    An input larger than max_bytes is never read ahead.
+
+    Example:
+        for file in tqdm(Prefetcher(files, max_bytes), desc="Converting"):
+            convert(file)
+
+    Attributes:
+        stats (dict): "Items", "Prefetched" (inputs read ahead), "Bytes" (bytes read
+            ahead) and "Wait seconds" (time spent waiting for a read-ahead to finish).
+    """
+
+    def __init__(self, paths, max_bytes=prefetch_max_bytes, n_threads=prefetch_threads):
+        """
+        Args:
+            paths (list): The input files or folders, in processing order.
+            max_bytes (int): Bytes read ahead at most; 0 disables read-ahead.
+            n_threads (int): Background threads reading ahead.
+        """
+        self.paths = list(paths)
+        self.max_bytes = max_bytes
+        self.n_threads = n_threads
+        self.stats = {"Items": 0, "Prefetched": 0, "Bytes": 0, "Wait seconds": 0.0}
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __iter__(self):
+        if self.max_bytes <= 0 or len(self.paths) < 2:
+            for path in self.paths:
+                self.stats["Items"] += 1
+                yield path
+            return
+
+        executor = ThreadPoolExecutor(max_workers=self.n_threads)
+        pending = deque()  # (index, size, future) of the inputs read ahead
+        sizes = {}
+        queued_bytes = 0
+        next_index = 1
+
+        try:
+            for index, path in enumerate(self.paths):
+                next_index = max(next_index, index + 1)
+                while next_index < len(self.paths):
+                    # Inputs that are not on disk (folders inside zip archives) are not read ahead
+                    if next_index not in sizes:
+                        sizes[next_index] = input_size(self.paths[next_index]) or 0
+                    size = sizes[next_index]
+                    if queued_bytes + size > self.max_bytes:
+                        if size > self.max_bytes:
+                            next_index += 1
+                            continue
+                        break
+                    pending.append(
+                        (next_index, size, executor.submit(warm_path, self.paths[next_index]))
+                    )
+                    queued_bytes += size
+                    next_index += 1
+
+                if pending and pending[0][0] == index:
+                    _, size, future = pending.popleft()
+                    start = time.perf_counter()
+                    self.stats["Bytes"] += future.result()
+                    self.stats["Wait seconds"] += time.perf_counter() - start
+                    self.stats["Prefetched"] += 1
+                    queued_bytes -= size
+
+                self.stats["Items"] += 1
+                yield path
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,377 @@
+import io
+import json
+import math
+import os
+import shutil
+
+import numpy as np
+from joblib import Parallel, delayed
+from PIL import Image
+from pydicom.pixels import convert_color_space
+
+import imaging_frames
+import imaging_writer
+
+# Longest side of a single-image preview, in pixels
+preview_max_size = 512
+
+# B-scans shown on the contact sheet of a multi-frame volume
+contact_sheet_frames = 9
+
+# Longest side of each B-scan on a contact sheet, in pixels
+contact_sheet_tile_size = 256
+
+# JPEG quality of the previews
+preview_quality = 85
+
+# Index of the rendered previews, kept in the preview folder
+preview_index_name = "preview_index.jsonl"
+
+# JPEG transfer syntaxes PIL can decode at a reduced scale (draft mode)
+draft_transfer_syntaxes = ["1.2.840.10008.1.2.4.50", "1.2.840.10008.1.2.4.51"]
+
+
+def downsample_step(rows, columns, max_size):
+    """
+    Return the stride that brings the longest side of an image close to max_size
+    (never below it); 1 if max_size is None (full resolution).
+    """
+    if max_size is None:
+        return 1
+    return max(1, max(rows, columns) // max_size)
+
+
+def read_frames(reader, frames, max_size):
+    """
+    Read the selected frames of a file, downsampled as early as its encoding allows.
+
+    Native pixel data is strided on its memory map, so only the kept pixels are read;
+    JPEG frames are decoded at a reduced scale (PIL draft mode); other encodings are
+    decoded frame by frame, then strided.
+
+    Args:
+        reader (imaging_frames.FrameReader): The reader of the file.
+        frames (list): Indices of the frames to read.
+        max_size (int): Longest side wanted for each frame (None for full resolution).
+
+    Returns:
+        numpy.ndarray: (frames, rows, columns[, samples]) array, roughly max_size on its
+        longest side.
+    """
+    step = downsample_step(reader.header.Rows, reader.header.Columns, max_size)
+    if (
+        reader.encapsulated
+        and reader.frame_fragments is not None
+        and reader.transfer_syntax in draft_transfer_syntaxes
+    ):
+        images = []
+        for index in frames:
+            image = Image.open(io.BytesIO(reader.frame_bytes(index)))
+            if max_size is not None:
+                image.draft(image.mode, (max_size, max_size))
+            images.append(np.asarray(image))
+        return np.stack(images)
+
+    array = reader.read(frames, step)
+    if reader.array is not None and reader.header.get("PhotometricInterpretation") == "YBR_FULL":
+        array = convert_color_space(array, "YBR_FULL", "RGB", per_frame=True)
+    return array
+
+
+def to_uint8(array, photometric="MONOCHROME2"):
+    """
+    Scale an image to 8 bits between its 0.5 and 99.5 percentiles.
+    """
+    if array.dtype != np.uint8:
+        low, high = np.percentile(array, [0.5, 99.5])
+        scale = 255.0 / (high - low) if high > low else 0.0
+        array = np.clip((array.astype(np.float32) - low) * scale, 0, 255).astype(np.uint8)
+    if photometric == "MONOCHROME1":
+        array = 255 - array
+    return array
+
+
+def to_image(array, photometric, max_size):
+    """
+    Convert one frame to an 8-bit PIL image whose longest side is at most max_size
+    (None keeps the size of the frame).
+    """
+    image = Image.fromarray(to_uint8(array, photometric))
+    if max_size is not None:
+        image.thumbnail((max_size, max_size))
+    return image
+
+
+def contact_sheet(images):
+    """
+    Tile images on a square grid, in reading order.
+    """
+    columns = math.ceil(math.sqrt(len(images)))
+    rows = math.ceil(len(images) / columns)
+    width = max(image.width for image in images)
+    height = max(image.height for image in images)
+    sheet = Image.new(images[0].mode, (columns * width, rows * height))
+    for index, image in enumerate(images):
+        sheet.paste(image, ((index % columns) * width, (index // columns) * height))
+    return sheet
+
+
+def render_preview(file, max_size=preview_max_size, sheet_frames=contact_sheet_frames):
+    """
+    Render the preview of a DICOM file.
+
+    Photographs and enface images give one thumbnail, multi-frame OCT volumes and flow
+    cubes a contact sheet of evenly spaced B-scans, and FLIO measurements the intensity
+    image (the sum of the time channels).
+
+    Args:
+        file (str): The DICOM file.
+        max_size (int): Longest side of a single-image preview (None for full resolution).
+        sheet_frames (int): B-scans shown on a contact sheet.
+
+    Returns:
+        tuple: (PIL.Image, kind), where kind is "Image", "Contact sheet" or "FLIO intensity",
+        or (None, None) if the file has no pixel data (e.g. a segmentation).
+    """
+    with imaging_frames.FrameReader(file) as reader:
+        if not reader.has_pixel_data:
+            return None, None
+
+        ds = reader.header
+        photometric = ds.get("PhotometricInterpretation", "MONOCHROME2")
+        n_frames = len(reader)
+
+        if ds.get("Modality") == "FLIO":
+            frames = read_frames(reader, list(range(n_frames)), max_size)
+            intensity = frames.sum(axis=0, dtype=np.float64)
+            return to_image(intensity, photometric, max_size), "FLIO intensity"
+
+        if n_frames == 1:
+            return to_image(read_frames(reader, [0], max_size)[0], photometric, max_size), "Image"
+
+        frames = sorted({int(round(i)) for i in np.linspace(0, n_frames - 1, min(sheet_frames, n_frames))})
+        tiles = read_frames(reader, frames, contact_sheet_tile_size)
+        images = [to_image(tile, photometric, contact_sheet_tile_size) for tile in tiles]
+        return contact_sheet(images), "Contact sheet"
+
+
+def save_preview(file, preview_path, max_size=preview_max_size, sheet_frames=contact_sheet_frames):
+    """
+    Render the preview of a DICOM file and save it as a JPEG.
+
+    Returns:
+        str: The kind of preview (see render_preview), or None if the file has no pixel data.
+    """
+    image, kind = render_preview(file, max_size, sheet_frames)
+    if image is None:
+        return None
+    os.makedirs(os.path.dirname(os.path.abspath(preview_path)), exist_ok=True)
+    imaging_writer.atomic_write(
+        preview_path,
+        lambda f: image.convert("RGB" if image.mode not in ("L", "RGB") else image.mode).save(
+            f, format="JPEG", quality=preview_quality
+        ),
+    )
+    return kind
+
+
+def load_preview_index(preview_folder):
+    """
+    Load the preview index of a preview folder.
+
+    Returns:
+        dict: Relative path of the DICOM file -> {"Size", "Mtime", "BLAKE2b", "Preview",
+        "Kind", "Status"}.
+    """
+    path = os.path.join(preview_folder, preview_index_name)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as file:
+        entries = [json.loads(line) for line in file if line.strip()]
+    return {entry.pop("Path"): entry for entry in entries}
+
+
+def file_state(input_folder, relative_path, entry):
+    """
+    Return the size, modification time and content hash of a file.
+
+    The content hash is reused from the index entry of the file when the size and
+    modification time are unchanged, otherwise the file is hashed (much cheaper than
+    decoding it).
+
+    Args:
+        input_folder (str): The folder of DICOM files.
+        relative_path (str): The file, relative to input_folder.
+        entry (dict): The previous index entry of the file, or None.
+
+    Returns:
+        dict: The index entry of the file without its preview status, with "Path", "Size",
+        "Mtime", "BLAKE2b" and "Preview" (the relative path of its preview).
+    """
+    stat = os.stat(os.path.join(input_folder, relative_path))
+    if entry and entry["Size"] == stat.st_size and entry["Mtime"] == stat.st_mtime_ns:
+        checksum = entry["BLAKE2b"]
+    else:
+        checksum = imaging_writer.file_checksum(os.path.join(input_folder, relative_path))
+
+    return {
+        "Path": relative_path,
+        "Size": stat.st_size,
+        "Mtime": stat.st_mtime_ns,
+        "BLAKE2b": checksum,
+        "Preview": os.path.normpath(relative_path + ".jpg"),
+    }
+
+
+def reuse_preview(result, entry, preview_folder):
+    """
+    Give a file the preview of an index entry with the same content.
+
+    The JPEG is hard linked (or copied, across file systems) to the preview path of the
+    file, so the previews keep mirroring the input tree.
+
+    Args:
+        result (dict): The index entry of the file (see file_state), updated in place.
+        entry (dict): The index entry with the same content.
+        preview_folder (str): The folder of the previews.
+
+    Returns:
+        bool: True if the preview was reused, False if the file has to be rendered.
+    """
+    if entry.get("Status") == "Skipped":
+        result.update(Preview=None, Kind=None, Status="Skipped")
+        return True
+    if not entry.get("Preview"):
+        return False
+    source = os.path.join(preview_folder, entry["Preview"])
+    if not os.path.exists(source):
+        return False
+
+    destination = os.path.join(preview_folder, result["Preview"])
+    if os.path.abspath(source) != os.path.abspath(destination):
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        if os.path.exists(destination):
+            os.remove(destination)
+        try:
+            os.link(source, destination)
+        except OSError:
+            shutil.copy2(source, destination)
+    result.update(Kind=entry.get("Kind"), Status="Cached")
+    return True
+
+
+def preview_file(input_folder, result, preview_folder, max_size, sheet_frames):
+    """
+    Render the preview of one file.
+
+    Args:
+        input_folder (str): The folder of DICOM files.
+        result (dict): The index entry of the file (see file_state).
+        preview_folder (str): The folder receiving the previews.
+        max_size (int): Longest side of a single-image preview.
+        sheet_frames (int): B-scans shown on the contact sheet of a volume.
+
+    Returns:
+        dict: The index entry of the file, with "Status" ("Rendered", "Skipped" for files
+        without pixel data, or the error message).
+    """
+    file = os.path.join(input_folder, result["Path"])
+    preview_path = os.path.join(preview_folder, result["Preview"])
+    try:
+        result["Kind"] = save_preview(file, preview_path, max_size, sheet_frames)
+        if result["Kind"] is None:
+            result.update(Preview=None, Status="Skipped")
+        else:
+            result["Status"] = "Rendered"
+    except Exception as e:
+        result.update(Preview=None, Kind=None, Status=str(e))
+    return result
+
+
+def make_previews(
+    input_folder,
+    preview_folder,
+    max_size=preview_max_size,
+    sheet_frames=contact_sheet_frames,
+    force=False,
+    n_jobs=-1,
+):
+    """
+    Render the previews of every DICOM file of a folder in parallel.
+
+    The previews mirror the input tree (<preview_folder>/<relative path>.jpg). Files
+    whose content hash (BLAKE2b) already has a preview are not rendered again, so
+    re-running on a grown release only renders the new or changed files. A renamed,
+    moved or duplicated file gets a link to the existing preview of its content.
+
+    Args:
+        input_folder (str): The folder of DICOM files (e.g. step4_final_structure).
+        preview_folder (str): The folder receiving the previews and their index.
+        max_size (int): Longest side of a single-image preview.
+        sheet_frames (int): B-scans shown on the contact sheet of a volume.
+        force (bool): Render every file again.
+        n_jobs (int): Number of files rendered in parallel.
+
+    Returns:
+        dict: Number of files per status ("Rendered", "Cached", "Skipped", "Failed").
+    """
+    cached = {} if force else load_preview_index(preview_folder)
+
+    relative_paths = []
+    for root, _, files in os.walk(input_folder):
+        for file in files:
+            if not file.startswith(".") and file.lower().endswith(".dcm"):
+                relative_paths.append(os.path.relpath(os.path.join(root, file), input_folder))
+
+    # Largest files first, so one big volume does not finish last
+    relative_paths.sort(key=lambda path: os.path.getsize(os.path.join(input_folder, path)), reverse=True)
+    states = Parallel(n_jobs=n_jobs)(
+        delayed(file_state)(input_folder, path, cached.get(path)) for path in relative_paths
+    )
+
+    # Previews by content, so renamed, moved or duplicated files reuse them
+    previews = {}
+    for entry in cached.values():
+        if entry.get("Status") in ("Rendered", "Cached", "Skipped"):
+            previews.setdefault(entry["BLAKE2b"], entry)
+
+    entries = []
+    pending = {}
+    for result in states:
+        entry = cached.get(result["Path"])
+        if entry is None or entry["BLAKE2b"] != result["BLAKE2b"]:
+            entry = previews.get(result["BLAKE2b"])
+        if entry is not None and reuse_preview(result, entry, preview_folder):
+            entries.append(result)
+        else:
+            pending.setdefault(result["BLAKE2b"], []).append(result)
+
+    # One file of each new content is rendered, its duplicates reuse the preview
+    rendered = Parallel(n_jobs=n_jobs)(
+        delayed(preview_file)(input_folder, results[0], preview_folder, max_size, sheet_frames)
+        for results in pending.values()
+    )
+    for first, results in zip(rendered, pending.values()):
+        entries.append(first)
+        for result in results[1:]:
+            if not reuse_preview(result, first, preview_folder):
+                result.update(Preview=None, Kind=None, Status=first["Status"])
+            entries.append(result)
+
+    counts = {"Rendered": 0, "Cached": 0, "Skipped": 0, "Failed": 0}
+    for entry in entries:
+        status = entry["Status"]
+        if status in counts:
+            counts[status] += 1
+        else:
+            counts["Failed"] += 1
+            print(f"Error rendering {entry['Path']}: {status}")
+
+    os.makedirs(preview_folder, exist_ok=True)
+    imaging_writer.atomic_write(
+        os.path.join(preview_folder, preview_index_name),
+        lambda file: file.write(
+            "".join(json.dumps(entry) + "\n" for entry in sorted(entries, key=lambda e: e["Path"])).encode()
+        ),
+    )
+    return counts
@@ -0,0 +1,155 @@
+import importlib
+import importlib.util
+import os
+
+# The process_*.py and other driver scripts of the repository
+driver_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "main")
+
+# The same scripts once the pipeline is installed with pip (see pyproject.toml)
+driver_package = "aireadi_imaging_drivers"
+
+# Device name -> (root module, DataDomain class, driver script in main/)
+# Modules are imported on first use, so listing the devices costs nothing.
+device_domains = {
+    "cirrus": ("imaging_cirrus_root", "Cirrus", "process_cirrus"),
+    "topcon": ("imaging_maestro2_triton_root", "Maestro2_Triton", "process_topcon"),
+    "spectralis": ("imaging_spectralis_root", "Spectralis", "process_spectralis"),
+    "eidon": ("imaging_eidon_retinal_photography_root", "Eidon", "process_eidon"),
+    "optomed": ("imaging_optomed_retinal_photography_root", "Optomed", "process_optomed"),
+    "flio": ("imaging_flio_root", "Flio", "process_flio"),
+}
+
+# SOP Class UID -> compliance rule (attribute of compliance_rules), as in
+# main/create_compliance_report.py
+compliance_sop_class_rules = {
+    "1.2.840.10008.5.1.4.1.1.77.1.5.1": "cfp_ir_rule",
+    "1.2.840.10008.5.1.4.1.1.77.1.5.4": "oct_b_rule",
+    "1.2.840.10008.5.1.4.1.1.77.1.5.8": "volume_analysis_rule",
+    "1.2.840.10008.5.1.4.1.1.66.5": "heightmap_rule",
+    "1.2.840.10008.5.1.4.1.1.66.8": "heightmap_rule",
+    "1.2.840.10008.5.1.4.1.1.77.1.5.7": "octa_enface_rule",
+    "1.2.840.10008.5.1.4.1.1.77.1.5.2": "cfp_ir_16_rule",
+}
+
+# DICOM attributes missing from the pydicom dictionary, as (VR, VM, description,
+# is_retired flag, keyword); the is_retired flag is left blank
+private_dictionary_items = {
+    0x00221627: (
+        "SQ",
+        "1",
+        "En Face Volume Descriptor Sequence",
+        "",
+        "EnFaceVolumeDescriptorSequence",
+    ),
+    0x00221629: (
+        "CS",
+        "1",
+        "En Face Volume Descriptor Scope",
+        "",
+        "EnFaceVolumeDescriptorScope",
+    ),
+    0x0008114C: (
+        "SQ",
+        "1",
+        "Referenced Segmentation Sequence",
+        "",
+        "ReferencedSegmentationSequence",
+    ),
+    0x00660005: ("FL", "1", "Surface Offset", "", "SurfaceOffset"),
+}
+
+_dictionary_registered = False
+_domain_classes = {}
+
+
+def get_driver_folder():
+    """
+    Return the folder of the driver scripts: main/ in a checkout of the repository,
+    else the aireadi_imaging_drivers package installed with the pipeline modules.
+
+    Returns:
+        str: The folder.
+
+    Raises:
+        FileNotFoundError: If the driver scripts are in neither place.
+    """
+    if os.path.isdir(driver_folder):
+        return os.path.normpath(driver_folder)
+    spec = importlib.util.find_spec(driver_package)
+    if spec is not None and spec.submodule_search_locations:
+        return list(spec.submodule_search_locations)[0]
+    raise FileNotFoundError(
+        f"The driver scripts were found neither in {os.path.normpath(driver_folder)} nor as "
+        f"the {driver_package} package. Reinstall aireadi-imaging (pip install .) or run "
+        "it from a checkout of the repository."
+    )
+
+
+def register_dicom_dictionary():
+    """
+    Add private_dictionary_items to the pydicom dictionary and its keyword mapping.
+
+    Safe to call from every module that needs the keywords; the dictionary is only
+    updated once per process.
+    """
+    global _dictionary_registered
+    if _dictionary_registered:
+        return
+
+    from pydicom.datadict import DicomDictionary, keyword_dict
+
+    DicomDictionary.update(private_dictionary_items)
+    keyword_dict.update({value[4]: tag for tag, value in private_dictionary_items.items()})
+    _dictionary_registered = True
+
+
+def get_domain_class(device):
+    """
+    Return the DataDomain class of a device, importing its module on first use.
+
+    Args:
+        device (str): A key of device_domains, e.g. "cirrus".
+
+    Returns:
+        type: The DataDomain subclass (e.g. Cirrus).
+
+    Raises:
+        ValueError: If the device is not registered.
+    """
+    if device not in device_domains:
+        raise ValueError(
+            f"Unknown device: {device} (expected one of {', '.join(device_domains)})"
+        )
+    if device not in _domain_classes:
+        module_name, class_name, _ = device_domains[device]
+        _domain_classes[device] = getattr(importlib.import_module(module_name), class_name)
+    return _domain_classes[device]
+
+
+def create_domain(device):
+    """
+    Create the DataDomain instance of a device.
+
+    Args:
+        device (str): A key of device_domains.
+
+    Returns:
+        DataDomain: The device instance (e.g. Cirrus()).
+    """
+    return get_domain_class(device)()
+
+
+def get_compliance_rule(sop_class):
+    """
+    Return the compliance rule of a SOP Class UID, importing compliance_rules on first use.
+
+    Args:
+        sop_class (str): The SOP Class UID.
+
+    Returns:
+        The rule object of compliance_rules, or None if the SOP class has no rule.
+    """
+    rule_name = compliance_sop_class_rules.get(str(sop_class))
+    if rule_name is None:
+        return None
+    return getattr(importlib.import_module("compliance_rules"), rule_name)
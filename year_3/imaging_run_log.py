@@ -0,0 +1,265 @@
+import contextlib
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends of one write call are not interleaved within a process
+    fcntl = None
+
+# Records kept in memory before they are appended to the log file
+run_log_buffer_size = 200
+
+run_log_fields = [
+    "Timestamp",
+    "Step",
+    "Input",
+    "Protocol",
+    "Converter",
+    "Status",
+    "Seconds",
+    "Bytes",
+    "ErrorMessage",
+]
+
+
+def input_size(path):
+    """
+    Return the size of an input file, or the total size of the files of an input folder.
+
+    Args:
+        path (str): The file or folder.
+
+    Returns:
+        int: The size in bytes, or None if the path does not exist.
+    """
+    if os.path.isdir(path):
+        return sum(
+            os.path.getsize(os.path.join(root, file))
+            for root, _, files in os.walk(path)
+            for file in files
+        )
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return None
+
+
+def percentile(values, q):
+    """
+    Return the q-th percentile of a list of values, or None if it is empty.
+    """
+    return float(np.percentile(values, q)) if values else None
+
+
+class RunLog:
+    """
+    Buffered structured log of a pipeline run, written as JSON Lines.
+
+    Every processed item gets one record (success or failure) with its duration, input
+    size and converter. Records are buffered and appended in batches; each batch is a
+    single write under an exclusive file lock, so threads and worker processes can log to
+    the same file.
+
+    Args:
+        path (str): The JSON Lines log file.
+        buffer_size (int): The number of records buffered before they are written.
+    """
+
+    def __init__(self, path, buffer_size=run_log_buffer_size):
+        self.path = path
+        self.buffer_size = buffer_size
+        self.records = []
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # Where the records of this run start, if the log already holds earlier runs
+        self.offset = os.path.getsize(path) if os.path.exists(path) else 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+
+    def record(self, step, input_path, status, protocol="", converter="", seconds=None, size=None, error_message=""):
+        """
+        Add a record to the log.
+
+        Args:
+            step (str): The pipeline step, e.g. "step3_convert".
+            input_path (str): The input file or folder.
+            status (str): "SUCCESS" or "FAILURE".
+            protocol (str): The protocol of the input, if known.
+            converter (str): The function that processed the input, e.g. "Cirrus.convert".
+            seconds (float): The processing time.
+            size (int): The input size in bytes.
+            error_message (str): The error message of a failure.
+        """
+        entry = {
+            "Timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "Step": step,
+            "Input": input_path,
+            "Protocol": protocol,
+            "Converter": converter,
+            "Status": status,
+            "Seconds": seconds,
+            "Bytes": size,
+            "ErrorMessage": error_message,
+        }
+        with self.lock:
+            self.records.append(entry)
+            full = len(self.records) >= self.buffer_size
+        if full:
+            self.flush()
+
+    @contextlib.contextmanager
+    def item(self, step, input_path, protocol="", converter=""):
+        """
+        Time the processing of one item and record it.
+
+        The item is a success unless the block raises (the exception is recorded and
+        re-raised) or sets the "Status" of the yielded entry to "FAILURE".
+
+        Args:
+            step (str): The pipeline step.
+            input_path (str): The input file or folder.
+            protocol (str): The protocol of the input, if known.
+            converter (str): The function that processes the input.
+
+        Yields:
+            dict: The entry, whose "Protocol", "Status" and "ErrorMessage" may be updated.
+        """
+        entry = {"Protocol": protocol, "Status": "SUCCESS", "ErrorMessage": ""}
+        start = time.perf_counter()
+        try:
+            yield entry
+        except Exception as e:
+            entry["Status"] = "FAILURE"
+            entry["ErrorMessage"] = str(e)
+            raise
+        finally:
+            self.record(
+                step,
+                input_path,
+                entry["Status"],
+                protocol=entry["Protocol"],
+                converter=converter,
+                seconds=time.perf_counter() - start,
+                size=input_size(input_path),
+                error_message=entry["ErrorMessage"],
+            )
+
+    def flush(self):
+        """
+        Append the buffered records to the log file.
+        """
+        with self.lock:
+            records = self.records
+            self.records = []
+        if not records:
+            return
+
+        data = "".join(json.dumps(entry) + "\n" for entry in records).encode()
+        with open(self.path, "ab") as file:
+            if fcntl:
+                fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                file.write(data)
+                file.flush()
+            finally:
+                if fcntl:
+                    fcntl.flock(file, fcntl.LOCK_UN)
+
+    def read(self, step=None, current_run=False):
+        """
+        Flush the buffer and read the records of the log file.
+
+        Args:
+            step (str, optional): Only return the records of this step.
+            current_run (bool): Only return the records appended since this log was opened.
+
+        Returns:
+            list: The records.
+        """
+        self.flush()
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, "rb") as file:
+            if current_run:
+                file.seek(self.offset)
+            records = [json.loads(line) for line in file if line.strip()]
+        return [entry for entry in records if step is None or entry["Step"] == step]
+
+    def summary(self, step=None, current_run=False):
+        """
+        Summarize the records per protocol.
+
+        An input logged more than once in a step (e.g. a conversion followed by the
+        failure of one of its background writes) counts as one item, which failed if
+        any of its records did.
+
+        Args:
+            step (str, optional): Only summarize the records of this step.
+            current_run (bool): Only summarize the records appended since this log was opened.
+
+        Returns:
+            list: One dictionary per protocol with "Protocol", "Items", "Failures",
+            "Failure rate", "p50 seconds" and "p95 seconds".
+        """
+        protocols = {}
+        for entry in self.read(step, current_run):
+            items = protocols.setdefault(entry["Protocol"] or "unknown", {})
+            items.setdefault(entry["Input"], []).append(entry)
+
+        rows = []
+        for protocol, items in sorted(protocols.items()):
+            failures = sum(
+                any(entry["Status"] != "SUCCESS" for entry in entries)
+                for entries in items.values()
+            )
+            seconds = [
+                entry["Seconds"]
+                for entries in items.values()
+                for entry in entries
+                if entry["Seconds"] is not None
+            ]
+            rows.append(
+                {
+                    "Protocol": protocol,
+                    "Items": len(items),
+                    "Failures": failures,
+                    "Failure rate": failures / len(items),
+                    "p50 seconds": percentile(seconds, 50),
+                    "p95 seconds": percentile(seconds, 95),
+                }
+            )
+        return rows
+
+    def print_summary(self, step=None, current_run=False):
+        """
+        Print the per-protocol summary of a step as a table.
+
+        Args:
+            step (str, optional): Only summarize the records of this step.
+            current_run (bool): Only summarize the records appended since this log was opened.
+        """
+        rows = self.summary(step, current_run)
+        if not rows:
+            print(f"No items logged for {step or 'the run'}.")
+            return
+
+        width = max(len("Protocol"), *(len(row["Protocol"]) for row in rows))
+        print(f"\nSummary of {step or 'the run'}:")
+        print(f"{'Protocol':<{width}}  {'Items':>6}  {'Failures':>8}  {'Rate':>6}  {'p50 (s)':>8}  {'p95 (s)':>8}")
+        for row in rows:
+            p50 = "" if row["p50 seconds"] is None else f"{row['p50 seconds']:.3f}"
+            p95 = "" if row["p95 seconds"] is None else f"{row['p95 seconds']:.3f}"
+            print(
+                f"{row['Protocol']:<{width}}  {row['Items']:>6}  {row['Failures']:>8}  "
+                f"{row['Failure rate']:>6.1%}  {p50:>8}  {p95:>8}"
+            )
@@ -1,9 +1,17 @@
 from abc import abstractmethod
 
+import imaging_tracing
+
 
 class DataDomain:
     def __init__(self):
         print("in standards init")
+        imaging_tracing.install()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # organize/convert/metadata calls are recorded as spans once tracing is enabled
+        imaging_tracing.trace_methods(cls)
 
     @abstractmethod
     def organize(self, files, outfile, **kwargs):
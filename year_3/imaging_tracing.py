@@ -0,0 +1,287 @@
+import csv
+import functools
+import glob
+import json
+import os
+import sys
+import threading
+import time
+
+import pydicom
+
+# Environment variable holding the trace folder; set by enable_tracing and inherited by
+# worker processes, so spans of parallel jobs are recorded as well
+trace_env_var = "AIREADI_TRACE_FOLDER"
+
+# DataDomain methods wrapped with a span
+traced_methods = ["organize", "organize_many", "convert", "convert1", "convert2", "metadata"]
+
+# Module-level functions wrapped with a span in the converter modules and the utils
+traced_functions = [
+    "convert_dicom",
+    "extract_dicom_dict",
+    "write_dicom",
+    "make_flio_dicom",
+    "format_file",
+    "format_cirrus_file",
+]
+traced_utils_modules = ["imaging_utils", "cirrus_utils"]
+
+# Spans kept in memory before they are appended to the span file of the process
+span_buffer_size = 500
+
+span_fields = [
+    "Name",
+    "Category",
+    "Start",
+    "Duration",
+    "Process",
+    "Thread",
+    "Depth",
+    "Input",
+    "Bytes",
+    "SOP Class",
+    "Outcome",
+    "Error",
+]
+
+_spans = []
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def tracing_folder():
+    """
+    Return the trace folder, or None when tracing is disabled.
+    """
+    return os.environ.get(trace_env_var)
+
+
+def enable_tracing(folder):
+    """
+    Enable tracing for this process and the worker processes it starts.
+
+    Spans are appended to spans_<pid>.jsonl files in the folder; export_trace merges them.
+
+    Args:
+        folder (str): The trace folder.
+    """
+    os.makedirs(folder, exist_ok=True)
+    os.environ[trace_env_var] = folder
+    install()
+
+
+def input_details(path):
+    """
+    Describe the input of a span.
+
+    Args:
+        path (str): A file or folder path.
+
+    Returns:
+        tuple: (size in bytes, SOP Class UID). The size of a folder is the total size of
+        its files; the SOP Class UID is empty for folders and non-DICOM files.
+    """
+    if os.path.isdir(path):
+        size = 0
+        for root, _, files in os.walk(path):
+            size += sum(os.path.getsize(os.path.join(root, file)) for file in files)
+        return size, ""
+
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return None, ""
+
+    try:
+        dataset = pydicom.dcmread(path, stop_before_pixels=True, specific_tags=["SOPClassUID"])
+        sop_class = str(dataset.get("SOPClassUID", ""))
+    except Exception:
+        sop_class = ""
+    return size, sop_class
+
+
+def find_input(args):
+    """
+    Return the input path of a traced call: its first argument that is an existing path,
+    or its first string argument (e.g. the protocol of write_dicom).
+    """
+    strings = [arg for arg in args if isinstance(arg, str)]
+    for arg in strings:
+        if os.path.exists(arg):
+            return arg
+    return strings[0] if strings else ""
+
+
+def flush_spans():
+    """
+    Append the buffered spans to the span file of this process.
+    """
+    folder = tracing_folder()
+    with _lock:
+        spans = _spans[:]
+        _spans.clear()
+    if not spans or not folder:
+        return
+
+    with open(os.path.join(folder, f"spans_{os.getpid()}.jsonl"), "a") as file:
+        file.writelines(json.dumps(span) + "\n" for span in spans)
+
+
+def record_span(name, category, function, args, kwargs):
+    """
+    Call a function inside a span and record the span.
+
+    Args:
+        name (str): The span name, e.g. "Cirrus.convert" or "cirrus_oct_converter.convert_dicom".
+        category (str): "domain" for DataDomain methods, "function" otherwise.
+        function (callable): The function.
+        args (tuple): The positional arguments of the call.
+        kwargs (dict): The keyword arguments of the call.
+
+    Returns:
+        The return value of the function; its exception is re-raised.
+    """
+    depth = getattr(_local, "depth", 0)
+    _local.depth = depth + 1
+    input_path = find_input(args)
+    size, sop_class = input_details(input_path) if os.path.exists(input_path) else (None, "")
+
+    span = {
+        "Name": name,
+        "Category": category,
+        "Start": time.time_ns() // 1000,
+        "Duration": 0,
+        "Process": os.getpid(),
+        "Thread": threading.get_ident(),
+        "Depth": depth,
+        "Input": input_path,
+        "Bytes": size,
+        "SOP Class": sop_class,
+        "Outcome": "success",
+        "Error": "",
+    }
+    start = time.perf_counter()
+    try:
+        return function(*args, **kwargs)
+    except Exception as e:
+        span["Outcome"] = "failure"
+        span["Error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        span["Duration"] = int((time.perf_counter() - start) * 1_000_000)
+        _local.depth = depth
+        with _lock:
+            _spans.append(span)
+            full = len(_spans) >= span_buffer_size
+        # Spans are written once per top-level call, so worker processes leave no spans behind
+        if depth == 0 or full:
+            flush_spans()
+
+
+def traced(function, name, category):
+    """
+    Wrap a function so that its calls are recorded while tracing is enabled.
+    """
+    if getattr(function, "__traced__", False):
+        return function
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if not tracing_folder():
+            return function(*args, **kwargs)
+        return record_span(name, category, function, args, kwargs)
+
+    wrapper.__traced__ = True
+    return wrapper
+
+
+def trace_methods(cls):
+    """
+    Wrap the DataDomain methods defined by a class (see DataDomain.__init_subclass__).
+
+    Args:
+        cls (type): The DataDomain subclass.
+    """
+    for method in traced_methods:
+        if method in cls.__dict__:
+            setattr(
+                cls,
+                method,
+                traced(cls.__dict__[method], f"{cls.__name__}.{method}", "domain"),
+            )
+
+
+def install():
+    """
+    Wrap the functions of the converter modules and utils imported so far, when tracing
+    is enabled. Calls made through the module (e.g. cirrus_oct_converter.convert_dicom)
+    are recorded; wrapping twice is a no-op.
+    """
+    if not tracing_folder():
+        return
+
+    for module_name, module in list(sys.modules.items()):
+        if not (module_name.endswith("_converter") or module_name in traced_utils_modules):
+            continue
+        for function_name in traced_functions:
+            function = getattr(module, function_name, None)
+            if callable(function):
+                setattr(
+                    module,
+                    function_name,
+                    traced(function, f"{module_name}.{function_name}", "function"),
+                )
+
+
+def load_spans(folder):
+    """
+    Load the spans of every process from a trace folder, ordered by start time.
+    """
+    spans = []
+    for path in glob.glob(os.path.join(folder, "spans_*.jsonl")):
+        with open(path, "r") as file:
+            spans += [json.loads(line) for line in file if line.strip()]
+    return sorted(spans, key=lambda span: span["Start"])
+
+
+def export_trace(folder):
+    """
+    Merge the spans of a trace folder into a Chrome trace-event file (trace.json, for
+    chrome://tracing or Perfetto) and a flat CSV (trace.csv).
+
+    Args:
+        folder (str): The trace folder.
+
+    Returns:
+        dict: The number of spans and the paths of the two exports.
+    """
+    flush_spans()
+    spans = load_spans(folder)
+
+    events = [
+        {
+            "name": span["Name"],
+            "cat": span["Category"],
+            "ph": "X",
+            "ts": span["Start"],
+            "dur": span["Duration"],
+            "pid": span["Process"],
+            "tid": span["Thread"],
+            "args": {
+                key: span[key] for key in ["Input", "Bytes", "SOP Class", "Outcome", "Error"]
+            },
+        }
+        for span in spans
+    ]
+    trace_path = os.path.join(folder, "trace.json")
+    with open(trace_path, "w") as file:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+
+    csv_path = os.path.join(folder, "trace.csv")
+    with open(csv_path, "w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=span_fields)
+        writer.writeheader()
+        writer.writerows(spans)
+
+    return {"Spans": len(spans), "Chrome trace": trace_path, "CSV": csv_path}
@@ -4,10 +4,15 @@ import re
 import shutil
 import string
 import sys
+import time
 import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import imaging_classifying_rules
+import imaging_writer
+import imaging_zip_input
 import pydicom
 from bs4 import BeautifulSoup
 
@@ -62,79 +67,274 @@ def list_zip_files(directory):
     return zip_files
 
 
-def unzip_fda_file(input_zip_path, output_folder_path):
+# Device folder and member filter for each kind of FDA zip, checked in this order
+zip_device_mapping = {
+    "maestro2": ("Maestro2", lambda name: True),
+    "triton": ("Triton", lambda name: True),
+    "cirrus": ("Cirrus", lambda name: name.lower().endswith(".dcm")),
+}
+
+
+def zip_device_key(zip_path):
+    """
+    Return the key of zip_device_mapping an FDA zip belongs to.
+
+    Args:
+        zip_path (str): The path to the zip file.
+
+    Returns:
+        str: The key, or None if the zip is not an FDA zip of a known device.
+    """
+    name = os.path.basename(zip_path).lower()
+    if "fda" not in name:
+        return None
+    return next((key for key in zip_device_mapping if key in name), None)
+
+
+def list_fda_zip_files(directory, keys):
+    """
+    List the FDA zip files of some devices in a directory.
+
+    The zips are selected as unzip_fda_file selects them: only zips with "fda" in
+    their name, and only those of the given devices.
+
+    Args:
+        directory (str): The path to the directory to search for zip files.
+        keys (list): The keys of zip_device_mapping to keep, e.g. ["maestro2", "triton"].
+
+    Returns:
+        list: A list of file paths for each matching zip file.
+    """
+    return [
+        zip_path for zip_path in list_zip_files(directory) if zip_device_key(zip_path) in keys
+    ]
+
+# Size of the buffer used to stream zip members to disk
+zip_copy_buffer_size = 16 * 1024 * 1024
+
+
+def extract_zip_members(zip_ref, destination, keep):
+    """
+    Stream the selected members of an open zip file into a destination folder.
+
+    Members are filtered by name before anything is written, and each one is
+    copied with a large buffer. Reading a member to its end verifies its CRC,
+    so a corrupt member raises zipfile.BadZipFile (or zlib.error).
+
+    Args:
+        zip_ref (zipfile.ZipFile): The open zip file.
+        destination (str): The folder where the members are written.
+        keep (callable): Function taking a member name and returning True if the member is extracted.
+
+    Returns:
+        tuple: The number of members and the number of bytes written.
+    """
+    destination_root = os.path.realpath(destination)
+    members = 0
+    total_bytes = 0
+
+    for info in zip_ref.infolist():
+        if info.is_dir() or not keep(info.filename):
+            continue
+
+        target = os.path.realpath(os.path.join(destination_root, info.filename))
+        if not target.startswith(destination_root + os.sep):
+            print(f"Skipping zip member outside of the output folder: {info.filename}")
+            continue
+
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            with zip_ref.open(info) as source, open(target, "wb") as dest:
+                shutil.copyfileobj(source, dest, zip_copy_buffer_size)
+        except (zipfile.BadZipFile, zlib.error):
+            # Do not leave a truncated or corrupt member behind
+            os.remove(target)
+            raise
+
+        members += 1
+        total_bytes += info.file_size
+
+    return members, total_bytes
+
+
+def move_folder_contents(source, destination):
+    """
+    Move every file and folder of a folder into another folder, keeping the relative
+    paths, and remove the emptied source folder.
+
+    Both folders must be on the same file system, so each file is renamed, not copied.
+
+    Args:
+        source (str): The folder to empty.
+        destination (str): The folder receiving the files (created if needed).
+
+    Returns:
+        tuple: The number of files and the number of bytes moved.
+    """
+    files_moved = 0
+    total_bytes = 0
+    for root, _, files in os.walk(source):
+        target_root = os.path.normpath(
+            os.path.join(destination, os.path.relpath(root, source))
+        )
+        os.makedirs(target_root, exist_ok=True)
+        for file in files:
+            source_path = os.path.join(root, file)
+            total_bytes += os.path.getsize(source_path)
+            os.replace(source_path, os.path.join(target_root, file))
+            files_moved += 1
+    shutil.rmtree(source)
+    return files_moved, total_bytes
+
+
+def unzip_staging_folder(output_folder_path):
+    """
+    Return the folder where zips are unpacked before being moved into an output folder.
+
+    It sits next to the output folder (so moving out of it is a rename), and not inside
+    it, so the steps reading the output folder never see a half unpacked zip.
+
+    Args:
+        output_folder_path (str): The output folder.
+
+    Returns:
+        str: The staging folder.
+    """
+    return os.path.normpath(output_folder_path) + "_unzipping"
+
+
+def unzip_fda_file(input_zip_path, output_folder_path, organize=None):
     """
     Unzips the contents of a zip file into the specified output folder based on specific criteria.
 
     The function will only unzip files if they contain 'fda' in their name. It also categorizes the files into
-    'Maestro2' or 'Triton' folders based on their names. If the file does not meet these criteria, it will be skipped.
+    'Maestro2', 'Triton' or 'Cirrus' folders based on their names. If the file does not meet these criteria,
+    it will be skipped. For Cirrus only the *.dcm members are extracted.
+
+    With an organize function, the acquisition folders of the zip are organized straight out of the
+    archive into the output folder (the organize layout, e.g. step2_organized) instead.
+
+    The zip is first unpacked into a staging folder (see unzip_staging_folder) and only moved into the
+    output folder once every member was read. A corrupt zip (bad CRC) leaves nothing behind.
 
     Parameters:
     input_zip_path (str): Path to the input zip file.
-    output_folder_path (str): Path to the output folder where files will be extracted.
+    output_folder_path (str): Path to the output folder where files will be extracted or organized.
+    organize (callable, optional): Function taking an acquisition folder inside the zip and an output
+        folder, and returning its organize dictionary (e.g. Cirrus().organize).
 
     Returns:
-    dict: A dictionary containing the input zip path and the unzipping status.
+    dict: A dictionary containing the input zip path, the unzipping status, the number of files and
+    bytes written, the elapsed seconds and the throughput in MB/s. With an organize function, also
+    "Organized" (the organize dictionaries) and "Errors" (the acquisitions that failed to organize,
+    as {"Input": folder, "Error": message}).
     """
     input_name = input_zip_path.split("/")[-1].replace(".", "_")
     input_name = input_name[:-4] if input_name.endswith("_zip") else input_name
 
-    if "fda" not in input_zip_path.lower():
-        dic = {
-            "Input": f"{input_zip_path}",
-            "Unzipping": "no fda file will be skipped",
-        }
-
-        return dic
-
-    elif "maestro2" in input_zip_path.lower():
-        # Create the output folder if it doesn't exist
-        maestro2 = f"{output_folder_path}/Maestro2/{input_name}"
-        os.makedirs(maestro2, exist_ok=True)
-
-        # Unzip the contents of the zip file into the output folder
-        with zipfile.ZipFile(input_zip_path, "r") as zip_ref:
-            zip_ref.extractall(maestro2)
-
-        dic = {"Input": f"{input_zip_path}", "Unzipping": "correct"}
-
-        return dic
+    key = zip_device_key(input_zip_path)
+    if key is None:
+        if "fda" not in os.path.basename(input_zip_path).lower():
+            status = "no fda file will be skipped"
+        else:
+            print("unknown")
+            status = "unknown"
+        return {"Input": f"{input_zip_path}", "Unzipping": status}
+
+    device_folder, keep = zip_device_mapping[key]
+    staging = os.path.join(unzip_staging_folder(output_folder_path), input_name)
+    if os.path.exists(staging):
+        shutil.rmtree(staging)
+    os.makedirs(staging)
+
+    organized = []
+    errors = []
+    start = time.perf_counter()
+    try:
+        if organize is None:
+            with zipfile.ZipFile(input_zip_path, "r") as zip_ref:
+                extract_zip_members(zip_ref, staging, keep)
+            destination = f"{output_folder_path}/{device_folder}/{input_name}"
+        else:
+            for folder in imaging_zip_input.list_subfolders(input_zip_path):
+                try:
+                    organized.append(organize(folder, staging))
+                except (zipfile.BadZipFile, zlib.error):
+                    raise
+                except Exception as e:
+                    errors.append({"Input": folder, "Error": str(e)})
+            destination = output_folder_path
+        members, total_bytes = move_folder_contents(staging, destination)
+        status = "correct"
+    except (zipfile.BadZipFile, zlib.error) as e:
+        members, total_bytes = 0, 0
+        status = f"bad zip file: {e}"
+    finally:
+        # Do not leave the members read before an error behind
+        shutil.rmtree(staging, ignore_errors=True)
+    seconds = time.perf_counter() - start
+
+    for dic in organized:
+        if dic.get("Output"):
+            dic["Output"] = dic["Output"].replace(staging, output_folder_path, 1)
 
-    elif "triton" in input_zip_path.lower():
-        # Create the output folder if it doesn't exist
-        triton = f"{output_folder_path}/Triton/{input_name}"
-        os.makedirs(triton, exist_ok=True)
+    dic = {
+        "Input": f"{input_zip_path}",
+        "Unzipping": status,
+        "Members": members,
+        "Bytes": total_bytes,
+        "Seconds": round(seconds, 3),
+        "MB/s": round(total_bytes / (1024**2) / seconds, 2) if seconds > 0 else 0,
+    }
+    if organize is not None:
+        dic["Organized"] = organized
+        dic["Errors"] = errors
 
-        # Unzip the contents of the zip file into the output folder
-        with zipfile.ZipFile(input_zip_path, "r") as zip_ref:
-            zip_ref.extractall(triton)
-        dic = {"Input": f"{input_zip_path}", "Unzipping": "correct"}
+    return dic
 
-        return dic
 
-    elif "cirrus" in input_zip_path.lower():
-        # Create the output folder if it doesn't exist
-        cirrus = f"{output_folder_path}/Cirrus/{input_name}"
-        os.makedirs(cirrus, exist_ok=True)
+def unzip_fda_files(zip_paths, output_folder_path, max_workers=4, organize=None):
+    """
+    Unzip several FDA zip files concurrently and print a throughput report.
 
-        # Unzip the contents of the zip file into the output folder
-        with zipfile.ZipFile(input_zip_path, "r") as zip_ref:
-            zip_ref.extractall(cirrus)
+    Decompression and writing release the GIL, so a bounded thread pool keeps
+    several zips in flight without holding more than max_workers open at once.
 
-        for root, dirs, files in os.walk(cirrus):
-            for file in files:
-                if not file.lower().endswith(".dcm"):
-                    os.remove(os.path.join(root, file))
+    Args:
+        zip_paths (list): Paths to the zip files (e.g. from list_zip_files).
+        output_folder_path (str): Path to the output folder where files will be extracted.
+        max_workers (int): Maximum number of zips processed at the same time.
+        organize (callable, optional): Organize the acquisitions of each zip into the output
+            folder instead of extracting them, see unzip_fda_file. It is called from several
+            threads at once.
 
-        dic = {"Input": f"{input_zip_path}", "Unzipping": "correct"}
+    Returns:
+        list: One unzip_fda_file dictionary per zip, in the input order.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(
+            executor.map(
+                lambda zip_path: unzip_fda_file(zip_path, output_folder_path, organize),
+                zip_paths,
+            )
+        )
 
-        return dic
+    staging = unzip_staging_folder(output_folder_path)
+    if os.path.isdir(staging) and not os.listdir(staging):
+        os.rmdir(staging)
 
-    else:
-        print("unknown")
-        dic = {"Input": f"{input_zip_path}", "Unzipping": "unknown"}
+    for dic in results:
+        if "Bytes" in dic:
+            print(
+                f"{dic['Input']}: {dic['Unzipping']}, {dic['Members']} files, "
+                f"{dic['Bytes'] / 1024 ** 2:.1f} MB in {dic['Seconds']} s ({dic['MB/s']} MB/s)"
+            )
+        else:
+            print(f"{dic['Input']}: {dic['Unzipping']}")
+        for error in dic.get("Errors", []):
+            print(f"ERROR organizing {error['Input']}: {error['Error']}")
 
-        return dic
+    return results
 
 import os
 
@@ -149,13 +349,14 @@ def get_filtered_file_names(folder_path):
       - any '.csv' files
 
     Args:
-        folder_path (str): The path to the folder to search for files.
+        folder_path (str): The path to the folder to search for files. Folders inside zip
+            archives ("archive.zip::/folder") are listed without extracting them.
 
     Returns:
         list: A list of filtered file paths.
     """
     filtered_files = []
-    for root, _, files in os.walk(folder_path):
+    for root, _, files in imaging_zip_input.walk(folder_path):
         for file in files:
             if file.lower().endswith(".csv"):  # skip CSV files
                 continue
@@ -307,14 +508,10 @@ def list_subfolders(folder_path):
         list: A list of paths to subfolders.
     """
 
-    if not os.path.isdir(folder_path):
+    if not imaging_zip_input.isdir(folder_path):
         print("Invalid folder path.")
         return []
-    subfolders = [
-        os.path.join(folder_path, item)
-        for item in os.listdir(folder_path)
-        if os.path.isdir(os.path.join(folder_path, item))
-    ]
+    subfolders = imaging_zip_input.list_subfolders(folder_path)
     return subfolders
 
 
@@ -542,7 +739,7 @@ def topcon_check_files_expected(folder_path):
 
     files_count_9 = 0
 
-    for root, dirs, files in os.walk(folder_path):
+    for root, dirs, files in imaging_zip_input.walk(folder_path):
         for file in files:
             if file.endswith(
                 (
@@ -579,7 +776,7 @@ def cirrus_check_files_expected(folder_path):
 
     files_count = 0
 
-    for root, dirs, files in os.walk(folder_path):
+    for root, dirs, files in imaging_zip_input.walk(folder_path):
         for file in files:
             if file.endswith((".dcm",)) and file.startswith("A"):
                 files_count += 1
@@ -1080,7 +1277,7 @@ def format_file(file, output):
         os.makedirs(full_dir_path, exist_ok=True)
         filename = os.path.basename(file)
         full_file_path = os.path.join(full_dir_path, filename)
-        shutil.copy(file, full_file_path)
+        imaging_writer.copy_file(file, full_file_path)
     else:
         # try:
         #     # Check if dataset has pixel data
@@ -1101,7 +1298,7 @@ def format_file(file, output):
             os.makedirs(full_dir_path, exist_ok=True)
             filename = os.path.basename(file)
             full_file_path = os.path.join(full_dir_path, filename)
-            dataset.save_as(full_file_path)
+            imaging_writer.save_dataset(dataset, full_file_path)
 
         else:
             uid = dataset.SOPInstanceUID
@@ -1182,7 +1379,7 @@ def format_file(file, output):
 
             full_file_path = os.path.join(full_dir_path, filename)
 
-            dataset.save_as(full_file_path)
+            imaging_writer.save_dataset(dataset, full_file_path)
 
             return full_file_path
 # def format_file(file, output):
@@ -1466,7 +1663,20 @@ def check_critical_info_from_files_in_folder(folder):
 
     file = files[0]
 
-    dataset = pydicom.dcmread(file)
+    dataset = imaging_zip_input.dcmread(file, stop_before_pixels=True)
+    return check_critical_info_from_dataset(dataset)
+
+
+def check_critical_info_from_dataset(dataset):
+    """
+    Check for critical information in an already loaded DICOM dataset.
+
+    Args:
+        dataset (pydicom.Dataset): The DICOM dataset (pixel data is not needed).
+
+    Returns:
+        str: "critical_info_missing" if critical information is missing, "pass" otherwise.
+    """
     try:
         uid = dataset.SOPInstanceUID
     except AttributeError:
@@ -1483,7 +1693,6 @@ def check_critical_info_from_files_in_folder(folder):
 import os
 import sys
 
-sys.path.append("/Users/nayoonkim/pipeline_imaging/a_year3/year_3")
 
 import os
 
@@ -1502,10 +1711,14 @@ def replace_last_three(path, a, b, c):
 
 # for i in [file11, file22, file33, file44]:  # , b, c, d, e, f
 
-def get_protocol_updated(i):
+def get_protocol_updated(i, dataset=None):
     main = i
-    ds = pydicom.dcmread(main)
-    protocol = imaging_classifying_rules.find_rule(main)
+    ds = (
+        dataset
+        if dataset is not None
+        else imaging_zip_input.dcmread(main, stop_before_pixels=True)
+    )
+    protocol = imaging_classifying_rules.find_rule(main, ds)
 
     make_unknown = False
 
@@ -1545,16 +1758,16 @@ def get_protocol_updated(i):
     # --- Check 7 (segmentation file 7.3.dcm)
     if "triton_macula_12x12_octa" in protocol or "triton_macula_6x6_octa" in protocol:
         segmentation_path = replace_last_three(main, "7", "3", "dcm")
-        if os.path.exists(segmentation_path):
-            seg = pydicom.dcmread(segmentation_path)
+        if imaging_zip_input.exists(segmentation_path):
+            seg = imaging_zip_input.dcmread(segmentation_path, stop_before_pixels=True)
             if len(seg.SegmentSequence) == 9:
                 make_unknown = True
 
     # --- Check 8 (op file 2.1.dcm)
     if "triton_macula_6x6_octa" in protocol:
         op_path = replace_last_three(main, "2", "1", "dcm")
-        if os.path.exists(op_path):
-            op = pydicom.dcmread(op_path)
+        if imaging_zip_input.exists(op_path):
+            op = imaging_zip_input.dcmread(op_path, stop_before_pixels=True)
             if op.get("PixelSpacing") is None:
                 make_unknown = True
 
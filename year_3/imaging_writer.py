@@ -0,0 +1,498 @@
+import contextlib
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pydicom
+
+# Threads writing converted DICOMs in the background
+writer_threads = 2
+
+# Bytes of pixel data queued for writing before the converters have to wait
+writer_max_queued_bytes = 1024 * 1024 * 1024
+
+# When written files are flushed to the disk: never, once per step (flush_writer), or after each file
+fsync_policies = ["none", "batch", "each"]
+
+# Buffer used to copy and hash files
+copy_buffer_size = 1024 * 1024
+
+# BLAKE2b digest size in bytes of the file and pixel data checksums
+checksum_digest_size = 32
+
+# Elements holding the pixel data payload of a dataset
+pixel_data_keywords = ["PixelData", "FloatPixelData", "DoubleFloatPixelData"]
+
+# Permissions of new files under the current umask (temp files are created as 0600)
+_umask = os.umask(0)
+os.umask(_umask)
+file_mode = 0o666 & ~_umask
+
+_writer = None
+
+# Input (and its protocol) whose conversion submits the writes of the current thread
+_source = threading.local()
+
+# Absolute path -> checksums of the files written by this process
+_checksums = {}
+_checksums_lock = threading.Lock()
+
+
+def new_checksum():
+    """
+    Return an empty BLAKE2b hash of checksum_digest_size bytes.
+    """
+    return hashlib.blake2b(digest_size=checksum_digest_size)
+
+
+class HashingFile:
+    """
+    Binary file wrapper hashing the bytes while they are written.
+
+    If the writer seeks back and overwrites bytes, the running hash no longer matches
+    the file and hexdigest returns None.
+    """
+
+    def __init__(self, file):
+        self.file = file
+        self.name = file.name
+        self.hash = new_checksum()
+        self.position = 0
+        self.end = 0
+        self.rewritten = False
+
+    def write(self, data):
+        if self.position != self.end:
+            self.rewritten = True
+        written = self.file.write(data)
+        if not self.rewritten:
+            self.hash.update(data)
+        self.position += written
+        self.end = max(self.end, self.position)
+        return written
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        self.position = self.file.seek(offset, whence)
+        return self.position
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def hexdigest(self):
+        return None if self.rewritten else self.hash.hexdigest()
+
+
+def file_checksum(path):
+    """
+    Return the BLAKE2b checksum of a file, read in chunks.
+    """
+    checksum = new_checksum()
+    with open(path, "rb") as file:
+        while True:
+            chunk = file.read(copy_buffer_size)
+            if not chunk:
+                break
+            checksum.update(chunk)
+    return checksum.hexdigest()
+
+
+def pixel_data_checksum(dataset):
+    """
+    Return the BLAKE2b checksum of the pixel data payload of a dataset, or None if it has none.
+
+    The payload is the value of PixelData (native or encapsulated), FloatPixelData or
+    DoubleFloatPixelData as it is stored in the file: an odd-length value is hashed with the
+    NUL byte pydicom pads it with on write, so a dataset about to be written and the same
+    file read back have the same checksum.
+    """
+    checksum = new_checksum()
+    found = False
+    for keyword in pixel_data_keywords:
+        if keyword in dataset and dataset[keyword].value:
+            value = dataset[keyword].value
+            checksum.update(value)
+            if len(value) % 2:
+                checksum.update(b"\x00")
+            found = True
+    return checksum.hexdigest() if found else None
+
+
+def record_checksums(path, checksums):
+    """
+    Remember the checksums of a file written by this process.
+    """
+    with _checksums_lock:
+        _checksums[os.path.abspath(path)] = checksums
+
+
+def file_checksums(path, dataset=None):
+    """
+    Return the file and pixel data checksums of a DICOM file.
+
+    Files written by this process through save_dataset, write_dataset or copy_file are
+    looked up without reading them. Other files are hashed, reusing the dataset if the
+    caller has already read it.
+
+    Args:
+        path (str): The DICOM file.
+        dataset (pydicom.Dataset, optional): The dataset of the file, if already read.
+
+    Returns:
+        dict: "file_blake2b" and "pixel_data_blake2b" (None if the file has no pixel data
+        or cannot be read).
+    """
+    with _checksums_lock:
+        recorded = _checksums.get(os.path.abspath(path))
+    if recorded is not None:
+        return dict(recorded)
+
+    try:
+        if dataset is None:
+            dataset = pydicom.dcmread(path)
+        pixel_checksum = pixel_data_checksum(dataset)
+    except Exception:
+        pixel_checksum = None
+    return {"file_blake2b": file_checksum(path), "pixel_data_blake2b": pixel_checksum}
+
+
+def atomic_write(path, write, fsync=False):
+    """
+    Write a file through a temp file in the same folder, renamed over the path once complete.
+
+    The temp file is hidden (".name.xxxx.tmp"), so get_filtered_file_names never picks up
+    one left by a crash, and readers never see a truncated file under the final name.
+
+    Args:
+        path (str): The final path.
+        write (callable): Function writing the content to the binary file object it is given.
+        fsync (bool): Flush the file to the disk before it is renamed.
+
+    Returns:
+        str: The BLAKE2b checksum of the file, computed while it is written.
+    """
+    folder = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(
+        dir=folder, prefix=f".{os.path.basename(path)}.", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "wb") as file:
+            hashing_file = HashingFile(file)
+            write(hashing_file)
+            if fsync:
+                file.flush()
+                os.fsync(file.fileno())
+        checksum = hashing_file.hexdigest() or file_checksum(temp_path)
+        os.chmod(temp_path, file_mode)
+        os.replace(temp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temp_path)
+        raise
+    return checksum
+
+
+def save_dataset(dataset, path, fsync=False, **kwargs):
+    """
+    Atomically write a DICOM dataset and record its checksums (see file_checksums).
+
+    Args:
+        dataset (pydicom.Dataset): The dataset.
+        path (str): The output file.
+        fsync (bool): Flush the file to the disk before it is renamed.
+        **kwargs: Passed to pydicom.dcmwrite (e.g. write_like_original=False).
+
+    Returns:
+        dict: "file_blake2b" and "pixel_data_blake2b" of the written file.
+    """
+    checksums = {
+        "file_blake2b": atomic_write(
+            path, lambda file: pydicom.dcmwrite(file, dataset, **kwargs), fsync
+        ),
+        "pixel_data_blake2b": pixel_data_checksum(dataset),
+    }
+    record_checksums(path, checksums)
+    return checksums
+
+
+def copy_file(source, path, fsync=False):
+    """
+    Atomically copy a file and record its checksum (see file_checksums).
+
+    The pixel data checksum of a copy is None: files are copied as bytes, without
+    being parsed.
+
+    Args:
+        source (str): The file to copy.
+        path (str): The destination file.
+        fsync (bool): Flush the copy to the disk before it is renamed.
+
+    Returns:
+        dict: "file_blake2b" and "pixel_data_blake2b" of the copy.
+    """
+    with open(source, "rb") as source_file:
+        checksums = {
+            "file_blake2b": atomic_write(
+                path,
+                lambda file: shutil.copyfileobj(source_file, file, copy_buffer_size),
+                fsync,
+            ),
+            "pixel_data_blake2b": None,
+        }
+    record_checksums(path, checksums)
+    return checksums
+
+
+def fsync_files(paths):
+    """
+    Flush written files and the folders holding them (so the renames persist) to the disk.
+
+    Args:
+        paths (list): The written files.
+    """
+    for path in paths:
+        with open(path, "rb") as file:
+            os.fsync(file.fileno())
+
+    for folder in {os.path.dirname(os.path.abspath(path)) for path in paths}:
+        with contextlib.suppress(OSError):
+            fd = os.open(folder, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+
+def dataset_size(dataset):
+    """
+    Estimate the bytes a dataset holds in memory from its pixel data.
+    """
+    return sum(
+        len(dataset[keyword].value or b"")
+        for keyword in ("PixelData", "FloatPixelData", "DoubleFloatPixelData")
+        if keyword in dataset
+    )
+
+
+class OutputWriter:
+    """
+    Write-behind service for converted DICOMs.
+
+    Datasets are written by background threads with save_dataset while the converter
+    moves on to the next input. When the queued datasets hold more than
+    max_queued_bytes of pixel data, submit waits for writes to finish, so a fast
+    converter cannot fill the memory with pending outputs.
+
+    A dataset must not be modified after it has been submitted.
+
+    Args:
+        n_threads (int): Background writing threads.
+        max_queued_bytes (int): Pixel data bytes queued at most.
+        fsync (str): One of fsync_policies.
+    """
+
+    def __init__(self, n_threads=writer_threads, max_queued_bytes=writer_max_queued_bytes, fsync="batch"):
+        if fsync not in fsync_policies:
+            raise ValueError(f"Unknown fsync policy: {fsync} (expected one of {', '.join(fsync_policies)})")
+        self.max_queued_bytes = max_queued_bytes
+        self.fsync = fsync
+        self.executor = ThreadPoolExecutor(max_workers=n_threads)
+        self.condition = threading.Condition()
+        self.queued_bytes = 0
+        self.futures = []
+
+    def submit(self, dataset, path, **kwargs):
+        """
+        Queue a dataset for writing.
+
+        Args:
+            dataset (pydicom.Dataset): The dataset.
+            path (str): The output file.
+            **kwargs: Passed to pydicom.dcmwrite.
+
+        Returns:
+            concurrent.futures.Future: The future of the write result (see write).
+        """
+        size = dataset_size(dataset)
+        with self.condition:
+            while self.queued_bytes and self.queued_bytes + size > self.max_queued_bytes:
+                self.condition.wait()
+            self.queued_bytes += size
+
+        source = getattr(_source, "value", None)
+        future = self.executor.submit(self.write, dataset, path, size, kwargs, source)
+        self.futures.append(future)
+        return future
+
+    def write(self, dataset, path, size, kwargs, source=None):
+        """
+        Write one queued dataset.
+
+        Returns:
+            dict: "Path", "Source" (the (input, protocol) given to writing_for, or None),
+            "Bytes" (size of the file), "Seconds" and "Checksums" of the write, or "Error"
+            instead of "Checksums" if it failed.
+        """
+        start = time.perf_counter()
+        try:
+            checksums = save_dataset(dataset, path, fsync=self.fsync == "each", **kwargs)
+            return {
+                "Path": path,
+                "Source": source,
+                "Bytes": os.path.getsize(path),
+                "Seconds": time.perf_counter() - start,
+                "Checksums": checksums,
+            }
+        except Exception as e:
+            return {
+                "Path": path,
+                "Source": source,
+                "Bytes": 0,
+                "Seconds": time.perf_counter() - start,
+                "Error": str(e),
+            }
+        finally:
+            with self.condition:
+                self.queued_bytes -= size
+                self.condition.notify_all()
+
+    def flush(self):
+        """
+        Wait for the queued writes and, under the "batch" policy, flush them to the disk.
+
+        Returns:
+            list: The result of each write since the previous flush.
+        """
+        futures, self.futures = self.futures, []
+        results = [future.result() for future in futures]
+        if self.fsync == "batch":
+            fsync_files([result["Path"] for result in results if "Error" not in result])
+        return results
+
+    def close(self):
+        """
+        Flush the queued writes and stop the threads.
+
+        Returns:
+            list: The result of each write since the previous flush.
+        """
+        results = self.flush()
+        self.executor.shutdown()
+        return results
+
+
+def start_writer(**kwargs):
+    """
+    Send the writes of write_dataset to a new OutputWriter until stop_writer is called.
+
+    Args:
+        **kwargs: Passed to OutputWriter.
+    """
+    global _writer
+    stop_writer()
+    _writer = OutputWriter(**kwargs)
+
+
+def stop_writer():
+    """
+    Flush and stop the writer started by start_writer, if any.
+
+    Returns:
+        list: The results of the writes not flushed yet.
+    """
+    global _writer
+    if _writer is None:
+        return []
+    results = _writer.close()
+    _writer = None
+    return results
+
+
+@contextlib.contextmanager
+def writing_for(input_path, protocol=""):
+    """
+    Link the writes submitted by the current thread in this block to the input being
+    converted, so flush_writer can report a failed background write against it.
+
+    Args:
+        input_path (str): The input file or folder, as logged by the conversion.
+        protocol (str): The protocol of the input.
+    """
+    previous = getattr(_source, "value", None)
+    _source.value = (input_path, protocol)
+    try:
+        yield
+    finally:
+        _source.value = previous
+
+
+def write_dataset(dataset, path, **kwargs):
+    """
+    Write a converted dataset: in the background if a writer is started, else atomically
+    in the calling thread.
+
+    Args:
+        dataset (pydicom.Dataset): The dataset.
+        path (str): The output file.
+        **kwargs: Passed to pydicom.dcmwrite.
+    """
+    if _writer is not None:
+        _writer.submit(dataset, path, **kwargs)
+    else:
+        save_dataset(dataset, path, **kwargs)
+
+
+def flush_writer(run_log=None, step="step3_write", source_step="step3_convert"):
+    """
+    Wait for the background writes of the started writer and log each of them.
+
+    Call it at the end of a step, before its outputs are read.
+
+    A conversion is logged as a success when it returns, before its files are written.
+    So a failed write submitted under writing_for also gets a failure record for its
+    input in source_step, and the summary of that step counts the input as failed.
+
+    Args:
+        run_log (RunLog, optional): Log receiving one record per written file; the
+            protocol is the one given to writing_for, else the name of the folder of the file.
+        step (str): The step of the records.
+        source_step (str): The step of the conversions whose writes failed.
+
+    Returns:
+        list: The write results (see OutputWriter.write).
+    """
+    if _writer is None:
+        return []
+    results = _writer.flush()
+    if run_log is not None:
+        for result in results:
+            source, protocol = result["Source"] or (None, "")
+            run_log.record(
+                step,
+                result["Path"],
+                "FAILURE" if "Error" in result else "SUCCESS",
+                protocol=protocol or os.path.basename(os.path.dirname(result["Path"])),
+                converter="imaging_writer.save_dataset",
+                seconds=result["Seconds"],
+                size=result["Bytes"],
+                error_message=result.get("Error", ""),
+            )
+            if "Error" in result and source is not None:
+                run_log.record(
+                    source_step,
+                    source,
+                    "FAILURE",
+                    protocol=protocol,
+                    converter="imaging_writer.save_dataset",
+                    error_message=f"Writing {result['Path']} failed: {result['Error']}",
+                )
+    return results
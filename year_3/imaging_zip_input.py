@@ -0,0 +1,322 @@
+import builtins
+import os
+import shutil
+import threading
+import zipfile
+
+import pydicom
+
+# Separator between a zip archive and a member path, e.g. "/data/maestro2_fda.zip::/folder/2.1.1.dcm"
+zip_separator = "::"
+
+# Size of the buffer used when a member is written to disk
+zip_copy_buffer_size = 16 * 1024 * 1024
+
+_archives = {}
+_archives_lock = threading.Lock()
+
+
+class ZipArchive:
+    """
+    An open zip archive with an index of its members and folders.
+
+    Members left out by the member filter of the zip (see member_filter) are not
+    indexed, so they are never listed, read or materialized.
+
+    Attributes:
+        path (str): The path to the zip file.
+        zip_ref (zipfile.ZipFile): The open zip file.
+        members (dict): Maps each member path (without trailing "/") to its ZipInfo.
+        folders (dict): Maps each folder path ("" is the root) to the set of its entries.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.zip_ref = zipfile.ZipFile(path, "r")
+        self.members = {}
+        self.folders = {"": set()}
+        keep = member_filter(path)
+
+        for info in self.zip_ref.infolist():
+            name = info.filename.strip("/")
+            if not name:
+                continue
+            if not info.is_dir():
+                if not keep(info.filename):
+                    continue
+                self.members[name] = info
+            parts = name.split("/")
+            for depth in range(len(parts)):
+                parent = "/".join(parts[:depth])
+                self.folders.setdefault(parent, set()).add(parts[depth])
+            if info.is_dir():
+                self.folders.setdefault(name, set())
+
+
+def member_filter(archive):
+    """
+    Return the member filter of a zip, as imaging_utils.zip_device_mapping defines it:
+    a zip read in place lists the members an extraction would have kept (the .dcm
+    files of a Cirrus zip), and every member of any other zip.
+
+    Args:
+        archive (str): The path to the zip file.
+
+    Returns:
+        callable: Function taking a member name and returning True if the member is kept.
+    """
+    import imaging_utils  # imaging_utils imports this module
+
+    key = imaging_utils.zip_device_key(archive)
+    return imaging_utils.zip_device_mapping[key][1] if key else lambda name: True
+
+
+def is_zip_path(path):
+    """
+    Check whether a path points into a zip archive.
+
+    Both "archive.zip::/member" paths and the path of a zip file itself count.
+
+    Args:
+        path (str): The path to check.
+
+    Returns:
+        bool: True if the path is read through a zip archive, False otherwise.
+    """
+    path = str(path)
+    return zip_separator in path or (
+        path.lower().endswith(".zip") and os.path.isfile(path)
+    )
+
+
+def split_zip_path(path):
+    """
+    Split a zip path into the archive path and the member path.
+
+    Args:
+        path (str): A path such as "archive.zip::/folder/file.dcm" or "archive.zip".
+
+    Returns:
+        tuple: The archive path and the member path ("" for the archive root).
+    """
+    archive, _, member = str(path).partition(zip_separator)
+    return archive, member.strip("/")
+
+
+def join_zip_path(archive, member=""):
+    """
+    Build the zip path of a member.
+
+    Members are always written as "archive.zip::/member" so that os.path.dirname and
+    os.path.basename behave as they do on regular paths.
+
+    Args:
+        archive (str): The path to the zip file.
+        member (str): The member path inside the archive ("" for the root).
+
+    Returns:
+        str: The zip path.
+    """
+    if member:
+        return f"{archive}{zip_separator}/{member}"
+    return f"{archive}{zip_separator}"
+
+
+def get_archive(archive):
+    """
+    Return the open archive for a zip file, opening and indexing it on first use.
+
+    Args:
+        archive (str): The path to the zip file.
+
+    Returns:
+        ZipArchive: The cached archive.
+    """
+    with _archives_lock:
+        if archive not in _archives:
+            _archives[archive] = ZipArchive(archive)
+        return _archives[archive]
+
+
+def close_archives():
+    """
+    Close every cached zip archive.
+    """
+    with _archives_lock:
+        for archive in _archives.values():
+            archive.zip_ref.close()
+        _archives.clear()
+
+
+def open(path, mode="rb"):
+    """
+    Open a regular file or a zip member as a binary, seekable file-like object.
+
+    Args:
+        path (str): A regular path or a zip path.
+        mode (str): The mode used for regular files.
+
+    Returns:
+        file object: The open file or zip member.
+    """
+    if not is_zip_path(path):
+        return builtins.open(path, mode)
+    archive, member = split_zip_path(path)
+    zip_archive = get_archive(archive)
+    return zip_archive.zip_ref.open(zip_archive.members[member])
+
+
+def dcmread(path, **kwargs):
+    """
+    Read a DICOM file from disk or straight out of a zip archive.
+
+    With stop_before_pixels=True only the header bytes of a zip member are decompressed.
+
+    Args:
+        path (str): A regular path or a zip path.
+        **kwargs: Keyword arguments passed to pydicom.dcmread.
+
+    Returns:
+        pydicom.Dataset: The DICOM dataset.
+    """
+    if not is_zip_path(path):
+        return pydicom.dcmread(path, **kwargs)
+    with open(path) as member:
+        return pydicom.dcmread(member, **kwargs)
+
+
+def exists(path):
+    """
+    Check whether a regular path or a zip path exists.
+    """
+    if not is_zip_path(path):
+        return os.path.exists(path)
+    return isfile(path) or isdir(path)
+
+
+def isfile(path):
+    """
+    Check whether a regular path or a zip path is a file.
+    """
+    if not is_zip_path(path):
+        return os.path.isfile(path)
+    archive, member = split_zip_path(path)
+    return member in get_archive(archive).members
+
+
+def isdir(path):
+    """
+    Check whether a regular path or a zip path is a folder. The root of an archive is a folder.
+    """
+    if not is_zip_path(path):
+        return os.path.isdir(path)
+    archive, member = split_zip_path(path)
+    return member in get_archive(archive).folders
+
+
+def getsize(path):
+    """
+    Return the (uncompressed) size in bytes of a regular file or a zip member.
+    """
+    if not is_zip_path(path):
+        return os.path.getsize(path)
+    archive, member = split_zip_path(path)
+    return get_archive(archive).members[member].file_size
+
+
+def listdir(path):
+    """
+    List the entries of a regular folder or of a folder inside a zip archive.
+    """
+    if not is_zip_path(path):
+        return os.listdir(path)
+    archive, member = split_zip_path(path)
+    return sorted(get_archive(archive).folders[member])
+
+
+def walk(path):
+    """
+    Walk a regular folder or a folder inside a zip archive, like os.walk.
+
+    Args:
+        path (str): A regular path or a zip path.
+
+    Yields:
+        tuple: (root, dirs, files) for each folder, top-down.
+    """
+    if not is_zip_path(path):
+        yield from os.walk(path)
+        return
+
+    archive, member = split_zip_path(path)
+    zip_archive = get_archive(archive)
+    pending = [member]
+    while pending:
+        folder = pending.pop(0)
+        entries = sorted(zip_archive.folders.get(folder, ()))
+        children = [f"{folder}/{entry}" if folder else entry for entry in entries]
+        dirs = [e for e, c in zip(entries, children) if c in zip_archive.folders]
+        files = [e for e, c in zip(entries, children) if c in zip_archive.members]
+        yield join_zip_path(archive, folder), dirs, files
+        pending.extend(f"{folder}/{d}" if folder else d for d in dirs)
+
+
+def list_subfolders(path):
+    """
+    List the subfolders of a regular folder or of a folder inside a zip archive.
+
+    Args:
+        path (str): A regular path, a zip file or a zip path.
+
+    Returns:
+        list: A list of paths to subfolders.
+    """
+    if not is_zip_path(path):
+        return [
+            os.path.join(path, item)
+            for item in os.listdir(path)
+            if os.path.isdir(os.path.join(path, item))
+        ]
+    archive, member = split_zip_path(path)
+    root = join_zip_path(archive, member)
+    return [
+        os.path.join(root, item)
+        for item in listdir(root)
+        if isdir(os.path.join(root, item))
+    ]
+
+
+def copy_file(source, destination):
+    """
+    Copy a regular file (with its metadata) or materialize a zip member on disk.
+
+    Args:
+        source (str): A regular path or a zip path.
+        destination (str): The destination file path.
+    """
+    if not is_zip_path(source):
+        shutil.copy2(source, destination)
+        return
+    with open(source) as member, builtins.open(destination, "wb") as dest:
+        shutil.copyfileobj(member, dest, zip_copy_buffer_size)
+
+
+def copy_tree(source, destination):
+    """
+    Copy a regular folder or a folder inside a zip archive to disk, like shutil.copytree
+    with dirs_exist_ok=True.
+
+    Args:
+        source (str): A regular path or a zip path.
+        destination (str): The destination folder.
+    """
+    if not is_zip_path(source):
+        shutil.copytree(source, destination, dirs_exist_ok=True)
+        return
+    source = join_zip_path(*split_zip_path(source))
+    for root, dirs, files in walk(source):
+        relative_root = os.path.relpath(root, source)
+        target_root = os.path.normpath(os.path.join(destination, relative_root))
+        os.makedirs(target_root, exist_ok=True)
+        for file in files:
+            copy_file(os.path.join(root, file), os.path.join(target_root, file))
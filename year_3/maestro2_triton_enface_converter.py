@@ -1,47 +1,38 @@
 import os
-from copy import deepcopy
 
+import imaging_registry
+import imaging_writer
 import pydicom
-from pydicom import dcmread, dcmwrite
-from pydicom.datadict import DicomDictionary, keyword_dict
+from pydicom import dcmread
 from pydicom.dataelem import DataElement
 from pydicom.dataset import Dataset
 from pydicom.sequence import Sequence
 from pydicom.tag import Tag
 
-# Define items as (VR, VM, description, is_retired flag, keyword)
-#   Leave is_retired flag blank.
-new_dict_items = {
-    0x00221627: (
-        "SQ",
-        "1",
-        "En Face Volume Descriptor Sequence",
-        "",
-        "EnFaceVolumeDescriptorSequence",
-    ),
-    0x00221629: (
-        "CS",
-        "1",
-        "En Face Volume Descriptor Scope",
-        "",
-        "EnFaceVolumeDescriptorScope",
-    ),
-    0x0008114C: (
-        "SQ",
-        "1",
-        "Referenced Segmentation Sequence",
-        "",
-        "ReferencedSegmentationSequence",
-    ),
-    0x00660005: ("FL", "1", "Surface Offset", "", "SurfaceOffset"),
-}
-
-# Update the dictionary itself
-DicomDictionary.update(new_dict_items)
-
-# Update the reverse mapping from name to tag
-new_names_dict = dict([(val[4], tag) for tag, val in new_dict_items.items()])
-keyword_dict.update(new_names_dict)
+# Private attributes such as EnFaceVolumeDescriptorSequence
+imaging_registry.register_dicom_dictionary()
+
+# Tags copied from each referenced file (SOP Class/Instance UID, Study/Series Instance UID)
+reference_tags = [
+    Tag(0x0008, 0x0016),
+    Tag(0x0008, 0x0018),
+    Tag(0x0020, 0x000D),
+    Tag(0x0020, 0x000E),
+]
+
+
+def read_reference_header(path, tags=reference_tags):
+    """
+    Read only the given tags of a referenced file, never its pixel data.
+
+    Args:
+        path (str): The path to the referenced DICOM file.
+        tags (list): The top-level tags to read.
+
+    Returns:
+        pydicom.Dataset: The projected header.
+    """
+    return pydicom.dcmread(path, specific_tags=tags, stop_before_pixels=True)
 
 
 def convert_dicom (input_path: str, output_dir: str, op, opt, vol, seg):
@@ -69,7 +60,7 @@ def convert_dicom (input_path: str, output_dir: str, op, opt, vol, seg):
         ref_item = ref_seq_elem.value[0]  # put under the first (0008,114C) item
 
         if SEG_PROP_SEQ_TAG not in ref_item:
-            ref_item.add(DataElement(SEG_PROP_SEQ_TAG, "SQ", deepcopy(seg_prop_elem.value)))
+            ref_item.add(DataElement(SEG_PROP_SEQ_TAG, "SQ", seg_prop_elem.value))
 
         # remove from the top-level so it's a true move
         del item[SEG_PROP_SEQ_TAG]
@@ -80,7 +71,8 @@ def convert_dicom (input_path: str, output_dir: str, op, opt, vol, seg):
 
     for i in files_list:
 
-        dss = pydicom.dcmread(i)
+        # Referenced files may be passed as already read (projected) headers
+        dss = i if isinstance(i, Dataset) else read_reference_header(i)
 
         referenced_instance_seq = pydicom.Sequence()
 
@@ -104,7 +96,7 @@ def convert_dicom (input_path: str, output_dir: str, op, opt, vol, seg):
     filename = os.path.basename(input_path)
     out_path = os.path.join(output_dir, f"converted_{filename}")
     
-    dcmwrite(out_path, ds, write_like_original=False)
+    imaging_writer.write_dataset(ds, out_path, write_like_original=False)
 
     return out_path
 
@@ -1,8 +1,8 @@
 import os
-from copy import deepcopy
 
+import imaging_writer
 import pydicom
-from pydicom import dcmread, dcmwrite
+from pydicom import dcmread
 from pydicom.datadict import DicomDictionary, keyword_dict
 from pydicom.dataelem import DataElement
 from pydicom.dataset import Dataset
@@ -14,7 +14,13 @@ def convert_dicom  (input_path: str, output_dir: str, opt):
     oct_path = opt
     seg = pydicom.dcmread(input_path)
 
-    ds = pydicom.dcmread(oct_path)
+    # Only the Shared Functional Groups Sequence of the OCT is needed, never its pixel data
+    if isinstance(oct_path, Dataset):
+        ds = oct_path
+    else:
+        ds = pydicom.dcmread(
+            oct_path, specific_tags=[Tag(0x5200, 0x9229)], stop_before_pixels=True
+        )
     oct_pixel_spacing = ds[Tag(0x5200,0x9229)].value[0][Tag(0x0028,0x9110)].value[0][Tag(0x0028,0x0030)].value
     thickness_mm = oct_pixel_spacing[0]
 
@@ -28,6 +34,6 @@ def convert_dicom  (input_path: str, output_dir: str, opt):
     filename = os.path.basename(input_path)
     out_path = os.path.join(output_dir, f"converted_{filename}")
     
-    dcmwrite(out_path, seg, write_like_original=False)
+    imaging_writer.write_dataset(seg, out_path, write_like_original=False)
 
     return out_path
\ No newline at end of file
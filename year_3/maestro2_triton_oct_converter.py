@@ -1,7 +1,8 @@
 import os
 
+import imaging_writer
 import pydicom
-from pydicom import dcmread, dcmwrite
+from pydicom import dcmread
 from pydicom.dataelem import DataElement
 from pydicom.tag import Tag
 
@@ -30,6 +31,6 @@ def convert_dicom(input_path: str, output_dir: str) -> str:
     out_path = os.path.join(output_dir, f"converted_{filename}")
 
     # Write with "write_like_original=False" to harmonize/normalize the file
-    dcmwrite(out_path, ds, write_like_original=False)
+    imaging_writer.write_dataset(ds, out_path, write_like_original=False)
 
     return out_path
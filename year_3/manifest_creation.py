@@ -8,7 +8,6 @@ import pandas as pd
 import pydicom
 from tqdm import tqdm
 
-sys.path.append("/Users/nayoonkim/pipeline_imaging/a_year3/year_3")
 
 import imaging_cirrus_metadata
 import imaging_eidon_retinal_photography_metadata
@@ -18,6 +17,9 @@ import imaging_optomed_retinal_photography_metadata
 import imaging_spectralis_metadata
 import organize_utils
 
+# Checksums recorded by imaging_writer in the metadata records (see imaging_writer.file_checksums)
+checksum_columns = ["file_blake2b", "pixel_data_blake2b"]
+
 
 def replace_dots_with_underscores(sop_instance_uid):
     """
@@ -64,6 +66,25 @@ def get_item_from_json(file_path, item):
         return item
 
 
+def add_checksum_columns(df):
+    """
+    Add the checksum columns missing from metadata written before checksums were recorded.
+    """
+    for column in checksum_columns:
+        if column not in df:
+            df[column] = "Not reported"
+    return df
+
+
+def get_checksums_from_json(file_path):
+    """
+    Return the checksums of a metadata JSON file, "Not reported" if it has none.
+    """
+    with open(file_path, "r") as dic:
+        values = next(iter(json.load(dic).values()))
+    return {column: values.get(column) or "Not reported" for column in checksum_columns}
+
+
 def process_enface(file):
     file_path = get_item_from_json(file, "filepath")
     sop_instance = get_item_from_json(file, "sop_instance_uid")
@@ -168,6 +189,9 @@ def process_cirrus_file(file, imaging_folder, metadata_folder):
         vol_file_number_of_frames = get_item_from_json(vol_file[0], "number_of_frames")
 
         df.loc[:, "flow_cube_file_path"] = vol_file_path
+        vol_checksums = get_checksums_from_json(vol_file[0])
+        df.loc[:, "flow_cube_file_blake2b"] = vol_checksums["file_blake2b"]
+        df.loc[:, "flow_cube_pixel_data_blake2b"] = vol_checksums["pixel_data_blake2b"]
         df.loc[:, "flow_cube_sop_instance_uid"] = vol_uid
         df.loc[:, "person_id"] = vol_file_participant_id
         df.loc[:, "manufacturer"] = vol_file_manufacturer.capitalize()
@@ -302,6 +326,8 @@ def process_cirrus_file(file, imaging_folder, metadata_folder):
             "associated_enface_4_segmentation_surface_2",
             "flow_cube_sop_instance_uid",
             "flow_cube_file_path",
+            "flow_cube_file_blake2b",
+            "flow_cube_pixel_data_blake2b",
             # "associated_flow_cube_raw_data_sop_instance_uid",
             # "associated_flow_cube_raw_data_file_path",
             "associated_retinal_photography_sop_instance_uid",
@@ -399,6 +425,9 @@ def process_topcon_file(seg, imaging_folder, metadata_folder):
         vol_file_number_of_frames = get_item_from_json(vol_file[0], "number_of_frames")
 
         df.loc[:, "flow_cube_file_path"] = vol_file_path
+        vol_checksums = get_checksums_from_json(vol_file[0])
+        df.loc[:, "flow_cube_file_blake2b"] = vol_checksums["file_blake2b"]
+        df.loc[:, "flow_cube_pixel_data_blake2b"] = vol_checksums["pixel_data_blake2b"]
         df.loc[:, "flow_cube_sop_instance_uid"] = vol_uid
         df.loc[:, "person_id"] = vol_file_participant_id
         df.loc[:, "manufacturer"] = vol_file_manufacturer.capitalize()
@@ -574,6 +603,8 @@ def process_topcon_file(seg, imaging_folder, metadata_folder):
             "associated_enface_4_segmentation_surface_2",
             "flow_cube_sop_instance_uid",
             "flow_cube_file_path",
+            "flow_cube_file_blake2b",
+            "flow_cube_pixel_data_blake2b",
             # "associated_flow_cube_raw_data_sop_instance_uid",
             # "associated_flow_cube_raw_data_file_path",
             "associated_retinal_photography_sop_instance_uid",
@@ -632,6 +663,9 @@ def process_sublist(sublist, sublist_index, imaging_folder):
             continue
         df_combined = pd.concat([df_combined, df], ignore_index=True)
 
+    if df_combined.empty:
+        return f"Sublist {sublist_index} has no rows."
+
     # Save the result as a TSV file
     df_combined.to_csv(
         f"{imaging_folder}/retinal_octa/manifest_{sublist_index}.tsv",
@@ -683,6 +717,10 @@ def octa_manifest(imaging_folder):
         for sublist_index, sublist in enumerate(merged_split_lists)
     )
     all_files = glob.glob(f"{imaging_folder}/retinal_octa/manifest_*.tsv")
+    if not all_files:
+        print(f"WARNING: retinal_octa has {len(files)} files but its manifest has no rows; it was not written.")
+        return
+
     df_list = [pd.read_csv(file, sep="\t") for file in all_files]
     final_df = pd.concat(df_list, ignore_index=True)
 
@@ -759,7 +797,7 @@ def make_retinal_photography_manifest(imaging_folder):
 
             flattened_data = [value for key, value in json_data.items()]
 
-            df = pd.DataFrame(flattened_data)
+            df = add_checksum_columns(pd.DataFrame(flattened_data))
 
             df_filtered = df[
                 [
@@ -774,6 +812,8 @@ def make_retinal_photography_manifest(imaging_folder):
                     "color_channel_dimension",
                     "sop_instance_uid",
                     "filepath",
+                    "file_blake2b",
+                    "pixel_data_blake2b",
                 ]
             ]
 
@@ -809,7 +849,7 @@ def make_retinal_oct_manifest(op, imaging_folder):
             flattened_data = [value for key, value in json_data.items()]
 
             # Convert the flattened data into a DataFrame
-            df = pd.DataFrame(flattened_data)
+            df = add_checksum_columns(pd.DataFrame(flattened_data))
 
 
             # Filter specific columns
@@ -828,6 +868,8 @@ def make_retinal_oct_manifest(op, imaging_folder):
                     "slice_thickness",
                     "sop_instance_uid",
                     "filepath",
+                    "file_blake2b",
+                    "pixel_data_blake2b",
                     "reference_retinal_photography_image_instance_uid",
                 ]
             ].copy()
@@ -873,7 +915,7 @@ def make_flio_manifest(imaging_folder):
             flattened_data = [value for key, value in json_data.items()]
 
             # Step 2: Convert the flattened data into a DataFrame
-            df = pd.DataFrame(flattened_data)
+            df = add_checksum_columns(pd.DataFrame(flattened_data))
 
             df_filtered = df[
                 [
@@ -887,6 +929,8 @@ def make_flio_manifest(imaging_folder):
                     "number_of_frames",
                     "sop_instance_uid",
                     "filepath",
+                    "file_blake2b",
+                    "pixel_data_blake2b",
                 ]
             ]
 
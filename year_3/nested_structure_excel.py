@@ -29,13 +29,15 @@ class DicomEntry:
         self.value = value
 
 
-def extract_dicom_dict(file, tags):
+def extract_dicom_dict(file, tags, matrix=None):
     """
     Extracts DICOM metadata and organizes it in a nested structure for specific tags.
 
     Args:
         file (str): Path to the DICOM file.
         tags (list): A list of DICOM tags to extract from the file.
+        matrix (HeaderMatrix, optional): Header matrix holding the file
+            (imaging_header_matrix), read instead of the file.
 
     Returns:
         dict: A dictionary with the following keys:
@@ -45,9 +47,10 @@ def extract_dicom_dict(file, tags):
             - "vr": The Value Representation (VR) type for each tag.
             - "value": The value of the DICOM elements.
     """
-    dataset = pydicom.dcmread(file)
-    json_dict = dataset.to_json_dict()
-    dicom = json_dict
+    if matrix is not None:
+        dicom = matrix.json_dict(file, tags)
+    else:
+        dicom = pydicom.dcmread(file).to_json_dict()
     output_lists = {
         "indentation": [],
         "tag": [],
@@ -107,7 +110,7 @@ def process_tags(tags, dicom, nesting_level, output_lists):
                     )  # Increment nesting level
 
 
-def create_excelsheet_nested_structure(input, tags, output):
+def create_excelsheet_nested_structure(input, tags, output, matrix=None):
     """
     Creates an Excel sheet for DICOM metadata with a nested structure for specific tags.
 
@@ -115,6 +118,7 @@ def create_excelsheet_nested_structure(input, tags, output):
         input (str): The path to the DICOM file.
         tags (list): A list of DICOM tags to extract and organize in the Excel sheet.
         output (str): The file path where the output Excel file will be saved.
+        matrix (HeaderMatrix, optional): Header matrix holding the file, read instead of it.
 
     Returns:
         None: The function saves the extracted DICOM metadata to an Excel file.
@@ -128,7 +132,7 @@ def create_excelsheet_nested_structure(input, tags, output):
         worksheet = workbook.add_worksheet(tag)
 
         tags_to_extract = [tag]  # Use the current 'tag' value in the loop
-        result = extract_dicom_dict(a, tags_to_extract)
+        result = extract_dicom_dict(a, tags_to_extract, matrix)
 
         # Assuming 'extract_dicom_dict' returns the necessary data
         # Modify the following lines accordingly if needed
@@ -158,7 +162,7 @@ def create_excelsheet_nested_structure(input, tags, output):
     workbook.close()
 
 
-def multi_create_excelsheet_nested_structure(inputs, tags, output):
+def multi_create_excelsheet_nested_structure(inputs, tags, output, matrix=None):
     """
     Creates an Excel sheet for multiple DICOM files, each with nested structures for specific tags.
 
@@ -166,6 +170,7 @@ def multi_create_excelsheet_nested_structure(inputs, tags, output):
         inputs (list): A list of file paths to DICOM files to process.
         tags (list): A list of DICOM tags to extract and organize for each DICOM file.
         output (str): The file path where the output Excel file will be saved.
+        matrix (HeaderMatrix, optional): Header matrix holding the files, read instead of them.
 
     Returns:
         None: The function saves the extracted metadata from multiple DICOM files to an Excel file.
@@ -182,7 +187,7 @@ def multi_create_excelsheet_nested_structure(inputs, tags, output):
         for a in aa:
             num = num + 1
 
-            result = extract_dicom_dict(a, tags_to_extract)
+            result = extract_dicom_dict(a, tags_to_extract, matrix)
             # Assuming 'extract_dicom_dict' returns the necessary data
             # Modify the following lines accordingly if needed
             result["tags"] = [
@@ -5,7 +5,6 @@ import pandas as pd
 import pydicom
 from tqdm import tqdm
 
-sys.path.append("/Users/nayoonkim/pipeline_imaging/a_year3/year_3")
 import json
 import re
 
@@ -75,7 +74,8 @@ def get_difference (file1, file2):
             print(f"  dcm2: {val2}")
             print("-" * 40)
 
-import hashlib
+import imaging_frames
+import imaging_writer
 
 import pydicom
 from pydicom.datadict import dictionary_description
@@ -109,12 +109,15 @@ def elem_name(ds, tag):
 def hash_bytes(b):
     if b is None:
         return None
-    return hashlib.md5(b).hexdigest()
+    # Same BLAKE2b as the pixel_data_blake2b of the metadata records
+    checksum = imaging_writer.new_checksum()
+    checksum.update(b)
+    return checksum.hexdigest()
 
 
 def normalize_value(v):
     if isinstance(v, bytes):
-        return f"<{len(v)} bytes, md5={hash_bytes(v)}>"
+        return f"<{len(v)} bytes, blake2b={hash_bytes(v)}>"
     if isinstance(v, PersonName):
         return str(v)
     if isinstance(v, (list, tuple)) and not isinstance(v, Sequence):
@@ -143,8 +146,8 @@ def compare_pixel_data(ds1, ds2, path):
     b1, b2 = v1.value, v2.value
     if b1 != b2:
         print(f"{path}(7FE0,0010) PixelData differs:")
-        print(f"  dcm1: <{len(b1)} bytes, md5={hash_bytes(b1)}>")
-        print(f"  dcm2: <{len(b2)} bytes, md5={hash_bytes(b2)}>")
+        print(f"  dcm1: <{len(b1)} bytes, blake2b={hash_bytes(b1)}>")
+        print(f"  dcm2: <{len(b2)} bytes, blake2b={hash_bytes(b2)}>")
         if NUMPY_AVAILABLE:
             try:
                 arr1 = apply_modality_lut(ds1.pixel_array, ds1)
@@ -163,8 +166,9 @@ def compare_pixel_data(ds1, ds2, path):
 
 
 def get_difference_pixel_nested(file1, file2):
-    dcm1 = pydicom.dcmread(file1)
-    dcm2 = pydicom.dcmread(file2)
+    # Headers only: the pixel data is compared frame by frame at the end
+    dcm1 = pydicom.dcmread(file1, stop_before_pixels=True)
+    dcm2 = pydicom.dcmread(file2, stop_before_pixels=True)
 
     printed = {"diff": False}  # use dict to allow mutation inside nested function
 
@@ -242,13 +246,23 @@ def get_difference_pixel_nested(file1, file2):
             return False
         if v1 is None or v2 is None or v1.value != v2.value:
             print(f"{path}(7FE0,0010) PixelData differs "
-                  f"md5={hash_bytes(v1.value) if v1 else None} vs {hash_bytes(v2.value) if v2 else None}")
+                  f"blake2b={hash_bytes(v1.value) if v1 else None} vs {hash_bytes(v2.value) if v2 else None}")
             print("-" * 40)
             return True
         return False
 
     diff_datasets(dcm1, dcm2)
 
+    frames = imaging_frames.differing_frames(file1, file2)
+    if frames is None:
+        printed["diff"] = True
+        print("(7FE0,0010) PixelData differs: missing in one file, or different frame count or shape")
+        print("-" * 40)
+    elif frames:
+        printed["diff"] = True
+        print(f"(7FE0,0010) PixelData differs in {len(frames)} frame(s): {frames[:20]}")
+        print("-" * 40)
+
     if not printed["diff"]:
         print("Same ✅")
 
@@ -298,17 +312,24 @@ def compare_folders(folder1, folder2):
 from collections import Counter
 
 
-def same_number_tags(files):
+def same_number_tags(files, sample_per_group=None, n_jobs=-1, matrix=None):
+    """
+    Print how many files have each number of tags.
+
+    With `sample_per_group`, only that many files of each structure group are checked
+    (see stratified_sample). With a header `matrix` (imaging_header_matrix.HeaderMatrix),
+    the files are not read.
+    """
+    if sample_per_group:
+        files = stratified_sample(files, sample_per_group, n_jobs, matrix)
 
     tag_counts = []
 
-    for f in files:
-        try:
-            ds = pydicom.dcmread(f, stop_before_pixels=True)  # metadata only
-            count = len(ds.keys())  # number of data elements (tags)
-            tag_counts.append(count)
-        except Exception as e:
-            print(f"❌ Error reading {f}: {e}")
+    for f, summary in header_summaries(files, n_jobs, matrix).items():
+        if "Error" in summary:
+            print(f"❌ Error reading {f}: {summary['Error']}")
+        else:
+            tag_counts.append(summary["Tag count"])  # number of data elements (tags)
 
     # summarize
     counter = Counter(tag_counts)
@@ -324,16 +345,24 @@ def same_number_tags(files):
 import pydicom
 
 
-def check_sopclassuid(file_list):
+def check_sopclassuid(file_list, sample_per_group=None, n_jobs=-1, matrix=None):
+    """
+    Print the SOPClassUIDs of the files and return the one of each file.
+
+    With `sample_per_group`, only that many files of each structure group are checked
+    (see stratified_sample). With a header `matrix` (imaging_header_matrix.HeaderMatrix),
+    the files are not read.
+    """
+    if sample_per_group:
+        file_list = stratified_sample(file_list, sample_per_group, n_jobs, matrix)
+
     sop_uids = {}
 
-    for f in tqdm(file_list):
-        try:
-            ds = pydicom.dcmread(f, stop_before_pixels=True)  # metadata only
-            sop_uid = getattr(ds, "SOPClassUID", None)
-            sop_uids[f] = str(sop_uid) if sop_uid else None
-        except Exception as e:
-            sop_uids[f] = f"Error: {e}"
+    for f, summary in header_summaries(file_list, n_jobs, matrix).items():
+        if "Error" in summary:
+            sop_uids[f] = f"Error: {summary['Error']}"
+        else:
+            sop_uids[f] = summary["SOPClassUID"]
 
     # Collect unique UIDs
     unique_uids = set(v for v in sop_uids.values() if v and not str(v).startswith("Error"))
@@ -419,12 +448,89 @@ def clean_filename(filename):
     return filename.replace("_", "").replace(".", "")
 
 import shutil
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
+# Threads copying (or linking) the merged files
+merge_copy_threads = 8
 
-def merge_folders_filter_id_files(patientid_csv, sources, destination, remove_txt):
+
+class RemovalMatcher:
     """
-    Merge files from the source directories into the destination directory
-    based on a list of unique study IDs and an optional list of files to exclude by base name.
+    Aho-Corasick automaton telling whether any of many patterns occurs in a name.
+
+    Matching a name costs one pass over its characters, whatever the number of
+    patterns, instead of one substring search per pattern.
+
+    Args:
+    - patterns (iterable): The patterns (already cleaned with clean_filename).
+    """
+
+    def __init__(self, patterns):
+        self.goto = [{}]
+        self.fail = [0]
+        self.terminal = [False]
+
+        for pattern in patterns:
+            state = 0
+            for char in pattern:
+                if char not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.terminal.append(False)
+                    self.goto[state][char] = len(self.goto) - 1
+                state = self.goto[state][char]
+            self.terminal[state] = True
+
+        # Breadth-first, so the failure state of each state is built before its children
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                if self.fail[child] == child:
+                    self.fail[child] = 0
+                self.terminal[child] = self.terminal[child] or self.terminal[self.fail[child]]
+
+    def matches(self, text):
+        """
+        Returns:
+        - bool: True if any pattern is a substring of text.
+        """
+        state = 0
+        if self.terminal[state]:
+            return True
+        for char in text:
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            if self.terminal[state]:
+                return True
+        return False
+
+
+def copy_or_link(src_file, dest_file, link=False):
+    """
+    Copy a file with its metadata, or hard-link it when `link` is set and the
+    destination is on the same file system.
+    """
+    if link:
+        try:
+            os.link(src_file, dest_file)
+            return
+        except OSError:
+            pass
+    shutil.copy2(src_file, dest_file)
+
+
+def select_merge_files(patientid_csv, sources, destination, remove_txt):
+    """
+    Select the files of the source directories that belong in the merged destination:
+    files of the listed study IDs that are not in the removal list.
 
     Args:
     - patientid_csv (str): Path to the CSV file containing patient IDs.
@@ -432,6 +538,10 @@ def merge_folders_filter_id_files(patientid_csv, sources, destination, remove_tx
     - destination (str): Path to the destination directory.
     - remove_txt (str): Path to the text file that contains the list of base filenames (without extension)
                         that need to be excluded.
+
+    Returns:
+    - tuple: (dict of destination file -> source file, where the first source wins,
+              number of files skipped because of the removal list)
     """
 
     # Read the files to be removed from the remove_txt file
@@ -439,15 +549,16 @@ def merge_folders_filter_id_files(patientid_csv, sources, destination, remove_tx
         # Read all lines and strip newline characters
         files_to_remove = [line.strip() for line in file]
 
-    # Read the CSV and get the list of unique study IDs
-    unique_study_ids_list = pd.read_csv(patientid_csv)["Participant ID"].astype(str).unique().tolist()
+    # Read the CSV and get the set of unique study IDs
+    unique_study_ids = set(pd.read_csv(patientid_csv)["Participant ID"].astype(str).unique())
 
-    # Convert the files_to_remove list to a set for faster lookup
-    files_to_remove_set = set(files_to_remove)
+    # Any cleaned element of files_to_remove found in a cleaned base file name removes the file
+    removal_matcher = RemovalMatcher({clean_filename(item) for item in files_to_remove})
     print("folder numbers:")
     print(len(sources))
 
     removed_count = 0
+    selected = {}
 
     for source in sources:
         print(source)
@@ -455,25 +566,20 @@ def merge_folders_filter_id_files(patientid_csv, sources, destination, remove_tx
             relative_path = os.path.relpath(root, source)
             dest_path = os.path.join(destination, relative_path)
 
-            # Collect valid files (those matching the IDs and not in the removal list)
-            valid_files = []
-
             for file in files:
                 if not file.startswith("._"):
                     file_id = file.split("_")[0]
 
                     # Get the base name of the file (without the extension)
                     base_file_name = os.path.splitext(file)[0]
-                    cleaned_base_file_name = clean_filename(base_file_name)
-
-                    # Check if any cleaned element in files_to_remove_set is part of the cleaned base file name
-                    should_remove = any(
-                        clean_filename(item) in cleaned_base_file_name
-                        for item in files_to_remove_set
-                    )
+                    should_remove = removal_matcher.matches(clean_filename(base_file_name))
 
-                    if file_id in unique_study_ids_list and not should_remove:
-                        valid_files.append(file)
+                    if file_id in unique_study_ids and not should_remove:
+                        dest_file = os.path.normpath(os.path.join(dest_path, file))
+                        if dest_file not in selected:
+                            selected[dest_file] = os.path.join(root, file)
+                        else:
+                            print(f"File {dest_file} already exists. Skipping...")
                     else:
                         if should_remove:
                             removed_count += 1 
@@ -485,22 +591,45 @@ def merge_folders_filter_id_files(patientid_csv, sources, destination, remove_tx
                                 f"File {file} not in the list of study IDs. Skipping..."
                             )
 
-            # Only create the destination folder if there are valid files to copy
-            if valid_files:
-                os.makedirs(
-                    dest_path, exist_ok=True
-                )  # Create the folder if it doesn't exist
+    return selected, removed_count
 
-                # Copy over the valid files
-                for file in valid_files:
-                    src_file = os.path.join(root, file)
-                    dest_file = os.path.join(dest_path, file)
 
-                    if not os.path.exists(dest_file):
-                        shutil.copy2(src_file, dest_file)
-                        # print(f"Copied {src_file} to {dest_file}")
-                    else:
-                        print(f"File {dest_file} already exists. Skipping...")
+def merge_folders_filter_id_files(
+    patientid_csv, sources, destination, remove_txt, link=False, n_threads=merge_copy_threads
+):
+    """
+    Merge files from the source directories into the destination directory
+    based on a list of unique study IDs and an optional list of files to exclude by base name.
+
+    Args:
+    - patientid_csv (str): Path to the CSV file containing patient IDs.
+    - sources (list): List of source directories.
+    - destination (str): Path to the destination directory.
+    - remove_txt (str): Path to the text file that contains the list of base filenames (without extension)
+                        that need to be excluded.
+    - link (bool): Hard-link the files instead of copying them when possible.
+    - n_threads (int): Number of files copied at the same time.
+    """
+    selected, removed_count = select_merge_files(patientid_csv, sources, destination, remove_txt)
+
+    copies = {}
+    for dest_file, src_file in selected.items():
+        if not os.path.exists(dest_file):
+            copies[dest_file] = src_file
+        else:
+            print(f"File {dest_file} already exists. Skipping...")
+
+    # Only create the destination folders that receive valid files
+    for dest_path in {os.path.dirname(dest_file) for dest_file in copies}:
+        os.makedirs(dest_path, exist_ok=True)
+
+    # Copy over the valid files
+    with ThreadPoolExecutor(max_workers=n_threads) as executor:
+        list(
+            executor.map(
+                lambda dest_file: copy_or_link(copies[dest_file], dest_file, link), copies
+            )
+        )
 
     print(removed_count)
     print("removed")
@@ -529,15 +658,34 @@ def get_patient_ids_from_final_output(folder_path):
 
 import pandas as pd
 
-year2 = pd.read_csv(
-    "/Users/nayoonkim/pipeline_imaging/a_year3/year_3/data/AIREADiPilot-ParticipantIDsForDat_DATA_LABELS_2024-09-25_1141.csv"
-)
-only_year2_list = year2["Participant Study ID"].tolist()
-year3 = pd.read_csv(
-    "/Users/nayoonkim/pipeline_imaging/a_year3/year_3/data/Participants for Data Release 3 through 05-01-2025.csv"
-)
-total_list = year3["Participant ID"].tolist()
-only_year3_list = list(set(total_list) - set(only_year2_list))
+year2_participants_csv = "/Users/nayoonkim/pipeline_imaging/a_year3/year_3/data/AIREADiPilot-ParticipantIDsForDat_DATA_LABELS_2024-09-25_1141.csv"
+year3_participants_csv = "/Users/nayoonkim/pipeline_imaging/a_year3/year_3/data/Participants for Data Release 3 through 05-01-2025.csv"
+
+
+def load_release_participants(
+    year2_csv=year2_participants_csv, year3_csv=year3_participants_csv
+):
+    """
+    Read the participant lists of the year 2 and year 3 releases.
+
+    The CSVs are read when this is called, not when the module is imported.
+
+    Args:
+        year2_csv (str): The year 2 participant CSV ("Participant Study ID" column).
+        year3_csv (str): The year 3 participant CSV ("Participant ID" column).
+
+    Returns:
+        dict: "Year 2" (year 2 participants), "Total" (year 3 release participants) and
+        "Year 3 only" (participants of the year 3 release missing from year 2).
+    """
+    only_year2_list = pd.read_csv(year2_csv)["Participant Study ID"].tolist()
+    total_list = pd.read_csv(year3_csv)["Participant ID"].tolist()
+    return {
+        "Year 2": only_year2_list,
+        "Total": total_list,
+        "Year 3 only": list(set(total_list) - set(only_year2_list)),
+    }
+
 
 def compare_lists(list1, list2):
     """
@@ -671,36 +819,29 @@ def get_dcm_basenames(folder):
         print(b)
 
 import numpy as np
-from PIL import Image
-from pydicom.pixel_data_handlers.util import convert_color_space
+
+import imaging_previews
 
 
 def file_to_jpg(file, jpg_output):
+    """
+    Save a DICOM file as a full-resolution JPEG in jpg_output.
+
+    Multi-frame volumes are saved as a contact sheet of B-scans and FLIO measurements
+    as their intensity image (see imaging_previews.render_preview); use
+    imaging_previews.make_previews for downsampled previews of a whole folder.
+    """
     os.makedirs(jpg_output, exist_ok=True)
     try:
-        ds = pydicom.dcmread(file)
-        dimension = len(ds.pixel_array.shape)
-
-        if dimension == 3:
-            arr = ds.pixel_array
-            # arr = convert_color_space(arr, "YBR_FULL", "RGB")
-            img = Image.fromarray(arr)
-            img.save(
-                os.path.join(jpg_output, os.path.basename(file) + ".jpg"),
-                format="JPEG",
-                quality=90  # adjust quality (default 75, higher = bigger file, better quality)
-            )
-        elif dimension == 2:
-            arr = ds.pixel_array
-            img = Image.fromarray(arr)
-            img.save(
-                os.path.join(jpg_output, os.path.basename(file) + ".jpg"),
-                format="JPEG",
-                quality=90
-            )
-        else:
-            print("Error: Image dimension not supported")
+        img, _ = imaging_previews.render_preview(file, max_size=None)
+        if img is None:
+            print("Error: No pixel data in", file)
             return
+        img.save(
+            os.path.join(jpg_output, os.path.basename(file) + ".jpg"),
+            format="JPEG",
+            quality=90  # adjust quality (default 75, higher = bigger file, better quality)
+        )
     except Exception as e:
         print("Error reading file:", file, "| Exception:", e)
         return
@@ -709,12 +850,16 @@ import pydicom
 
 
 # Example: maestro2 is your list of DICOM file paths
-def check_unique_sopclassuids(file_list):
+def check_unique_sopclassuids(file_list, sample_per_group=None, n_jobs=-1, matrix=None):
+    if sample_per_group:
+        file_list = stratified_sample(file_list, sample_per_group, n_jobs, matrix)
+
     sop_uids = []
     
-    for file in tqdm(file_list):
-        dcm = pydicom.dcmread(file, stop_before_pixels=True)  # faster, no pixel data
-        sop_uids.append(dcm.SOPClassUID)
+    for file, summary in header_summaries(file_list, n_jobs, matrix).items():
+        if "Error" in summary:
+            raise ValueError(f"Error reading {file}: {summary['Error']}")
+        sop_uids.append(summary["SOPClassUID"])
     
     unique_uids = set(sop_uids)
     
@@ -729,6 +874,7 @@ import os
 from hashlib import sha256
 
 import pydicom
+from joblib import Parallel, delayed
 from tqdm import tqdm
 
 # def _schema_signature(ds):
@@ -779,22 +925,121 @@ def _schema_signature(ds):
         return tuple(sorted(entries))
     return sha256(repr(walk(ds)).encode("utf-8")).hexdigest()
 
-def all_same_structure(dcm_files, sample_per_group=20):
+# (absolute path, size, mtime) -> header summary of the file, see header_summaries
+_header_summaries = {}
+
+
+def file_fingerprint(file):
+    """Return the cache key of a file: its absolute path, size and modification time."""
+    stat = os.stat(file)
+    return (os.path.abspath(file), stat.st_size, stat.st_mtime_ns)
+
+
+def header_summary(file):
+    """
+    Read the header of one DICOM file and summarize it for the structure checks.
+
+    Returns:
+        dict: "Signature" (see _schema_signature), "Tag count" (top-level elements) and
+        "SOPClassUID", or "Error" with the other values None if the file cannot be read.
+    """
+    try:
+        ds = pydicom.dcmread(file, stop_before_pixels=True)
+        sop_uid = getattr(ds, "SOPClassUID", None)
+        return {
+            "Signature": _schema_signature(ds),
+            "Tag count": len(ds.keys()),
+            "SOPClassUID": str(sop_uid) if sop_uid else None,
+        }
+    except Exception as e:
+        return {"Signature": None, "Tag count": None, "SOPClassUID": None, "Error": str(e)}
+
+
+def header_summaries(files, n_jobs=-1, matrix=None):
+    """
+    Return the header summary of each file, reading the headers in one parallel pass.
+
+    Summaries are cached by file fingerprint, so the structure checks run on the same
+    files (all_same_structure, same_number_tags, check_sopclassuid, ...) only read
+    each header once, and again only if the file changes.
+
+    Args:
+        files (list): The DICOM files.
+        n_jobs (int): Number of headers read in parallel.
+        matrix (HeaderMatrix, optional): Header matrix of the files
+            (imaging_header_matrix), the summaries are then taken from it.
+
+    Returns:
+        dict: File -> summary (see header_summary).
+    """
+    if matrix is not None:
+        return matrix.summaries(files)
+
+    keys = {}
+    for file in files:
+        try:
+            keys[file] = file_fingerprint(file)
+        except OSError:
+            # Unreadable files are summarized (with their error) but not cached
+            keys[file] = None
+
+    missing = [file for file, key in keys.items() if key is None or key not in _header_summaries]
+    summaries = dict(
+        zip(
+            missing,
+            Parallel(n_jobs=n_jobs, batch_size=64)(
+                delayed(header_summary)(file)
+                for file in (tqdm(missing, desc="Reading headers") if len(missing) > 1 else missing)
+            ),
+        )
+    )
+    for file, summary in summaries.items():
+        if keys[file] is not None:
+            _header_summaries[keys[file]] = summary
+
+    return {
+        file: summaries[file] if file in summaries else _header_summaries[keys[file]]
+        for file in files
+    }
+
+
+def group_by_signature(files, n_jobs=-1, matrix=None):
+    """
+    Group files by structural signature ("ERROR:<message>" for unreadable files).
+
+    Returns:
+        dict: Signature -> list of files.
+    """
+    sig_map = {}
+    for file, summary in header_summaries(files, n_jobs, matrix).items():
+        sig = summary["Signature"] or f"ERROR:{summary['Error']}"
+        sig_map.setdefault(sig, []).append(file)
+    return sig_map
+
+
+def stratified_sample(files, per_group, n_jobs=-1, matrix=None):
+    """
+    Keep at most `per_group` files (the first ones by path) of each signature group.
+
+    Every structure is still represented, so the checks run on the sample see the same
+    variety of files as on the full list.
+    """
+    return [
+        file
+        for group in group_by_signature(files, n_jobs, matrix).values()
+        for file in sorted(group)[:per_group]
+    ]
+
+
+def all_same_structure(dcm_files, sample_per_group=20, n_jobs=-1, matrix=None):
     """
     Check if all DICOMs have the same tag/nested-tag structure.
     If not, print the group count and up to `sample_per_group` example files per group.
     Returns True if all same, else False.
     """
-    sig_map = {}
-    for file in tqdm(dcm_files):
-        try:
-            ds = pydicom.dcmread(file, stop_before_pixels=True)
-            sig = _schema_signature(ds)
-            sig_map.setdefault(sig, []).append(file)
-        except Exception as e:
-            sig_map.setdefault(f"ERROR:{e}", []).append(file)
+    sig_map = group_by_signature(dcm_files, n_jobs, matrix)
 
-    if len(sig_map) == 1:
+    if len(sig_map) <= 1:
         return True
 
     print("⚠️ Different structures found:")
@@ -884,7 +1129,15 @@ def diff_dicom_structures(
     """
     Return a list of human-readable differences in structure (tags + nesting).
     Values are ignored.
+
+    Files whose cached signatures match (see header_summaries) have the same structure,
+    so they are not read again.
     """
+    if include_vr and include_private_tags and stop_before_pixels:
+        summaries = header_summaries([a_file, b_file], n_jobs=1)
+        if summaries[a_file]["Signature"] and summaries[a_file]["Signature"] == summaries[b_file]["Signature"]:
+            return []
+
     ds1 = pydicom.dcmread(a_file, stop_before_pixels=stop_before_pixels)
     ds2 = pydicom.dcmread(b_file, stop_before_pixels=stop_before_pixels)
     diffs: List[str] = []
@@ -0,0 +1,1056 @@
+import contextlib
+import importlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import sys
+import time
+from datetime import datetime
+
+import imaging_registry
+import imaging_utils
+import numpy as np
+import synthetic_corpus
+
+# Relative change (0.10 = 10 %) above which compare_baselines reports a regression
+benchmark_threshold = 0.10
+
+# Metrics compared between two runs, mapped to True when a larger value is worse
+compared_metrics = {
+    "Throughput": False,
+    "Peak RSS": True,
+    "Bytes read": True,
+    "Bytes written": True,
+}
+
+# End-to-end steps, in pipeline order
+pipeline_steps = ["organize", "convert", "finalize", "manifest"]
+
+micro_benchmarks = [
+    "find_rule",
+    "converters",
+    "zeiss_segmentation",
+    "flio_get_array",
+    "get_item_from_json",
+    "evaluate_compliance",
+    "cli_help",
+]
+
+device_converters = {
+    "cirrus": [
+        "cirrus_oct_converter",
+        "cirrus_volume_converter",
+        "cirrus_retinal_photography_converter",
+        "cirrus_enface_converter",
+        "cirrus_enface_structural_converter",
+        "cirrus_heightmap_converter",
+    ],
+    "topcon": [
+        "maestro2_triton_oct_converter",
+        "maestro2_triton_volume_converter",
+        "maestro2_triton_retinal_photography_converter",
+        "maestro2_triton_enface_converter",
+        "maestro2_triton_heightmap_converter",
+    ],
+    "spectralis": [
+        "spectralis_onh_oct_converter",
+        "spectralis_onh_retinal_photography_converter",
+        "spectralis_ppol_oct_converter",
+        "spectralis_ppol_retinal_photography_converter",
+    ],
+    "eidon": ["imaging_eidon_retinal_photography_converter"],
+    "optomed": ["imaging_optomed_retinal_photography_converter"],
+    "flio": ["imaging_flio_converter"],
+}
+
+# Converter functions timed by the converters.<device> benchmarks, when a module defines them
+converter_functions = [
+    "extract_dicom_dict",
+    "write_dicom",
+    "convert_dicom",
+    "make_flio_dicom",
+    "make_compliant_flio_dicom",
+]
+
+# Seconds `aireadi-imaging --help` may take; slower starts are counted as failures
+cli_help_budget = 1.0
+
+# Folders the drivers route the files they could not classify or convert to
+unrouted_folders = [
+    "Description not found",
+    "invalid_dicom",
+    "missing_critical_info",
+    "no_files",
+    "unknown_protocol",
+    "wrong_angio_protocol",
+]
+
+
+def peak_rss():
+    """
+    Return the peak resident set size of the current process.
+
+    Returns:
+        int: The peak RSS in bytes.
+    """
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def io_counters():
+    """
+    Return the bytes read and written by the current process so far.
+
+    Returns:
+        tuple: (bytes read, bytes written), or (None, None) where /proc/self/io is not
+        available (e.g. macOS).
+    """
+    try:
+        with open("/proc/self/io") as file:
+            counters = dict(line.split(": ") for line in file.read().splitlines())
+    except OSError:
+        return None, None
+    return int(counters["rchar"]), int(counters["wchar"])
+
+
+def count_files(folder):
+    """
+    Count the files below a folder.
+
+    Args:
+        folder (str): The folder.
+
+    Returns:
+        int: The number of files (0 if the folder does not exist).
+    """
+    return sum(len(files) for _, _, files in os.walk(folder))
+
+
+def benchmark_kind(name):
+    """
+    Return the kind of a benchmark from its name.
+
+    Args:
+        name (str): The benchmark name, e.g. "convert.cirrus" or "find_rule".
+
+    Returns:
+        str: "end_to_end" for pipeline steps, "micro" otherwise.
+    """
+    return "end_to_end" if name.split(".")[0] in pipeline_steps else "micro"
+
+
+def benchmark_names(devices):
+    """
+    List the benchmarks run for a set of devices, in run order.
+
+    End-to-end steps come first, as the microbenchmarks reuse their outputs.
+
+    Args:
+        devices (list): The devices, see synthetic_corpus.synthetic_devices.
+
+    Returns:
+        list: The benchmark names.
+    """
+    names = [f"{step}.{device}" for device in devices for step in pipeline_steps]
+    for benchmark in micro_benchmarks:
+        if benchmark == "converters":
+            names += [f"converters.{device}" for device in devices]
+        elif benchmark == "zeiss_segmentation" and "cirrus" not in devices:
+            continue
+        elif benchmark == "flio_get_array" and "flio" not in devices:
+            continue
+        else:
+            names.append(benchmark)
+    return names
+
+
+def select_benchmarks(names, only):
+    """
+    Keep the benchmarks matching any selector.
+
+    Args:
+        names (list): The benchmark names.
+        only (list): Selectors: a kind ("micro", "end_to_end"), a full name
+            ("convert.cirrus"), a step or benchmark ("convert") or a device ("cirrus").
+
+    Returns:
+        list: The selected names, in run order.
+    """
+    if not only:
+        return names
+    return [
+        name
+        for name in names
+        if any(
+            selector in (name, benchmark_kind(name)) or selector in name.split(".")
+            for selector in only
+        )
+    ]
+
+
+
+
+def device_folders(workdir, device):
+    """
+    Return the step folders of a device, laid out as in the process_*.py drivers.
+
+    The metadata folder sits next to the final structure, where manifest_creation looks for it.
+
+    Args:
+        workdir (str): The benchmark working folder.
+        device (str): The device.
+
+    Returns:
+        dict: The folders "organized", "raw" (FLIO only), "converted", "final" and "metadata".
+    """
+    root = os.path.join(workdir, device)
+    final = f"{root}/step4_final_structure"
+    return {
+        "organized": f"{root}/step2_organized",
+        "raw": f"{root}/step3_converted_raw_dicom",
+        "converted": f"{root}/step3_converted_dicom",
+        "final": final,
+        "metadata": f"{final}_metadata",
+    }
+
+
+def reset_folders(*folders):
+    """
+    Delete and recreate folders.
+
+    Args:
+        *folders (str): The folders.
+    """
+    for folder in folders:
+        if os.path.exists(folder):
+            shutil.rmtree(folder)
+        os.makedirs(folder)
+
+
+def run_items(function, items):
+    """
+    Call a function on every item and count the failures, like the drivers log them.
+
+    Args:
+        function (callable): The function called with each item (a tuple of arguments).
+        items (list): The argument tuples.
+
+    Returns:
+        int: The number of calls that raised an exception.
+    """
+    failures = 0
+    for arguments in items:
+        try:
+            function(*arguments)
+        except Exception:
+            failures += 1
+    return failures
+
+
+def organize_device(device, corpus, folders):
+    """
+    Organize the synthetic input of a device (step 2 of the drivers).
+
+    Returns:
+        int: The number of failed items.
+    """
+    instance = imaging_registry.create_domain(device)
+    input_folder = os.path.join(corpus, device)
+    output = folders["organized"]
+
+    if device == "topcon":
+        # The driver organizes the folders of a batch in parallel
+        return sum(
+            "Error" in result
+            for batch in imaging_utils.list_subfolders(input_folder)
+            for result in instance.organize_many(
+                imaging_utils.list_subfolders(batch), output
+            )
+        )
+    elif device == "cirrus":
+        items = [
+            (folder, output)
+            for batch in imaging_utils.list_subfolders(input_folder)
+            for folder in imaging_utils.list_subfolders(batch)
+        ]
+    elif device == "flio":
+        items = [(folder, output) for folder in imaging_utils.list_subfolders(input_folder)]
+    else:
+        list_files = (
+            imaging_utils.spectralis_get_filtered_file_names
+            if device == "spectralis"
+            else imaging_utils.get_filtered_file_names
+        )
+        items = [
+            (file, output)
+            for folder in imaging_utils.list_subfolders(input_folder)
+            for file in list_files(folder)
+        ]
+    return run_items(instance.organize, items)
+
+
+def convert_device(device, corpus, folders):
+    """
+    Convert the organized files of a device (step 3 of the drivers).
+
+    Returns:
+        int: The number of failed items.
+    """
+    instance = imaging_registry.create_domain(device)
+
+    if device == "flio":
+        jsonpath = os.path.join(corpus, "flio_uid_data.json")
+        return run_items(
+            instance.convert,
+            [
+                (folder, folders["converted"], jsonpath)
+                for folder in imaging_utils.list_subfolders(folders["organized"])
+            ],
+        )
+
+    items = []
+    for protocol_folder in imaging_utils.list_subfolders(folders["organized"]):
+        output = os.path.join(folders["converted"], os.path.basename(protocol_folder))
+        os.makedirs(output, exist_ok=True)
+        if device in ["cirrus", "topcon"]:
+            inputs = imaging_utils.list_subfolders(protocol_folder)
+        else:
+            inputs = imaging_utils.get_filtered_file_names(protocol_folder)
+        items += [(path, output) for path in inputs]
+    return run_items(instance.convert, items)
+
+
+def finalize_device(device, corpus, folders):
+    """
+    Arrange the final structure and extract the metadata of a device (step 4 of the drivers).
+
+    Returns:
+        int: The number of failed items.
+    """
+    import cirrus_utils
+
+    instance = imaging_registry.create_domain(device)
+    format_file = (
+        cirrus_utils.format_cirrus_file if device == "cirrus" else imaging_utils.format_file
+    )
+
+    def finalize(file):
+        full_file_path = format_file(file, folders["final"])
+        if full_file_path:
+            instance.metadata(full_file_path, folders["metadata"])
+
+    return run_items(
+        finalize,
+        [(file,) for file in imaging_utils.get_filtered_file_names(folders["converted"])],
+    )
+
+
+def manifest_device(device, corpus, folders):
+    """
+    Build the manifests of the final structure of a device.
+
+    Returns:
+        int: The number of failed manifests.
+    """
+    manifest_creation = importlib.import_module("manifest_creation")
+    final = folders["final"]
+
+    if device == "flio":
+        return run_items(manifest_creation.make_flio_manifest, [(final,)])
+
+    op, _ = manifest_creation.make_retinal_photography_manifest(final)
+    failures = 0
+    if device in ["cirrus", "topcon", "spectralis"]:
+        failures += run_items(manifest_creation.make_retinal_oct_manifest, [(op, final)])
+    if device in ["cirrus", "topcon"]:
+        failures += run_items(manifest_creation.octa_manifest, [(final,)])
+    return failures
+
+
+pipeline_functions = {
+    "organize": organize_device,
+    "convert": convert_device,
+    "finalize": finalize_device,
+    "manifest": manifest_device,
+}
+
+# Output folder of each step, reset before the step runs
+pipeline_outputs = {
+    "organize": ["organized"],
+    "convert": ["raw", "converted"],
+    "finalize": ["final", "metadata"],
+    "manifest": [],
+}
+
+# Input folder of each step, whose files are the benchmark items
+pipeline_inputs = {
+    "organize": None,
+    "convert": "organized",
+    "finalize": "converted",
+    "manifest": "metadata",
+}
+
+
+def ensure_step(device, step, corpus, workdir):
+    """
+    Run the steps before a pipeline step whose output is missing, untimed.
+
+    Args:
+        device (str): The device.
+        step (str): The step about to run (or whose output is needed).
+        corpus (str): The synthetic corpus folder.
+        workdir (str): The benchmark working folder.
+    """
+    folders = device_folders(workdir, device)
+    for previous in pipeline_steps[: pipeline_steps.index(step)]:
+        outputs = pipeline_outputs[previous]
+        if outputs and not all(os.path.isdir(folders[key]) for key in outputs):
+            reset_folders(*(folders[key] for key in outputs))
+            pipeline_functions[previous](device, corpus, folders)
+
+
+@contextlib.contextmanager
+def timed_functions(module_names, function_names):
+    """
+    Time every call of module-level functions while the context is active.
+
+    The functions are replaced by timing wrappers on their modules, so calls made
+    through the module (including calls from inside the module) are measured.
+
+    Args:
+        module_names (list): The modules.
+        function_names (list): The function names, skipped where a module does not define them.
+
+    Yields:
+        dict: Maps "<function>[<module>]" to [seconds, calls], updated as calls happen.
+    """
+    timings = {}
+    patched = []
+
+    def timed(function, timing):
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                timing[0] += time.perf_counter() - start
+                timing[1] += 1
+
+        return wrapper
+
+    for module_name in module_names:
+        module = importlib.import_module(module_name)
+        for function_name in function_names:
+            function = getattr(module, function_name, None)
+            if function is None:
+                continue
+            timing = timings.setdefault(f"{function_name}[{module_name}]", [0.0, 0])
+            setattr(module, function_name, timed(function, timing))
+            patched.append((module, function_name, function))
+    try:
+        yield timings
+    finally:
+        for module, function_name, function in patched:
+            setattr(module, function_name, function)
+
+
+def prepare_pipeline_step(name, corpus, workdir):
+    """
+    Prepare an end-to-end benchmark ("<step>.<device>").
+
+    Returns:
+        tuple: (run function, number of items).
+    """
+    step, device = name.split(".")
+    ensure_step(device, step, corpus, workdir)
+    folders = device_folders(workdir, device)
+    reset_folders(*(folders[key] for key in pipeline_outputs[step]))
+
+    source = pipeline_inputs[step]
+    items = count_files(os.path.join(corpus, device) if source is None else folders[source])
+
+    def run():
+        return {"Failures": pipeline_functions[step](device, corpus, folders)}
+
+    return run, items
+
+
+def prepare_converters(name, corpus, workdir):
+    """
+    Prepare the converters.<device> microbenchmark: convert the organized files into a
+    scratch folder while timing extract_dicom_dict, write_dicom and convert_dicom of
+    every converter module of the device.
+
+    Returns:
+        tuple: (run function, number of items).
+    """
+    device = name.split(".")[1]
+    ensure_step(device, "convert", corpus, workdir)
+    folders = dict(device_folders(workdir, device))
+    scratch = os.path.join(workdir, device, "benchmark_converted")
+    folders["raw"] = f"{scratch}/raw"
+    folders["converted"] = f"{scratch}/converted"
+    reset_folders(folders["raw"], folders["converted"])
+
+    def run():
+        with timed_functions(device_converters[device], converter_functions) as timings:
+            failures = convert_device(device, corpus, folders)
+        return {"Failures": failures, "Timings": timings}
+
+    return run, count_files(folders["organized"])
+
+
+def prepare_find_rule(name, corpus, workdir):
+    """
+    Prepare the find_rule microbenchmark on every file classified by imaging_classifying_rules.
+
+    Returns:
+        tuple: (run function, number of items).
+    """
+    import imaging_classifying_rules
+
+    files = []
+    for device in ["spectralis", "eidon", "optomed", "topcon"]:
+        for root, _, names in os.walk(os.path.join(corpus, device)):
+            files += [
+                os.path.join(root, file)
+                for file in sorted(names)
+                if device != "topcon" or file.endswith("1.1.dcm")
+            ]
+
+    def run():
+        return {"Failures": run_items(imaging_classifying_rules.find_rule, [(f,) for f in files])}
+
+    return run, len(files)
+
+
+def prepare_zeiss_segmentation(name, corpus, workdir):
+    """
+    Prepare the ZeissSegmentationConverter microbenchmark on an angiography-sized
+    segmentation (350 B-scans of 1024 x 350) holding one layer per A-scan.
+
+    Returns:
+        tuple: (run function, number of items).
+    """
+    import cirrus_heightmap_converter
+
+    rows, columns, frames = synthetic_corpus.cirrus_protocols["cirrus_mac_angiography"]["oct"]
+    pixel_array = np.zeros((frames, rows, columns), dtype=np.uint8)
+    pixel_array[:, rows // 3 : 2 * rows // 3, :] = 255
+
+    def run():
+        converter = cirrus_heightmap_converter.ZeissSegmentationConverter(
+            None, pixel_array=pixel_array
+        )
+        converter.zeiss_segmentation_to_heightmap()
+
+    return run, frames
+
+
+def prepare_flio_get_array(name, corpus, workdir):
+    """
+    Prepare the flio_reader.get_array microbenchmark on the synthetic SDT files.
+
+    Returns:
+        tuple: (run function, number of items).
+    """
+    import flio_reader
+
+    files = []
+    for root, _, names in os.walk(os.path.join(corpus, "flio")):
+        files += [os.path.join(root, file) for file in names if file.endswith(".sdt")]
+    files = sorted(files)[:4]
+
+    def run():
+        for file in files:
+            flio_reader.get_array(file)
+
+    return run, len(files)
+
+
+def prepare_cli_help(name, corpus, workdir):
+    """
+    Prepare the cli_help microbenchmark: start `aireadi-imaging --help` in a fresh
+    interpreter five times. Starts slower than cli_help_budget count as failures.
+
+    Returns:
+        tuple: (run function, number of items).
+    """
+    import subprocess
+
+    command = [
+        sys.executable,
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "imaging_cli.py"),
+        "--help",
+    ]
+    starts = 5
+
+    def run():
+        failures = 0
+        for _ in range(starts):
+            start = time.perf_counter()
+            subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+            if time.perf_counter() - start > cli_help_budget:
+                failures += 1
+        return {"Failures": failures}
+
+    return run, starts
+
+
+def metadata_files(workdir, devices):
+    """
+    List the metadata JSON files written by the finalize step of the given devices.
+    """
+    files = []
+    for device in devices:
+        for root, _, names in os.walk(device_folders(workdir, device)["metadata"]):
+            files += [os.path.join(root, file) for file in sorted(names) if file.endswith(".json")]
+    return files
+
+
+def prepare_get_item_from_json(name, corpus, workdir, devices):
+    """
+    Prepare the manifest_creation.get_item_from_json microbenchmark on the metadata files.
+
+    Returns:
+        tuple: (run function, number of items).
+    """
+    manifest_creation = importlib.import_module("manifest_creation")
+    for device in devices:
+        ensure_step(device, "manifest", corpus, workdir)
+    files = metadata_files(workdir, devices)
+
+    def run():
+        return {
+            "Failures": run_items(
+                manifest_creation.get_item_from_json, [(file, "filepath") for file in files]
+            )
+        }
+
+    return run, len(files)
+
+
+def prepare_evaluate_compliance(name, corpus, workdir, devices):
+    """
+    Prepare the compliance_report.evaluate_compliance microbenchmark on the converted files.
+
+    The DICOM dictionaries are extracted during the preparation; only the rule
+    evaluation is timed.
+
+    Returns:
+        tuple: (run function, number of items).
+    """
+    import compliance_report
+    import pydicom
+
+    evaluations = []
+    for device in devices:
+        ensure_step(device, "finalize", corpus, workdir)
+        for file in imaging_utils.get_filtered_file_names(
+            device_folders(workdir, device)["converted"]
+        ):
+            sop_class = pydicom.dcmread(file, stop_before_pixels=True).SOPClassUID
+            rule = imaging_registry.get_compliance_rule(sop_class)
+            if rule is not None:
+                evaluations.append(
+                    (rule, compliance_report.extract_dicom_dict(file, rule.tags()))
+                )
+
+    def run():
+        for rule, dicom_dict in evaluations:
+            compliance_report.evaluate_compliance(rule, dicom_dict)
+
+    return run, len(evaluations)
+
+
+def prepare_benchmark(name, corpus, workdir, devices):
+    """
+    Prepare a benchmark: set up its inputs (untimed) and return the work to measure.
+
+    Args:
+        name (str): The benchmark name.
+        corpus (str): The synthetic corpus folder.
+        workdir (str): The benchmark working folder.
+        devices (list): The devices of the run.
+
+    Returns:
+        tuple: (run function, number of items). The run function may return a dict
+        with "Failures" (int) and "Timings" (see timed_functions).
+    """
+    benchmark = name.split(".")[0]
+    if benchmark in pipeline_steps:
+        return prepare_pipeline_step(name, corpus, workdir)
+    if benchmark == "converters":
+        return prepare_converters(name, corpus, workdir)
+    if benchmark == "find_rule":
+        return prepare_find_rule(name, corpus, workdir)
+    if benchmark == "zeiss_segmentation":
+        return prepare_zeiss_segmentation(name, corpus, workdir)
+    if benchmark == "flio_get_array":
+        return prepare_flio_get_array(name, corpus, workdir)
+    if benchmark == "get_item_from_json":
+        return prepare_get_item_from_json(name, corpus, workdir, devices)
+    if benchmark == "evaluate_compliance":
+        return prepare_evaluate_compliance(name, corpus, workdir, devices)
+    if benchmark == "cli_help":
+        return prepare_cli_help(name, corpus, workdir)
+    raise ValueError(f"Unknown benchmark: {name}")
+
+
+def measure_benchmark(name, corpus, workdir, devices):
+    """
+    Run one benchmark in the current process and measure it.
+
+    Peak RSS covers the whole process, so benchmarks are meant to run in a fresh
+    process each (see run_benchmarks). The output printed by the pipeline is discarded.
+
+    Args:
+        name (str): The benchmark name.
+        corpus (str): The synthetic corpus folder.
+        workdir (str): The benchmark working folder.
+        devices (list): The devices of the run.
+
+    Returns:
+        list: The result dictionary of the benchmark, followed by one result per timed
+        function for the converters benchmarks. Each result holds "Name", "Kind",
+        "Items", "Seconds", "Throughput" (items per second), "Peak RSS", "Bytes read",
+        "Bytes written", "Failures" and, if the benchmark could not run, "Error".
+    """
+    result = {
+        "Name": name,
+        "Kind": benchmark_kind(name),
+        "Items": 0,
+        "Seconds": None,
+        "Throughput": None,
+        "Peak RSS": None,
+        "Bytes read": None,
+        "Bytes written": None,
+        "Failures": 0,
+    }
+
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            run, items = prepare_benchmark(name, corpus, workdir, devices)
+            read_before, written_before = io_counters()
+            start = time.perf_counter()
+            extra = run() or {}
+            seconds = time.perf_counter() - start
+            read_after, written_after = io_counters()
+    except Exception as e:
+        result["Error"] = f"{type(e).__name__}: {e}"
+        return [result]
+
+    result.update(
+        {
+            "Items": items,
+            "Seconds": seconds,
+            "Throughput": items / seconds if seconds > 0 else None,
+            "Peak RSS": peak_rss(),
+            "Bytes read": None if read_before is None else read_after - read_before,
+            "Bytes written": (
+                None if written_before is None else written_after - written_before
+            ),
+            "Failures": extra.get("Failures", 0),
+        }
+    )
+
+    results = [result]
+    for function, (function_seconds, calls) in extra.get("Timings", {}).items():
+        if calls:
+            results.append(
+                {
+                    "Name": f"{name}.{function}",
+                    "Kind": "micro",
+                    "Items": calls,
+                    "Seconds": function_seconds,
+                    "Throughput": calls / function_seconds if function_seconds > 0 else None,
+                    "Peak RSS": None,
+                    "Bytes read": None,
+                    "Bytes written": None,
+                    "Failures": 0,
+                }
+            )
+    return results
+
+
+def run_benchmarks(corpus, workdir, names, devices, repeat=1, isolate=True):
+    """
+    Run benchmarks one after the other and keep the fastest of the repeats of each.
+
+    Args:
+        corpus (str): The synthetic corpus folder.
+        workdir (str): The benchmark working folder.
+        names (list): The benchmark names, see benchmark_names.
+        devices (list): The devices of the run.
+        repeat (int): The number of runs of each benchmark.
+        isolate (bool): If True, each run happens in a fresh process, so its peak RSS
+            and I/O are its own.
+
+    Returns:
+        list: The result dictionaries, see measure_benchmark.
+    """
+    context = multiprocessing.get_context("spawn")
+    results = []
+
+    for name in names:
+        best = None
+        for _ in range(repeat):
+            if isolate:
+                with context.Pool(1) as pool:
+                    measured = pool.apply(
+                        measure_benchmark, (name, corpus, workdir, devices)
+                    )
+            else:
+                measured = measure_benchmark(name, corpus, workdir, devices)
+            if best is None or (
+                measured[0]["Seconds"] is not None
+                and (best[0]["Seconds"] is None or measured[0]["Seconds"] < best[0]["Seconds"])
+            ):
+                best = measured
+
+        result = best[0]
+        if "Error" in result:
+            print(f"{name}: ERROR {result['Error']}")
+        else:
+            print(
+                f"{name}: {result['Items']} items in {result['Seconds']:.2f} s "
+                f"({result['Throughput'] or 0:.1f}/s), peak RSS {result['Peak RSS'] / 1024 ** 2:.0f} MB"
+                + (f", {result['Failures']} failures" if result["Failures"] else "")
+            )
+        results.extend(best)
+
+    return results
+
+
+def prepare_corpus(corpus, participants, devices, seed=0):
+    """
+    Write the synthetic corpus unless every device folder already exists.
+
+    Args:
+        corpus (str): The synthetic corpus folder.
+        participants (int): The number of participants.
+        devices (list): The devices.
+        seed (int): The corpus seed.
+
+    Returns:
+        dict: The corpus description stored in the baseline.
+    """
+    missing = [device for device in devices if not os.path.isdir(os.path.join(corpus, device))]
+    if missing:
+        synthetic_corpus.generate_corpus(
+            corpus, participants=participants, devices=missing, seed=seed
+        )
+
+    return {
+        "Participants": participants,
+        "Seed": seed,
+        "Devices": devices,
+        "Files": {device: count_files(os.path.join(corpus, device)) for device in devices},
+    }
+
+
+def check_drivers(corpus, workdir, devices):
+    """
+    Run the synthetic corpus through the driver of every device and list what did not go through.
+
+    Each driver runs as `aireadi-imaging process <device>` in its own interpreter, with
+    tracing enabled. A device passes when its driver exits normally, its run log holds no
+    failed item, no file was routed to one of the unrouted_folders and its trace holds
+    the organize spans of its DataDomain, including those of the Topcon organize workers.
+    Benchmarks of a corpus that does not pass would time an error path.
+
+    Args:
+        corpus (str): The synthetic corpus folder.
+        workdir (str): The benchmark working folder; the outputs go to <workdir>/check/<device>.
+        devices (list): The devices to check.
+
+    Returns:
+        dict: Device -> list of problems (empty when the device passes).
+    """
+    import subprocess
+
+    import imaging_tracing
+    from imaging_run_log import RunLog
+
+    cli = os.path.join(os.path.dirname(os.path.abspath(__file__)), "imaging_cli.py")
+    problems = {}
+    for device in devices:
+        output = os.path.join(workdir, "check", device)
+        # Spans of an earlier check would be read as spans of this one
+        shutil.rmtree(os.path.join(output, "trace"), ignore_errors=True)
+        command = [
+            sys.executable, cli, "process", device,
+            "-i", os.path.join(corpus, device),
+            "-o", output,
+            "--trace-folder", os.path.join(output, "trace"),
+        ]
+        if device == "flio":
+            command += ["-j", os.path.join(corpus, "flio_uid_data.json")]
+
+        found = []
+        completed = subprocess.run(
+            command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+        )
+        if completed.returncode:
+            found.append(
+                f"driver exited with code {completed.returncode}: "
+                + (completed.stderr.strip().splitlines() or [""])[-1]
+            )
+
+        log_path = os.path.join(output, "logs", "run_log.jsonl")
+        for entry in RunLog(log_path).read() if os.path.exists(log_path) else []:
+            if entry["Status"] != "SUCCESS":
+                found.append(f"{entry['Step']} failed on {entry['Input']}: {entry['ErrorMessage']}")
+
+        for root, dirs, files in os.walk(output):
+            for folder in dirs:
+                if folder in unrouted_folders:
+                    count = sum(len(names) for _, _, names in os.walk(os.path.join(root, folder)))
+                    found.append(f"{count} file(s) in {os.path.join(root, folder)}")
+            dirs[:] = [folder for folder in dirs if folder not in unrouted_folders]
+
+        organize_span = f"{imaging_registry.device_domains[device][1]}.organize"
+        spans = imaging_tracing.load_spans(os.path.join(output, "trace"))
+        if not any(span["Name"] == organize_span for span in spans):
+            found.append(f"no {organize_span} span in the trace of the driver")
+
+        problems[device] = found
+    return problems
+
+
+def create_baseline(results, corpus_info):
+    """
+    Build the baseline document of a run.
+
+    Args:
+        results (list): The results of run_benchmarks.
+        corpus_info (dict): The corpus description of prepare_corpus.
+
+    Returns:
+        dict: The baseline with the keys "Created", "Platform", "Python", "Corpus" and "Results".
+    """
+    return {
+        "Created": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "Platform": platform.platform(),
+        "Python": platform.python_version(),
+        "Corpus": corpus_info,
+        "Results": results,
+    }
+
+
+def save_baseline(path, baseline):
+    """
+    Save a baseline as JSON.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as file:
+        json.dump(baseline, file, indent=4)
+
+
+def load_baseline(path):
+    """
+    Load a baseline saved by save_baseline.
+    """
+    with open(path, "r") as file:
+        return json.load(file)
+
+
+def compare_baselines(baseline, current, threshold=benchmark_threshold):
+    """
+    Compare two runs and list the regressions over a relative threshold.
+
+    Throughput regresses when it drops, peak RSS and bytes read or written when they
+    grow. A benchmark that ran in the baseline but fails in the current run, or that
+    has more failed items, is a regression as well.
+
+    Args:
+        baseline (dict): The reference baseline.
+        current (dict): The baseline of the run to check.
+        threshold (float): The relative change allowed (0.10 = 10 %).
+
+    Returns:
+        list: One dictionary per regression with the keys "Name", "Metric", "Baseline",
+        "Current" and "Change" (relative change, None for errors and failures).
+    """
+    reference = {result["Name"]: result for result in baseline["Results"]}
+    regressions = []
+
+    for result in current["Results"]:
+        previous = reference.get(result["Name"])
+        if previous is None or "Error" in previous:
+            continue
+
+        if "Error" in result:
+            regressions.append(
+                {
+                    "Name": result["Name"],
+                    "Metric": "Error",
+                    "Baseline": None,
+                    "Current": result["Error"],
+                    "Change": None,
+                }
+            )
+            continue
+
+        if result.get("Failures", 0) > previous.get("Failures", 0):
+            regressions.append(
+                {
+                    "Name": result["Name"],
+                    "Metric": "Failures",
+                    "Baseline": previous.get("Failures", 0),
+                    "Current": result["Failures"],
+                    "Change": None,
+                }
+            )
+
+        for metric, larger_is_worse in compared_metrics.items():
+            before = previous.get(metric)
+            after = result.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            if (change if larger_is_worse else -change) > threshold:
+                regressions.append(
+                    {
+                        "Name": result["Name"],
+                        "Metric": metric,
+                        "Baseline": before,
+                        "Current": after,
+                        "Change": change,
+                    }
+                )
+
+    return regressions
+
+
+def print_comparison(baseline, current, regressions, threshold=benchmark_threshold):
+    """
+    Print the regressions found by compare_baselines.
+    """
+    if baseline.get("Corpus") != current.get("Corpus"):
+        print("WARNING: the runs used different corpora, the comparison may not be meaningful.")
+
+    if not regressions:
+        print(f"No regression over {threshold:.0%}.")
+        return
+
+    print(f"{len(regressions)} regression(s) over {threshold:.0%}:")
+    for regression in regressions:
+        if regression["Metric"] == "Error":
+            print(f"  {regression['Name']}: now fails ({regression['Current']})")
+        elif regression["Metric"] == "Failures":
+            print(
+                f"  {regression['Name']} Failures: "
+                f"{regression['Baseline']} -> {regression['Current']}"
+            )
+        else:
+            print(
+                f"  {regression['Name']} {regression['Metric']}: "
+                f"{regression['Baseline']:.4g} -> {regression['Current']:.4g} "
+                f"({regression['Change']:+.1%})"
+            )
@@ -0,0 +1,326 @@
+import json
+import os
+
+import pydicom
+from joblib import Parallel, delayed
+from pydicom.datadict import keyword_for_tag
+from pydicom.tag import Tag
+
+import imaging_frames
+import imaging_writer
+import organize_utils
+
+# Fields of a release index entry
+index_fields = ["Path", "Size", "Mtime", "Header BLAKE2b", "Pixel BLAKE2b", "SOPInstanceUID"]
+
+# Differences listed at most per changed file
+explain_max_differences = 20
+
+
+def header_fingerprint(file_path):
+    """
+    Hash the header of a DICOM file and read its SOP Instance UID, without reading the pixel data.
+
+    The header is every byte before the pixel data element (preamble, file meta and
+    data elements), hashed as stored.
+
+    Args:
+        file_path (str): The DICOM file.
+
+    Returns:
+        tuple: (header BLAKE2b, SOPInstanceUID), with None for the UID if it is missing.
+    """
+    with open(file_path, "rb") as file:
+        dataset = pydicom.dcmread(file, stop_before_pixels=True)
+        # pydicom rewinds to the start of the pixel data element when it stops
+        header_length = file.tell()
+        file.seek(0)
+        checksum = imaging_writer.new_checksum()
+        remaining = header_length
+        while remaining:
+            chunk = file.read(min(remaining, imaging_writer.copy_buffer_size))
+            if not chunk:
+                break
+            checksum.update(chunk)
+            remaining -= len(chunk)
+    uid = dataset.get("SOPInstanceUID")
+    return checksum.hexdigest(), str(uid) if uid else None
+
+
+def load_metadata_checksums(metadata_folder):
+    """
+    Map the files of a release to the pixel data checksums of their metadata records.
+
+    Args:
+        metadata_folder (str): The metadata folder of the release (JSON records).
+
+    Returns:
+        dict: Relative file path ("retinal_oct/...") -> pixel_data_blake2b.
+    """
+    checksums = {}
+    for json_file in organize_utils.get_json_files(metadata_folder):
+        with open(json_file, "r") as file:
+            for record in json.load(file).values():
+                if record.get("pixel_data_blake2b"):
+                    checksums[record["filepath"].lstrip("/")] = record["pixel_data_blake2b"]
+    return checksums
+
+
+def index_file(release_folder, relative_path, metadata_checksums=None):
+    """
+    Build the index entry of one file of a release.
+
+    The pixel checksum is taken from the metadata record of the file when there is one,
+    so only the header is read; otherwise the file is read in full.
+
+    Args:
+        release_folder (str): The release root.
+        relative_path (str): The file, relative to the release root.
+        metadata_checksums (dict, optional): The result of load_metadata_checksums.
+
+    Returns:
+        dict: The entry (see index_fields), with "Error" instead of the hashes if the
+        file cannot be read.
+    """
+    file_path = os.path.join(release_folder, relative_path)
+    stat = os.stat(file_path)
+    entry = {"Path": relative_path, "Size": stat.st_size, "Mtime": stat.st_mtime_ns}
+    try:
+        entry["Header BLAKE2b"], entry["SOPInstanceUID"] = header_fingerprint(file_path)
+        pixel_checksum = (metadata_checksums or {}).get(relative_path)
+        if pixel_checksum is None:
+            pixel_checksum = imaging_writer.pixel_data_checksum(pydicom.dcmread(file_path))
+        entry["Pixel BLAKE2b"] = pixel_checksum
+    except Exception as e:
+        entry.update({"Header BLAKE2b": None, "Pixel BLAKE2b": None, "SOPInstanceUID": None})
+        entry["Error"] = str(e)
+    return entry
+
+
+def load_index(index_path):
+    """
+    Load a release index saved by save_index.
+
+    Args:
+        index_path (str): The JSON Lines index file.
+
+    Returns:
+        dict: Relative path -> entry, empty if the file does not exist.
+    """
+    if not index_path or not os.path.exists(index_path):
+        return {}
+    with open(index_path, "r") as file:
+        entries = [json.loads(line) for line in file if line.strip()]
+    return {entry["Path"]: entry for entry in entries}
+
+
+def save_index(index, index_path):
+    """
+    Save a release index as JSON Lines, one entry per file.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(index_path)), exist_ok=True)
+    imaging_writer.atomic_write(
+        index_path,
+        lambda file: file.write(
+            "".join(json.dumps(index[path]) + "\n" for path in sorted(index)).encode()
+        ),
+    )
+
+
+def build_index(release_folder, index_path=None, metadata_folder=None, n_jobs=-1):
+    """
+    Build the content index of a release, reusing a saved index for unchanged files.
+
+    Entries of the saved index are reused when the size and modification time of the
+    file have not changed, so re-indexing a release only reads new or modified files.
+
+    Args:
+        release_folder (str): The release root.
+        index_path (str, optional): Saved index, loaded first and updated afterwards.
+        metadata_folder (str, optional): Metadata records of the release, used for the
+            pixel checksums (see load_metadata_checksums).
+        n_jobs (int): Number of files indexed in parallel.
+
+    Returns:
+        dict: Relative path -> entry (see index_fields).
+    """
+    saved = load_index(index_path)
+    metadata_checksums = load_metadata_checksums(metadata_folder) if metadata_folder else None
+
+    index = {}
+    pending = []
+    for file_path in organize_utils.get_dcm_files(release_folder):
+        relative_path = os.path.relpath(file_path, release_folder)
+        entry = saved.get(relative_path)
+        stat = os.stat(file_path)
+        if entry and entry["Size"] == stat.st_size and entry["Mtime"] == stat.st_mtime_ns:
+            index[relative_path] = entry
+        else:
+            pending.append(relative_path)
+
+    entries = Parallel(n_jobs=n_jobs, batch_size=64)(
+        delayed(index_file)(release_folder, relative_path, metadata_checksums)
+        for relative_path in pending
+    )
+    index.update((entry["Path"], entry) for entry in entries)
+
+    if index_path:
+        save_index(index, index_path)
+    return index
+
+
+def same_content(old_entry, new_entry):
+    """
+    Return the parts ("Header", "Pixel data") that differ between two index entries.
+    """
+    parts = []
+    if old_entry["Header BLAKE2b"] != new_entry["Header BLAKE2b"]:
+        parts.append("Header")
+    if old_entry["Pixel BLAKE2b"] != new_entry["Pixel BLAKE2b"]:
+        parts.append("Pixel data")
+    return parts
+
+
+def diff_indexes(old_index, new_index):
+    """
+    Compare two release indexes with dictionary lookups only.
+
+    Files at the same path are unchanged or changed. Files whose path disappeared and
+    appeared elsewhere with the same SOP Instance UID are moved (and possibly changed).
+    The rest are removed or added.
+
+    Args:
+        old_index (dict): Index of the previous release.
+        new_index (dict): Index of the new release.
+
+    Returns:
+        dict: "Added", "Removed" (lists of paths), "Moved" (list of dictionaries with
+        "Old path", "New path" and "Changed"), "Changed" (list of dictionaries with
+        "Path" and "Changed", the differing parts) and "Unchanged" (count).
+    """
+    result = {"Added": [], "Removed": [], "Moved": [], "Changed": [], "Unchanged": 0}
+
+    for path in old_index.keys() & new_index.keys():
+        parts = same_content(old_index[path], new_index[path])
+        if parts:
+            result["Changed"].append({"Path": path, "Changed": parts})
+        else:
+            result["Unchanged"] += 1
+
+    removed = {path: old_index[path] for path in old_index.keys() - new_index.keys()}
+    added = {path: new_index[path] for path in new_index.keys() - old_index.keys()}
+
+    added_by_uid = {}
+    for path, entry in added.items():
+        if entry["SOPInstanceUID"]:
+            added_by_uid.setdefault(entry["SOPInstanceUID"], []).append(path)
+
+    for path, entry in sorted(removed.items()):
+        candidates = added_by_uid.get(entry["SOPInstanceUID"]) if entry["SOPInstanceUID"] else None
+        if candidates:
+            new_path = candidates.pop()
+            result["Moved"].append(
+                {
+                    "Old path": path,
+                    "New path": new_path,
+                    "Changed": same_content(entry, added.pop(new_path)),
+                }
+            )
+        else:
+            result["Removed"].append(path)
+
+    result["Added"] = sorted(added)
+    result["Changed"].sort(key=lambda change: change["Path"])
+    return result
+
+
+def explain_change(old_file, new_file, parts):
+    """
+    Open two versions of a file and list what differs between their headers.
+
+    Only the headers are read; a pixel data change is narrowed down to the frames that
+    differ, read one at a time.
+
+    Args:
+        old_file (str): The file in the previous release.
+        new_file (str): The file in the new release.
+        parts (list): The differing parts found by diff_indexes.
+
+    Returns:
+        list: Readable differences, at most explain_max_differences of them.
+    """
+    differences = []
+    if "Header" in parts:
+        old_dataset = pydicom.dcmread(old_file, stop_before_pixels=True)
+        new_dataset = pydicom.dcmread(new_file, stop_before_pixels=True)
+        old_tags = {int(element.tag) for element in old_dataset}
+        new_tags = {int(element.tag) for element in new_dataset}
+        for tag in sorted(old_tags | new_tags):
+            name = f"({Tag(tag).group:04X},{Tag(tag).element:04X}) {keyword_for_tag(tag)}".strip()
+            if tag not in new_tags:
+                differences.append(f"{name} removed")
+            elif tag not in old_tags:
+                differences.append(f"{name} added")
+            elif not organize_utils.compare_values(old_dataset[tag].value, new_dataset[tag].value):
+                differences.append(f"{name} changed")
+            if len(differences) >= explain_max_differences:
+                differences.append("...")
+                break
+        if old_dataset.file_meta != new_dataset.file_meta:
+            differences.append("File meta information changed")
+    if "Pixel data" in parts:
+        frames = imaging_frames.differing_frames(old_file, new_file)
+        if frames:
+            differences.append(f"Pixel data changed in {len(frames)} frame(s): {frames[:explain_max_differences]}")
+        else:
+            differences.append("Pixel data changed")
+    return differences
+
+
+def release_diff(
+    old_folder,
+    new_folder,
+    old_index_path=None,
+    new_index_path=None,
+    old_metadata=None,
+    new_metadata=None,
+    explain_limit=100,
+    n_jobs=-1,
+):
+    """
+    Compare two releases through their content indexes.
+
+    Args:
+        old_folder (str): Root of the previous release.
+        new_folder (str): Root of the new release.
+        old_index_path (str, optional): Saved index of the previous release.
+        new_index_path (str, optional): Saved index of the new release.
+        old_metadata (str, optional): Metadata records of the previous release.
+        new_metadata (str, optional): Metadata records of the new release.
+        explain_limit (int): Changed or moved-and-changed files opened to explain the change.
+        n_jobs (int): Number of files indexed in parallel.
+
+    Returns:
+        dict: The result of diff_indexes, where the first explain_limit changed files get
+        an "Explanation" list.
+    """
+    old_index = build_index(old_folder, old_index_path, old_metadata, n_jobs)
+    new_index = build_index(new_folder, new_index_path, new_metadata, n_jobs)
+    result = diff_indexes(old_index, new_index)
+
+    to_explain = [
+        (change, change["Path"], change["Path"]) for change in result["Changed"]
+    ] + [
+        (move, move["Old path"], move["New path"]) for move in result["Moved"] if move["Changed"]
+    ]
+    for change, old_path, new_path in to_explain[:explain_limit]:
+        try:
+            change["Explanation"] = explain_change(
+                os.path.join(old_folder, old_path),
+                os.path.join(new_folder, new_path),
+                change["Changed"],
+            )
+        except Exception as e:
+            change["Explanation"] = [f"Could not read the files: {e}"]
+
+    return result
@@ -0,0 +1,286 @@
+import contextlib
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import imaging_writer
+import organize_utils
+from imaging_run_log import RunLog
+
+# Sync state kept in the release folder (hidden, so get_dcm_files skips it)
+sync_state_name = ".release_sync.jsonl"
+
+# Threads transferring files
+sync_threads = 8
+
+# Transfer actions, as logged in the "Protocol" field of the transfer log
+sync_actions = ["Unchanged", "Link", "Copy", "Delete"]
+
+
+def load_sync_state(destination):
+    """
+    Load the sync state of a release folder.
+
+    Returns:
+        dict: Relative path -> {"Size", "Mtime", "BLAKE2b"} of the files as last synced.
+    """
+    path = os.path.join(destination, sync_state_name)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as file:
+        entries = [json.loads(line) for line in file if line.strip()]
+    return {entry.pop("Path"): entry for entry in entries}
+
+
+def save_sync_state(destination, state):
+    """
+    Save the sync state of a release folder.
+    """
+    imaging_writer.atomic_write(
+        os.path.join(destination, sync_state_name),
+        lambda file: file.write(
+            "".join(
+                json.dumps({"Path": path, **state[path]}) + "\n" for path in sorted(state)
+            ).encode()
+        ),
+    )
+
+
+def stored_checksum(path, stat, state_entry):
+    """
+    Return the BLAKE2b checksum of a file, from its sync state entry if the file has not
+    changed since (same size and modification time), else by hashing it.
+    """
+    if (
+        state_entry
+        and state_entry.get("BLAKE2b")
+        and state_entry["Size"] == stat.st_size
+        and state_entry["Mtime"] == stat.st_mtime_ns
+    ):
+        return state_entry["BLAKE2b"]
+    return imaging_writer.file_checksum(path)
+
+
+def same_file(source, target, target_state=None):
+    """
+    Tell whether a target file already holds the content of a source file.
+
+    Like rsync, the sizes and modification times are compared first; only files of the
+    same size whose times differ are hashed, and the target hash is taken from the sync
+    state when the target has not changed since the last sync.
+
+    Args:
+        source (str): The source file.
+        target (str): The target file.
+        target_state (dict, optional): The sync state entry of the target.
+
+    Returns:
+        tuple: (bool, BLAKE2b checksum of the source if it was computed, else None).
+    """
+    try:
+        source_stat = os.stat(source)
+        target_stat = os.stat(target)
+    except OSError:
+        return False, None
+
+    if os.path.samestat(source_stat, target_stat):
+        return True, None
+    if source_stat.st_size != target_stat.st_size:
+        return False, None
+    if source_stat.st_mtime_ns == target_stat.st_mtime_ns:
+        return True, None
+
+    checksum = imaging_writer.file_checksum(source)
+    return checksum == stored_checksum(target, target_stat, target_state), checksum
+
+
+def place_file(source, path, link):
+    """
+    Replace a release file with a hard link to, or a copy of, a source file.
+
+    The new file is created under a hidden temp name and renamed over the old one, so a
+    file shared with the previous release through a hard link is never written into.
+    """
+    folder = os.path.dirname(path)
+    os.makedirs(folder, exist_ok=True)
+    temp_path = os.path.join(folder, f".{os.path.basename(path)}.{os.getpid()}.sync")
+    try:
+        if link:
+            os.link(source, temp_path)
+        else:
+            shutil.copy2(source, temp_path)
+        os.replace(temp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temp_path)
+        raise
+
+
+def plan_sync(selected, destination, previous_release=None, state=None):
+    """
+    Decide the action of every file of the new release.
+
+    Args:
+        selected (dict): Destination file -> source file (see organize_utils.select_merge_files).
+        destination (str): The release folder being assembled.
+        previous_release (str, optional): The previous release; files whose content is
+            unchanged are hard-linked from it.
+        state (dict, optional): The sync state of the destination.
+
+    Returns:
+        dict: Destination file -> (action, file to link or copy, BLAKE2b if computed).
+    """
+    state = state or {}
+    plan = {}
+    for dest_file, src_file in selected.items():
+        relative_path = os.path.relpath(dest_file, destination)
+
+        same, checksum = same_file(src_file, dest_file, state.get(relative_path))
+        if same:
+            plan[dest_file] = ("Unchanged", src_file, checksum)
+            continue
+
+        if previous_release:
+            previous_file = os.path.join(previous_release, relative_path)
+            same, previous_checksum = same_file(src_file, previous_file)
+            if same:
+                plan[dest_file] = ("Link", previous_file, checksum or previous_checksum)
+                continue
+
+        plan[dest_file] = ("Copy", src_file, checksum)
+    return plan
+
+
+def sync_release(
+    patientid_csv,
+    sources,
+    destination,
+    remove_txt,
+    previous_release=None,
+    delete=True,
+    link=True,
+    dry_run=False,
+    log_path=None,
+    n_threads=sync_threads,
+):
+    """
+    Assemble a release folder incrementally from the past-year and newly processed trees.
+
+    The files are selected as in organize_utils.merge_folders_filter_id_files. Files
+    already in the release are kept, files unchanged since the previous release are
+    hard-linked from it (or copied if it is on another file system), the others are
+    copied, and release files no longer selected are removed.
+
+    Args:
+        patientid_csv (str): Path to the CSV file containing patient IDs.
+        sources (list): Source directories, in priority order.
+        destination (str): The release folder.
+        remove_txt (str): Path to the text file listing the base filenames to exclude.
+        previous_release (str, optional): The previous release folder.
+        delete (bool): Remove the release files that are no longer selected.
+        link (bool): Hard-link unchanged files from the previous release.
+        dry_run (bool): Only log the actions.
+        log_path (str, optional): The transfer log (default: <destination>_sync_log.jsonl).
+        n_threads (int): Number of files transferred at the same time.
+
+    Returns:
+        dict: Number of files per action.
+    """
+    destination = os.path.normpath(destination)
+    if log_path is None:
+        log_path = f"{destination}_sync_log.jsonl"
+
+    selected, _ = organize_utils.select_merge_files(patientid_csv, sources, destination, remove_txt)
+    state = load_sync_state(destination)
+    plan = plan_sync(selected, destination, previous_release if link else None, state)
+
+    stale = []
+    if delete and os.path.isdir(destination):
+        for root, _, files in os.walk(destination):
+            for file in files:
+                path = os.path.join(root, file)
+                if path not in selected and path != os.path.join(destination, sync_state_name):
+                    stale.append(path)
+
+    run_log = RunLog(log_path)
+    new_state = {}
+
+    def transfer(dest_file):
+        action, source, checksum = plan[dest_file]
+        relative_path = os.path.relpath(dest_file, destination)
+        start = time.perf_counter()
+        error_message = ""
+        try:
+            if not dry_run and action != "Unchanged":
+                place_file(source, dest_file, action == "Link")
+        except Exception as e:
+            if action == "Link":
+                # Another file system: fall back to a copy
+                try:
+                    action, source = "Copy", selected[dest_file]
+                    place_file(source, dest_file, False)
+                except Exception as e:
+                    error_message = str(e)
+            else:
+                error_message = str(e)
+
+        if not dry_run and not error_message:
+            stat = os.stat(dest_file)
+            previous = state.get(relative_path, {})
+            new_state[relative_path] = {
+                "Size": stat.st_size,
+                "Mtime": stat.st_mtime_ns,
+                "BLAKE2b": checksum if checksum else (
+                    previous.get("BLAKE2b")
+                    if previous.get("Size") == stat.st_size and previous.get("Mtime") == stat.st_mtime_ns
+                    else None
+                ),
+            }
+        run_log.record(
+            "sync",
+            relative_path,
+            "FAILURE" if error_message else "SUCCESS",
+            protocol=action,
+            converter=source,
+            seconds=time.perf_counter() - start,
+            size=os.path.getsize(source) if os.path.exists(source) else None,
+            error_message=error_message,
+        )
+        return action
+
+    if not dry_run:
+        os.makedirs(destination, exist_ok=True)
+    counts = {action: 0 for action in sync_actions}
+    with ThreadPoolExecutor(max_workers=n_threads) as executor:
+        for action in executor.map(transfer, plan):
+            counts[action] += 1
+    counts["Delete"] = len(stale)
+
+    for path in stale:
+        error_message = ""
+        if not dry_run:
+            try:
+                os.remove(path)
+            except OSError as e:
+                error_message = str(e)
+        run_log.record(
+            "sync",
+            os.path.relpath(path, destination),
+            "FAILURE" if error_message else "SUCCESS",
+            protocol="Delete",
+            error_message=error_message,
+        )
+
+    if not dry_run:
+        # Remove the folders emptied by the deletions, deepest first
+        for root, _, _ in sorted(os.walk(destination), key=lambda item: item[0], reverse=True):
+            if root != destination and not os.listdir(root):
+                os.rmdir(root)
+        save_sync_state(destination, new_state)
+
+    run_log.flush()
+    # The log keeps every run; only this one is summarized
+    run_log.print_summary("sync", current_run=True)
+    return counts
@@ -1,8 +1,9 @@
 import os
 
 import imaging_classifying_rules
+import imaging_writer
 import pydicom
-from pydicom import dcmread, dcmwrite
+from pydicom import dcmread
 from spectralis_onh_oct_converter_functional_groups import (
     acquisition_device_type_code_sequence, anatomic_region_sequence,
     dimension_index_sequence, dimension_organization_sequence,
@@ -488,7 +489,7 @@ def write_dicom(protocol, dicom_dict_list, file_path):
         anatomic_region_sequence(dataset, dicom_dict_list)
         dimension_organization_sequence(dataset, dicom_dict_list)
 
-    dcmwrite(file_path, dataset, write_like_original=False)
+    imaging_writer.write_dataset(dataset, file_path, write_like_original=False)
 
 
 def convert_dicom(input, output):
@@ -1,8 +1,9 @@
 import os
 
 import imaging_classifying_rules
+import imaging_writer
 import pydicom
-from pydicom import dcmread, dcmwrite
+from pydicom import dcmread
 
 KEEP = 0
 BLANK = 1
@@ -513,7 +514,7 @@ def write_dicom(protocol, dicom_dict_list, file_path):
             value = pydicom.Sequence()
             element_name = pydicom.datadict.keyword_for_tag(key)
             setattr(dataset, element_name, value)
-    dcmwrite(file_path, dataset, write_like_original=False)
+    imaging_writer.write_dataset(dataset, file_path, write_like_original=False)
 
 
 def convert_dicom(input, output):
@@ -0,0 +1,1225 @@
+import json
+import os
+import random
+import struct
+
+from joblib import Parallel, delayed
+from pydicom.dataelem import DataElement
+from pydicom.dataset import Dataset, FileMetaDataset
+from pydicom.tag import Tag
+from pydicom.uid import ExplicitVRLittleEndian, generate_uid
+
+# SOP Class UIDs used by the synthetic files
+op_sop_class = "1.2.840.10008.5.1.4.1.1.77.1.5.1"  # Ophthalmic Photography 8 Bit
+opt_sop_class = "1.2.840.10008.5.1.4.1.1.77.1.5.4"  # Ophthalmic Tomography
+enface_sop_class = "1.2.840.10008.5.1.4.1.1.77.1.5.7"  # Ophthalmic OCT En Face
+volume_sop_class = "1.2.840.10008.5.1.4.1.1.77.1.5.8"  # Ophthalmic OCT B-scan Volume Analysis
+heightmap_seg_sop_class = "1.2.840.10008.5.1.4.1.1.66.8"  # Heightmap Segmentation
+segmentation_sop_class = "1.2.840.10008.5.1.4.1.1.66.4"  # Segmentation
+
+synthetic_devices = ["cirrus", "topcon", "spectralis", "eidon", "optomed", "flio"]
+
+# Cirrus protocols: ProtocolName is chosen so that imaging_cirrus_organize.cirrus_protocol_name
+# maps it to the protocol folders converted by process_cirrus.py
+cirrus_protocols = {
+    "cirrus_mac_angiography": {
+        "ProtocolName": "Mac Angiography 6x6 mm",
+        "size": "350x350",
+        "oct": (1024, 350, 350),
+        "angio": True,
+    },
+    "cirrus_mac_macular_cube": {
+        "ProtocolName": "Mac Macular Cube 512x128",
+        "size": "512x128",
+        "oct": (1024, 512, 128),
+        "angio": False,
+    },
+    "cirrus_onh_angiography": {
+        "ProtocolName": "ONH Angiography 6x6 mm",
+        "size": "350x350",
+        "oct": (1024, 350, 350),
+        "angio": True,
+    },
+    "cirrus_onh_optic_disc_cube": {
+        "ProtocolName": "ONH Optic Disc Cube 200x200",
+        "size": "200x200",
+        "oct": (1024, 200, 200),
+        "angio": False,
+    },
+}
+
+# Angiography enface slabs and the last digit of their UID: the enfaces of an acquisition
+# share their UID but for that digit, which catalog_manifests and manifest_creation use
+# to group them (1, 2, 6 and 4; 3, 7 and 5 are the projection removed slabs)
+cirrus_angio_slabs = {
+    "SRL": "1",
+    "DRL": "2",
+    "DRL_ProjectionRemoved": "3",
+    "AVL": "4",
+    "AVL_ProjectionRemoved": "5",
+    "CC": "6",
+    "CC_ProjectionRemoved": "7",
+}
+cirrus_structural_slabs = ["ILM", "RPE", "RPEFit", "SubRPE"]
+
+# Topcon protocols: the OCT (*1.1.dcm) header drives imaging_classifying_rules and
+# imaging_utils.get_protocol_updated; (rows, columns, frames) of the OCT
+topcon_protocols = {
+    "maestro2_3d_macula_oct": {
+        "device": "Maestro2",
+        "photo_device": "3DOCT-1Maestro2",
+        "oct": (885, 512, 128),
+        "slice_thickness": 0.047,
+        "angio": False,
+    },
+    "maestro2_3d_wide_oct": {
+        "device": "Maestro2",
+        "photo_device": "3DOCT-1Maestro2",
+        "oct": (885, 512, 128),
+        "slice_thickness": 0.0703,
+        "angio": False,
+        "anatomic_structures": 2,
+    },
+    "maestro2_mac_6x6_octa": {
+        "device": "Maestro2",
+        "photo_device": "3DOCT-1Maestro2",
+        "oct": (885, 360, 360),
+        "slice_thickness": 0.0167,
+        "angio": True,
+    },
+    "triton_3d_radial_oct": {
+        "device": "Triton plus",
+        "photo_device": "Triton plus",
+        "oct": (992, 1024, 12),
+        "slice_thickness": 0.03,
+        "angio": False,
+        "anatomic_structures": 2,
+        "lossy": True,
+    },
+    "triton_macula_6x6_octa": {
+        "device": "Triton plus",
+        "photo_device": "Triton plus",
+        "oct": (992, 320, 320),
+        "slice_thickness": 0.01875,
+        "angio": True,
+        "lossy": True,
+        "op_pixel_spacing": True,
+    },
+    "triton_macula_12x12_octa": {
+        "device": "Triton plus",
+        "photo_device": "Triton plus",
+        "oct": (992, 512, 512),
+        "slice_thickness": 0.0234,
+        "angio": True,
+        "lossy": True,
+    },
+}
+
+topcon_enface_members = ["6.3", "6.4", "6.5", "6.80"]
+
+# Spectralis protocols: (rows, columns, frames) of the OCT, the IR photo size, its
+# SeriesDescription and the minimum photo file size (MB) required by the classifying rules
+spectralis_protocols = {
+    "spectralis_onh_rc_hr": {
+        "oct": (496, 768, 27),
+        "oct_description": "ONH-RC",
+        "photo": 1536,
+        "photo_description": "IR",
+        "photo_min_size": 5.5,
+    },
+    "spectralis_ppol_mac_hr": {
+        "oct": (496, 1536, 61),
+        "oct_description": "Volume",
+        "photo": 1536,
+        "photo_description": "Volume IR",
+        "photo_min_size": 5.5,
+        "gaze": True,
+    },
+    "spectralis_ppol_mac_hr_small": {
+        "oct": (496, 768, 61),
+        "oct_description": "Volume",
+        "photo": 768,
+        "photo_description": "Volume IR",
+        "photo_min_size": 1.5,
+        "gaze": True,
+    },
+}
+
+# Eidon fields: (file name token, rows, columns, samples per pixel)
+eidon_fields = [
+    ("0-visible", 3680, 3288, 3),
+    ("0-infrared", 3680, 3288, 1),
+    ("0-af-blue", 3680, 3288, 1),
+    ("3-visible", 3680, 3288, 3),
+    ("4-visible", 3680, 3288, 3),
+    ("11-visible", 6400, 5600, 3),
+]
+
+optomed_fields = ["macula", "disc"]
+optomed_size = (1536, 1152)
+
+# FLIO SDT layout, see flio_reader: two data blocks of 256 x 256 pixels x 1024 time channels
+flio_image_bytes = 256 * 256 * 1024 * 2
+flio_block_header_bytes = 22
+flio_setup_offset = 258
+flio_meas_desc_block_length = 512
+
+
+def synthetic_patient_id(index):
+    """
+    Return the AI-READI style patient ID of a synthetic participant.
+
+    IDs follow imaging_utils.check_format (AIREADI- followed by four digits starting with 1, 4 or 7).
+
+    Args:
+        index (int): The zero-based participant index.
+
+    Returns:
+        str: The patient ID, e.g. "AIREADI-1001".
+    """
+    block, offset = divmod(index, 999)
+    if block >= 3:
+        raise ValueError("At most 2997 synthetic participants are supported.")
+    return f"AIREADI-{'147'[block]}{offset + 1:03d}"
+
+
+def synthetic_uid(seed, *parts):
+    """
+    Return a deterministic UID for a synthetic object.
+
+    Args:
+        seed (int): The corpus seed.
+        *parts: The values identifying the object (participant, device, acquisition, file...).
+
+    Returns:
+        str: A "2.25." UID derived from the seed and the parts.
+    """
+    return generate_uid(prefix=None, entropy_srcs=[str(seed), *map(str, parts)])
+
+
+def write_synthetic_dicom(path, dataset, pixel_bytes=0, pixels=True, min_size=0):
+    """
+    Save a synthetic DICOM header and append zero pixel data of the given size.
+
+    The pixel data (and the optional Data Set Trailing Padding used to reach a minimum
+    file size) is appended by extending the file, so it is written as a sparse hole on
+    file systems that support it: the files have their realistic size without costing
+    the disk space or the time to write it.
+
+    Args:
+        path (str): The output file path.
+        dataset (pydicom.Dataset): The header, with file_meta and without PixelData.
+        pixel_bytes (int): The size of the pixel data in bytes.
+        pixels (bool): If False, no pixel data is written (header only).
+        min_size (float): The minimum file size in MB, reached with trailing padding.
+
+    Returns:
+        int: The size of the written file in bytes.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    dataset.save_as(path, write_like_original=False)
+
+    with open(path, "r+b") as file:
+        file.seek(0, os.SEEK_END)
+        if pixels and pixel_bytes:
+            length = pixel_bytes + pixel_bytes % 2
+            vr = b"OW" if dataset.get("BitsAllocated", 8) > 8 else b"OB"
+            file.write(struct.pack("<HH2s2xI", 0x7FE0, 0x0010, vr, length))
+            file.truncate(file.tell() + length)
+            file.seek(0, os.SEEK_END)
+
+        padding = int(min_size * 1000 * 1000) - file.tell() - 12
+        if padding > 0:
+            padding += padding % 2
+            file.write(struct.pack("<HH2s2xI", 0xFFFC, 0xFFFC, b"OB", padding))
+            file.truncate(file.tell() + padding)
+            file.seek(0, os.SEEK_END)
+
+        return file.tell()
+
+
+def base_dataset(sop_class, sop_instance, patient, study, series, device):
+    """
+    Build the header shared by every synthetic DICOM file.
+
+    Args:
+        sop_class (str): The SOP Class UID.
+        sop_instance (str): The SOP Instance UID.
+        patient (dict): The participant ("PatientID", "Laterality", "Date", "Time").
+        study (str): The Study Instance UID.
+        series (str): The Series Instance UID.
+        device (tuple): The (Manufacturer, ManufacturerModelName) pair.
+
+    Returns:
+        pydicom.Dataset: The header with its file meta information.
+    """
+    file_meta = FileMetaDataset()
+    file_meta.MediaStorageSOPClassUID = sop_class
+    file_meta.MediaStorageSOPInstanceUID = sop_instance
+    file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+    file_meta.ImplementationClassUID = "1.2.826.0.1.3680043.10.1433.1"
+    file_meta.ImplementationVersionName = "SYNTHETIC"
+
+    dataset = Dataset()
+    dataset.file_meta = file_meta
+    dataset.SOPClassUID = sop_class
+    dataset.SOPInstanceUID = sop_instance
+    dataset.StudyDate = patient["Date"]
+    dataset.StudyTime = patient["Time"]
+    dataset.ContentDate = patient["Date"]
+    dataset.ContentTime = patient["Time"]
+    dataset.AcquisitionDateTime = f"{patient['Date']}{patient['Time']}"
+    dataset.Modality = "OPT" if sop_class == opt_sop_class else "OP"
+    dataset.Manufacturer = device[0]
+    dataset.ManufacturerModelName = device[1]
+    dataset.ReferringPhysicianName = ""
+    dataset.PatientName = f"Synthetic^{patient['PatientID']}"
+    dataset.PatientID = patient["PatientID"]
+    dataset.PatientBirthDate = "19700101"
+    dataset.PatientSex = "O"
+    dataset.StudyInstanceUID = study
+    dataset.SeriesInstanceUID = series
+    dataset.StudyID = "1"
+    dataset.SeriesNumber = 1
+    dataset.InstanceNumber = 1
+    dataset.ImageLaterality = patient["Laterality"]
+    dataset.Laterality = patient["Laterality"]
+    set_acquisition_context(dataset)
+    return dataset
+
+
+def set_image(dataset, rows, columns, frames=None, samples=1, bits=8):
+    """
+    Set the image pixel module of a synthetic header.
+
+    Args:
+        dataset (pydicom.Dataset): The header.
+        rows (int): The number of rows.
+        columns (int): The number of columns.
+        frames (int, optional): The number of frames of a multi-frame image.
+        samples (int): The samples per pixel (3 for RGB).
+        bits (int): The bits allocated per sample.
+
+    Returns:
+        int: The size of the pixel data in bytes.
+    """
+    dataset.Rows = rows
+    dataset.Columns = columns
+    dataset.SamplesPerPixel = samples
+    dataset.PhotometricInterpretation = "RGB" if samples == 3 else "MONOCHROME2"
+    if samples == 3:
+        dataset.PlanarConfiguration = 0
+    dataset.BitsAllocated = bits
+    dataset.BitsStored = bits
+    dataset.HighBit = bits - 1
+    dataset.PixelRepresentation = 0
+    if frames is not None:
+        dataset.NumberOfFrames = frames
+    return rows * columns * samples * (bits // 8) * (frames or 1)
+
+
+def code_item(value, scheme, meaning):
+    """
+    Build a code sequence item.
+
+    Args:
+        value (str): The code value.
+        scheme (str): The coding scheme designator.
+        meaning (str): The code meaning.
+
+    Returns:
+        pydicom.Dataset: The code item.
+    """
+    item = Dataset()
+    item.CodeValue = value
+    item.CodingSchemeDesignator = scheme
+    item.CodeMeaning = meaning
+    return item
+
+
+def reference_item(sop_class, sop_instance):
+    """
+    Build an image reference item.
+
+    Args:
+        sop_class (str): The referenced SOP Class UID.
+        sop_instance (str): The referenced SOP Instance UID.
+
+    Returns:
+        pydicom.Dataset: The reference item.
+    """
+    item = Dataset()
+    item.ReferencedSOPClassUID = sop_class
+    item.ReferencedSOPInstanceUID = sop_instance
+    return item
+
+
+def set_acquisition_context(dataset):
+    """
+    Set the acquisition context sequences carried by every ophthalmic image.
+
+    Args:
+        dataset (pydicom.Dataset): The header.
+    """
+    dataset.AnatomicRegionSequence = [code_item("T-AA610", "SRT", "Retina")]
+    dataset.AcquisitionDeviceTypeCodeSequence = [
+        code_item("A-00FBE", "SRT", "Optical Coherence Tomography Scanner")
+    ]
+    dataset.LightPathFilterTypeStackCodeSequence = []
+    dataset.MydriaticAgentSequence = []
+    dataset.RefractiveStateSequence = []
+    dataset.AcquisitionContextSequence = []
+
+
+def algorithm_item(name):
+    """
+    Build an algorithm identification item (derivation or acquisition method).
+
+    Args:
+        name (str): The algorithm name.
+
+    Returns:
+        pydicom.Dataset: The algorithm item.
+    """
+    item = Dataset()
+    item.AlgorithmFamilyCodeSequence = [code_item("123110", "DCM", "Synthetic algorithm")]
+    item.AlgorithmName = name
+    item.AlgorithmVersion = "1.0"
+    return item
+
+
+def source_image_item(sop_class, sop_instance):
+    """
+    Build a Source Image Sequence item for an image derived from an OCT.
+
+    Args:
+        sop_class (str): The source SOP Class UID.
+        sop_instance (str): The source SOP Instance UID.
+
+    Returns:
+        pydicom.Dataset: The source image item.
+    """
+    item = reference_item(sop_class, sop_instance)
+    item.PurposeOfReferenceCodeSequence = [
+        code_item("121322", "DCM", "Source image for image processing operation")
+    ]
+    return item
+
+
+def set_enface_derivation(dataset, oct_uid):
+    """
+    Set the derivation of an en face image from its OCT.
+
+    Args:
+        dataset (pydicom.Dataset): The en face header.
+        oct_uid (str): The SOP Instance UID of the source OCT.
+    """
+    dataset.SourceImageSequence = [source_image_item(opt_sop_class, oct_uid)]
+    dataset.DerivationAlgorithmSequence = [algorithm_item("Synthetic en face")]
+    dataset.OphthalmicImageTypeCodeSequence = [
+        code_item("128264", "DCM", "OCT-A amplitude decorrelation")
+    ]
+
+
+def set_volume_algorithm(dataset):
+    """
+    Set the acquisition method of an OCT B-scan volume analysis (flow) image.
+
+    Args:
+        dataset (pydicom.Dataset): The flow volume header.
+    """
+    dataset.AcquisitionMethodAlgorithmSequence = [algorithm_item("Synthetic flow")]
+    parameters = Dataset()
+    parameters.NumberOfBscansPerFrame = 2
+    dataset.OCTBscanAnalysisAcquisitionParametersSequence = [parameters]
+
+
+def set_oct_functional_groups(
+    dataset, frames, slice_thickness, pixel_spacing, photo_uid, width_mm=6.0
+):
+    """
+    Set the shared and per-frame functional groups of a synthetic OCT or volume.
+
+    Every frame gets an Ophthalmic Frame Location with reference coordinates on the
+    photo, spread over width_mm, as read by the enface and heightmap converters.
+
+    Args:
+        dataset (pydicom.Dataset): The header.
+        frames (int): The number of B-scans.
+        slice_thickness (float): The distance between B-scans in mm.
+        pixel_spacing (list): The [row, column] pixel spacing in mm.
+        photo_uid (str): The SOP Instance UID of the referenced photo.
+        width_mm (float): The scan width in mm.
+    """
+    pixel_measures = Dataset()
+    pixel_measures.PixelSpacing = pixel_spacing
+    pixel_measures.SliceThickness = slice_thickness
+
+    shared = Dataset()
+    shared.PixelMeasuresSequence = [pixel_measures]
+    shared.ReferencedImageSequence = [reference_item(op_sop_class, photo_uid)]
+    dataset.SharedFunctionalGroupsSequence = [shared]
+
+    organization_uid = generate_uid(
+        prefix=None, entropy_srcs=[dataset.SOPInstanceUID, "dimension"]
+    )
+    organization = Dataset()
+    organization.DimensionOrganizationUID = organization_uid
+    dataset.DimensionOrganizationSequence = [organization]
+    dimensions = []
+    for pointer, group in [(0x00209157, 0x00209111), (0x00209128, 0x00209111)]:
+        dimension = Dataset()
+        dimension.DimensionOrganizationUID = organization_uid
+        dimension.DimensionIndexPointer = pointer
+        dimension.FunctionalGroupPointer = group
+        dimensions.append(dimension)
+    dataset.DimensionIndexSequence = dimensions
+
+    per_frame = []
+    for frame in range(frames):
+        y = -width_mm / 2 + width_mm * frame / max(frames - 1, 1)
+        location = Dataset()
+        location.ReferencedSOPClassUID = op_sop_class
+        location.ReferencedSOPInstanceUID = photo_uid
+        location.ReferenceCoordinates = [-width_mm / 2, y, width_mm / 2, y]
+        content = Dataset()
+        content.DimensionIndexValues = [1, frame + 1]
+        item = Dataset()
+        item.OphthalmicFrameLocationSequence = [location]
+        item.FrameContentSequence = [content]
+        per_frame.append(item)
+    dataset.PerFrameFunctionalGroupsSequence = per_frame
+
+
+def participant_info(index, laterality, seed):
+    """
+    Return the identity and acquisition date of a synthetic participant eye.
+
+    Args:
+        index (int): The zero-based participant index.
+        laterality (str): "R" or "L".
+        seed (int): The corpus seed.
+
+    Returns:
+        dict: "PatientID", "Laterality", "Eye" (OD/OS), "Date" and "Time".
+    """
+    rng = random.Random(f"{seed}-{index}-{laterality}")
+    return {
+        "PatientID": synthetic_patient_id(index),
+        "Laterality": laterality,
+        "Eye": "OD" if laterality == "R" else "OS",
+        "Date": f"2024{rng.randint(1, 12):02d}{rng.randint(1, 28):02d}",
+        "Time": f"{rng.randint(8, 17):02d}{rng.randint(0, 59):02d}{rng.randint(0, 59):02d}",
+    }
+
+
+def generate_cirrus_acquisition(folder, patient, protocol, seed, pixels=True):
+    """
+    Write one Cirrus acquisition folder as exported by the device.
+
+    Angiography acquisitions hold 15 files (Struc, Flow, Seg, LSO, 7 AngioEnface and
+    4 StructuralEnface slabs); cube acquisitions hold 7 files (Struc, LSO, Seg and
+    4 StructuralEnface slabs), matching imaging_utils.cirrus_check_files_expected.
+    Enfaces are named <prefix>_<slab>_AngioEnface.dcm, so that
+    cirrus_utils.cirrus_submodality_mapping recognises them.
+
+    Args:
+        folder (str): The acquisition folder.
+        patient (dict): The participant eye, see participant_info.
+        protocol (str): A key of cirrus_protocols.
+        seed (int): The corpus seed.
+        pixels (bool): If False, only headers are written.
+
+    Returns:
+        list: (path, size in bytes) of every written file.
+    """
+    spec = cirrus_protocols[protocol]
+    rows, columns, frames = spec["oct"]
+    key = (patient["PatientID"], patient["Laterality"], protocol)
+    study = synthetic_uid(seed, *key, "study")
+    series = synthetic_uid(seed, *key, "series")
+    device = ("Carl Zeiss Meditec", "CIRRUS HD-OCT 6000")
+    uid = {
+        name: synthetic_uid(seed, *key, name)
+        for name in ["Struc", "Flow", "Seg", "LSO"] + cirrus_structural_slabs
+    }
+    enface_uid = synthetic_uid(seed, *key, "AngioEnface")
+    uid.update({name: f"{enface_uid}.{digit}" for name, digit in cirrus_angio_slabs.items()})
+    prefix = (
+        f"{patient['PatientID']}_{spec['ProtocolName'].replace(' ', '_')}_"
+        f"{patient['Eye']}_{patient['Date']}_{patient['Time']}_{spec['size']}"
+    )
+
+    def header(sop_class, name):
+        dataset = base_dataset(sop_class, uid[name], patient, study, series, device)
+        dataset.ProtocolName = spec["ProtocolName"]
+        dataset.SeriesDescription = f"{spec['ProtocolName']} {name}"
+        return dataset
+
+    written = []
+
+    dataset = header(op_sop_class, "LSO")
+    size = set_image(dataset, 664, 512)
+    dataset.PixelSpacing = [0.01350, 0.01350]
+    path = f"{folder}/{prefix}_LSO.dcm"
+    written.append((path, write_synthetic_dicom(path, dataset, size, pixels)))
+
+    dataset = header(opt_sop_class, "Struc")
+    size = set_image(dataset, rows, columns, frames)
+    set_oct_functional_groups(
+        dataset, frames, 6.0 / frames, [0.00195, 6.0 / columns], uid["LSO"]
+    )
+    path = f"{folder}/{prefix}_Struc.dcm"
+    written.append((path, write_synthetic_dicom(path, dataset, size, pixels)))
+
+    dataset = header(segmentation_sop_class, "Seg")
+    size = set_image(dataset, rows, columns, frames)
+    path = f"{folder}/{prefix}_Seg.dcm"
+    written.append((path, write_synthetic_dicom(path, dataset, size, pixels)))
+
+    slabs = [(name, f"StructuralEnface_{name}") for name in cirrus_structural_slabs]
+    if spec["angio"]:
+        dataset = header(volume_sop_class, "Flow")
+        set_volume_algorithm(dataset)
+        size = set_image(dataset, rows, columns, frames)
+        set_oct_functional_groups(
+            dataset, frames, 6.0 / frames, [0.00195, 6.0 / columns], uid["LSO"]
+        )
+        path = f"{folder}/{prefix}_Flow.dcm"
+        written.append((path, write_synthetic_dicom(path, dataset, size, pixels)))
+        slabs = [(name, f"{name}_AngioEnface") for name in cirrus_angio_slabs] + slabs
+
+    for name, suffix in slabs:
+        dataset = header(enface_sop_class, name)
+        set_enface_derivation(dataset, uid["Struc"])
+        size = set_image(dataset, 1024, 1024)
+        dataset.PixelSpacing = [0.005859375, 0.005859375]
+        path = f"{folder}/{prefix}_{suffix}.dcm"
+        written.append((path, write_synthetic_dicom(path, dataset, size, pixels)))
+
+    return written
+
+
+def generate_topcon_acquisition(folder, patient, protocol, seed, acquisition, pixels=True):
+    """
+    Write one Maestro2 or Triton acquisition folder as exported by the device.
+
+    OCT protocols hold the 1.1 (OCT), 2.1 (photo) and 7.3 (segmentation) files; OCTA
+    protocols also hold the 3.1 (flow volume) and the four enface files (6.3, 6.4, 6.5
+    and 6.80), matching imaging_utils.topcon_check_files_expected.
+
+    Args:
+        folder (str): The acquisition folder.
+        patient (dict): The participant eye, see participant_info.
+        protocol (str): A key of topcon_protocols.
+        seed (int): The corpus seed.
+        acquisition (int): The acquisition number, used in the file names.
+        pixels (bool): If False, only headers are written.
+
+    Returns:
+        list: (path, size in bytes) of every written file.
+    """
+    spec = topcon_protocols[protocol]
+    rows, columns, frames = spec["oct"]
+    key = (patient["PatientID"], patient["Laterality"], protocol)
+    study = synthetic_uid(seed, *key, "study")
+    members = ["1.1", "2.1", "7.3"]
+    if spec["angio"]:
+        members += ["3.1"] + topcon_enface_members
+    number = patient["PatientID"][-4:]
+    prefix = f"2.16.392.200036.9116.{number}{'01' if patient['Laterality'] == 'R' else '02'}.{acquisition}"
+    # Each file is named after its UID, <prefix>.<member>, as manifest_creation and
+    # catalog_manifests expect when they associate the files of an acquisition
+    uid = {member: f"{prefix}.{member}" for member in members}
+
+    def header(sop_class, member, device):
+        series = synthetic_uid(seed, *key, "series", member.split(".")[0])
+        dataset = base_dataset(
+            sop_class, uid[member], patient, study, series, ("Topcon", device)
+        )
+        dataset.SeriesDescription = protocol
+        return dataset
+
+    def path_of(member):
+        return f"{folder}/{prefix}.{member}.dcm"
+
+    written = []
+
+    dataset = header(op_sop_class, "2.1", spec["photo_device"])
+    size = set_image(dataset, 1934, 2576, samples=3)
+    # imaging_utils.topcon_submodality reads the color or IR type from the fourth value
+    dataset.ImageType = ["ORIGINAL", "PRIMARY", "", "COLOR"]
+    if spec.get("op_pixel_spacing") or not protocol.startswith("triton"):
+        dataset.PixelSpacing = [0.0052, 0.0052]
+    written.append((path_of("2.1"), write_synthetic_dicom(path_of("2.1"), dataset, size, pixels)))
+
+    dataset = header(opt_sop_class, "1.1", spec["device"])
+    size = set_image(dataset, rows, columns, frames)
+    set_oct_functional_groups(
+        dataset,
+        frames,
+        spec["slice_thickness"],
+        [0.0026, round(spec["slice_thickness"] * frames / columns, 6)],
+        uid["2.1"],
+        width_mm=spec["slice_thickness"] * frames,
+    )
+    dataset.PrimaryAnatomicStructureSequence = [
+        code_item("T-AA610", "SRT", "Retina"),
+        code_item("T-AA630", "SRT", "Optic nerve head"),
+    ][: spec.get("anatomic_structures", 1)]
+    if spec.get("lossy"):
+        dataset.LossyImageCompression = "01"
+        dataset.LossyImageCompressionRatio = 10.0
+    written.append((path_of("1.1"), write_synthetic_dicom(path_of("1.1"), dataset, size, pixels)))
+
+    dataset = header(heightmap_seg_sop_class, "7.3", spec["photo_device"])
+    # One frame per segmented surface, each a B-scan by A-scan height map
+    size = set_image(dataset, frames, columns, 7)
+    dataset.SegmentSequence = [Dataset() for _ in range(7)]
+    for number, segment in enumerate(dataset.SegmentSequence, start=1):
+        segment.SegmentNumber = number
+        segment.SegmentLabel = f"Layer {number}"
+    pixel_measures = Dataset()
+    pixel_measures.PixelSpacing = [0.0026, 0.0026]
+    shared = Dataset()
+    shared.PixelMeasuresSequence = [pixel_measures]
+    dataset.SharedFunctionalGroupsSequence = [shared]
+    written.append((path_of("7.3"), write_synthetic_dicom(path_of("7.3"), dataset, size, pixels)))
+
+    if spec["angio"]:
+        dataset = header(volume_sop_class, "3.1", spec["photo_device"])
+        set_volume_algorithm(dataset)
+        size = set_image(dataset, rows, columns, frames)
+        set_oct_functional_groups(
+            dataset,
+            frames,
+            spec["slice_thickness"],
+            [0.0026, spec["slice_thickness"]],
+            uid["2.1"],
+            width_mm=spec["slice_thickness"] * frames,
+        )
+        written.append((path_of("3.1"), write_synthetic_dicom(path_of("3.1"), dataset, size, pixels)))
+
+        for member in topcon_enface_members:
+            dataset = header(enface_sop_class, member, spec["photo_device"])
+            set_enface_derivation(dataset, uid["1.1"])
+            size = set_image(dataset, columns, frames)
+            descriptor = Dataset()
+            segmentation = Dataset()
+            segmentation.add(
+                DataElement(
+                    Tag(0x0062, 0x000F),
+                    "SQ",
+                    [code_item("C-SYNTH", "99SYNTH", "Surface")],
+                )
+            )
+            segmentation.add(
+                DataElement(
+                    Tag(0x0008, 0x114C),
+                    "SQ",
+                    [reference_item(heightmap_seg_sop_class, uid["7.3"])],
+                )
+            )
+            descriptor.add(
+                DataElement(
+                    Tag(0x0008, 0x114C),
+                    "SQ",
+                    [reference_item(heightmap_seg_sop_class, uid["7.3"])],
+                )
+            )
+            descriptor.add(
+                DataElement(
+                    Tag(0x0062, 0x000F),
+                    "SQ",
+                    [code_item("C-SYNTH", "99SYNTH", "Surface")],
+                )
+            )
+            dataset.add(
+                DataElement(Tag(0x0022, 0x1627), "SQ", [descriptor, segmentation])
+            )
+            path = path_of(member)
+            written.append((path, write_synthetic_dicom(path, dataset, size, pixels)))
+
+    return written
+
+
+def generate_spectralis_files(folder, patient, seed, pixels=True):
+    """
+    Write the Spectralis OCT and IR photo files of one participant eye.
+
+    File names start with "0" and end with digits, as the Spectralis export does.
+
+    Args:
+        folder (str): The participant folder.
+        patient (dict): The participant eye, see participant_info.
+        seed (int): The corpus seed.
+        pixels (bool): If False, only headers are written (the photos keep their
+            minimum size through trailing padding, as the classifying rules check it).
+
+    Returns:
+        list: (path, size in bytes) of every written file.
+    """
+    device = ("Heidelberg Engineering", "Spectralis")
+    written = []
+    for index, (protocol, spec) in enumerate(spectralis_protocols.items()):
+        rows, columns, frames = spec["oct"]
+        key = (patient["PatientID"], patient["Laterality"], protocol)
+        study = synthetic_uid(seed, patient["PatientID"], "spectralis", "study")
+        series = synthetic_uid(seed, *key, "series")
+        photo_uid = synthetic_uid(seed, *key, "photo")
+        oct_uid = synthetic_uid(seed, *key, "oct")
+        base = f"{folder}/0{patient['PatientID'][-4:]}{'1' if patient['Laterality'] == 'R' else '2'}{index:02d}"
+
+        dataset = base_dataset(op_sop_class, photo_uid, patient, study, series, device)
+        dataset.SeriesDescription = spec["photo_description"]
+        size = set_image(dataset, spec["photo"], spec["photo"])
+        dataset.PixelSpacing = [0.0057, 0.0057]
+        if spec.get("gaze"):
+            dataset.PatientEyeMovementCommandCodeSequence = [
+                code_item("R-40899", "SRT", "Primary gaze")
+            ]
+        path = f"{base}0001"
+        written.append(
+            (
+                path,
+                write_synthetic_dicom(
+                    path, dataset, size, pixels, min_size=spec["photo_min_size"]
+                ),
+            )
+        )
+
+        dataset = base_dataset(opt_sop_class, oct_uid, patient, study, series, device)
+        dataset.SeriesDescription = spec["oct_description"]
+        size = set_image(dataset, rows, columns, frames)
+        set_oct_functional_groups(
+            dataset, frames, 0.12, [0.0039, 0.0114], photo_uid
+        )
+        path = f"{base}0002"
+        written.append((path, write_synthetic_dicom(path, dataset, size, pixels)))
+
+    return written
+
+
+def generate_eidon_files(folder, patient, seed, pixels=True):
+    """
+    Write the Eidon fields (central, nasal, temporal, mosaic, infrared and autofluorescence) of one eye.
+
+    Args:
+        folder (str): The participant folder.
+        patient (dict): The participant eye, see participant_info.
+        seed (int): The corpus seed.
+        pixels (bool): If False, only headers are written.
+
+    Returns:
+        list: (path, size in bytes) of every written file.
+    """
+    device = ("CenterVue", "Eidon AF")
+    study = synthetic_uid(seed, patient["PatientID"], "eidon", "study")
+    written = []
+    for field, rows, columns, samples in eidon_fields:
+        key = (patient["PatientID"], patient["Laterality"], "eidon", field)
+        dataset = base_dataset(
+            op_sop_class,
+            synthetic_uid(seed, *key),
+            patient,
+            study,
+            synthetic_uid(seed, *key, "series"),
+            device,
+        )
+        size = set_image(dataset, rows, columns, samples=samples)
+        path = f"{folder}/{patient['PatientID']}_{patient['Eye']}_{patient['Date']}_{field}.dcm"
+        written.append((path, write_synthetic_dicom(path, dataset, size, pixels)))
+    return written
+
+
+def generate_optomed_files(folder, patient, seed, pixels=True):
+    """
+    Write the Optomed Aurora macula and disc centered color photos of one eye.
+
+    Args:
+        folder (str): The participant folder.
+        patient (dict): The participant eye, see participant_info.
+        seed (int): The corpus seed.
+        pixels (bool): If False, only headers are written.
+
+    Returns:
+        list: (path, size in bytes) of every written file.
+    """
+    device = ("Optomed", "Aurora")
+    study = synthetic_uid(seed, patient["PatientID"], "optomed", "study")
+    written = []
+    for field in optomed_fields:
+        key = (patient["PatientID"], patient["Laterality"], "optomed", field)
+        dataset = base_dataset(
+            op_sop_class,
+            synthetic_uid(seed, *key),
+            patient,
+            study,
+            synthetic_uid(seed, *key, "series"),
+            device,
+        )
+        size = set_image(dataset, *optomed_size, samples=3)
+        path = f"{folder}/{patient['PatientID']}_{patient['Eye']}_{field}.dcm"
+        written.append((path, write_synthetic_dicom(path, dataset, size, pixels)))
+    return written
+
+
+def flio_html(patient):
+    """
+    Build the measurement_info.html of a FLIO measurement, in the layout read by
+    imaging_flio_converter.extract_dicom_info_from_html.
+
+    Args:
+        patient (dict): The participant eye, see participant_info.
+
+    Returns:
+        str: The HTML document.
+    """
+    date = patient["Date"]
+    time = patient["Time"]
+    photons = [
+        ("Minimal photons per pixel", "120", "95"),
+        ("Maximal photons per pixel", "4810", "3920"),
+        ("Photons per pixel", "1850", "1470"),
+        ("Processed frames", "412", "412"),
+        ("Valid photons per frame", "118000", "94000"),
+        ("Invalid photons per frame", "310", "250"),
+    ]
+    patient_rows = [
+        ("Patient", ""),
+        ("", ""),
+        ("Name", patient["PatientID"]),
+        ("Sex", "Other"),
+        ("Birthdate", "01/01/1970"),
+    ]
+    measurement_rows = [
+        ("Measurement", "", ""),
+        ("", "", ""),
+        ("Date", f"{date[:4]}-{date[4:6]}-{date[6:]}, {time[:2]}:{time[2:4]}:{time[4:]}", ""),
+        ("Duration", "00:01:35", ""),
+        ("Mode", "FLIO", ""),
+        ("", "Short", "Long"),
+        ("", "", ""),
+    ] + photons
+
+    def table(rows):
+        cells = "".join(
+            "<tr>" + "".join(f"<td>{cell}</td>" for cell in row) + "</tr>"
+            for row in rows
+        )
+        return f"<table>{cells}</table>"
+
+    return (
+        "<html><body>"
+        "<p>FLIO Mapping Info: synthetic measurement</p>"
+        "<ul>"
+        "<li>Focus: +0.25 D</li>"
+        # The camera serial number must be listed in imaging_flio_converter.irf_data
+        "<li>Camera SN: 15352</li>"
+        "<li>PWS SN: SYN-0002</li>"
+        f"<li>Eye: {patient['Eye']}</li>"
+        "</ul>"
+        f"{table(patient_rows)}{table(measurement_rows)}"
+        "</body></html>"
+    )
+
+
+def write_synthetic_sdt(path, patient, pixels=True):
+    """
+    Write a Becker & Hickl SDT file with the layout read by flio_reader.
+
+    The file holds the header, the identification text, the setup text, two
+    measurement description blocks and two data blocks of 256 x 256 x 1024 photon
+    counts (short and long wavelength). The photon counts are zeros written as a
+    sparse hole.
+
+    Args:
+        path (str): The output file path.
+        patient (dict): The participant eye, see participant_info.
+        pixels (bool): If False, the data blocks are left out.
+
+    Returns:
+        int: The size of the written file in bytes.
+    """
+    info = (
+        "*IDENTIFICATION\r\n"
+        "ID: SPC Setup & Data File\r\n"
+        "Title: FLIO\r\n"
+        "Version: 1 781 M\r\n"
+        "Revision: 11 bits ADC\r\n"
+        f"Date: {patient['Date'][4:6]}-{patient['Date'][6:]}-{patient['Date'][:4]}\r\n"
+        f"Time: {patient['Time'][:2]}:{patient['Time'][2:4]}:{patient['Time'][4:]}\r\n"
+        "Author: Synthetic\r\n"
+        "Company: Synthetic\r\n"
+        "Contents: FLIO\r\n"
+        "*END\r\n\r\n"
+    ).encode("ascii")
+    # The identification text must end before the setup text read at a fixed offset
+    info = info[: flio_setup_offset - 42]
+    setup = (
+        "*SETUP\r\n"
+        "SYS_PARA_BEGIN:\r\n"
+        "Module: SPC-150\r\n"
+        "Serial: SYN0001\r\n"
+        "Channels: 2\r\n"
+        "Resolution: 256 x 256 x 1024\r\n"
+        "SYS_PARA_END:\r\n"
+    ).encode("ascii")
+    setup = setup.ljust(128, b" ")
+
+    meas_desc_offset = flio_setup_offset + len(setup)
+    data_block_offset = meas_desc_offset + 2 * flio_meas_desc_block_length
+    data_block_length = flio_block_header_bytes + flio_image_bytes
+
+    header = struct.pack(
+        "<hlhlhlhllhhHLHH",
+        15,  # revision
+        42,  # info_offset
+        len(info),
+        flio_setup_offset,
+        len(setup),
+        data_block_offset,
+        2,  # no_of_data_blocks
+        data_block_length,
+        meas_desc_offset,
+        2,  # no_of_meas_desc_blocks
+        flio_meas_desc_block_length,
+        0x5555,  # header_valid
+        2,  # reserved1
+        0,
+        0,
+    )
+
+    time = f"{patient['Time'][:2]}:{patient['Time'][2:4]}:{patient['Time'][4:]}".encode()
+    date = f"{patient['Date'][4:6]}-{patient['Date'][6:]}-{patient['Date'][:4]}".encode()
+    meas_desc = (
+        time.ljust(9, b"\0")
+        + date.ljust(11, b"\0")
+        + b"SYN0001".ljust(16, b"\0")
+        + struct.pack("<h", 0)
+        + struct.pack("<fffff", -49.0, 80.0, 0.0, 5.0, -30.0)
+    ).ljust(flio_meas_desc_block_length, b"\0")
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as file:
+        file.write(header)
+        file.write(info)
+        file.seek(flio_setup_offset)
+        file.write(setup)
+        file.write(meas_desc)
+        file.write(meas_desc)
+        if pixels:
+            for block in range(2):
+                offset = data_block_offset + block * data_block_length
+                file.seek(offset)
+                file.write(
+                    struct.pack(
+                        "<hllHhLl",
+                        block,
+                        offset + flio_block_header_bytes,
+                        offset + data_block_length if block == 0 else 0,
+                        0x0011,
+                        block,
+                        block,
+                        flio_image_bytes,
+                    )
+                )
+            file.truncate(data_block_offset + 2 * data_block_length)
+        file.seek(0, os.SEEK_END)
+        return file.tell()
+
+
+def generate_flio_files(folder, patient, pixels=True):
+    """
+    Write the Measurement.sdt and measurement_info.html pair of one eye.
+
+    Args:
+        folder (str): The laterality folder (e.g. <patient>/OD).
+        patient (dict): The participant eye, see participant_info.
+        pixels (bool): If False, the SDT data blocks are left out.
+
+    Returns:
+        list: (path, size in bytes) of every written file.
+    """
+    os.makedirs(folder, exist_ok=True)
+    html_path = f"{folder}/measurement_info.html"
+    with open(html_path, "w") as file:
+        file.write(flio_html(patient))
+    sdt_path = f"{folder}/Measurement.sdt"
+    return [
+        (html_path, os.path.getsize(html_path)),
+        (sdt_path, write_synthetic_sdt(sdt_path, patient, pixels)),
+    ]
+
+
+def write_flio_uid_data(path, participants, seed=0):
+    """
+    Write the FLIO UID JSON (as read by imaging_flio_converter.make_flio_dicom) for the synthetic participants.
+
+    Args:
+        path (str): The output JSON path.
+        participants (int): The number of participants.
+        seed (int): The corpus seed.
+    """
+    data = {}
+    for index in range(participants):
+        patientid = synthetic_patient_id(index)
+        data[patientid[-4:]] = {
+            laterality: {
+                f"{wavelength}_uid": synthetic_uid(seed, patientid, laterality, "flio", wavelength)
+                for wavelength in ["short", "long"]
+            }
+            for laterality in ["L", "R"]
+        }
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as file:
+        json.dump(data, file, indent=4)
+
+
+def generate_participant(output, index, devices, seed=0, pixels=True, batch_size=50):
+    """
+    Write every synthetic file of one participant (both eyes) under the device input folders.
+
+    Cirrus, Topcon and FLIO data are grouped in batch folders of batch_size participants,
+    like the exports read by process_cirrus.py, process_topcon.py and process_flio.py.
+
+    Args:
+        output (str): The corpus root folder.
+        index (int): The zero-based participant index.
+        devices (list): The devices to generate, see synthetic_devices.
+        seed (int): The corpus seed.
+        pixels (bool): If False, only headers are written.
+        batch_size (int): The number of participants per batch folder.
+
+    Returns:
+        list: (device, path, size in bytes) of every written file.
+    """
+    batch = f"batch_{index // batch_size:04d}"
+    written = []
+    for laterality in ["R", "L"]:
+        patient = participant_info(index, laterality, seed)
+        name = f"{patient['PatientID']}_{patient['Eye']}"
+
+        if "cirrus" in devices:
+            for protocol in cirrus_protocols:
+                folder = f"{output}/cirrus/{batch}/{name}_{protocol}"
+                for path, size in generate_cirrus_acquisition(
+                    folder, patient, protocol, seed, pixels
+                ):
+                    written.append(("cirrus", path, size))
+
+        if "topcon" in devices:
+            for acquisition, protocol in enumerate(topcon_protocols, start=1):
+                folder = f"{output}/topcon/{batch}/{name}_{protocol}"
+                for path, size in generate_topcon_acquisition(
+                    folder, patient, protocol, seed, acquisition, pixels
+                ):
+                    written.append(("topcon", path, size))
+
+        if "spectralis" in devices:
+            folder = f"{output}/spectralis/{patient['PatientID']}"
+            for path, size in generate_spectralis_files(folder, patient, seed, pixels):
+                written.append(("spectralis", path, size))
+
+        if "eidon" in devices:
+            folder = f"{output}/eidon/{patient['PatientID']}"
+            for path, size in generate_eidon_files(folder, patient, seed, pixels):
+                written.append(("eidon", path, size))
+
+        if "optomed" in devices:
+            folder = f"{output}/optomed/{patient['PatientID']}"
+            for path, size in generate_optomed_files(folder, patient, seed, pixels):
+                written.append(("optomed", path, size))
+
+        if "flio" in devices:
+            folder = f"{output}/flio/{batch}/{patient['PatientID']}/{patient['Eye']}"
+            for path, size in generate_flio_files(folder, patient, pixels):
+                written.append(("flio", path, size))
+
+    return written
+
+
+def files_per_participant(devices):
+    """
+    Return the number of files generate_participant writes for one participant.
+
+    Args:
+        devices (list): The devices to generate, see synthetic_devices.
+
+    Returns:
+        int: The number of files (both eyes).
+    """
+    per_eye = {
+        "cirrus": sum(15 if spec["angio"] else 7 for spec in cirrus_protocols.values()),
+        "topcon": sum(8 if spec["angio"] else 3 for spec in topcon_protocols.values()),
+        "spectralis": 2 * len(spectralis_protocols),
+        "eidon": len(eidon_fields),
+        "optomed": len(optomed_fields),
+        "flio": 2,
+    }
+    return 2 * sum(per_eye[device] for device in devices)
+
+
+def generate_corpus(
+    output,
+    participants=10,
+    devices=None,
+    seed=0,
+    pixels=True,
+    batch_size=50,
+    n_jobs=-1,
+):
+    """
+    Write a synthetic corpus with the input layout of every process_*.py driver.
+
+    The corpus is written under output/<device>, each folder being a valid --input-folder
+    for the matching driver; process_flio.py also takes output/flio_uid_data.json as
+    --json-path. Headers carry consistent patient IDs, lateralities and UIDs (the OCTs
+    reference their photos, the enfaces their segmentation) and pixel data has its
+    realistic size but is written sparsely, so large corpora fit on a laptop.
+    The same seed always produces the same corpus.
+
+    Args:
+        output (str): The corpus root folder.
+        participants (int): The number of participants.
+        devices (list, optional): The devices to generate. Defaults to synthetic_devices.
+        seed (int): The corpus seed.
+        pixels (bool): If False, only headers are written.
+        batch_size (int): The number of participants per Cirrus, Topcon and FLIO batch folder.
+        n_jobs (int): The number of parallel jobs (-1 uses all cores).
+
+    Returns:
+        dict: A dictionary with the keys "Output", "Participants", "Files", "Bytes"
+        (apparent size) and "Devices" (files per device).
+    """
+    devices = devices or synthetic_devices
+    unknown = set(devices) - set(synthetic_devices)
+    if unknown:
+        raise ValueError(f"Unknown devices: {sorted(unknown)}")
+
+    if "flio" in devices:
+        write_flio_uid_data(f"{output}/flio_uid_data.json", participants, seed)
+
+    results = Parallel(n_jobs=n_jobs)(
+        delayed(generate_participant)(output, index, devices, seed, pixels, batch_size)
+        for index in range(participants)
+    )
+
+    counts = {device: 0 for device in devices}
+    total_files = 0
+    total_bytes = 0
+    for written in results:
+        for device, path, size in written:
+            counts[device] += 1
+            total_files += 1
+            total_bytes += size
+
+    dic = {
+        "Output": output,
+        "Participants": participants,
+        "Files": total_files,
+        "Bytes": total_bytes,
+        "Devices": counts,
+    }
+
+    return dic